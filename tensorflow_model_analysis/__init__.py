@@ -31,10 +31,12 @@ from tensorflow_model_analysis.api.model_eval_lib import ExtractEvaluateAndWrite
 from tensorflow_model_analysis.api.model_eval_lib import InputsToExtracts
 from tensorflow_model_analysis.api.model_eval_lib import load_eval_result
 from tensorflow_model_analysis.api.model_eval_lib import load_eval_results
+from tensorflow_model_analysis.api.model_eval_lib import load_validation_failures
 from tensorflow_model_analysis.api.model_eval_lib import load_validation_result
 from tensorflow_model_analysis.api.model_eval_lib import make_eval_results
 from tensorflow_model_analysis.api.model_eval_lib import multiple_data_analysis
 from tensorflow_model_analysis.api.model_eval_lib import multiple_model_analysis
+from tensorflow_model_analysis.api.model_eval_lib import recompute_metrics
 from tensorflow_model_analysis.api.model_eval_lib import run_model_analysis
 from tensorflow_model_analysis.api.model_eval_lib import WriteResults
 from tensorflow_model_analysis.api.model_eval_lib import ValidationResult
@@ -42,6 +44,7 @@ from tensorflow_model_analysis.api.model_eval_lib import ValidationResult
 from tensorflow_model_analysis.api.verifier_lib import Validate
 
 from tensorflow_model_analysis.config import AggregationOptions
+from tensorflow_model_analysis.config import BatchSizeOptions
 from tensorflow_model_analysis.config import BinarizationOptions
 from tensorflow_model_analysis.config import EvalConfig
 from tensorflow_model_analysis.config import GenericChangeThreshold
@@ -54,6 +57,7 @@ from tensorflow_model_analysis.config import Options
 from tensorflow_model_analysis.config import SlicingSpec
 from tensorflow_model_analysis.config import update_eval_config_with_defaults
 from tensorflow_model_analysis.config import verify_eval_config
+from tensorflow_model_analysis.config import WindowingSpec
 
 from tensorflow_model_analysis.constants import ANALYSIS_KEY
 from tensorflow_model_analysis.constants import ATTRIBUTIONS_KEY
@@ -44,6 +44,9 @@ from tensorflow_model_analysis.extractors import input_extractor
 from tensorflow_model_analysis.extractors import predict_extractor
 from tensorflow_model_analysis.extractors import predict_extractor_v2
 from tensorflow_model_analysis.extractors import slice_key_extractor
+from tensorflow_model_analysis.metrics import calibration_histogram
+from tensorflow_model_analysis.metrics import metric_specs
+from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.post_export_metrics import post_export_metrics
 from tensorflow_model_analysis.proto import config_pb2
 from tensorflow_model_analysis.proto import validation_result_pb2
@@ -151,7 +154,12 @@ def _load_eval_run(
 # in this order. Note MetricValue uses oneof so metric values will always
 # contain only a single key representing the type in the oneof and the actual
 # metric value is in the value.
-EvalResult = NamedTuple(  # pylint: disable=invalid-name
+#
+# When loaded using load_eval_result, slicing_metrics and plots are
+# LazySlicedResults that behave like the lists above, but only deserialize the
+# results for a slice when it is accessed (see LazySlicedResults.get and
+# LazySlicedResults.find_slices).
+_EvalResult = NamedTuple(  # pylint: disable=invalid-name
     'EvalResult',
     [('slicing_metrics',
       List[Tuple[slicer.SliceKeyType,
@@ -162,6 +170,75 @@ EvalResult = NamedTuple(  # pylint: disable=invalid-name
      ('file_format', Text), ('model_location', Text)])
 
 
+class EvalResult(_EvalResult):
+  """Results of a model analysis run."""
+
+  __slots__ = ()
+
+  def to_dataframe(self,
+                   metric_names: Optional[List[Text]] = None,
+                   model_name: Optional[Text] = None) -> Any:
+    """Returns the metrics as a pandas DataFrame with one row per metric.
+
+    The metrics are read directly from the stored MetricsForSlice protos into
+    columns, which is much faster than walking slicing_metrics for results
+    with many slices. Only scalar metrics are included. Requires pandas.
+
+    Args:
+      metric_names: Optional names of the metrics to load. Defaults to all.
+      model_name: Optional model name used to select the metrics of a model in
+        multi-model evaluations. Defaults to the metrics of all models.
+
+    Returns:
+      DataFrame with the columns 'slice', one column per slice feature,
+      'model_name', 'output_name', 'sub_key', 'metric_name', 'is_diff',
+      'value', 'lower_bound', and 'upper_bound'.
+
+    Raises:
+      ValueError: If the results were not loaded using load_eval_result.
+    """
+    return _columns_to_dataframe(
+        metrics_and_plots_serialization.metrics_to_columns(
+            _records(self.slicing_metrics),
+            metric_names=metric_names,
+            model_name=model_name))
+
+  def plots_to_dataframe(
+      self, plot_type: Text = 'confusion_matrix_at_thresholds') -> Any:
+    """Returns the plots as a pandas DataFrame with one row per plot point.
+
+    Args:
+      plot_type: Name of the PlotData field to load (e.g.
+        'confusion_matrix_at_thresholds' or 'calibration_histogram_buckets').
+
+    Returns:
+      DataFrame with the columns 'slice', one column per slice feature,
+      'model_name', 'output_name', 'sub_key', and the fields of the plot points
+      (e.g. 'threshold', 'true_positives', ...).
+
+    Raises:
+      ValueError: If the results were not loaded using load_eval_result or the
+        plot type is not supported.
+    """
+    return _columns_to_dataframe(
+        metrics_and_plots_serialization.plots_to_columns(
+            _records(self.plots), plot_type))
+
+
+def _records(results: Any) -> Any:
+  """Returns the serialized records of results loaded by load_eval_result."""
+  if not isinstance(results, metrics_and_plots_serialization.LazySlicedResults):
+    raise ValueError(
+        'DataFrames can only be created for results loaded using '
+        'tfma.load_eval_result.')
+  return results.records()
+
+
+def _columns_to_dataframe(columns: Dict[Text, Any]) -> Any:
+  import pandas as pd  # pylint: disable=g-import-not-at-top
+  return pd.DataFrame(columns, columns=list(columns.keys()))
+
+
 # Define types here to avoid type errors between OSS and internal code.
 ValidationResult = validation_result_pb2.ValidationResult
 
@@ -177,6 +254,30 @@ def load_validation_result(
     return validation_records[0]
 
 
+def load_validation_failures(
+    validation_failures_path: Text
+) -> List[validation_result_pb2.MetricsValidationForSlice]:
+  """Read and deserialize the complete list of validation failures.
+
+  Unlike the ValidationResult (see load_validation_result), which only stores
+  up to Options.max_validation_failures_per_metric failures per metric, the
+  validation failures output contains every failing slice.
+
+  Args:
+    validation_failures_path: Path (prefix) of the validation failures output
+      (e.g. <output_path>/validation_failures).
+
+  Returns:
+    List of failures per slice.
+  """
+  result = []
+  for path in tf.io.gfile.glob(validation_failures_path + '*'):
+    for record in tf.compat.v1.python_io.tf_record_iterator(path):
+      result.append(
+          validation_result_pb2.MetricsValidationForSlice.FromString(record))
+  return result
+
+
 class EvalResults(object):
   """Class for results from multiple model analysis run."""
 
@@ -243,12 +344,14 @@ def load_eval_result(output_path: Text,
   """Creates an EvalResult object for use with the visualization functions."""
   eval_config, data_location, file_format, model_locations = (
       _load_eval_run(output_path))
+  # The metrics and plots are indexed by slice key and only deserialized when a
+  # slice is accessed, which keeps loading results with many slices cheap.
   metrics_proto_list = (
-      metrics_and_plots_serialization.load_and_deserialize_metrics(
+      metrics_and_plots_serialization.load_lazy_metrics(
           path=os.path.join(output_path, constants.METRICS_KEY),
           model_name=model_name))
   plots_proto_list = (
-      metrics_and_plots_serialization.load_and_deserialize_plots(
+      metrics_and_plots_serialization.load_lazy_plots(
           path=os.path.join(output_path, constants.PLOTS_KEY)))
 
   if model_name is None:
@@ -264,6 +367,69 @@ def load_eval_result(output_path: Text,
       model_location=model_location)
 
 
+def recompute_metrics(
+    output_path: Text,
+    metrics_specs: List[config.MetricsSpec],
+    eval_config: Optional[config.EvalConfig] = None
+) -> List[Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey, Any]]]:
+  """Computes metrics from the calibration histograms stored by an evaluation.
+
+  The calibration histogram is a sufficient statistic for the threshold based
+  metrics and plots (confusion matrices, precision, recall, AUC, calibration
+  plots, etc). If the evaluation stored its histograms (see
+  Options.output_calibration_histograms), such metrics can be computed for new
+  thresholds locally without a model or a Beam pipeline. The histograms used by
+  the metrics must be the same as those computed by the evaluation (e.g. the
+  same bucketing).
+
+  Args:
+    output_path: Output path of the evaluation.
+    metrics_specs: Specs for the metrics to compute. All the metrics must be
+      derived from the calibration histogram.
+    eval_config: Eval config used to create the metric computations. Defaults
+      to the config stored with the evaluation.
+
+  Returns:
+    List of (slice key, dict of metrics and plots keyed by MetricKey/PlotKey).
+
+  Raises:
+    ValueError: If the histograms were not stored or if a metric is not derived
+      from the calibration histogram.
+  """
+  if eval_config is None:
+    eval_config = _load_eval_run(output_path)[0]
+  if eval_config.options.HasField('windowing_spec'):
+    raise ValueError('recompute_metrics is not supported for windowed '
+                     'evaluations')
+  histogram_computations = {}
+  derived_computations = []
+  for c in metric_specs.to_computations(metrics_specs, eval_config=eval_config):
+    if isinstance(c, metric_types.DerivedMetricComputation):
+      derived_computations.append(c)
+    elif tuple(c.keys) not in histogram_computations:
+      histogram_computations[tuple(c.keys)] = c
+  histograms_pattern = os.path.join(output_path,
+                                    constants.CALIBRATION_HISTOGRAMS_KEY) + '*'
+  stored_histograms = (
+      metrics_and_plots_serialization
+      .load_and_deserialize_calibration_histograms(histograms_pattern))
+  if not stored_histograms:
+    raise ValueError(
+        'no calibration histograms found in {}: set '
+        'options.output_calibration_histograms to store the histograms during '
+        'the evaluation'.format(output_path))
+  result = []
+  for slice_key, histograms in stored_histograms:
+    metrics = calibration_histogram.histograms_from_protos(
+        list(histogram_computations.values()), histograms)
+    for c in derived_computations:
+      metrics.update(c.result(metrics))
+    result.append((slice_key, {
+        k: v for k, v in metrics.items() if not k.name.startswith('_')
+    }))
+  return result
+
+
 def default_eval_shared_model(
     eval_saved_model_path: Text,
     add_metrics_callbacks: Optional[List[types.AddMetricsCallbackType]] = None,
@@ -295,7 +461,8 @@ def default_eval_shared_model(
       scenarios where features are large (e.g. images) and can lead to excessive
       memory use if stored.
     tags: Model tags (e.g. 'serve' for serving or 'eval' for EvalSavedModel).
-    eval_config: Eval config. Only used for setting default tags.
+    eval_config: Eval config. Only used for setting default tags and the model
+      cache and warmup options.
   """
   if tags is None:
     if eval_config:
@@ -336,6 +503,17 @@ def default_eval_shared_model(
         add_metrics_callbacks.append(example_weight_callback)
     # pytype: enable=module-attr
 
+  model_cache_size = None
+  warmup_signature_names = None
+  if eval_config:
+    if eval_config.options.HasField('model_cache_size'):
+      model_cache_size = eval_config.options.model_cache_size.value
+    if (eval_config.options.HasField('warmup_models') and
+        eval_config.options.warmup_models.value):
+      warmup_signature_names = [
+          s.signature_name for s in eval_config.model_specs
+      ] or ['']
+
   return types.EvalSharedModel(
       model_path=eval_saved_model_path,
       add_metrics_callbacks=add_metrics_callbacks,
@@ -350,7 +528,9 @@ def default_eval_shared_model(
               include_default_metrics=include_default_metrics,
               additional_fetches=additional_fetches,
               blacklist_feature_fetches=blacklist_feature_fetches,
-              tags=tags)))
+              tags=tags,
+              model_cache_size=model_cache_size,
+              warmup_signature_names=warmup_signature_names)))
 
 
 def default_extractors(  # pylint: disable=invalid-name
@@ -468,7 +648,8 @@ def default_evaluators(  # pylint: disable=invalid-name
             k_anonymization_count=k_anonymization_count,
             desired_batch_size=desired_batch_size,
             serialize=serialize,
-            random_seed_for_testing=random_seed_for_testing)
+            random_seed_for_testing=random_seed_for_testing,
+            eval_config=eval_config)
     ]
   else:
     return [
@@ -480,7 +661,8 @@ def default_evaluators(  # pylint: disable=invalid-name
 def default_writers(
     output_path: Optional[Text],
     eval_shared_model: Optional[Union[types.EvalSharedModel,
-                                      Dict[Text, types.EvalSharedModel]]] = None
+                                      Dict[Text, types.EvalSharedModel]]] = None,
+    eval_config: Optional[config.EvalConfig] = None
 ) -> List[writer.Writer]:  # pylint: disable=invalid-name
   """Returns the default writers for use in WriteResults.
 
@@ -489,6 +671,8 @@ def default_writers(
     eval_shared_model: Optional shared model (single-model evaluation) or dict
       of shared models keyed by model name (multi-model evaluation). Only
       required if legacy add_metrics_callbacks are used.
+    eval_config: Optional eval config. If a windowing_spec is set, the results
+      are written to separate files per window.
   """
   add_metric_callbacks = []
   # The add_metric_callbacks are used in the metrics and plots serialization
@@ -508,12 +692,29 @@ def default_writers(
       constants.PLOTS_KEY:
           os.path.join(output_path, constants.PLOTS_KEY),
       constants.VALIDATIONS_KEY:
-          os.path.join(output_path, constants.VALIDATIONS_KEY)
+          os.path.join(output_path, constants.VALIDATIONS_KEY),
+      constants.ACCUMULATORS_KEY:
+          os.path.join(output_path, constants.ACCUMULATORS_KEY),
+      constants.CALIBRATION_HISTOGRAMS_KEY:
+          os.path.join(output_path, constants.CALIBRATION_HISTOGRAMS_KEY),
+      constants.VALIDATION_FAILURES_KEY:
+          os.path.join(output_path, constants.VALIDATION_FAILURES_KEY)
   }
+  max_validation_failures_per_metric = (
+      metrics_plots_and_validations_writer
+      .DEFAULT_MAX_VALIDATION_FAILURES_PER_METRIC)
+  if (eval_config and
+      eval_config.options.HasField('max_validation_failures_per_metric')):
+    max_validation_failures_per_metric = (
+        eval_config.options.max_validation_failures_per_metric.value)
   return [
       metrics_plots_and_validations_writer.MetricsPlotsAndValidationsWriter(
           output_paths=output_paths,
-          add_metrics_callbacks=add_metric_callbacks),
+          add_metrics_callbacks=add_metric_callbacks,
+          windowed=bool(eval_config and
+                        eval_config.options.HasField('windowing_spec')),
+          max_validation_failures_per_metric=max_validation_failures_per_metric
+      ),
   ]
 
 
@@ -716,6 +917,12 @@ def ExtractEvaluateAndWriteResults(  # pylint: disable=invalid-name
   and subject to change. Users should only use the TFMA functions to write and
   read the results.
 
+  If eval_config.options.windowing_spec is set, the examples may come from an
+  unbounded source (e.g. Pub/Sub in a streaming pipeline). The metrics, plots,
+  and validations are then computed per event-time window and written to
+  separate files per window under the metrics, plots, and validations
+  directories of the output_path.
+
   Args:
     examples: PCollection of input examples. Can be any format the model accepts
       (e.g. string containing CSV row, TensorFlow.Example, etc).
@@ -804,7 +1011,9 @@ def ExtractEvaluateAndWriteResults(  # pylint: disable=invalid-name
 
   if not writers:
     writers = default_writers(
-        output_path=output_path, eval_shared_model=eval_shared_model)
+        output_path=output_path,
+        eval_shared_model=eval_shared_model,
+        eval_config=eval_config)
 
   # pylint: disable=no-value-for-parameter
   _ = (
@@ -931,31 +1140,39 @@ def run_model_analysis(
     eval_config = config.EvalConfig(
         model_specs=model_specs, slicing_specs=slicing_specs, options=options)
 
-  with beam.Pipeline(options=pipeline_options) as p:
-    if file_format == 'tfrecords':
-      data = p | 'ReadFromTFRecord' >> beam.io.ReadFromTFRecord(
-          file_pattern=data_location,
-          compression_type=beam.io.filesystem.CompressionTypes.AUTO)
-    elif file_format == 'text':
-      data = p | 'ReadFromText' >> beam.io.textio.ReadFromText(data_location)
-    else:
-      raise ValueError('unknown file_format: {}'.format(file_format))
+  p = beam.Pipeline(options=pipeline_options)
+  if file_format == 'tfrecords':
+    data = p | 'ReadFromTFRecord' >> beam.io.ReadFromTFRecord(
+        file_pattern=data_location,
+        compression_type=beam.io.filesystem.CompressionTypes.AUTO)
+  elif file_format == 'text':
+    data = p | 'ReadFromText' >> beam.io.textio.ReadFromText(data_location)
+  else:
+    raise ValueError('unknown file_format: {}'.format(file_format))
 
-    # pylint: disable=no-value-for-parameter
-    _ = (
-        data
-        | 'ExtractEvaluateAndWriteResults' >> ExtractEvaluateAndWriteResults(
-            eval_config=eval_config,
-            eval_shared_model=eval_shared_model,
-            display_only_data_location=data_location,
-            display_only_file_format=file_format,
-            output_path=output_path,
-            extractors=extractors,
-            evaluators=evaluators,
-            writers=writers,
-            desired_batch_size=desired_batch_size,
-            random_seed_for_testing=random_seed_for_testing))
-    # pylint: enable=no-value-for-parameter
+  # pylint: disable=no-value-for-parameter
+  _ = (
+      data
+      | 'ExtractEvaluateAndWriteResults' >> ExtractEvaluateAndWriteResults(
+          eval_config=eval_config,
+          eval_shared_model=eval_shared_model,
+          display_only_data_location=data_location,
+          display_only_file_format=file_format,
+          output_path=output_path,
+          extractors=extractors,
+          evaluators=evaluators,
+          writers=writers,
+          desired_batch_size=desired_batch_size,
+          random_seed_for_testing=random_seed_for_testing))
+  # pylint: enable=no-value-for-parameter
+  pipeline_result = p.run()
+  pipeline_result.wait_until_finish()
+  try:
+    tf.compat.v1.logging.info(
+        'Evaluation timings:\n%s',
+        metrics_and_plots_evaluator_v2.timing_summary(pipeline_result))
+  except NotImplementedError:
+    pass  # Runner does not support querying metrics.
 
   if len(eval_config.model_specs) <= 1:
     return load_eval_result(output_path)
@@ -966,6 +1183,12 @@ def run_model_analysis(
     return EvalResults(results, constants.MODEL_CENTRIC_MODE)
 
 
+def _slicing_specs(
+    slice_spec: Optional[List[slicer.SingleSliceSpec]]
+) -> Optional[List[config.SlicingSpec]]:
+  return [s.to_proto() for s in slice_spec] if slice_spec else None
+
+
 def single_model_analysis(
     model_location: Text,
     data_location: Text,
@@ -993,21 +1216,71 @@ def single_model_analysis(
   if not tf.io.gfile.exists(output_path):
     tf.io.gfile.makedirs(output_path)
 
-  eval_config = config.EvalConfig(
-      slicing_specs=[s.to_proto() for s in slice_spec])
+  eval_config = config.EvalConfig(slicing_specs=_slicing_specs(slice_spec))
 
-  return run_model_analysis(
+  result = run_model_analysis(
       eval_config=eval_config,
       eval_shared_model=default_eval_shared_model(
           eval_saved_model_path=model_location),
       data_location=data_location,
-      output_path=output_path)  # pytype: disable=bad-return-type
+      output_path=output_path)
+  assert isinstance(result, EvalResult)
+  return result
+
+
+def _multiple_model_analysis(
+    model_locations: List[Text],
+    data_location: Text,
+    output_path: Text = None,
+    slice_spec: Optional[List[slicer.SingleSliceSpec]] = None) -> EvalResults:
+  """Runs model analysis for multiple models using a single pipeline.
+
+  A single model is evaluated exactly as in single_model_analysis. Two or more
+  models are evaluated as a multi-model EvalConfig whose model specs are named
+  model_0, model_1, ... (in the order of model_locations) and use the eval
+  signature of each EvalSavedModel.
+  """
+  if len(model_locations) == 1:
+    return EvalResults([
+        single_model_analysis(
+            model_locations[0],
+            data_location,
+            output_path=output_path,
+            slice_spec=slice_spec)
+    ], constants.MODEL_CENTRIC_MODE)
+
+  model_names = ['model_{}'.format(i) for i in range(len(model_locations))]
+  eval_config = config.EvalConfig(
+      model_specs=[
+          config.ModelSpec(name=name, signature_name=eval_constants.EVAL_TAG)
+          for name in model_names
+      ],
+      slicing_specs=_slicing_specs(slice_spec))
+  eval_shared_models = {}
+  for name, location in zip(model_names, model_locations):
+    eval_shared_models[name] = default_eval_shared_model(
+        eval_saved_model_path=location, eval_config=eval_config)
+  results = run_model_analysis(
+      eval_config=eval_config,
+      eval_shared_model=eval_shared_models,
+      data_location=data_location,
+      output_path=output_path)
+  assert isinstance(results, EvalResults)
+  return results
 
 
 def multiple_model_analysis(model_locations: List[Text], data_location: Text,
                             **kwargs) -> EvalResults:
   """Run model analysis for multiple models on the same data set.
 
+  All the models are evaluated in a single pipeline. The data is read once and
+  the predictions for each model are computed using multi-model evaluation.
+  When two or more models are given, every model is evaluated through the
+  multi-model path under the name model_i (its index in model_locations), so
+  the metrics are computed by the same evaluators as tfma.run_model_analysis
+  with a dict of shared models rather than by tfma.single_model_analysis. The
+  metrics exported by the EvalSavedModel are expected to match on both paths.
+
   Args:
     model_locations: A list of paths to the export eval saved model.
     data_location: The location of the data files.
@@ -1018,27 +1291,70 @@ def multiple_model_analysis(model_locations: List[Text], data_location: Text,
     A tfma.EvalResults containing all the evaluation results with the same order
     as model_locations.
   """
-  results = []
-  for m in model_locations:
-    results.append(single_model_analysis(m, data_location, **kwargs))
-  return EvalResults(results, constants.MODEL_CENTRIC_MODE)
+  return _multiple_model_analysis(model_locations, data_location, **kwargs)
+
+
+def _multiple_data_analysis(
+    model_location: Text,
+    data_locations: List[Text],
+    output_path: Text = None,
+    slice_spec: Optional[List[slicer.SingleSliceSpec]] = None) -> EvalResults:
+  """Runs model analysis for multiple data sets using a single pipeline."""
+  _assert_tensorflow_version()
+
+  if output_path is None:
+    output_path = tempfile.mkdtemp()
+  output_paths = []
+  for i in range(len(data_locations)):
+    data_output_path = os.path.join(output_path, 'data_{}'.format(i))
+    if not tf.io.gfile.exists(data_output_path):
+      tf.io.gfile.makedirs(data_output_path)
+    output_paths.append(data_output_path)
+
+  eval_config = config.EvalConfig(slicing_specs=_slicing_specs(slice_spec))
+  # The same shared model is used for every data set so that the model is only
+  # loaded once (per worker) for all the evaluations.
+  eval_shared_model = default_eval_shared_model(
+      eval_saved_model_path=model_location)
+
+  with beam.Pipeline() as p:
+    for i, (data_location, data_output_path) in enumerate(
+        zip(data_locations, output_paths)):
+      data = p | 'ReadFromTFRecord({})'.format(i) >> beam.io.ReadFromTFRecord(
+          file_pattern=data_location,
+          compression_type=beam.io.filesystem.CompressionTypes.AUTO)
+      # pylint: disable=no-value-for-parameter
+      _ = (
+          data
+          | 'ExtractEvaluateAndWriteResults({})'.format(i) >>
+          ExtractEvaluateAndWriteResults(
+              eval_config=eval_config,
+              eval_shared_model=eval_shared_model,
+              display_only_data_location=data_location,
+              display_only_file_format='tfrecords',
+              output_path=data_output_path))
+      # pylint: enable=no-value-for-parameter
+
+  return EvalResults([load_eval_result(path) for path in output_paths],
+                     constants.DATA_CENTRIC_MODE)
 
 
 def multiple_data_analysis(model_location: Text, data_locations: List[Text],
                            **kwargs) -> EvalResults:
   """Run model analysis for a single model on multiple data sets.
 
+  All the data sets are evaluated in a single pipeline using the same model.
+  The results for each data set are written to a separate sub-directory of
+  output_path (data_0, data_1, ...).
+
   Args:
     model_location: The location of the exported eval saved model.
     data_locations: A list of data set locations.
-    **kwargs: The args used for evaluation. See tfma.run_model_analysis() for
+    **kwargs: The args used for evaluation. See tfma.single_model_analysis() for
       details.
 
   Returns:
     A tfma.EvalResults containing all the evaluation results with the same order
     as data_locations.
   """
-  results = []
-  for d in data_locations:
-    results.append(single_model_analysis(model_location, d, **kwargs))
-  return EvalResults(results, constants.DATA_CENTRIC_MODE)
+  return _multiple_data_analysis(model_location, data_locations, **kwargs)
@@ -42,7 +42,11 @@ from tensorflow_model_analysis.evaluators.query_metrics import query_statistics
 from tensorflow_model_analysis.extractors import feature_extractor
 from tensorflow_model_analysis.extractors import predict_extractor
 from tensorflow_model_analysis.extractors import slice_key_extractor
+from tensorflow_model_analysis.metrics import calibration
+from tensorflow_model_analysis.metrics import confusion_matrix_metrics
+from tensorflow_model_analysis.metrics import confusion_matrix_plot
 from tensorflow_model_analysis.metrics import metric_specs
+from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import ndcg
 from tensorflow_model_analysis.post_export_metrics import metric_keys
 from tensorflow_model_analysis.post_export_metrics import post_export_metrics
@@ -920,6 +924,106 @@ class EvaluateTest(testutil.TensorflowModelAnalysisTest):
         plots['']['']['confusionMatrixAtThresholds']['matrices'][8001],
         expected_matrix)
 
+  def testRecomputeMetricsFromCalibrationHistograms(self):
+    model_location = self._exportEvalSavedModel(
+        fixed_prediction_estimator.simple_fixed_prediction_estimator)
+    examples = [
+        self._makeExample(prediction=0.0, label=1.0),
+        self._makeExample(prediction=0.7, label=0.0),
+        self._makeExample(prediction=0.8, label=1.0),
+        self._makeExample(prediction=1.0, label=1.0),
+        self._makeExample(prediction=1.0, label=1.0)
+    ]
+    data_location = self._writeTFExamplesToTFRecords(examples)
+    eval_config = config.EvalConfig(
+        model_specs=[config.ModelSpec(label_key='label')],
+        metrics_specs=metric_specs.specs_from_metrics(
+            [confusion_matrix_metrics.Specificity(thresholds=[0.5])]),
+        options=config.Options(output_calibration_histograms={'value': True}))
+    eval_shared_model = model_eval_lib.default_eval_shared_model(
+        eval_saved_model_path=model_location, eval_config=eval_config)
+    output_path = self._getTempDir()
+    eval_result = model_eval_lib.run_model_analysis(
+        eval_config=eval_config,
+        eval_shared_model=eval_shared_model,
+        data_location=data_location,
+        output_path=output_path)
+    self.assertMetricsAlmostEqual(
+        eval_result.slicing_metrics,
+        {(): {
+            'specificity': {
+                'doubleValue': 0.0
+            }
+        }})
+
+    # The metrics are computed at a new threshold without the model or data.
+    got = model_eval_lib.recompute_metrics(
+        output_path,
+        metric_specs.specs_from_metrics([
+            confusion_matrix_metrics.Specificity(
+                thresholds=[0.75], name='specificity_at_75'),
+            confusion_matrix_metrics.MissRate(thresholds=[0.75])
+        ]))
+    self.assertLen(got, 1)
+    slice_key, metrics = got[0]
+    self.assertEqual((), slice_key)
+    self.assertDictElementsAlmostEqual(
+        metrics, {
+            metric_types.MetricKey(name='specificity_at_75'): 1.0,
+            metric_types.MetricKey(name='miss_rate'): 0.25
+        })
+
+  def testEvalResultToDataFrame(self):
+    model_location = self._exportEvalSavedModel(
+        fixed_prediction_estimator.simple_fixed_prediction_estimator)
+    examples = [
+        self._makeExample(prediction=0.2, label=1.0),
+        self._makeExample(prediction=0.8, label=0.0),
+        self._makeExample(prediction=0.5, label=1.0)
+    ]
+    data_location = self._writeTFExamplesToTFRecords(examples)
+    eval_config = config.EvalConfig(
+        model_specs=[config.ModelSpec(label_key='label')],
+        slicing_specs=[config.SlicingSpec()],
+        metrics_specs=metric_specs.specs_from_metrics([
+            calibration.MeanLabel('mean_label'),
+            calibration.MeanPrediction('mean_prediction'),
+            confusion_matrix_plot.ConfusionMatrixPlot(num_thresholds=4)
+        ]))
+    eval_shared_model = model_eval_lib.default_eval_shared_model(
+        eval_saved_model_path=model_location, eval_config=eval_config)
+    eval_result = model_eval_lib.run_model_analysis(
+        eval_config=eval_config,
+        eval_shared_model=eval_shared_model,
+        data_location=data_location,
+        output_path=self._getTempDir())
+
+    df = eval_result.to_dataframe(
+        metric_names=['mean_label', 'mean_prediction'])
+    self.assertEqual(['Overall', 'Overall'], list(df['slice']))
+    self.assertEqual(['mean_label', 'mean_prediction'],
+                     sorted(df['metric_name']))
+    self.assertAlmostEqual(
+        2.0 / 3.0, df[df['metric_name'] == 'mean_label']['value'].iloc[0])
+
+    plots_df = eval_result.plots_to_dataframe()
+    self.assertIn('threshold', plots_df.columns)
+    self.assertIn('true_positives', plots_df.columns)
+    self.assertGreater(len(plots_df), 0)
+
+    with self.assertRaisesRegexp(ValueError, 'load_eval_result'):
+      eval_result._replace(slicing_metrics=list(
+          eval_result.slicing_metrics)).to_dataframe()
+
+  def testRecomputeMetricsWithoutStoredHistogramsRaisesError(self):
+    output_path = self._getTempDir()
+    with self.assertRaisesRegexp(ValueError, 'no calibration histograms'):
+      model_eval_lib.recompute_metrics(
+          output_path,
+          metric_specs.specs_from_metrics(
+              [confusion_matrix_metrics.Specificity()]),
+          eval_config=config.EvalConfig())
+
   def testRunModelAnalysisWithMultiplePlots(self):
     model_location = self._exportEvalSavedModel(
         fixed_prediction_estimator.simple_fixed_prediction_estimator)
@@ -1014,6 +1118,7 @@ class EvaluateTest(testutil.TensorflowModelAnalysisTest):
     # We only check some of the metrics to ensure that the end-to-end
     # pipeline works.
     self.assertEqual(2, len(eval_results._results))
+    self.assertEqual(constants.MODEL_CENTRIC_MODE, eval_results.get_mode())
     expected_result_1 = {
         (('language', 'english'),): {
             'my_mean_label': {
@@ -1039,6 +1144,33 @@ class EvaluateTest(testutil.TensorflowModelAnalysisTest):
     self.assertMetricsAlmostEqual(eval_results._results[1].slicing_metrics,
                                   expected_result_2)
 
+  def testMultipleModelAnalysisMatchesSingleModelAnalysis(self):
+    model_location = self._exportEvalSavedModel(
+        linear_classifier.simple_linear_classifier)
+    examples = [
+        self._makeExample(age=3.0, language='english', label=1.0),
+        self._makeExample(age=3.0, language='chinese', label=0.0),
+        self._makeExample(age=4.0, language='english', label=1.0),
+        self._makeExample(age=5.0, language='chinese', label=1.0)
+    ]
+    data_location = self._writeTFExamplesToTFRecords(examples)
+    slice_spec = [slicer.SingleSliceSpec(columns=['language'])]
+    single_result = model_eval_lib.single_model_analysis(
+        model_location, data_location, slice_spec=slice_spec)
+    eval_results = model_eval_lib.multiple_model_analysis(
+        [model_location, model_location], data_location, slice_spec=slice_spec)
+    # The first model of the multi-model evaluation (model_0) must produce the
+    # same metrics as evaluating the model on its own.
+    expected = {
+        s: {k: v for k, v in m[''][''].items()
+            if k in ('my_mean_label', metric_keys.EXAMPLE_COUNT)}
+        for s, m in single_result.slicing_metrics
+    }
+    self.assertLen(expected, 2)
+    got = eval_results._results[0].slicing_metrics
+    self.assertCountEqual(list(expected.keys()), [s for s, _ in got])
+    self.assertMetricsAlmostEqual(got, expected)
+
   def testMultipleDataAnalysis(self):
     model_location = self._exportEvalSavedModel(
         linear_classifier.simple_linear_classifier)
@@ -1053,6 +1185,9 @@ class EvaluateTest(testutil.TensorflowModelAnalysisTest):
         model_location, [data_location_1, data_location_2],
         slice_spec=[slicer.SingleSliceSpec(features=[('language', 'english')])])
     self.assertEqual(2, len(eval_results._results))
+    self.assertEqual(constants.DATA_CENTRIC_MODE, eval_results.get_mode())
+    self.assertEqual(eval_results._results[0].data_location, data_location_1)
+    self.assertEqual(eval_results._results[1].data_location, data_location_2)
     # We only check some of the metrics to ensure that the end-to-end
     # pipeline works.
     expected_result_1 = {
@@ -0,0 +1,249 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""End to end benchmark of run_model_analysis on synthetic data.
+
+Times run_model_analysis on the DirectRunner for different numbers of slices,
+metrics, with and without confidence intervals, and for the legacy
+(EvalSavedModel) and V2 (keras) evaluation paths. The examples per second and
+the peak RSS are reported for each configuration.
+
+To run the quick benchmark (a few small configurations suitable for CI):
+
+  python -m tensorflow_model_analysis.benchmarks.end_to_end_benchmark \
+      --benchmarks=EndToEndBenchmark.benchmarkQuick
+
+To run all the configurations (each configuration is run in a separate process
+so that the peak RSS is measured per configuration):
+
+  python -m tensorflow_model_analysis.benchmarks.end_to_end_benchmark \
+      --benchmarks=EndToEndBenchmark.benchmarkFull
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis.api import model_eval_lib
+from tensorflow_model_analysis.benchmarks import synthetic_data
+from tensorflow_model_analysis.eval_saved_model.example_trainers import fixed_prediction_estimator_extra_fields
+from tensorflow_model_analysis.metrics import calibration
+from tensorflow_model_analysis.metrics import calibration_plot
+from tensorflow_model_analysis.metrics import confusion_matrix_plot
+from tensorflow_model_analysis.metrics import metric_specs
+from tensorflow_model_analysis.metrics import multi_class_confusion_matrix_plot
+from tensorflow_model_analysis.post_export_metrics import post_export_metrics
+
+from typing import Dict, List, NamedTuple, Text
+
+CALIBRATION = 'calibration'
+CONFUSION_MATRICES = 'confusion_matrices'
+MULTI_CLASS_PLOTS = 'multi_class_plots'
+
+_NUM_THRESHOLDS = 1000
+_NUM_CLASSES = 3
+
+_QUICK_NUM_EXAMPLES = 200
+_FULL_NUM_EXAMPLES = 50000
+
+BenchmarkConfig = NamedTuple(
+    'BenchmarkConfig',
+    [
+        # Number of distinct slices (in addition to the overall slice).
+        ('num_slices', int),
+        # One of CALIBRATION, CONFUSION_MATRICES, MULTI_CLASS_PLOTS.
+        ('metrics', Text),
+        ('compute_confidence_intervals', bool),
+        # True to use the legacy EvalSavedModel path, False for V2 (keras).
+        ('legacy', bool)
+    ])
+
+
+def _config_name(benchmark_config: BenchmarkConfig) -> Text:
+  return '{}_{}_slices_{}{}'.format(
+      'legacy' if benchmark_config.legacy else 'v2',
+      benchmark_config.num_slices, benchmark_config.metrics,
+      '_with_ci' if benchmark_config.compute_confidence_intervals else '')
+
+
+def quick_configs() -> List[BenchmarkConfig]:
+  """Returns configurations run in quick mode."""
+  return [
+      BenchmarkConfig(1, CALIBRATION, False, False),
+      BenchmarkConfig(100, CONFUSION_MATRICES, False, False),
+      BenchmarkConfig(1, CALIBRATION, False, True),
+  ]
+
+
+def full_configs() -> List[BenchmarkConfig]:
+  """Returns all configurations."""
+  result = []
+  for num_slices, metrics, ci, legacy in itertools.product(
+      [1, 100, 10000], [CALIBRATION, CONFUSION_MATRICES, MULTI_CLASS_PLOTS],
+      [False, True], [False, True]):
+    if legacy and metrics == MULTI_CLASS_PLOTS:
+      continue  # The legacy EvalSavedModel used is a binary model.
+    result.append(BenchmarkConfig(num_slices, metrics, ci, legacy))
+  return result
+
+
+def _peak_rss_mb() -> float:
+  """Returns peak resident set size of the current process in MB."""
+  import resource  # pylint: disable=g-import-not-at-top
+  # ru_maxrss is in kilobytes on Linux.
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _v2_metrics(metrics: Text) -> List[config.MetricsSpec]:
+  if metrics == CALIBRATION:
+    return metric_specs.specs_from_metrics([
+        calibration.MeanLabel('mean_label'),
+        calibration.MeanPrediction('mean_prediction'),
+        calibration.Calibration('calibration'),
+        calibration_plot.CalibrationPlot()
+    ])
+  elif metrics == CONFUSION_MATRICES:
+    return metric_specs.specs_from_metrics([
+        confusion_matrix_plot.ConfusionMatrixPlot(
+            num_thresholds=_NUM_THRESHOLDS)
+    ])
+  elif metrics == MULTI_CLASS_PLOTS:
+    return metric_specs.specs_from_metrics(
+        [multi_class_confusion_matrix_plot.MultiClassConfusionMatrixPlot()])
+  raise ValueError('unknown metrics: {}'.format(metrics))
+
+
+def _legacy_metrics(metrics: Text) -> List[object]:
+  if metrics == CALIBRATION:
+    return [
+        post_export_metrics.calibration(),
+        post_export_metrics.calibration_plot_and_prediction_histogram()
+    ]
+  elif metrics == CONFUSION_MATRICES:
+    return [
+        post_export_metrics.confusion_matrix_at_thresholds(
+            thresholds=list(np.linspace(0.0, 1.0, _NUM_THRESHOLDS)))
+    ]
+  raise ValueError('unsupported legacy metrics: {}'.format(metrics))
+
+
+def run_benchmark_config(benchmark_config: BenchmarkConfig, num_examples: int,
+                         work_dir: Text) -> Dict[Text, float]:
+  """Runs run_model_analysis for config and returns timing and memory stats.
+
+  Args:
+    benchmark_config: Benchmark configuration.
+    num_examples: Number of synthetic examples to evaluate.
+    work_dir: Directory for storing the data, models, and outputs.
+
+  Returns:
+    Dict with the wall_time, examples_per_sec, and peak_rss_mb.
+  """
+  name = _config_name(benchmark_config)
+  num_classes = (
+      _NUM_CLASSES if benchmark_config.metrics == MULTI_CLASS_PLOTS else 2)
+  data_location = os.path.join(work_dir, '{}_data.tfrecord'.format(name))
+  synthetic_data.write_examples(
+      synthetic_data.make_examples(
+          num_examples,
+          num_slices=benchmark_config.num_slices,
+          num_classes=num_classes), data_location)
+
+  slicing_specs = [config.SlicingSpec()]
+  if benchmark_config.num_slices > 1:
+    slicing_specs.append(
+        config.SlicingSpec(feature_keys=[synthetic_data.SLICE_FEATURE]))
+  eval_config = config.EvalConfig(
+      model_specs=[config.ModelSpec(label_key=synthetic_data.LABEL_KEY)],
+      slicing_specs=slicing_specs)
+  eval_config.options.compute_confidence_intervals.value = (
+      benchmark_config.compute_confidence_intervals)
+
+  model_dir = os.path.join(work_dir, '{}_model'.format(name))
+  if benchmark_config.legacy:
+    _, eval_export_dir = (
+        fixed_prediction_estimator_extra_fields
+        .simple_fixed_prediction_estimator_extra_fields(None, model_dir))
+    eval_shared_model = model_eval_lib.default_eval_shared_model(
+        eval_saved_model_path=eval_export_dir,
+        add_metrics_callbacks=_legacy_metrics(benchmark_config.metrics))
+  else:
+    synthetic_data.export_keras_model(model_dir, num_classes=num_classes)
+    eval_config.metrics_specs.extend(_v2_metrics(benchmark_config.metrics))
+    eval_shared_model = model_eval_lib.default_eval_shared_model(
+        eval_saved_model_path=model_dir, eval_config=eval_config)
+
+  start = time.time()
+  model_eval_lib.run_model_analysis(
+      eval_shared_model=eval_shared_model,
+      eval_config=eval_config,
+      data_location=data_location,
+      output_path=os.path.join(work_dir, '{}_output'.format(name)))
+  delta = time.time() - start
+  return {
+      'wall_time': delta,
+      'examples_per_sec': num_examples / delta,
+      'peak_rss_mb': _peak_rss_mb()
+  }
+
+
+class EndToEndBenchmark(tf.test.Benchmark):
+  """End to end benchmarks of run_model_analysis."""
+
+  def _run(self, configs: List[BenchmarkConfig], num_examples: int,
+           isolate: bool):
+    work_dir = tempfile.mkdtemp()
+    for benchmark_config in configs:
+      if isolate:
+        # A fresh process per config so that the peak RSS is per config.
+        pool = multiprocessing.get_context('spawn').Pool(1)
+        try:
+          stats = pool.apply(run_benchmark_config,
+                             (benchmark_config, num_examples, work_dir))
+        finally:
+          pool.close()
+          pool.join()
+      else:
+        stats = run_benchmark_config(benchmark_config, num_examples, work_dir)
+      self.report_benchmark(
+          name=_config_name(benchmark_config),
+          iters=1,
+          wall_time=stats['wall_time'],
+          extras={
+              'num_examples': num_examples,
+              'examples_per_sec': stats['examples_per_sec'],
+              'peak_rss_mb': stats['peak_rss_mb']
+          })
+
+  def benchmarkQuick(self):
+    # Run in process to avoid the cost of importing TF per config (the peak
+    # RSS is therefore cumulative).
+    self._run(quick_configs(), _QUICK_NUM_EXAMPLES, isolate=False)
+
+  def benchmarkFull(self):
+    self._run(full_configs(), _FULL_NUM_EXAMPLES, isolate=True)
+
+
+if __name__ == '__main__':
+  tf.test.main()
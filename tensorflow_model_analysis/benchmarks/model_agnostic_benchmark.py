@@ -0,0 +1,157 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark of the parsing paths used for model-agnostic evaluation.
+
+Compares the time taken to get from serialized examples to labels and
+predictions on the DirectRunner using:
+  graph: The ModelAgnosticExtractor, which parses the examples by running
+    tf.io.parse_example in a TF session (using the feature_spec of the
+    ModelAgnosticConfig) and splits the results into one FPL per example.
+  numpy: The InputExtractor, which decodes the examples into NumPy arrays using
+    tfx_bsl's example_coder and reads the labels and predictions using the
+    label_key and prediction_key of the ModelSpec (no TF graph or session).
+
+To run the quick benchmark (small enough for CI):
+
+  python -m tensorflow_model_analysis.benchmarks.model_agnostic_benchmark \
+      --benchmarks=ModelAgnosticBenchmark.benchmarkQuick
+
+To run the benchmark on more examples:
+
+  python -m tensorflow_model_analysis.benchmarks.model_agnostic_benchmark \
+      --benchmarks=ModelAgnosticBenchmark.benchmarkFull
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import time
+
+import apache_beam as beam
+import tensorflow as tf
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis import constants
+from tensorflow_model_analysis import types
+from tensorflow_model_analysis.api import model_eval_lib
+from tensorflow_model_analysis.benchmarks import synthetic_data
+from tensorflow_model_analysis.extractors import input_extractor
+from tensorflow_model_analysis.metrics import metric_util
+from tensorflow_model_analysis.model_agnostic_eval import model_agnostic_extractor
+from tensorflow_model_analysis.model_agnostic_eval import model_agnostic_predict
+
+from typing import Any, List, Text, Tuple
+
+GRAPH = 'graph'
+NUMPY = 'numpy'
+
+_QUICK_NUM_EXAMPLES = 1000
+_FULL_NUM_EXAMPLES = 100000
+_DESIRED_BATCH_SIZE = 100
+
+
+def _model_agnostic_config() -> model_agnostic_predict.ModelAgnosticConfig:
+  return model_agnostic_predict.ModelAgnosticConfig(
+      label_keys=[synthetic_data.LABEL_KEY],
+      prediction_keys=['prediction'],
+      feature_spec={
+          synthetic_data.INPUT_NAME:
+              tf.io.FixedLenFeature([synthetic_data.NUM_FEATURES],
+                                    tf.float32),
+          'prediction':
+              tf.io.FixedLenFeature([1], tf.float32),
+          synthetic_data.LABEL_KEY:
+              tf.io.FixedLenFeature([1], tf.float32),
+          synthetic_data.SLICE_FEATURE:
+              tf.io.VarLenFeature(tf.string),
+          'fixed_float':
+              tf.io.FixedLenFeature([1], tf.float32),
+          'fixed_int':
+              tf.io.FixedLenFeature([1], tf.int64),
+      })
+
+
+def _fpl_to_label_and_prediction(extracts: types.Extracts) -> Tuple[Any, Any]:
+  fpl = extracts[constants.FEATURES_PREDICTIONS_LABELS_KEY]
+  return (fpl.labels[synthetic_data.LABEL_KEY]['node'],
+          fpl.predictions['prediction']['node'])
+
+
+def run_benchmark(path: Text, serialized_examples: List[bytes]) -> float:
+  """Parses the examples using the given path and returns the wall time.
+
+  Args:
+    path: One of GRAPH or NUMPY.
+    serialized_examples: Serialized tf.train.Examples.
+  """
+  model_agnostic_config = _model_agnostic_config()
+  start = time.time()
+  with beam.Pipeline() as pipeline:
+    extracts = (
+        pipeline
+        | 'Create' >> beam.Create(serialized_examples)
+        | 'InputsToExtracts' >> model_eval_lib.InputsToExtracts())
+    if path == GRAPH:
+      extractor = model_agnostic_extractor.ModelAgnosticExtractor(
+          model_agnostic_config, desired_batch_size=_DESIRED_BATCH_SIZE)
+      inputs = (
+          extracts
+          | extractor.stage_name >> extractor.ptransform
+          | 'ToInputs' >> beam.Map(_fpl_to_label_and_prediction))
+    elif path == NUMPY:
+      model_spec = (
+          model_agnostic_predict.model_spec_from_model_agnostic_config(
+              model_agnostic_config))
+      extractor = input_extractor.InputExtractor(
+          eval_config=config.EvalConfig(model_specs=[model_spec]))
+      inputs = (
+          extracts
+          | extractor.stage_name >> extractor.ptransform
+          | 'ToInputs' >> beam.Map(metric_util.to_standard_metric_inputs))
+    else:
+      raise ValueError('unknown path: {}'.format(path))
+    _ = inputs | 'Count' >> beam.combiners.Count.Globally()
+  return time.time() - start
+
+
+class ModelAgnosticBenchmark(tf.test.Benchmark):
+  """Benchmarks of the model-agnostic parsing paths."""
+
+  def _run(self, num_examples: int):
+    serialized_examples = [
+        e.SerializeToString()
+        for e in synthetic_data.make_examples(num_examples, num_slices=10)
+    ]
+    for path in (GRAPH, NUMPY):
+      wall_time = run_benchmark(path, serialized_examples)
+      self.report_benchmark(
+          name=path,
+          iters=1,
+          wall_time=wall_time,
+          extras={
+              'num_examples': num_examples,
+              'examples_per_sec': num_examples / wall_time
+          })
+
+  def benchmarkQuick(self):
+    self._run(_QUICK_NUM_EXAMPLES)
+
+  def benchmarkFull(self):
+    self._run(_FULL_NUM_EXAMPLES)
+
+
+if __name__ == '__main__':
+  tf.test.main()
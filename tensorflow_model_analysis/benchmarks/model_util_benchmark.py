@@ -0,0 +1,94 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark for rebatching extracts into model inputs.
+
+Compares rebatch_by_input_names with a precompiled RebatchPlan on batches of
+extracts with 200 input features.
+
+To run the benchmark:
+
+  python -m tensorflow_model_analysis.benchmarks.model_util_benchmark \
+      --benchmarks=RebatchBenchmark
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis import constants
+from tensorflow_model_analysis import model_util
+
+_NUM_FEATURES = 200
+_BATCH_SIZE = 1000
+_NUM_BATCHES = 20
+
+
+class RebatchBenchmark(tf.test.Benchmark):
+  """Benchmarks for rebatching extracts into model inputs."""
+
+  def _setup(self):
+    random_state = np.random.RandomState(0)
+    input_names = ['feature_{}'.format(i) for i in range(_NUM_FEATURES)]
+    # Half of the inputs only have a batch dimension (and must be flattened).
+    input_specs = {
+        name: tf.TensorSpec(shape=(None,) if i % 2 else (None, 1))
+        for i, name in enumerate(input_names)
+    }
+    batch_of_extracts = []
+    for _ in range(_BATCH_SIZE):
+      batch_of_extracts.append({
+          constants.FEATURES_KEY: {
+              name: random_state.rand(1).astype(np.float32)
+              for name in input_names
+          }
+      })
+    return input_names, input_specs, batch_of_extracts
+
+  def _report(self, name, delta):
+    num_examples = _BATCH_SIZE * _NUM_BATCHES
+    self.report_benchmark(
+        name=name,
+        iters=_NUM_BATCHES,
+        wall_time=delta,
+        extras={
+            'num_features': _NUM_FEATURES,
+            'batch_size': _BATCH_SIZE,
+            'examples_per_sec': num_examples / delta
+        })
+
+  def benchmarkRebatchByInputNames(self):
+    input_names, input_specs, batch_of_extracts = self._setup()
+    start = time.time()
+    for _ in range(_NUM_BATCHES):
+      model_util.rebatch_by_input_names(batch_of_extracts, input_names,
+                                        input_specs)
+    self._report('rebatch_by_input_names', time.time() - start)
+
+  def benchmarkRebatchPlan(self):
+    input_names, input_specs, batch_of_extracts = self._setup()
+    plan = model_util.RebatchPlan(input_names, input_specs)
+    start = time.time()
+    for _ in range(_NUM_BATCHES):
+      plan.rebatch(batch_of_extracts)
+    self._report('rebatch_plan', time.time() - start)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,115 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark for vectorized NDCG over padded query batches.
+
+Compares the per-query ranking that was previously used by the NDCG combiner
+with the vectorized batch computation on 1M queries x 50 candidates.
+
+To run the benchmark:
+
+  python -m tensorflow_model_analysis.benchmarks.ndcg_benchmark \
+      --benchmarks=NDCGBenchmark
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis.metrics import metric_util
+from tensorflow_model_analysis.metrics import ndcg
+
+from typing import List
+
+_NUM_QUERIES = 1000000
+_NUM_CANDIDATES = 50
+# The per-query implementation is too slow to run over all queries so it is run
+# over a sample and extrapolated.
+_NUM_PER_QUERY_SAMPLES = 10000
+_TOP_KS = [1, 5, 10, 20, 50]
+
+
+def _per_query_ndcg_at_k(gains: np.ndarray, predictions: np.ndarray,
+                         top_ks: List[int]) -> List[float]:
+  """Computes NDCG@k for a single query one k at a time."""
+  sorted_gains = gains[np.argsort(predictions)[::-1]]
+  optimal_gains = np.sort(gains)[::-1]
+  result = []
+  for k in top_ks:
+    max_rank = min(k, len(gains))
+    discounts = np.log2(np.array(range(2, max_rank + 2)))
+    dcg = np.sum(sorted_gains[:max_rank] / discounts)
+    optimal_dcg = np.sum(optimal_gains[:max_rank] / discounts)
+    result.append(dcg / optimal_dcg if optimal_dcg > 0 else 0.0)
+  return result
+
+
+class NDCGBenchmark(tf.test.Benchmark):
+  """Benchmarks for NDCG."""
+
+  def _random_queries(self, random_state: np.random.RandomState,
+                      num_queries: int):
+    lengths = random_state.randint(1, _NUM_CANDIDATES + 1, size=num_queries)
+    gains = [random_state.randint(0, 5, size=n).astype(np.float64)
+             for n in lengths]
+    predictions = [random_state.rand(n) for n in lengths]
+    return gains, predictions
+
+  def benchmarkPerQueryNDCG(self):
+    random_state = np.random.RandomState(0)
+    gains, predictions = self._random_queries(random_state,
+                                              _NUM_PER_QUERY_SAMPLES)
+    start = time.time()
+    for g, p in zip(gains, predictions):
+      _per_query_ndcg_at_k(g, p, _TOP_KS)
+    delta = time.time() - start
+    self.report_benchmark(
+        name='per_query_ndcg',
+        iters=_NUM_PER_QUERY_SAMPLES,
+        wall_time=delta * _NUM_QUERIES / _NUM_PER_QUERY_SAMPLES,
+        extras={
+            'num_queries': _NUM_QUERIES,
+            'num_candidates': _NUM_CANDIDATES,
+            'queries_per_sec': _NUM_PER_QUERY_SAMPLES / delta
+        })
+
+  def benchmarkBatchedNDCG(self):
+    random_state = np.random.RandomState(0)
+    batch_size = ndcg._NDCGCombiner._BATCH_SIZE  # pylint: disable=protected-access
+    delta = 0.0
+    for _ in range(_NUM_QUERIES // batch_size):
+      gains, predictions = self._random_queries(random_state, batch_size)
+      start = time.time()
+      padded_gains, mask = metric_util.pad_and_stack(gains)
+      padded_predictions, _ = metric_util.pad_and_stack(predictions)
+      ndcg._ndcg_at_k(padded_gains, padded_predictions, mask, _TOP_KS)  # pylint: disable=protected-access
+      delta += time.time() - start
+    self.report_benchmark(
+        name='batched_ndcg',
+        iters=_NUM_QUERIES,
+        wall_time=delta,
+        extras={
+            'num_queries': _NUM_QUERIES,
+            'num_candidates': _NUM_CANDIDATES,
+            'queries_per_sec': _NUM_QUERIES / delta
+        })
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,104 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Synthetic data and models used by the benchmarks.
+
+The examples contain the following features:
+  x: Dense float features of length NUM_FEATURES (input to the keras models).
+  prediction: Float in [0, 1] (used as the prediction of the EvalSavedModel
+    exported by fixed_prediction_estimator_extra_fields).
+  label: Binary label (or class id in [0, num_classes) for multi-class).
+  fixed_string: Slice the example belongs to ('slice_<i>').
+  fixed_float, fixed_int: Extra fields parsed by the EvalSavedModel.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from typing import List, Text
+
+NUM_FEATURES = 8
+SLICE_FEATURE = 'fixed_string'
+LABEL_KEY = 'label'
+INPUT_NAME = 'x'
+
+
+def make_examples(num_examples: int,
+                  num_slices: int = 1,
+                  num_classes: int = 2,
+                  random_seed: int = 0) -> List[tf.train.Example]:
+  """Returns synthetic examples.
+
+  Args:
+    num_examples: Number of examples.
+    num_slices: Number of distinct values of the slice feature (examples are
+      assigned round robin).
+    num_classes: Number of classes used for the labels.
+    random_seed: Random seed.
+  """
+  random_state = np.random.RandomState(random_seed)
+  features = random_state.rand(num_examples, NUM_FEATURES).astype(np.float32)
+  labels = random_state.randint(0, num_classes, size=num_examples)
+  predictions = random_state.rand(num_examples).astype(np.float32)
+  examples = []
+  for i in range(num_examples):
+    example = tf.train.Example()
+    feature = example.features.feature
+    feature[INPUT_NAME].float_list.value.extend(features[i])
+    feature['prediction'].float_list.value.append(predictions[i])
+    feature[LABEL_KEY].float_list.value.append(float(labels[i]))
+    feature[SLICE_FEATURE].bytes_list.value.append(
+        'slice_{}'.format(i % num_slices).encode('utf-8'))
+    feature['fixed_float'].float_list.value.append(1.0)
+    feature['fixed_int'].int64_list.value.append(1)
+    examples.append(example)
+  return examples
+
+
+def write_examples(examples: List[tf.train.Example], path: Text):
+  """Writes examples to a TFRecord file."""
+  with tf.io.TFRecordWriter(path) as writer:
+    for example in examples:
+      writer.write(example.SerializeToString())
+
+
+def export_keras_model(export_dir: Text, num_classes: int = 2):
+  """Exports a tiny (untrained) keras binary or multi-class model.
+
+  Args:
+    export_dir: Directory to save the model to.
+    num_classes: Number of classes. Binary models (num_classes == 2) output a
+      single sigmoid probability and multi-class models a softmax over the
+      classes.
+  """
+  inputs = tf.keras.layers.Input(shape=(NUM_FEATURES,), name=INPUT_NAME)
+  hidden = tf.keras.layers.Dense(16, activation=tf.nn.relu)(inputs)
+  if num_classes == 2:
+    outputs = tf.keras.layers.Dense(
+        1, activation=tf.nn.sigmoid, name='output')(
+            hidden)
+    loss = tf.keras.losses.binary_crossentropy
+  else:
+    outputs = tf.keras.layers.Dense(
+        num_classes, activation=tf.nn.softmax, name='output')(
+            hidden)
+    loss = tf.keras.losses.sparse_categorical_crossentropy
+  model = tf.keras.models.Model(inputs, outputs)
+  model.compile(optimizer=tf.keras.optimizers.Adam(lr=.001), loss=loss)
+  model.save(export_dir, save_format='tf')
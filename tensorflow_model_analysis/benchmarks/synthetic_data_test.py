@@ -0,0 +1,60 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for synthetic benchmark data."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis.benchmarks import synthetic_data
+
+
+class SyntheticDataTest(tf.test.TestCase):
+
+  def testMakeExamples(self):
+    examples = synthetic_data.make_examples(10, num_slices=3, num_classes=4)
+    self.assertLen(examples, 10)
+    slices = set()
+    for example in examples:
+      feature = example.features.feature
+      self.assertLen(feature[synthetic_data.INPUT_NAME].float_list.value,
+                     synthetic_data.NUM_FEATURES)
+      label = feature[synthetic_data.LABEL_KEY].float_list.value[0]
+      self.assertIn(label, [0.0, 1.0, 2.0, 3.0])
+      slices.add(feature[synthetic_data.SLICE_FEATURE].bytes_list.value[0])
+    self.assertEqual(slices, {b'slice_0', b'slice_1', b'slice_2'})
+
+  def testWriteExamples(self):
+    path = os.path.join(self.get_temp_dir(), 'data.tfrecord')
+    examples = synthetic_data.make_examples(5)
+    synthetic_data.write_examples(examples, path)
+    records = list(tf.compat.v1.python_io.tf_record_iterator(path))
+    self.assertEqual(records, [e.SerializeToString() for e in examples])
+
+  def testExportKerasModel(self):
+    export_dir = os.path.join(self.get_temp_dir(), 'model')
+    synthetic_data.export_keras_model(export_dir, num_classes=3)
+    model = tf.keras.models.load_model(export_dir)
+    outputs = model.predict(
+        np.zeros((2, synthetic_data.NUM_FEATURES), dtype=np.float32))
+    self.assertEqual(outputs.shape, (2, 3))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -33,6 +33,8 @@ MetricDirection = config_pb2.MetricDirection
 GenericChangeThreshold = config_pb2.GenericChangeThreshold
 GenericValueThreshold = config_pb2.GenericValueThreshold
 MetricThreshold = config_pb2.MetricThreshold
+WindowingSpec = config_pb2.WindowingSpec
+BatchSizeOptions = config_pb2.BatchSizeOptions
 Options = config_pb2.Options
 EvalConfig = config_pb2.EvalConfig
 
@@ -70,6 +70,12 @@ PLOTS_KEY = 'plots'
 VALIDATIONS_KEY = 'validations'
 # Analysis output key.
 ANALYSIS_KEY = 'analysis'
+# Per slice metric accumulators output key.
+ACCUMULATORS_KEY = 'accumulators'
+# Per slice calibration histograms output key.
+CALIBRATION_HISTOGRAMS_KEY = 'calibration_histograms'
+# Complete list of validation failures (per slice) output key.
+VALIDATION_FAILURES_KEY = 'validation_failures'
 
 # Keys for validation alternatives
 BASELINE_KEY = 'baseline'
@@ -53,6 +53,11 @@ FPLFeedConfig = NamedTuple(  # pylint: disable=invalid-name
                       ('labels', Dict[Text, Any])])
 
 
+def _add_metric_variables(left: List[Any], right: List[Any]) -> List[Any]:
+  """Returns the metric variables from two separate updates combined."""
+  return [x + y for x, y in zip(left, right)]
+
+
 class EvalMetricsGraph(object):  # pytype: disable=ignored-metaclass
   """Abstraction for a graph that is used for computing and aggregating metrics.
 
@@ -130,6 +135,11 @@ class EvalMetricsGraph(object):  # pytype: disable=ignored-metaclass
     self._batch_size_failed = (
         beam.metrics.Metrics.distribution(constants.METRICS_NAMESPACE,
                                           'batch_size_failed'))
+    self._num_bad_examples = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, 'num_bad_examples')
+    self._batch_bisection_depth = (
+        beam.metrics.Metrics.distribution(constants.METRICS_NAMESPACE,
+                                          'batch_bisection_depth'))
 
     try:
       self._construct_graph()
@@ -341,23 +351,74 @@ class EvalMetricsGraph(object):  # pytype: disable=ignored-metaclass
       # these operations into a single atomic reset_update_get operation.
       #
       # Try to run the entire batch size through. If we hit a functional issue,
-      # attempt to run the examples through serially
+      # bisect the batch so that the halves that succeed are still run through
+      # at large batch sizes and only the offending examples are isolated.
       batch_size = len(examples_list)
       try:
         self._reset_metric_variables()
         self._perform_metrics_update_list(examples_list)
         self._batch_size.update(batch_size)
       except (ValueError, tf.errors.InvalidArgumentError) as e:
-        self._reset_metric_variables()
-        self._batch_size_failed.update(batch_size)
         tf.compat.v1.logging.warning(
             'Large batch_size %s failed with error %s. '
-            'Attempting to run batch through serially.', batch_size, e)
-        for example in examples_list:
-          self._perform_metrics_update_list([example])
-          self._batch_size.update(1)
+            'Attempting to bisect the batch.', batch_size, e)
+        # Leave the graph in the same state as if the update had succeeded.
+        self._set_metric_variables(
+            self._bisect_metrics_update_get_list(examples_list, 0, 0, e))
       return self._get_metric_variables()
 
+  def _bisect_metrics_update_get_list(self, examples_list: List[Any],
+                                      offset: int, depth: int,
+                                      error: Exception) -> List[Any]:
+    """Returns metric variables for examples whose update failed with error.
+
+    The examples are split in half and each half is retried (recursively
+    bisecting any half that fails again). Lock should be acquired before calling
+    this function.
+
+    Args:
+      examples_list: Examples that failed to update the metrics.
+      offset: Offset of the examples within the batch originally passed to
+        metrics_reset_update_get_list (for debugging).
+      depth: Bisection depth of examples_list.
+      error: Error raised when updating the metrics with examples_list.
+
+    Raises:
+      The error raised by the metric update if a single example fails. The
+      error includes the example's offset, the bisection depth, and a reference
+      to the example. The example is also counted in num_bad_examples, but since
+      the error fails the bundle the counter is only visible for work items that
+      are retried or reported as failed by the runner.
+    """
+    self._batch_size_failed.update(len(examples_list))
+    if len(examples_list) == 1:
+      self._num_bad_examples.inc(1)
+      self._batch_bisection_depth.update(depth)
+      general_util.reraise_augmented(
+          error,
+          'bad example at offset %d of the batch (bisection depth %d): '
+          'input=%s' %
+          (offset, depth, general_util.input_ref(examples_list[0])))
+    half = len(examples_list) // 2
+    metric_variables = None
+    for sub_offset, sub_list in ((0, examples_list[:half]),
+                                 (half, examples_list[half:])):
+      try:
+        self._reset_metric_variables()
+        self._perform_metrics_update_list(sub_list)
+        self._batch_size.update(len(sub_list))
+        self._batch_bisection_depth.update(depth + 1)
+        sub_variables = self._get_metric_variables()
+      except (ValueError, tf.errors.InvalidArgumentError) as e:
+        sub_variables = self._bisect_metrics_update_get_list(
+            sub_list, offset + sub_offset, depth + 1, e)
+      if metric_variables is None:
+        metric_variables = sub_variables
+      else:
+        metric_variables = _add_metric_variables(metric_variables,
+                                                 sub_variables)
+    return metric_variables
+
   def _get_metric_variables(self) -> List[Any]:
     # Lock should be acquired before calling this function.
     return self._session.run(fetches=self._metric_variable_nodes)
@@ -821,6 +821,71 @@ class IntegrationTest(testutil.TensorflowModelAnalysisTest):
               inputs=tf.constant([example1.SerializeToString()]))
       self.assertAllClose(predictions['outputs'], np.array([[0.9]]))
 
+  def testMetricsResetUpdateGetListBisectsFailedBatch(self):
+    temp_eval_export_dir = self._getEvalExportDir()
+    _, eval_export_dir = (
+        fixed_prediction_estimator.simple_fixed_prediction_estimator(
+            None, temp_eval_export_dir))
+    examples_list = [
+        self._makeExample(prediction=i / 10.0,
+                          label=float(i % 2)).SerializeToString()
+        for i in range(8)
+    ]
+
+    eval_saved_model = load.EvalSavedModel(eval_export_dir)
+    expected_variables = eval_saved_model.metrics_reset_update_get_list(
+        examples_list)
+    expected_values = eval_saved_model.get_metric_values()
+
+    bisected_model = load.EvalSavedModel(eval_export_dir)
+    # pylint: disable=protected-access
+    perform_metrics_update_list = bisected_model._perform_metrics_update_list
+    batch_sizes = []
+
+    def fail_large_batches(examples):
+      batch_sizes.append(len(examples))
+      if len(examples) > 4:
+        raise ValueError('batch too large')
+      perform_metrics_update_list(examples)
+
+    bisected_model._perform_metrics_update_list = fail_large_batches
+    # pylint: enable=protected-access
+    got_variables = bisected_model.metrics_reset_update_get_list(examples_list)
+
+    # Both halves succeed, so the batch is only split once.
+    self.assertEqual([8, 4, 4], batch_sizes)
+    self.assertLen(got_variables, len(expected_variables))
+    for got, expected in zip(got_variables, expected_variables):
+      self.assertAllClose(expected, got)
+    self.assertDictElementsAlmostEqual(bisected_model.get_metric_values(),
+                                       expected_values)
+
+  def testMetricsResetUpdateGetListReportsBadExample(self):
+    temp_eval_export_dir = self._getEvalExportDir()
+    _, eval_export_dir = (
+        fixed_prediction_estimator.simple_fixed_prediction_estimator(
+            None, temp_eval_export_dir))
+    good_example = self._makeExample(prediction=0.5, label=1.0)
+    bad_example = self._makeExample(prediction=0.5, label=2.0)
+    examples_list = ([good_example.SerializeToString()] * 5 +
+                     [bad_example.SerializeToString()] +
+                     [good_example.SerializeToString()] * 2)
+
+    eval_saved_model = load.EvalSavedModel(eval_export_dir)
+    # pylint: disable=protected-access
+    perform_metrics_update_list = eval_saved_model._perform_metrics_update_list
+
+    def fail_for_bad_example(examples):
+      if bad_example.SerializeToString() in examples:
+        raise ValueError('bad label')
+      perform_metrics_update_list(examples)
+
+    eval_saved_model._perform_metrics_update_list = fail_for_bad_example
+    # pylint: enable=protected-access
+    with self.assertRaisesRegexp(
+        ValueError, 'bad label.*offset 5 of the batch.*depth 3.*input='):
+      eval_saved_model.metrics_reset_update_get_list(examples_list)
+
   def testEvaluateExistingMetricsWithExportedCustomMetricsDNN(self):
     temp_eval_export_dir = self._getEvalExportDir()
     _, eval_export_dir = dnn_classifier.simple_dnn_classifier(
@@ -292,6 +292,19 @@ class EvalSavedModel(eval_metrics_graph.EvalMetricsGraph):
 
     return (features, predictions, labels)
 
+  def get_fetch_options(self) -> Dict[Text, List[Text]]:
+    """Returns the options (other than the model) that predict_list depends on.
+
+    Returns:
+      Dict containing the sorted additional_fetches and
+      blacklist_feature_fetches.
+    """
+    return {
+        'additional_fetches': sorted(self._additional_fetches or []),
+        'blacklist_feature_fetches': sorted(self._blacklist_feature_fetches or
+                                            []),
+    }
+
   def predict(self,
               single_input: SingleInputFeedType) -> List[FetchedTensorValues]:
     """Returns fetches (features, predictions, labels, etc) for single_input.
@@ -0,0 +1,236 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Explicit (non-pickle) encoding of combiner accumulators.
+
+Accumulators stored for incremental evaluation are encoded as JSON where every
+value that is not a JSON scalar (None, bool, int, float, string) is stored as an
+object tagged with its type:
+
+  {'t': 'list' | 'tuple' | 'set' | 'frozenset', 'v': [values]}
+  {'t': 'dict', 'v': [[key, value], ...]}
+  {'t': 'bytes', 'v': base64 data}
+  {'t': 'ndarray', 'dtype': dtype, 'shape': shape, 'v': base64 data}
+  {'t': 'object_ndarray', 'shape': shape, 'v': [values]}
+  {'t': 'np_scalar', 'dtype': dtype, 'v': base64 data}
+  {'t': 'namedtuple', 'cls': class, 'fields': [names], 'v': [values]}
+  {'t': 'object', 'cls': class, 'slots': [names], 'v': {attribute: value}}
+
+Only classes defined in tensorflow_model_analysis (and a few others, see
+_ALLOWED_CLASSES) can be encoded and decoded, and decoding never runs any code
+other than creating the instance and setting its attributes, so unlike pickle
+decoding untrusted data cannot execute arbitrary code. The attribute names are
+stored with each object (and the __slots__ of classes using them, including
+any that were not set) so that changes to the layout of a class result in an
+error instead of a silently broken accumulator.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import base64
+import importlib
+import json
+
+import numpy as np
+import six
+import tensorflow as tf
+from typing import Any, List, Text, Type
+
+_TAG = 't'
+_VALUE = 'v'
+_ALLOWED_MODULE = 'tensorflow_model_analysis'
+# Classes defined outside of tensorflow_model_analysis that can be encoded.
+_ALLOWED_CLASSES = (tf.compat.v1.SparseTensorValue,)
+
+
+def _class_name(cls: Type[Any]) -> Text:
+  return '{}:{}'.format(cls.__module__,
+                        getattr(cls, '__qualname__', cls.__name__))
+
+
+def _is_allowed(name: Text) -> bool:
+  module = name.split(':', 1)[0]
+  return (module == _ALLOWED_MODULE or
+          module.startswith(_ALLOWED_MODULE + '.') or
+          name in [_class_name(c) for c in _ALLOWED_CLASSES])
+
+
+def _check_class_allowed(cls: Type[Any]):
+  if not _is_allowed(_class_name(cls)):
+    raise ValueError(
+        'accumulators of type {} cannot be stored: only types defined in {} '
+        'are supported'.format(_class_name(cls), _ALLOWED_MODULE))
+
+
+def _load_class(name: Text) -> Type[Any]:
+  """Returns class with given name (as returned by _class_name)."""
+  # Checked before importing so that no other modules are imported.
+  if not _is_allowed(name):
+    raise ValueError('accumulators of type {} are not supported'.format(name))
+  module_name, qualname = name.split(':', 1)
+  cls = importlib.import_module(module_name)
+  for part in qualname.split('.'):
+    cls = getattr(cls, part)
+  if not isinstance(cls, type):
+    raise ValueError('{} is not a class'.format(name))
+  _check_class_allowed(cls)
+  return cls
+
+
+def _attribute_names(cls: Type[Any]) -> List[Text]:
+  """Returns the names of the __slots__ defined by cls and its bases."""
+  names = []
+  for c in reversed(cls.__mro__):
+    slots = c.__dict__.get('__slots__', ())
+    if isinstance(slots, six.string_types):
+      slots = (slots,)
+    names.extend(s for s in slots if s not in ('__dict__', '__weakref__'))
+  return names
+
+
+def _encode_array(value: np.ndarray) -> Any:
+  return base64.b64encode(np.ascontiguousarray(value).tobytes()).decode('ascii')
+
+
+def encode(value: Any) -> Any:
+  """Returns JSON compatible encoding of value."""
+  if value is None or isinstance(value, (bool, float) + six.string_types):
+    return value
+  if isinstance(value, six.integer_types):
+    return value
+  if isinstance(value, bytes):
+    return {_TAG: 'bytes', _VALUE: base64.b64encode(value).decode('ascii')}
+  if isinstance(value, np.ndarray):
+    if value.dtype == object:
+      return {
+          _TAG: 'object_ndarray',
+          'shape': list(value.shape),
+          _VALUE: [encode(v) for v in value.flatten()]
+      }
+    return {
+        _TAG: 'ndarray',
+        'dtype': value.dtype.str,
+        'shape': list(value.shape),
+        _VALUE: _encode_array(value)
+    }
+  if isinstance(value, np.generic):
+    return {
+        _TAG: 'np_scalar',
+        'dtype': value.dtype.str,
+        _VALUE: _encode_array(np.asarray(value))
+    }
+  if isinstance(value, tuple) and hasattr(value, '_fields'):
+    _check_class_allowed(type(value))
+    return {
+        _TAG: 'namedtuple',
+        'cls': _class_name(type(value)),
+        'fields': list(value._fields),
+        _VALUE: [encode(v) for v in value]
+    }
+  for container_type, tag in ((list, 'list'), (tuple, 'tuple'), (set, 'set'),
+                              (frozenset, 'frozenset')):
+    if type(value) is container_type:  # pylint: disable=unidiomatic-typecheck
+      return {_TAG: tag, _VALUE: [encode(v) for v in value]}
+  if type(value) is dict:  # pylint: disable=unidiomatic-typecheck
+    return {
+        _TAG: 'dict',
+        _VALUE: [[encode(k), encode(v)] for k, v in value.items()]
+    }
+  cls = type(value)
+  _check_class_allowed(cls)
+  attributes = {}
+  for name in _attribute_names(cls):
+    if hasattr(value, name):
+      attributes[name] = encode(getattr(value, name))
+  if hasattr(value, '__dict__'):
+    for name, v in value.__dict__.items():
+      attributes[name] = encode(v)
+    return {_TAG: 'object', 'cls': _class_name(cls), _VALUE: attributes}
+  return {
+      _TAG: 'object',
+      'cls': _class_name(cls),
+      'slots': _attribute_names(cls),
+      _VALUE: attributes
+  }
+
+
+def _decode_array(encoded: Any) -> np.ndarray:
+  data = base64.b64decode(encoded[_VALUE])
+  return np.frombuffer(data, dtype=np.dtype(encoded['dtype'])).copy()
+
+
+def decode(encoded: Any) -> Any:
+  """Returns value encoded using encode."""
+  if not isinstance(encoded, dict):
+    return encoded
+  tag = encoded[_TAG]
+  if tag == 'bytes':
+    return base64.b64decode(encoded[_VALUE])
+  if tag == 'ndarray':
+    return _decode_array(encoded).reshape(encoded['shape'])
+  if tag == 'object_ndarray':
+    result = np.empty(len(encoded[_VALUE]), dtype=object)
+    for i, v in enumerate(encoded[_VALUE]):
+      result[i] = decode(v)
+    return result.reshape(encoded['shape'])
+  if tag == 'np_scalar':
+    return _decode_array(encoded)[0]
+  if tag in ('list', 'tuple', 'set', 'frozenset'):
+    container_type = {
+        'list': list,
+        'tuple': tuple,
+        'set': set,
+        'frozenset': frozenset
+    }[tag]
+    return container_type(decode(v) for v in encoded[_VALUE])
+  if tag == 'dict':
+    return {decode(k): decode(v) for k, v in encoded[_VALUE]}
+  if tag == 'namedtuple':
+    cls = _load_class(encoded['cls'])
+    if list(cls._fields) != encoded['fields']:
+      raise ValueError(
+          'fields of {} changed from {} to {} since the accumulators were '
+          'stored'.format(encoded['cls'], encoded['fields'], list(cls._fields)))
+    return cls._make(decode(v) for v in encoded[_VALUE])
+  if tag == 'object':
+    cls = _load_class(encoded['cls'])
+    result = cls.__new__(cls)
+    # Only the attributes of classes using __slots__ are known up front. Slots
+    # that were added would be left unset, so both directions are checked.
+    if not hasattr(result, '__dict__'):
+      stored = set(encoded.get('slots', encoded[_VALUE]))
+      current = set(_attribute_names(cls))
+      if stored != current:
+        raise ValueError(
+            'attributes of {} changed since the accumulators were stored: '
+            'removed={}, added={}'.format(encoded['cls'],
+                                          sorted(stored - current),
+                                          sorted(current - stored)))
+    for name, v in encoded[_VALUE].items():
+      object.__setattr__(result, name, decode(v))
+    return result
+  raise ValueError('unknown tag: {}'.format(tag))
+
+
+def dumps(value: Any) -> bytes:
+  """Returns value encoded as JSON (see module docstring)."""
+  return json.dumps(encode(value), sort_keys=True).encode('utf-8')
+
+
+def loads(serialized: bytes) -> Any:
+  """Returns value encoded using dumps."""
+  return decode(json.loads(serialized.decode('utf-8')))
@@ -0,0 +1,116 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for accumulator serialization."""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import collections
+
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis.evaluators import accumulator_serialization
+from tensorflow_model_analysis.metrics import calibration
+from tensorflow_model_analysis.metrics import calibration_histogram
+from tensorflow_model_analysis.metrics import metric_types
+
+
+class AccumulatorSerializationTest(tf.test.TestCase):
+
+  def testRoundTrip(self):
+    sums = calibration._WeightedLabelsPredictionsExamples()  # pylint: disable=protected-access
+    sums.total_weighted_labels = 1.0
+    sums.total_weighted_predictions = 0.5
+    sums.total_weighted_examples = 2.0
+    value = (
+        [sums, None, float('nan')],
+        {
+            metric_types.MetricKey(name='example_count'): np.int64(3),
+            b'bytes': {1, 2},
+            'histogram': [
+                calibration_histogram.Bucket(
+                    bucket_id=1,
+                    weighted_labels=1.0,
+                    weighted_predictions=0.5,
+                    weighted_examples=2.0)
+            ],
+        },
+        np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32),
+        np.array([b'a', 1], dtype=object),
+    )
+
+    got = accumulator_serialization.loads(
+        accumulator_serialization.dumps(value))
+
+    self.assertIsInstance(got, tuple)
+    got_sums, got_none, got_nan = got[0]
+    self.assertIsInstance(got_sums,
+                          calibration._WeightedLabelsPredictionsExamples)  # pylint: disable=protected-access
+    self.assertEqual(got_sums.total_weighted_labels, 1.0)
+    self.assertEqual(got_sums.total_weighted_predictions, 0.5)
+    self.assertEqual(got_sums.total_weighted_examples, 2.0)
+    self.assertIsNone(got_none)
+    self.assertTrue(np.isnan(got_nan))
+    self.assertDictEqual(value[1], got[1])
+    self.assertIsInstance(got[1][metric_types.MetricKey(name='example_count')],
+                          np.int64)
+    self.assertIsInstance(got[1]['histogram'][0], calibration_histogram.Bucket)
+    self.assertAllEqual(value[2], got[2])
+    self.assertEqual(got[2].dtype, np.float32)
+    self.assertEqual(list(got[3]), [b'a', 1])
+
+  def testDisallowedClassRaisesError(self):
+    with self.assertRaisesRegexp(ValueError, 'cannot be stored'):
+      accumulator_serialization.dumps(collections.OrderedDict())
+    with self.assertRaisesRegexp(ValueError, 'not supported'):
+      accumulator_serialization.decode({
+          't': 'object',
+          'cls': 'os:system',
+          'v': {}
+      })
+
+  def testChangedClassLayoutRaisesError(self):
+    encoded = accumulator_serialization.encode(
+        calibration_histogram.Bucket(
+            bucket_id=1,
+            weighted_labels=1.0,
+            weighted_predictions=0.5,
+            weighted_examples=2.0))
+    encoded['fields'] = encoded['fields'][:-1]
+    with self.assertRaisesRegexp(ValueError, 'fields of .* changed'):
+      accumulator_serialization.decode(encoded)
+
+    encoded = accumulator_serialization.encode(
+        calibration._WeightedLabelsPredictionsExamples())  # pylint: disable=protected-access
+    encoded['slots'].append('removed_attribute')
+    encoded['v']['removed_attribute'] = 1.0
+    with self.assertRaisesRegexp(ValueError,
+                                 'changed.*removed=\\[\'removed_attribute'):
+      accumulator_serialization.decode(encoded)
+
+    # A slot added to the class since the accumulator was stored.
+    encoded = accumulator_serialization.encode(
+        calibration._WeightedLabelsPredictionsExamples())  # pylint: disable=protected-access
+    added = encoded['slots'].pop()
+    del encoded['v'][added]
+    with self.assertRaisesRegexp(ValueError,
+                                 'changed.*added=\\[\'{}'.format(added)):
+      accumulator_serialization.decode(encoded)
+
+
+if __name__ == '__main__':
+  tf.test.main()
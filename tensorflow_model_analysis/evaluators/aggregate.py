@@ -19,9 +19,12 @@ from __future__ import division
 from __future__ import print_function
 
 # Standard Imports
+import time
+
 import apache_beam as beam
 import numpy as np
 
+from tensorflow_model_analysis import config
 from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import model_util
 from tensorflow_model_analysis import types
@@ -38,7 +41,9 @@ def ComputePerSliceMetrics(  # pylint: disable=invalid-name
     eval_shared_model: types.EvalSharedModel,
     desired_batch_size: Optional[int] = None,
     compute_with_sampling: Optional[bool] = False,
-    random_seed_for_testing: Optional[int] = None) -> beam.pvalue.PCollection:
+    random_seed_for_testing: Optional[int] = None,
+    eval_config: Optional[config.EvalConfig] = None
+) -> beam.pvalue.PCollection:
   """PTransform for computing, aggregating and combining metrics.
 
   Args:
@@ -47,6 +52,9 @@ def ComputePerSliceMetrics(  # pylint: disable=invalid-name
     desired_batch_size: Optional batch size for batching in Aggregate.
     compute_with_sampling: True to compute with sampling.
     random_seed_for_testing: Seed to use for unit testing.
+    eval_config: Optional eval config. The Options.metrics_batch_size_options
+      are used to configure the batch size used in Aggregate (an explicit
+      desired_batch_size takes precedence over the configured batch size).
 
   Returns:
     PCollection of (slice key, dict of metrics).
@@ -69,7 +77,8 @@ def ComputePerSliceMetrics(  # pylint: disable=invalid-name
               eval_shared_model=eval_shared_model,
               desired_batch_size=desired_batch_size,
               compute_with_sampling=compute_with_sampling,
-              seed_for_testing=random_seed_for_testing))
+              seed_for_testing=random_seed_for_testing,
+              eval_config=eval_config))
       | 'InterpretOutput' >> beam.ParDo(
           _ExtractOutputDoFn(eval_shared_model=eval_shared_model)))
 
@@ -157,25 +166,23 @@ class _AggregateCombineFn(model_util.CombineFnWithModels):
 
   # This needs to be large enough to allow for efficient TF invocations during
   # batch flushing, but shouldn't be too large as it also acts as cap on the
-  # maximum memory usage of the computation.
+  # maximum memory usage of the computation. This is only the default, the
+  # batch size (and whether it adapts) is configured using
+  # Options.metrics_batch_size_options.
   _DEFAULT_DESIRED_BATCH_SIZE = 1000
 
   def __init__(self,
                eval_shared_model: types.EvalSharedModel,
                desired_batch_size: Optional[int] = None,
                compute_with_sampling: Optional[bool] = False,
-               seed_for_testing: Optional[int] = None) -> None:
+               seed_for_testing: Optional[int] = None,
+               eval_config: Optional[config.EvalConfig] = None) -> None:
     super(_AggregateCombineFn,
           self).__init__({'': eval_shared_model.model_loader})
     self._seed_for_testing = seed_for_testing
     self._eval_metrics_graph = None  # type: eval_metrics_graph.EvalMetricsGraph
-    # We really want the batch size to be adaptive like it is in
-    # beam.BatchElements(), but there isn't an easy way to make it so.
-    # TODO(b/73789023): Figure out how to make this batch size dynamic.
-    if desired_batch_size and desired_batch_size > 0:
-      self._desired_batch_size = desired_batch_size
-    else:
-      self._desired_batch_size = self._DEFAULT_DESIRED_BATCH_SIZE
+    self._batch_sizer = model_util.get_metrics_batch_sizer(
+        eval_config, self._DEFAULT_DESIRED_BATCH_SIZE, desired_batch_size)
 
     self._compute_with_sampling = compute_with_sampling
     self._random_state = np.random.RandomState(seed_for_testing)
@@ -183,6 +190,8 @@ class _AggregateCombineFn(model_util.CombineFnWithModels):
     # Metrics.
     self._combine_batch_size = beam.metrics.Metrics.distribution(
         constants.METRICS_NAMESPACE, 'combine_batch_size')
+    self._combine_desired_batch_size = beam.metrics.Metrics.distribution(
+        constants.METRICS_NAMESPACE, 'combine_desired_batch_size')
     self._num_compacts = beam.metrics.Metrics.counter(
         constants.METRICS_NAMESPACE, 'num_compacts')
 
@@ -234,7 +243,7 @@ class _AggregateCombineFn(model_util.CombineFnWithModels):
         raise ValueError('ModelLoader does not support eval_saved_model.')
       self._eval_metrics_graph = self._loaded_models[''].eval_saved_model
     batch_size = len(accumulator.inputs)
-    if force or batch_size >= self._desired_batch_size:
+    if force or batch_size >= self._batch_sizer.batch_size:
       if accumulator.inputs:
         self._combine_batch_size.update(batch_size)
         inputs_for_metrics = accumulator.inputs
@@ -243,9 +252,12 @@ class _AggregateCombineFn(model_util.CombineFnWithModels):
           # generated by the Poisson bootstrapping technique.
           inputs_for_metrics = self._poissonify(accumulator)
         if inputs_for_metrics:
+          start = time.time()
           accumulator.add_metrics_variables(
               self._eval_metrics_graph.metrics_reset_update_get_list(
                   inputs_for_metrics))
+          self._batch_sizer.record(batch_size, time.time() - start)
+          self._combine_desired_batch_size.update(self._batch_sizer.batch_size)
         else:
           # Call to metrics_reset_update_get_list does a reset prior to the
           # metrics update, but does not handle empty updates. Explicitly
@@ -21,6 +21,7 @@ from __future__ import print_function
 # Standard Imports
 
 import apache_beam as beam
+from tensorflow_model_analysis import config
 from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis.evaluators import aggregate
@@ -47,7 +48,8 @@ def MetricsAndPlotsEvaluator(  # pylint: disable=invalid-name
     compute_confidence_intervals: Optional[bool] = False,
     k_anonymization_count: int = 1,
     serialize=False,
-    random_seed_for_testing: Optional[int] = None) -> evaluator.Evaluator:
+    random_seed_for_testing: Optional[int] = None,
+    eval_config: Optional[config.EvalConfig] = None) -> evaluator.Evaluator:
   """Creates an Evaluator for evaluating metrics and plots.
 
   Args:
@@ -65,6 +67,8 @@ def MetricsAndPlotsEvaluator(  # pylint: disable=invalid-name
     serialize: If true, serialize the metrics to protos as part of the
       evaluation as well.
     random_seed_for_testing: Provide for deterministic tests only.
+    eval_config: Optional eval config (used for the
+      Options.metrics_batch_size_options).
 
   Returns:
     Evaluator for evaluating metrics and plots. The output will be stored under
@@ -82,7 +86,8 @@ def MetricsAndPlotsEvaluator(  # pylint: disable=invalid-name
           compute_confidence_intervals=compute_confidence_intervals,
           k_anonymization_count=k_anonymization_count,
           serialize=serialize,
-          random_seed_for_testing=random_seed_for_testing))
+          random_seed_for_testing=random_seed_for_testing,
+          eval_config=eval_config))
 
 
 @beam.ptransform_fn
@@ -94,7 +99,8 @@ def ComputeMetricsAndPlots(  # pylint: disable=invalid-name
     eval_shared_model: types.EvalSharedModel,
     desired_batch_size: Optional[int] = None,
     compute_confidence_intervals: Optional[bool] = False,
-    random_seed_for_testing: Optional[int] = None
+    random_seed_for_testing: Optional[int] = None,
+    eval_config: Optional[config.EvalConfig] = None
 ) -> Tuple[beam.pvalue.DoOutputsTuple, beam.pvalue.PCollection]:
   """Computes metrics and plots using the EvalSavedModel.
 
@@ -111,6 +117,8 @@ def ComputeMetricsAndPlots(  # pylint: disable=invalid-name
     compute_confidence_intervals: Set to True to run metrics analysis over
       multiple bootstrap samples and compute uncertainty intervals.
     random_seed_for_testing: Provide for deterministic tests only.
+    eval_config: Optional eval config (used for the
+      Options.metrics_batch_size_options).
 
   Returns:
     Tuple of Tuple[PCollection of (slice key, metrics),
@@ -159,7 +167,8 @@ def ComputeMetricsAndPlots(  # pylint: disable=invalid-name
                                  if compute_confidence_intervals else 1),
           random_seed_for_testing=random_seed_for_testing,
           eval_shared_model=eval_shared_model,
-          desired_batch_size=desired_batch_size)
+          desired_batch_size=desired_batch_size,
+          eval_config=eval_config)
       | 'SeparateMetricsAndPlots' >> beam.ParDo(
           _SeparateMetricsAndPlotsFn()).with_outputs(
               _SeparateMetricsAndPlotsFn.OUTPUT_TAG_PLOTS,
@@ -180,7 +189,8 @@ def EvaluateMetricsAndPlots(  # pylint: disable=invalid-name
     compute_confidence_intervals: Optional[bool] = False,
     k_anonymization_count: int = 1,
     serialize: bool = False,
-    random_seed_for_testing: Optional[int] = None) -> evaluator.Evaluation:
+    random_seed_for_testing: Optional[int] = None,
+    eval_config: Optional[config.EvalConfig] = None) -> evaluator.Evaluation:
   """Evaluates metrics and plots using the EvalSavedModel.
 
   Args:
@@ -204,6 +214,8 @@ def EvaluateMetricsAndPlots(  # pylint: disable=invalid-name
     serialize: If true, serialize the metrics to protos as part of the
       evaluation as well.
     random_seed_for_testing: Provide for deterministic tests only.
+    eval_config: Optional eval config (used for the
+      Options.metrics_batch_size_options).
 
   Returns:
     Evaluation containing metrics and plots dictionaries keyed by 'metrics'
@@ -217,7 +229,8 @@ def EvaluateMetricsAndPlots(  # pylint: disable=invalid-name
           eval_shared_model,
           desired_batch_size,
           compute_confidence_intervals=compute_confidence_intervals,
-          random_seed_for_testing=random_seed_for_testing))
+          random_seed_for_testing=random_seed_for_testing,
+          eval_config=eval_config))
 
   if k_anonymization_count > 1:
     metrics = (
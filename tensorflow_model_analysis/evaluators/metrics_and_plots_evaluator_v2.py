@@ -20,8 +20,10 @@ from __future__ import division
 from __future__ import print_function
 
 import copy
-import datetime
-from typing import Any, Dict, Iterable, List, Optional, Text, Tuple, Type, Union
+import hashlib
+import json
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Text, Tuple, Type, Union
 import apache_beam as beam
 import numpy as np
 
@@ -30,11 +32,15 @@ from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import model_util
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis import util
+from tensorflow_model_analysis.evaluators import accumulator_serialization
 from tensorflow_model_analysis.evaluators import eval_saved_model_util
 from tensorflow_model_analysis.evaluators import evaluator
 from tensorflow_model_analysis.evaluators import metrics_validator
 from tensorflow_model_analysis.evaluators import poisson_bootstrap
+from tensorflow_model_analysis.extractors import prediction_cache
 from tensorflow_model_analysis.extractors import slice_key_extractor
+from tensorflow_model_analysis.metrics import additive_sums
+from tensorflow_model_analysis.metrics import calibration_histogram
 from tensorflow_model_analysis.metrics import metric_specs
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
@@ -44,6 +50,90 @@ from google.protobuf import message
 _COMBINER_INPUTS_KEY = '_combiner_inputs'
 _DEFAULT_COMBINER_INPUT_KEY = '_default_combiner_input'
 
+# Suffix of the Beam metrics used to record timings.
+_MICROSECONDS_SUFFIX = '_microseconds'
+_PREPROCESSOR_TIMING_SUFFIX = '_preprocessor' + _MICROSECONDS_SUFFIX
+_COMBINER_OPS = ('add_input', 'merge_accumulators', 'extract_output')
+# Number of add_input calls after which the timings are flushed to the
+# counters (updating the counters for every call is relatively expensive).
+_TIMING_FLUSH_INTERVAL = 1000
+
+
+# High resolution clock used for the timings (time.perf_counter is not
+# available in Python 2).
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _flush_seconds(counter: Any, seconds: float) -> float:
+  """Adds whole microseconds of seconds to counter and returns the remainder.
+
+  Timings are summed as float seconds and only converted to (integer)
+  microseconds when flushed so that calls taking less than a microsecond are
+  not counted as zero.
+
+  Args:
+    counter: Counter of microseconds.
+    seconds: Seconds not yet added to the counter.
+  """
+  micros = int(seconds * 1e6)
+  if micros:
+    counter.inc(micros)
+  return seconds - micros / 1e6
+
+
+def _combiner_timing_name(combiner: beam.CombineFn, op: Text) -> Text:
+  return '{}_{}{}'.format(type(combiner).__name__, op, _MICROSECONDS_SUFFIX)
+
+
+def timing_summary(pipeline_result: beam.runners.runner.PipelineResult) -> Text:
+  """Returns table summarizing the time spent per preprocessor and combiner.
+
+  The table lists the total time spent in each preprocessor (keyed by class
+  name) and in the add_input, merge_accumulators, and extract_output calls of
+  each combiner (keyed by class name) together with the share of the total
+  preprocessing and combining time respectively.
+
+  Args:
+    pipeline_result: Result of a pipeline that ran the evaluator.
+  """
+  query_result = pipeline_result.metrics().query(
+      beam.metrics.MetricsFilter().with_namespace(constants.METRICS_NAMESPACE))
+
+  def value(metric_result):
+    # Not all runners support committed metrics.
+    if metric_result.committed is not None:
+      return metric_result.committed
+    return metric_result.attempted
+
+  preprocessor_micros = {}
+  combiner_micros = {}
+  for result in query_result['counters']:
+    name = result.key.metric.name
+    if name.endswith(_PREPROCESSOR_TIMING_SUFFIX):
+      name = name[:-len(_PREPROCESSOR_TIMING_SUFFIX)]
+      preprocessor_micros[name] = (
+          preprocessor_micros.get(name, 0) + value(result))
+      continue
+    for op in _COMBINER_OPS:
+      suffix = '_{}{}'.format(op, _MICROSECONDS_SUFFIX)
+      if name.endswith(suffix):
+        key = (name[:-len(suffix)], op)
+        combiner_micros[key] = combiner_micros.get(key, 0) + value(result)
+
+  lines = []
+  for title, micros in (('preprocessor', {
+      (k, 'process'): v for k, v in preprocessor_micros.items()
+  }), ('combiner', combiner_micros)):
+    total = sum(micros.values())
+    lines.append('{:<50} {:<20} {:>12} {:>7}'.format(title, 'op', 'seconds',
+                                                      '%'))
+    for (name, op), v in sorted(
+        micros.items(), key=lambda item: item[1], reverse=True):
+      lines.append('{:<50} {:<20} {:>12.3f} {:>6.1f}%'.format(
+          name, op, v / 1e6, 100.0 * v / total if total else 0.0))
+    lines.append('')
+  return '\n'.join(lines)
+
 
 def MetricsAndPlotsEvaluator(  # pylint: disable=invalid-name
     eval_config: config.EvalConfig,
@@ -86,7 +176,10 @@ def MetricsAndPlotsEvaluator(  # pylint: disable=invalid-name
           eval_config=eval_config,
           eval_shared_models=eval_shared_models,
           metrics_key=metrics_key,
-          plots_key=plots_key))
+          plots_key=plots_key,
+          # The thresholds are compiled once here instead of once per slice.
+          compiled_thresholds=metrics_validator.CompiledMetricThresholds(
+              eval_config)))
 
 
 def _filter_and_separate_computations(
@@ -177,6 +270,63 @@ def _GroupByQueryKey(  # pylint: disable=invalid-name
           | 'DropQueryId' >> beam.Map(lambda kv: kv[1]))
 
 
+@beam.ptransform_fn
+@beam.typehints.with_input_types(types.Extracts)
+@beam.typehints.with_output_types(types.Extracts)
+def _WindowIntoEventTimeWindows(  # pylint: disable=invalid-name
+    extracts: beam.pvalue.PCollection,
+    windowing_spec: config.WindowingSpec) -> beam.pvalue.PCollection:
+  """PTransform for assigning extracts to event-time windows.
+
+  Args:
+    extracts: Incoming PCollection consisting of extracts.
+    windowing_spec: Windowing spec. If a timestamp_key is set the event time is
+      read from the feature with that name (stored under tfma.FEATURES_KEY),
+      otherwise the timestamps assigned by the source are used.
+
+  Returns:
+    PCollection of extracts assigned to fixed or sliding windows.
+
+  Raises:
+    ValueError: If the window size or period is invalid.
+  """
+  if windowing_spec.size_seconds <= 0:
+    raise ValueError('windowing_spec.size_seconds must be > 0: '
+                     'windowing_spec={}'.format(windowing_spec))
+  if windowing_spec.period_seconds < 0:
+    raise ValueError('windowing_spec.period_seconds must be >= 0: '
+                     'windowing_spec={}'.format(windowing_spec))
+
+  missing_timestamp_counter = beam.metrics.Metrics.counter(
+      constants.METRICS_NAMESPACE, 'missing_event_timestamp')
+
+  def add_event_timestamp(extracts: types.Extracts,
+                          timestamp_key: Text) -> Any:
+    """Re-assigns the timestamp of the extract using the timestamp feature."""
+    value = metric_util.to_scalar(
+        util.get_by_keys(
+            extracts, [constants.FEATURES_KEY, timestamp_key], optional=True),
+        tensor_name=timestamp_key)
+    if value is None:
+      # Keep the timestamp assigned by the source.
+      missing_timestamp_counter.inc()
+      return extracts
+    return beam.window.TimestampedValue(extracts, float(value))
+
+  if windowing_spec.timestamp_key:
+    extracts = (
+        extracts
+        | 'AddEventTimestamps' >> beam.Map(add_event_timestamp,
+                                           windowing_spec.timestamp_key))
+  if (windowing_spec.period_seconds and
+      windowing_spec.period_seconds != windowing_spec.size_seconds):
+    window_fn = beam.window.SlidingWindows(windowing_spec.size_seconds,
+                                           windowing_spec.period_seconds)
+  else:
+    window_fn = beam.window.FixedWindows(windowing_spec.size_seconds)
+  return extracts | 'WindowInto' >> beam.WindowInto(window_fn)
+
+
 class _PreprocessorDoFn(beam.DoFn):
   """Do function that computes initial state from extracts.
 
@@ -205,8 +355,17 @@ class _PreprocessorDoFn(beam.DoFn):
     self._computations = computations
     self._evaluate_num_instances = beam.metrics.Metrics.counter(
         constants.METRICS_NAMESPACE, 'evaluate_num_instances')
-    self._timer = beam.metrics.Metrics.distribution(
-        constants.METRICS_NAMESPACE, '_PreprocessorDoFn_seconds')
+    self._timer = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, '_PreprocessorDoFn' + _MICROSECONDS_SUFFIX)
+    self._preprocessor_timers = [
+        beam.metrics.Metrics.counter(
+            constants.METRICS_NAMESPACE,
+            type(c.preprocessor).__name__ + _PREPROCESSOR_TIMING_SUFFIX)
+        if c.preprocessor is not None else None for c in computations
+    ]
+    # Seconds not yet added to self._timer and self._preprocessor_timers.
+    self._pending_seconds = 0.0
+    self._pending_preprocessor_seconds = [0.0] * len(computations)
 
   def setup(self):
     for computation in self._computations:
@@ -222,6 +381,11 @@ class _PreprocessorDoFn(beam.DoFn):
     for computation in self._computations:
       if computation.preprocessor is not None:
         computation.preprocessor.finish_bundle()
+    self._pending_seconds = _flush_seconds(self._timer, self._pending_seconds)
+    for i, timer in enumerate(self._preprocessor_timers):
+      if timer is not None:
+        self._pending_preprocessor_seconds[i] = _flush_seconds(
+            timer, self._pending_preprocessor_seconds[i])
 
   def teardown(self):
     for computation in self._computations:
@@ -231,7 +395,7 @@ class _PreprocessorDoFn(beam.DoFn):
   def process(
       self, extracts: Union[types.Extracts,
                             List[types.Extracts]]) -> Iterable[Any]:
-    start_time = datetime.datetime.now()
+    start_time = _clock()
     self._evaluate_num_instances.inc(1)
 
     # Assume multiple extracts (i.e. query key used) and reset after if only one
@@ -242,12 +406,13 @@ class _PreprocessorDoFn(beam.DoFn):
     use_default_combiner_input = None
     features = None
     combiner_inputs = []
-    for computation in self._computations:
+    for i, computation in enumerate(self._computations):
       if computation.preprocessor is None:
         combiner_inputs.append(None)
         use_default_combiner_input = True
-      elif isinstance(computation.preprocessor,
-                      metric_types.FeaturePreprocessor):
+        continue
+      preprocessor_start_time = _clock()
+      if isinstance(computation.preprocessor, metric_types.FeaturePreprocessor):
         if features is None:
           features = [{} for i in range(len(list_of_extracts))]
         for i, e in enumerate(list_of_extracts):
@@ -257,6 +422,8 @@ class _PreprocessorDoFn(beam.DoFn):
         use_default_combiner_input = True
       else:
         combiner_inputs.append(next(computation.preprocessor.process(extracts)))
+      self._pending_preprocessor_seconds[i] += (
+          _clock() - preprocessor_start_time)
 
     output = {}
     # Merge the keys for all extracts together.
@@ -281,8 +448,7 @@ class _PreprocessorDoFn(beam.DoFn):
       output[_DEFAULT_COMBINER_INPUT_KEY] = default_combiner_input
     yield output
 
-    self._timer.update(
-        int((datetime.datetime.now() - start_time).total_seconds()))
+    self._pending_seconds += _clock() - start_time
 
 
 class _ComputationsCombineFn(beam.combiners.SingleInputTupleCombineFn):
@@ -323,6 +489,27 @@ class _ComputationsCombineFn(beam.combiners.SingleInputTupleCombineFn):
     # misbehaving.
     self._num_bootstrap_empties = beam.metrics.Metrics.counter(
         constants.METRICS_NAMESPACE, 'num_bootstrap_empties')
+    # Total time spent in each op of each combiner, keyed by combiner class
+    # name (so combiners of the same type are reported together).
+    self._timing_counters = {
+        op: [
+            beam.metrics.Metrics.counter(constants.METRICS_NAMESPACE,
+                                         _combiner_timing_name(c.combiner, op))
+            for c in computations
+        ] for op in _COMBINER_OPS
+    }
+    # Seconds not yet added to the timing counters.
+    self._pending_seconds = {
+        op: [0.0] * len(computations) for op in _COMBINER_OPS
+    }
+    self._num_pending_add_inputs = 0
+
+  def _flush_timings(self):
+    for op in _COMBINER_OPS:
+      pending = self._pending_seconds[op]
+      for i, counter in enumerate(self._timing_counters[op]):
+        pending[i] = _flush_seconds(counter, pending[i])
+    self._num_pending_add_inputs = 0
 
   def add_input(self, accumulator, element):
     elements = [element]
@@ -337,22 +524,41 @@ class _ComputationsCombineFn(beam.combiners.SingleInputTupleCombineFn):
         item = element[_DEFAULT_COMBINER_INPUT_KEY]
       return item
 
+    pending = self._pending_seconds['add_input']
     results = []
     for i, (c, a) in enumerate(zip(self._combiners, accumulator)):
+      start_time = _clock()
       result = c.add_input(a, get_combiner_input(elements[0], i))
       for e in elements[1:]:
         result = c.add_input(result, get_combiner_input(e, i))
+      pending[i] += _clock() - start_time
       results.append(result)
+    self._num_pending_add_inputs += 1
+    if self._num_pending_add_inputs >= _TIMING_FLUSH_INTERVAL:
+      self._flush_timings()
+    return results
+
+  def merge_accumulators(self, accumulators: Iterable[Any]) -> Any:
+    pending = self._pending_seconds['merge_accumulators']
+    results = []
+    for i, (c, a) in enumerate(zip(self._combiners, zip(*accumulators))):
+      start_time = _clock()
+      results.append(c.merge_accumulators(a))
+      pending[i] += _clock() - start_time
     return results
 
   def compact(self, accumulator: Any) -> Any:
     self._num_compacts.inc(1)
+    self._flush_timings()
     return super(_ComputationsCombineFn, self).compact(accumulator)
 
   def extract_output(self, accumulator: Any) -> Tuple[Dict[Any, Any]]:
+    pending = self._pending_seconds['extract_output']
     result = []
-    for c, a in zip(self._combiners, accumulator):
+    for i, (c, a) in enumerate(zip(self._combiners, accumulator)):
+      start_time = _clock()
       output = c.extract_output(a)
+      pending[i] += _clock() - start_time
       if not output:
         # Increase a counter for empty bootstrap samples. When sampling is not
         # enabled, this should never be exected. This should only occur when the
@@ -360,9 +566,51 @@ class _ComputationsCombineFn(beam.combiners.SingleInputTupleCombineFn):
         # counter is a sign that something has gone wrong.
         self._num_bootstrap_empties.inc(1)
       result.append(output)
+    self._flush_timings()
     return tuple(result)
 
 
+def _convert_and_add_derived_values(
+    sliced_results: Tuple[slicer.SliceKeyType, Tuple[Any, ...]],
+    derived_computations: List[metric_types.DerivedMetricComputation],
+) -> Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey, Any]]:
+  """Converts per slice tuple of dicts into single dict and adds derived."""
+  result = {}
+  for v in sliced_results[1]:
+    result.update(v)
+  for c in derived_computations:
+    result.update(c.result(result))
+  # Remove private metrics
+  keys = list(result.keys())
+  for k in keys:
+    if k.name.startswith('_'):
+      result.pop(k)
+  return (sliced_results[0], result)
+
+
+def _add_diff_metrics(
+    sliced_metrics: Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey,
+                                                    Any]],
+    baseline_model_name: Text,
+) -> Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey, Any]]:
+  """Add diff metrics if there is a baseline model."""
+
+  result = copy.copy(sliced_metrics[1])
+
+  if baseline_model_name:
+    diff_result = {}
+    for k, v in result.items():
+      if k.model_name != baseline_model_name and k.make_baseline_key(
+          baseline_model_name) in result:
+        # plots will not be diffed.
+        if not isinstance(v, message.Message):
+          diff_result[k.make_diff_key(
+          )] = v - result[k.make_baseline_key(baseline_model_name)]
+    result.update(diff_result)
+
+  return (sliced_metrics[0], result)
+
+
 @beam.ptransform_fn
 @beam.typehints.with_input_types(Tuple[slicer.SliceKeyType, types.Extracts])
 @beam.typehints.with_output_types(Tuple[slicer.SliceKeyType,
@@ -390,45 +638,6 @@ def _ComputePerSlice(  # pylint: disable=invalid-name
   # TODO(b/123516222): Remove this workaround per discussions in CL/227944001
   sliced_extracts.element_type = beam.typehints.Any
 
-  def convert_and_add_derived_values(
-      sliced_results: Tuple[Text, Tuple[Any, ...]],
-      derived_computations: List[metric_types.DerivedMetricComputation],
-  ) -> Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey, Any]]:
-    """Converts per slice tuple of dicts into single dict and adds derived."""
-    result = {}
-    for v in sliced_results[1]:
-      result.update(v)
-    for c in derived_computations:
-      result.update(c.result(result))
-    # Remove private metrics
-    keys = list(result.keys())
-    for k in keys:
-      if k.name.startswith('_'):
-        result.pop(k)
-    return (sliced_results[0], result)
-
-  def add_diff_metrics(
-      sliced_metrics: Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey,
-                                                      Any]],
-      baseline_model_name: Text,
-  ) -> Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey, Any]]:
-    """Add diff metrics if there is a baseline model."""
-
-    result = copy.copy(sliced_metrics[1])
-
-    if baseline_model_name:
-      diff_result = {}
-      for k, v in result.items():
-        if k.model_name != baseline_model_name and k.make_baseline_key(
-            baseline_model_name) in result:
-          # plots will not be diffed.
-          if not isinstance(v, message.Message):
-            diff_result[k.make_diff_key(
-            )] = v - result[k.make_baseline_key(baseline_model_name)]
-      result.update(diff_result)
-
-    return (sliced_metrics[0], result)
-
   # A fanout of 8 is used here to reduce stragglers that occur during the
   # merger of large datasets such as historgram buckets. This has little effect
   # on the msec profiles, but can impact the wall time and memory usage. If
@@ -442,8 +651,241 @@ def _ComputePerSlice(  # pylint: disable=invalid-name
                   random_seed_for_testing=random_seed_for_testing))
           .with_hot_key_fanout(8)
           | 'ConvertAndAddDerivedValues' >> beam.Map(
-              convert_and_add_derived_values, derived_computations)
-          | 'AddDiffMetrics' >> beam.Map(add_diff_metrics, baseline_model_name))
+              _convert_and_add_derived_values, derived_computations)
+          | 'AddDiffMetrics' >> beam.Map(_add_diff_metrics, baseline_model_name))
+
+
+# Version of the format used when serializing accumulators. This must be updated
+# whenever the layout of the serialized records changes.
+_ACCUMULATORS_FORMAT_VERSION = 4
+
+# Accumulator read from the output of a previous evaluation. The wrapper is used
+# to distinguish stored accumulators from combiner input extracts when both are
+# combined under the same slice key.
+_StoredAccumulator = NamedTuple('_StoredAccumulator', [('accumulator', Any)])
+
+
+def _model_fingerprints(
+    eval_config: config.EvalConfig,
+    eval_shared_models: Optional[Dict[Text, types.EvalSharedModel]]
+) -> Dict[Text, Text]:
+  """Returns fingerprints of the models keyed by model name."""
+  fingerprints = {}
+  for model_name, eval_shared_model in (eval_shared_models or {}).items():
+    model_spec = model_util.get_model_spec(eval_config, model_name)
+    signature_name = model_spec.signature_name if model_spec else ''
+    if eval_shared_model.model_path:
+      fingerprints[model_name] = prediction_cache.model_fingerprint(
+          eval_shared_model.model_path, signature_name)
+    else:
+      fingerprints[model_name] = signature_name
+  return fingerprints
+
+
+def _computations_fingerprint(
+    computations: List[metric_types.MetricComputation],
+    metrics_specs: List[config.MetricsSpec],
+    model_fingerprints: Optional[Dict[Text, Text]] = None) -> Text:
+  """Returns a fingerprint of the computations used to create accumulators.
+
+  Accumulators are stored as tuples of the accumulators of the individual
+  computations so they can only be merged with accumulators created by the same
+  computations (in the same order) from the same metrics configuration and
+  models.
+
+  Args:
+    computations: List of MetricComputations.
+    metrics_specs: Metrics specs the computations were created from.
+    model_fingerprints: Fingerprints of the models evaluated keyed by model
+      name (see _model_fingerprints).
+
+  Returns:
+    Hex digest identifying the accumulators.
+  """
+  fingerprint = hashlib.sha256()
+  for spec in metrics_specs:
+    fingerprint.update(spec.SerializeToString(deterministic=True))
+  for model_name, model_fingerprint in sorted(
+      (model_fingerprints or {}).items()):
+    fingerprint.update(model_name.encode())
+    fingerprint.update(model_fingerprint.encode())
+  for c in computations:
+    fingerprint.update(c.combiner.__class__.__name__.encode())
+    for key in sorted('{}'.format(k) for k in c.keys):
+      fingerprint.update(key.encode())
+  return fingerprint.hexdigest()
+
+
+def _serialize_accumulator(sliced_accumulator: Tuple[slicer.SliceKeyType, Any],
+                           accumulators_id: Text, fingerprint: Text) -> bytes:
+  """Serializes a per slice accumulator for storage.
+
+  The record is stored as JSON (rather than pickled) with the slice key and
+  accumulator encoded using accumulator_serialization so that the version and
+  fingerprint can be checked before any of the stored classes are decoded.
+
+  Args:
+    sliced_accumulator: Tuple of (slice key, accumulator).
+    accumulators_id: Identifier of the computations the accumulator is for.
+    fingerprint: Fingerprint of the computations (see
+      _computations_fingerprint).
+
+  Returns:
+    Serialized record.
+  """
+  slice_key, accumulator = sliced_accumulator
+  return json.dumps(
+      {
+          'version': _ACCUMULATORS_FORMAT_VERSION,
+          'accumulators_id': accumulators_id,
+          'fingerprint': fingerprint,
+          'slice_key': accumulator_serialization.encode(slice_key),
+          'accumulator': accumulator_serialization.encode(accumulator)
+      },
+      sort_keys=True).encode('utf-8')
+
+
+def _deserialize_accumulator(
+    serialized: bytes, accumulators_id: Text, fingerprint: Text
+) -> Iterable[Tuple[slicer.SliceKeyType, _StoredAccumulator]]:
+  """Deserializes a stored accumulator if it is for the given computations.
+
+  Args:
+    serialized: Accumulator serialized using _serialize_accumulator.
+    accumulators_id: Identifier of the computations the accumulators are for
+      (e.g. the query key). Accumulators for other identifiers are skipped.
+    fingerprint: Fingerprint of the current computations.
+
+  Yields:
+    Tuple of (slice key, stored accumulator).
+
+  Raises:
+    ValueError: If the accumulator was stored using a different format version
+      or a metrics configuration or models that do not match the current ones.
+  """
+  try:
+    record = json.loads(serialized.decode('utf-8'))
+  except ValueError:
+    # Records written before version 4 were pickled.
+    record = None
+  if not isinstance(record, dict) or 'version' not in record:
+    raise ValueError(
+        'stored accumulators were written using an unsupported format, version '
+        '{} is required'.format(_ACCUMULATORS_FORMAT_VERSION))
+  version = record['version']
+  if version != _ACCUMULATORS_FORMAT_VERSION:
+    raise ValueError(
+        'stored accumulators have format version {}, but version {} is '
+        'required'.format(version, _ACCUMULATORS_FORMAT_VERSION))
+  if record['accumulators_id'] != accumulators_id:
+    return
+  slice_key = accumulator_serialization.decode(record['slice_key'])
+  if record['fingerprint'] != fingerprint:
+    raise ValueError(
+        'stored accumulators for slice {} were computed using a different '
+        'metrics configuration or model than the current evaluation '
+        '(fingerprint {} != {}). Incremental evaluation requires the metrics '
+        'configuration and models to be unchanged.'.format(
+            slice_key, record['fingerprint'], fingerprint))
+  yield (slice_key,
+         _StoredAccumulator(
+             accumulator_serialization.decode(record['accumulator'])))
+
+
+class _AccumulatorsCombineFn(_ComputationsCombineFn):
+  """Combine function that outputs accumulators instead of metric values.
+
+  Inputs may be either combiner input extracts (as output by _PreprocessorDoFn)
+  or _StoredAccumulator values read from a previous evaluation. Stored
+  accumulators are merged into the accumulator directly.
+  """
+
+  def __init__(self, computations: List[metric_types.MetricComputation]):
+    super(_AccumulatorsCombineFn, self).__init__(computations=computations)
+
+  def add_input(self, accumulator, element):
+    if isinstance(element, _StoredAccumulator):
+      return self.merge_accumulators([accumulator, element.accumulator])
+    return super(_AccumulatorsCombineFn, self).add_input(accumulator, element)
+
+  def extract_output(self, accumulator: Any) -> Tuple[Any, ...]:
+    return tuple(self.compact(accumulator))
+
+
+@beam.ptransform_fn
+@beam.typehints.with_input_types(Tuple[slicer.SliceKeyType, types.Extracts])
+def _ComputePerSliceIncrementally(  # pylint: disable=invalid-name
+    sliced_extracts: beam.pvalue.PCollection,
+    computations: List[metric_types.MetricComputation],
+    derived_computations: List[metric_types.DerivedMetricComputation],
+    accumulators_id: Text,
+    fingerprint: Text,
+    input_accumulators_paths: Optional[List[Text]] = None,
+    baseline_model_name: Optional[Text] = None
+) -> Tuple[beam.pvalue.PCollection, beam.pvalue.PCollection]:
+  """PTransform for computing metrics and plots from per slice accumulators.
+
+  The accumulators computed from the incoming extracts are merged with any
+  accumulators stored by previous evaluations before the metrics are extracted.
+
+  Args:
+    sliced_extracts: Incoming PCollection consisting of slice key and extracts.
+    computations: List of MetricComputations.
+    derived_computations: List of DerivedMetricComputations.
+    accumulators_id: Identifier for the computations (e.g. the query key) used
+      to distinguish the stored accumulators of different computations.
+    fingerprint: Fingerprint of the computations (see
+      _computations_fingerprint).
+    input_accumulators_paths: Optional file patterns of accumulators stored by
+      previous evaluations.
+    baseline_model_name: Name for baseline model.
+
+  Returns:
+    Tuple of PCollections of (slice key, dict of metrics) and of serialized
+    per slice accumulators.
+  """
+  # TODO(b/123516222): Remove this workaround per discussions in CL/227944001
+  sliced_extracts.element_type = beam.typehints.Any
+
+  combiner_inputs = sliced_extracts
+  if input_accumulators_paths:
+    stored_accumulators = []
+    for i, path in enumerate(input_accumulators_paths):
+      stored_accumulators.append(
+          sliced_extracts.pipeline
+          | 'ReadAccumulators({})'.format(i) >> beam.io.ReadFromTFRecord(path))
+    stored_accumulators = (
+        tuple(stored_accumulators)
+        | 'FlattenStoredAccumulators' >> beam.Flatten()
+        | 'DeserializeAccumulators' >> beam.FlatMap(
+            _deserialize_accumulator, accumulators_id, fingerprint))
+    combiner_inputs = ((sliced_extracts, stored_accumulators)
+                       | 'FlattenWithStoredAccumulators' >> beam.Flatten())
+
+  combine_fn = _ComputationsCombineFn(computations=computations)
+
+  def extract_output(
+      sliced_accumulator: Tuple[slicer.SliceKeyType, Any]
+  ) -> Tuple[slicer.SliceKeyType, Tuple[Dict[Any, Any]]]:
+    return (sliced_accumulator[0],
+            combine_fn.extract_output(sliced_accumulator[1]))
+
+  # See _ComputePerSlice for the choice of fanout.
+  accumulators = (
+      combiner_inputs
+      | 'CombineAccumulatorsPerSliceKey' >> beam.CombinePerKey(
+          _AccumulatorsCombineFn(computations)).with_hot_key_fanout(8))
+  sliced_metrics_and_plots = (
+      accumulators
+      | 'ExtractOutput' >> beam.Map(extract_output)
+      | 'ConvertAndAddDerivedValues' >> beam.Map(
+          _convert_and_add_derived_values, derived_computations)
+      | 'AddDiffMetrics' >> beam.Map(_add_diff_metrics, baseline_model_name))
+  serialized_accumulators = (
+      accumulators
+      | 'SerializeAccumulators' >> beam.Map(_serialize_accumulator,
+                                            accumulators_id, fingerprint))
+  return sliced_metrics_and_plots, serialized_accumulators
 
 
 def _filter_by_key_type(
@@ -465,6 +907,20 @@ def _filter_by_key_type(
   return (slice_value, output)
 
 
+def _filter_by_keys(
+    sliced_metrics_and_plots: Tuple[slicer.SliceKeyType,
+                                    Dict[metric_types.MetricKey, Any]],
+    keys: Set[metric_types.MetricKey], include: bool
+) -> Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey, Any]]:
+  """Keeps (include=True) or removes (include=False) the given keys."""
+  slice_value, metrics_and_plots = sliced_metrics_and_plots
+  output = {}
+  for k, v in metrics_and_plots.items():
+    if (k in keys) == include:
+      output[k] = v
+  return (slice_value, output)
+
+
 @beam.ptransform_fn
 @beam.typehints.with_input_types(Union[types.Extracts, List[types.Extracts]])
 @beam.typehints.with_output_types(evaluator.Evaluation)
@@ -474,7 +930,10 @@ def _ComputeMetricsAndPlots(  # pylint: disable=invalid-name
     metrics_specs: List[config.MetricsSpec],
     eval_shared_models: Optional[Dict[Text, types.EvalSharedModel]] = None,
     metrics_key: Text = constants.METRICS_KEY,
-    plots_key: Text = constants.PLOTS_KEY) -> evaluator.Evaluation:
+    plots_key: Text = constants.PLOTS_KEY,
+    accumulators_key: Text = constants.ACCUMULATORS_KEY,
+    calibration_histograms_key: Text = constants.CALIBRATION_HISTOGRAMS_KEY,
+    accumulators_id: Text = '') -> evaluator.Evaluation:
   """Computes metrics and plots.
 
   Args:
@@ -487,12 +946,34 @@ def _ComputeMetricsAndPlots(  # pylint: disable=invalid-name
       required if there are metrics to be computed in-graph using the model.
     metrics_key: Name to use for metrics key in Evaluation output.
     plots_key: Name to use for plots key in Evaluation output.
+    accumulators_key: Name to use for accumulators key in Evaluation output.
+    calibration_histograms_key: Name to use for calibration histograms key in
+      Evaluation output.
+    accumulators_id: Identifier used to distinguish the stored accumulators of
+      these metrics specs from those of other metrics specs (e.g. query key).
 
   Returns:
     Evaluation containing dict of PCollections of (slice_key, results_dict)
     tuples where the dict is keyed by either the metrics_key (e.g. 'metrics') or
-    plots_key (e.g. 'plots') depending on what the results_dict contains.
+    plots_key (e.g. 'plots') depending on what the results_dict contains. If
+    eval_config.options.output_accumulators is set, the serialized per slice
+    accumulators are stored under the accumulators_key. If
+    eval_config.options.output_calibration_histograms is set, the per slice
+    CalibrationHistogramBuckets are stored under the calibration_histograms_key.
+
+  Raises:
+    ValueError: If incremental evaluation is used together with confidence
+      intervals or k-anonymization.
   """
+  if (eval_config.options.output_accumulators.value or
+      eval_config.options.input_accumulators_paths.values):
+    if eval_config.options.compute_confidence_intervals.value:
+      raise ValueError('output_accumulators and input_accumulators_paths are '
+                       'not supported with compute_confidence_intervals')
+    if eval_config.options.k_anonymization_count.value > 1:
+      raise ValueError('output_accumulators and input_accumulators_paths are '
+                       'not supported with k_anonymization_count')
+
   computations = []
   model_loaders = None
   # Add default metric computations
@@ -525,6 +1006,15 @@ def _ComputeMetricsAndPlots(  # pylint: disable=invalid-name
               eval_config=eval_config,
               model_loaders=model_loaders)))
   computations.extend(computations_from_specs)
+  # Metrics whose state is a vector of sums share a single flat accumulator.
+  computations = additive_sums.fuse_additive_sums_computations(computations)
+  histogram_keys = set()
+  if eval_config.options.output_calibration_histograms.value:
+    histogram_computations = (
+        calibration_histogram.histogram_proto_computations(computations))
+    for c in histogram_computations:
+      histogram_keys.update(c.keys)
+    derived_computations.extend(histogram_computations)
 
   # Find out which model is baseline.
   baseline_spec = model_util.get_baseline_model_spec(eval_config)
@@ -568,16 +1058,35 @@ def _ComputeMetricsAndPlots(  # pylint: disable=invalid-name
   #         of the associated computations. A given MetricComputation can
   #         perform computations for multiple keys, but the keys should be
   #         unique across computations.
-  sliced_metrics_and_plots = (
-      slices
-      | 'ComputePerSlice' >> poisson_bootstrap.ComputeWithConfidenceIntervals(
-          _ComputePerSlice,
-          computations=computations,
-          derived_computations=derived_computations,
-          baseline_model_name=baseline_model_name,
-          num_bootstrap_samples=(
-              poisson_bootstrap.DEFAULT_NUM_BOOTSTRAP_SAMPLES if
-              eval_config.options.compute_confidence_intervals.value else 1)))
+  serialized_accumulators = None
+  if (eval_config.options.output_accumulators.value or
+      eval_config.options.input_accumulators_paths.values):
+    # Output: Tuple of (slice key, dict of computed metrics/plots) and
+    #         serialized (slice key, accumulator) records. The accumulators
+    #         include the state stored by previous evaluations (if any).
+    sliced_metrics_and_plots, serialized_accumulators = (
+        slices
+        | 'ComputePerSliceIncrementally' >> _ComputePerSliceIncrementally(
+            computations=computations,
+            derived_computations=derived_computations,
+            accumulators_id=accumulators_id,
+            fingerprint=_computations_fingerprint(
+                computations, metrics_specs,
+                _model_fingerprints(eval_config, eval_shared_models)),
+            input_accumulators_paths=list(
+                eval_config.options.input_accumulators_paths.values),
+            baseline_model_name=baseline_model_name))
+  else:
+    sliced_metrics_and_plots = (
+        slices
+        | 'ComputePerSlice' >> poisson_bootstrap.ComputeWithConfidenceIntervals(
+            _ComputePerSlice,
+            computations=computations,
+            derived_computations=derived_computations,
+            baseline_model_name=baseline_model_name,
+            num_bootstrap_samples=(
+                poisson_bootstrap.DEFAULT_NUM_BOOTSTRAP_SAMPLES if
+                eval_config.options.compute_confidence_intervals.value else 1)))
 
   if eval_config.options.k_anonymization_count.value > 1:
     sliced_metrics_and_plots = (
@@ -585,6 +1094,17 @@ def _ComputeMetricsAndPlots(  # pylint: disable=invalid-name
         | 'FilterForSmallSlices' >> slicer.FilterOutSlices(
             slices_count, eval_config.options.k_anonymization_count.value))
 
+  sliced_histograms = None
+  if histogram_keys:
+    sliced_histograms = (
+        sliced_metrics_and_plots
+        | 'FilterByCalibrationHistograms' >> beam.Map(
+            _filter_by_keys, histogram_keys, True))
+    sliced_metrics_and_plots = (
+        sliced_metrics_and_plots
+        | 'RemoveCalibrationHistograms' >> beam.Map(
+            _filter_by_keys, histogram_keys, False))
+
   sliced_metrics = (
       sliced_metrics_and_plots
       | 'FilterByMetrics' >> beam.Map(_filter_by_key_type,
@@ -595,7 +1115,13 @@ def _ComputeMetricsAndPlots(  # pylint: disable=invalid-name
 
   # pylint: enable=no-value-for-parameter
 
-  return {metrics_key: sliced_metrics, plots_key: sliced_plots}
+  evaluation = {metrics_key: sliced_metrics, plots_key: sliced_plots}
+  if (serialized_accumulators is not None and
+      eval_config.options.output_accumulators.value):
+    evaluation[accumulators_key] = serialized_accumulators
+  if sliced_histograms is not None:
+    evaluation[calibration_histograms_key] = sliced_histograms
+  return evaluation
 
 
 @beam.ptransform_fn
@@ -607,7 +1133,12 @@ def _EvaluateMetricsAndPlots(  # pylint: disable=invalid-name
     eval_shared_models: Optional[Dict[Text, types.EvalSharedModel]] = None,
     metrics_key: Text = constants.METRICS_KEY,
     plots_key: Text = constants.PLOTS_KEY,
-    validations_key: Text = constants.VALIDATIONS_KEY) -> evaluator.Evaluation:
+    validations_key: Text = constants.VALIDATIONS_KEY,
+    accumulators_key: Text = constants.ACCUMULATORS_KEY,
+    calibration_histograms_key: Text = constants.CALIBRATION_HISTOGRAMS_KEY,
+    compiled_thresholds: Optional[
+        metrics_validator.CompiledMetricThresholds] = None
+) -> evaluator.Evaluation:
   """Evaluates metrics and plots.
 
   Args:
@@ -624,12 +1155,30 @@ def _EvaluateMetricsAndPlots(  # pylint: disable=invalid-name
     metrics_key: Name to use for metrics key in Evaluation output.
     plots_key: Name to use for plots key in Evaluation output.
     validations_key: Name to use for validation key in Evaluation output.
+    accumulators_key: Name to use for accumulators key in Evaluation output.
+    calibration_histograms_key: Name to use for calibration histograms key in
+      Evaluation output.
+    compiled_thresholds: Metric thresholds compiled from the eval_config. If
+      not set, the thresholds are compiled from the eval_config.
 
   Returns:
     Evaluation containing dict of PCollections of (slice_key, results_dict)
     tuples where the dict is keyed by either the metrics_key (e.g. 'metrics') or
     plots_key (e.g. 'plots') depending on what the results_dict contains.
   """
+  if eval_config.options.HasField('windowing_spec'):
+    if eval_config.options.input_accumulators_paths.values:
+      raise ValueError('input_accumulators_paths is not supported with '
+                       'windowing_spec')
+    # Input: Extracts (typically from an unbounded source).
+    # Output: Extracts assigned to event-time windows. All the downstream
+    #         combines (per slice metrics, slice counts, query grouping) are
+    #         computed independently for each window.
+    extracts = (
+        extracts
+        | 'WindowIntoEventTimeWindows' >> _WindowIntoEventTimeWindows(
+            eval_config.options.windowing_spec))
+
   # Separate metrics based on query_key (which may be None).
   metrics_specs_by_query_key = {}
   for spec in eval_config.metrics_specs:
@@ -668,7 +1217,10 @@ def _EvaluateMetricsAndPlots(  # pylint: disable=invalid-name
             eval_shared_models=(eval_shared_models
                                 if include_default_metrics else None),
             metrics_key=metrics_key,
-            plots_key=plots_key))
+            plots_key=plots_key,
+            accumulators_key=accumulators_key,
+            calibration_histograms_key=calibration_histograms_key,
+            accumulators_id=query_key_text))
 
     for k, v in evaluation.items():
       if k not in evaluations:
@@ -676,9 +1228,11 @@ def _EvaluateMetricsAndPlots(  # pylint: disable=invalid-name
       evaluations[k].append(v)
   metrics_and_plots = evaluator.combine_dict_based_evaluations(evaluations)
 
+  if compiled_thresholds is None:
+    compiled_thresholds = metrics_validator.CompiledMetricThresholds(
+        eval_config)
   validations = (
       metrics_and_plots[metrics_key]
-      | 'ValidateMetrics' >> beam.Map(metrics_validator.validate_metrics,
-                                      eval_config))
+      | 'ValidateMetrics' >> beam.Map(compiled_thresholds.validate))
   metrics_and_plots[validations_key] = validations
   return metrics_and_plots
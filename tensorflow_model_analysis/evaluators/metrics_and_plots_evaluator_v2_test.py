@@ -22,6 +22,7 @@ import os
 
 import apache_beam as beam
 from apache_beam.testing import util
+import numpy as np
 import tensorflow as tf  # pylint: disable=g-explicit-tensorflow-version-import
 from tensorflow_model_analysis import config
 from tensorflow_model_analysis import constants
@@ -678,6 +679,283 @@ class MetricsAndPlotsEvaluatorTest(testutil.TensorflowModelAnalysisTest):
       util.assert_that(
           metrics[constants.METRICS_KEY], check_metrics, label='metrics')
 
+  def testEvaluateWithEventTimeWindows(self):
+    temp_export_dir = self._getExportDir()
+    _, export_dir = (
+        fixed_prediction_estimator_extra_fields
+        .simple_fixed_prediction_estimator_extra_fields(None, temp_export_dir))
+    # fixed_int is used as the event time (in seconds) of each example.
+    eval_config = config.EvalConfig(
+        model_specs=[config.ModelSpec(label_key='label')],
+        slicing_specs=[config.SlicingSpec()],
+        metrics_specs=metric_specs.specs_from_metrics(
+            [calibration.MeanLabel('mean_label')]),
+        options=config.Options(
+            windowing_spec=config.WindowingSpec(
+                size_seconds=10, timestamp_key='fixed_int')))
+    eval_shared_model = self.createTestEvalSharedModel(
+        eval_saved_model_path=export_dir, tags=[tf.saved_model.SERVING])
+    extractors = [
+        input_extractor.InputExtractor(eval_config=eval_config),
+        predict_extractor_v2.PredictExtractor(
+            eval_config=eval_config, eval_shared_model=eval_shared_model),
+        slice_key_extractor.SliceKeyExtractor(
+            slice_spec=[slicer.SingleSliceSpec()])
+    ]
+    evaluators = [
+        metrics_and_plots_evaluator_v2.MetricsAndPlotsEvaluator(
+            eval_config=eval_config, eval_shared_model=eval_shared_model)
+    ]
+
+    examples = [
+        self._makeExample(
+            prediction=0.2,
+            label=1.0,
+            fixed_int=1,
+            fixed_float=1.0,
+            fixed_string='fixed_string1'),
+        self._makeExample(
+            prediction=0.8,
+            label=0.0,
+            fixed_int=5,
+            fixed_float=1.0,
+            fixed_string='fixed_string1'),
+        self._makeExample(
+            prediction=0.5,
+            label=0.0,
+            fixed_int=12,
+            fixed_float=2.0,
+            fixed_string='fixed_string2')
+    ]
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      metrics = (
+          pipeline
+          | 'Create' >> beam.Create([e.SerializeToString() for e in examples])
+          | 'InputsToExtracts' >> model_eval_lib.InputsToExtracts()
+          | 'ExtractAndEvaluate' >> model_eval_lib.ExtractAndEvaluate(
+              extractors=extractors, evaluators=evaluators))
+
+      # pylint: enable=no-value-for-parameter
+
+      def check_metrics(got):
+        try:
+          self.assertLen(got, 2)
+          example_count_key = metric_types.MetricKey(name='example_count')
+          label_key = metric_types.MetricKey(name='mean_label')
+          got_by_window = {}
+          for windowed_value in got:
+            slice_key, metrics = windowed_value.value
+            self.assertEqual((), slice_key)
+            window, = windowed_value.windows
+            got_by_window[window.start.micros] = metrics
+          self.assertEqual([0, 10000000], sorted(got_by_window.keys()))
+          self.assertDictElementsAlmostEqual(got_by_window[0], {
+              example_count_key: 2,
+              label_key: 0.5,
+          })
+          self.assertDictElementsAlmostEqual(got_by_window[10000000], {
+              example_count_key: 1,
+              label_key: 0.0,
+          })
+
+        except AssertionError as err:
+          raise util.BeamAssertException(err)
+
+      util.assert_that(
+          metrics[constants.METRICS_KEY],
+          check_metrics,
+          label='metrics',
+          reify_windows=True)
+
+  def _runIncrementalEvaluation(self,
+                                export_dir,
+                                eval_config,
+                                examples,
+                                accumulators_path,
+                                check_metrics=None):
+    eval_shared_model = self.createTestEvalSharedModel(
+        eval_saved_model_path=export_dir, tags=[tf.saved_model.SERVING])
+    slice_spec = [
+        slicer.SingleSliceSpec(spec=s) for s in eval_config.slicing_specs
+    ]
+    extractors = [
+        input_extractor.InputExtractor(eval_config=eval_config),
+        predict_extractor_v2.PredictExtractor(
+            eval_config=eval_config, eval_shared_model=eval_shared_model),
+        slice_key_extractor.SliceKeyExtractor(slice_spec=slice_spec)
+    ]
+    evaluators = [
+        metrics_and_plots_evaluator_v2.MetricsAndPlotsEvaluator(
+            eval_config=eval_config, eval_shared_model=eval_shared_model)
+    ]
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      evaluation = (
+          pipeline
+          | 'Create' >> beam.Create([e.SerializeToString() for e in examples])
+          | 'InputsToExtracts' >> model_eval_lib.InputsToExtracts()
+          | 'ExtractAndEvaluate' >> model_eval_lib.ExtractAndEvaluate(
+              extractors=extractors, evaluators=evaluators))
+      # pylint: enable=no-value-for-parameter
+      _ = (
+          evaluation[constants.ACCUMULATORS_KEY]
+          | 'WriteAccumulators' >> beam.io.WriteToTFRecord(accumulators_path))
+      if check_metrics is not None:
+        util.assert_that(
+            evaluation[constants.METRICS_KEY], check_metrics, label='metrics')
+
+  def testEvaluateIncrementallyWithStoredAccumulators(self):
+    temp_export_dir = self._getExportDir()
+    _, export_dir = (
+        fixed_prediction_estimator_extra_fields
+        .simple_fixed_prediction_estimator_extra_fields(None, temp_export_dir))
+    metrics_specs = metric_specs.specs_from_metrics([
+        calibration.MeanLabel('mean_label'),
+        calibration.MeanPrediction('mean_prediction')
+    ])
+    model_specs = [
+        config.ModelSpec(label_key='label', example_weight_key='fixed_float')
+    ]
+    slicing_specs = [
+        config.SlicingSpec(),
+        config.SlicingSpec(feature_keys=['fixed_string'])
+    ]
+    day1_path = os.path.join(self._getTempDir(), 'accumulators')
+    day2_path = os.path.join(self._getTempDir(), 'accumulators')
+
+    day1_examples = [
+        self._makeExample(
+            prediction=0.2,
+            label=1.0,
+            fixed_int=1,
+            fixed_float=1.0,
+            fixed_string='fixed_string1'),
+        self._makeExample(
+            prediction=0.8,
+            label=0.0,
+            fixed_int=1,
+            fixed_float=1.0,
+            fixed_string='fixed_string1')
+    ]
+    day2_examples = [
+        self._makeExample(
+            prediction=0.5,
+            label=0.0,
+            fixed_int=2,
+            fixed_float=2.0,
+            fixed_string='fixed_string2')
+    ]
+
+    example_count_key = metric_types.MetricKey(name='example_count')
+    weighted_example_count_key = metric_types.MetricKey(
+        name='weighted_example_count')
+    label_key = metric_types.MetricKey(name='mean_label')
+    pred_key = metric_types.MetricKey(name='mean_prediction')
+
+    def check_metrics(got):
+      try:
+        self.assertLen(got, 3)
+        slices = dict(got)
+        self.assertDictElementsAlmostEqual(
+            slices[()], {
+                example_count_key: 3,
+                weighted_example_count_key: 4.0,
+                label_key: (1.0 + 0.0 + 2 * 0.0) / (1.0 + 1.0 + 2.0),
+                pred_key: (0.2 + 0.8 + 2 * 0.5) / (1.0 + 1.0 + 2.0),
+            })
+        self.assertDictElementsAlmostEqual(
+            slices[(('fixed_string', b'fixed_string1'),)], {
+                example_count_key: 2,
+                weighted_example_count_key: 2.0,
+                label_key: 0.5,
+                pred_key: 0.5,
+            })
+        self.assertDictElementsAlmostEqual(
+            slices[(('fixed_string', b'fixed_string2'),)], {
+                example_count_key: 1,
+                weighted_example_count_key: 2.0,
+                label_key: 0.0,
+                pred_key: 0.5,
+            })
+
+      except AssertionError as err:
+        raise util.BeamAssertException(err)
+
+    self._runIncrementalEvaluation(
+        export_dir,
+        config.EvalConfig(
+            model_specs=model_specs,
+            slicing_specs=slicing_specs,
+            metrics_specs=metrics_specs,
+            options=config.Options(output_accumulators={'value': True})),
+        day1_examples, day1_path)
+    self._runIncrementalEvaluation(
+        export_dir,
+        config.EvalConfig(
+            model_specs=model_specs,
+            slicing_specs=slicing_specs,
+            metrics_specs=metrics_specs,
+            options=config.Options(
+                output_accumulators={'value': True},
+                input_accumulators_paths={'values': [day1_path + '*']})),
+        day2_examples,
+        day2_path,
+        check_metrics=check_metrics)
+    # The accumulators written by the second evaluation include the state from
+    # the first evaluation so no new data is needed to get the same metrics.
+    self._runIncrementalEvaluation(
+        export_dir,
+        config.EvalConfig(
+            model_specs=model_specs,
+            slicing_specs=slicing_specs,
+            metrics_specs=metrics_specs,
+            options=config.Options(
+                output_accumulators={'value': True},
+                input_accumulators_paths={'values': [day2_path + '*']})), [],
+        os.path.join(self._getTempDir(), 'accumulators'),
+        check_metrics=check_metrics)
+
+  def testEvaluateIncrementallyWithChangedMetricsConfigRaisesError(self):
+    temp_export_dir = self._getExportDir()
+    _, export_dir = (
+        fixed_prediction_estimator_extra_fields
+        .simple_fixed_prediction_estimator_extra_fields(None, temp_export_dir))
+    model_specs = [config.ModelSpec(label_key='label')]
+    accumulators_path = os.path.join(self._getTempDir(), 'accumulators')
+    examples = [
+        self._makeExample(
+            prediction=0.2,
+            label=1.0,
+            fixed_int=1,
+            fixed_float=1.0,
+            fixed_string='fixed_string1')
+    ]
+    self._runIncrementalEvaluation(
+        export_dir,
+        config.EvalConfig(
+            model_specs=model_specs,
+            slicing_specs=[config.SlicingSpec()],
+            metrics_specs=metric_specs.specs_from_metrics(
+                [calibration.MeanLabel('mean_label')]),
+            options=config.Options(output_accumulators={'value': True})),
+        examples, accumulators_path)
+    with self.assertRaisesRegexp(Exception, 'different metrics configuration'):
+      self._runIncrementalEvaluation(
+          export_dir,
+          config.EvalConfig(
+              model_specs=model_specs,
+              slicing_specs=[config.SlicingSpec()],
+              metrics_specs=metric_specs.specs_from_metrics(
+                  [calibration.MeanPrediction('mean_prediction')]),
+              options=config.Options(
+                  output_accumulators={'value': True},
+                  input_accumulators_paths={
+                      'values': [accumulators_path + '*']
+                  })), examples,
+          os.path.join(self._getTempDir(), 'new_accumulators'))
+
   def testEvaluateWithBinaryClassificationModel(self):
     n_classes = 2
     temp_export_dir = self._getExportDir()
@@ -1321,6 +1599,85 @@ class MetricsAndPlotsEvaluatorTest(testutil.TensorflowModelAnalysisTest):
       util.assert_that(
           metrics[constants.METRICS_KEY], check_metrics, label='metrics')
 
+  def testFlushSecondsKeepsSubMicrosecondRemainder(self):
+
+    class _Counter(object):
+
+      def __init__(self):
+        self.value = 0
+
+      def inc(self, n):
+        self.value += n
+
+    counter = _Counter()
+    pending = 0.0
+    for _ in range(10):
+      # pylint: disable=protected-access
+      pending = metrics_and_plots_evaluator_v2._flush_seconds(
+          counter, pending + 0.4e-6)
+      # pylint: enable=protected-access
+    # 10 calls of 0.4us add up to 4us (rather than 0 if truncated per call).
+    self.assertGreaterEqual(counter.value, 3)
+    self.assertLess(pending, 1e-6)
+    self.assertAlmostEqual(4.0, counter.value + pending * 1e6, places=3)
+
+  def testComputationTimings(self):
+    computations = [
+        c for c in calibration.MeanLabel('mean_label').computations()
+        if isinstance(c, metric_types.MetricComputation)
+    ]
+    extracts = [{
+        constants.LABELS_KEY: np.array([float(i % 2)]),
+        constants.PREDICTIONS_KEY: np.array([0.5]),
+        constants.EXAMPLE_WEIGHTS_KEY: np.array([1.0]),
+        constants.SLICE_KEY_TYPES_KEY: [()],
+    } for i in range(10)]
+
+    pipeline = beam.Pipeline()
+    # pylint: disable=protected-access
+    _ = (
+        pipeline
+        | 'Create' >> beam.Create(extracts)
+        | 'Preprocess' >> beam.ParDo(
+            metrics_and_plots_evaluator_v2._PreprocessorDoFn(computations))
+        | 'Combine' >> beam.CombineGlobally(
+            metrics_and_plots_evaluator_v2._ComputationsCombineFn(
+                computations)))
+    # pylint: enable=protected-access
+    result = pipeline.run()
+    result.wait_until_finish()
+
+    metric_filter = beam.metrics.metric.MetricsFilter().with_namespace(
+        constants.METRICS_NAMESPACE)
+    query_result = result.metrics().query(filter=metric_filter)
+    combiner_name = type(computations[0].combiner).__name__
+    counter_names = [r.key.metric.name for r in query_result['counters']]
+    for op in ('add_input', 'merge_accumulators', 'extract_output'):
+      self.assertIn('{}_{}_microseconds'.format(combiner_name, op),
+                    counter_names)
+    self.assertIn('_PreprocessorDoFn_microseconds', counter_names)
+
+    summary = metrics_and_plots_evaluator_v2.timing_summary(result)
+    self.assertIn(combiner_name, summary)
+    self.assertIn('extract_output', summary)
+
+  def testComputationsFingerprintDependsOnModels(self):
+    metrics_specs = metric_specs.specs_from_metrics(
+        [calibration.MeanLabel('mean_label')])
+    computations = metric_specs.to_computations(metrics_specs)
+    # pylint: disable=protected-access
+    fingerprint = metrics_and_plots_evaluator_v2._computations_fingerprint(
+        computations, metrics_specs, {'': 'model1'})
+    self.assertEqual(
+        fingerprint,
+        metrics_and_plots_evaluator_v2._computations_fingerprint(
+            computations, metrics_specs, {'': 'model1'}))
+    self.assertNotEqual(
+        fingerprint,
+        metrics_and_plots_evaluator_v2._computations_fingerprint(
+            computations, metrics_specs, {'': 'model2'}))
+    # pylint: enable=protected-access
+
 
 if __name__ == '__main__':
   tf.compat.v1.enable_v2_behavior()
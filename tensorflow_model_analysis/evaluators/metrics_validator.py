@@ -19,7 +19,7 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Optional, Text, Tuple, Union
 import numpy as np
 
 from tensorflow_model_analysis import config
@@ -29,87 +29,181 @@ from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.proto import validation_result_pb2
 from tensorflow_model_analysis.slicer import slicer_lib as slicer
 
+_ThresholdType = Union[config.GenericValueThreshold,
+                       config.GenericChangeThreshold]
 
-def validate_metrics(
-    sliced_metrics: Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey,
-                                                    Any]],
-    eval_config: config.EvalConfig) -> validation_result_pb2.ValidationResult:
-  """Check the metrics and check whether they should be validated."""
-  # Find out which model is baseline.
-  baseline_spec = model_util.get_baseline_model_spec(eval_config)
-  baseline_model_name = baseline_spec.name if baseline_spec else None
-
-  sliced_key, metrics = sliced_metrics
-  thresholds = metric_specs.metric_thresholds_from_metric_specs(
-      eval_config.metrics_specs)
-
-  def _check_threshold(key: metric_types.MetricKey, metric: Any) -> bool:
-    """Verify a metric given its metric key and metric value."""
-    threshold = thresholds[key]
-    if isinstance(threshold, config.GenericValueThreshold):
-      lower_bound, upper_bound = -np.inf, np.inf
-      if threshold.HasField('lower_bound'):
-        lower_bound = threshold.lower_bound.value
-      if threshold.HasField('upper_bound'):
-        upper_bound = threshold.upper_bound.value
-      return metric > lower_bound and metric < upper_bound
-    elif isinstance(threshold, config.GenericChangeThreshold):
-      diff = metric
-      ratio = diff / metrics[key.make_baseline_key(baseline_model_name)]
-      if threshold.direction == config.MetricDirection.LOWER_IS_BETTER:
-        absolute, relative = np.inf, np.inf
-      elif threshold.direction == config.MetricDirection.HIGHER_IS_BETTER:
-        absolute, relative = -np.inf, -np.inf
-      else:
+
+class CompiledMetricThresholds(object):
+  """Metric thresholds compiled into arrays for validating slice metrics.
+
+  The thresholds configured in the eval config are looked up once (which
+  requires instantiating the configured metrics to get their keys) and stored
+  as arrays of bounds so that the metrics of each slice are checked using
+  vectorized comparisons.
+  """
+
+  def __init__(self, eval_config: config.EvalConfig):
+    baseline_spec = model_util.get_baseline_model_spec(eval_config)
+    baseline_model_name = baseline_spec.name if baseline_spec else None
+    self._thresholds = {}
+    value_keys = []
+    lower_bounds = []
+    upper_bounds = []
+    change_keys = []
+    baseline_keys = []
+    # Thresholds are multiplied by the sign of the direction (+1 for higher is
+    # better, -1 for lower is better) so that all change checks are of the form
+    # sign * value > sign * threshold.
+    signs = []
+    absolutes = []
+    relatives = []
+    for key, threshold in metric_specs.metric_thresholds_from_metric_specs(
+        eval_config.metrics_specs).items():
+      # Not meaningful to check threshold for baseline model.
+      if key.model_name == baseline_model_name:
+        continue
+      self._thresholds[key] = threshold
+      if isinstance(threshold, config.GenericValueThreshold):
+        value_keys.append(key)
+        lower_bounds.append(threshold.lower_bound.value if threshold
+                            .HasField('lower_bound') else -np.inf)
+        upper_bounds.append(threshold.upper_bound.value if threshold
+                            .HasField('upper_bound') else np.inf)
+      elif isinstance(threshold, config.GenericChangeThreshold):
+        if threshold.direction == config.MetricDirection.LOWER_IS_BETTER:
+          sign = -1.0
+        elif threshold.direction == config.MetricDirection.HIGHER_IS_BETTER:
+          sign = 1.0
+        else:
+          # Only raised when the metric is validated (see validate).
+          sign = np.nan
+        change_keys.append(key)
+        baseline_keys.append(key.make_baseline_key(baseline_model_name))
+        signs.append(sign)
+        absolutes.append(sign * threshold.absolute.value if threshold
+                         .HasField('absolute') else -np.inf)
+        relatives.append(sign * threshold.relative.value if threshold
+                         .HasField('relative') else -np.inf)
+    self._value_keys = value_keys
+    self._lower_bounds = np.array(lower_bounds, dtype=np.float64)
+    self._upper_bounds = np.array(upper_bounds, dtype=np.float64)
+    self._change_keys = change_keys
+    self._baseline_keys = baseline_keys
+    self._signs = np.array(signs, dtype=np.float64)
+    self._absolutes = np.array(absolutes, dtype=np.float64)
+    self._relatives = np.array(relatives, dtype=np.float64)
+
+  def validate(
+      self, sliced_metrics: Tuple[slicer.SliceKeyType,
+                                  Dict[metric_types.MetricKey, Any]]
+  ) -> validation_result_pb2.ValidationResult:
+    """Returns the result of validating the metrics of a slice."""
+    sliced_key, metrics = sliced_metrics
+    # Failed keys mapped to the failure message (if any).
+    failed = {}
+    if self._value_keys:
+      values, present = _to_float_array(self._value_keys, metrics, failed)
+      passed = (values > self._lower_bounds) & (values < self._upper_bounds)
+      _add_failures(self._value_keys, present & ~passed, failed)
+    if self._change_keys:
+      diffs, present = _to_float_array(self._change_keys, metrics, failed)
+      if np.any(np.isnan(self._signs) & present):
         raise ValueError('"UNKNOWN" direction for change threshold.')
-      if threshold.HasField('absolute'):
-        absolute = threshold.absolute.value
-      if threshold.HasField('relative'):
-        relative = threshold.relative.value
-      if threshold.direction == config.MetricDirection.LOWER_IS_BETTER:
-        return diff < absolute and ratio < relative
-      elif threshold.direction == config.MetricDirection.HIGHER_IS_BETTER:
-        return diff > absolute and ratio > relative
-
-  def _copy_metric(metric, to):
-    # Will add more types when more MetricValue are supported.
-    to.double_value.value = float(metric)
-
-  def _copy_threshold(threshold, to):
-    if isinstance(threshold, config.GenericValueThreshold):
-      to.value_threshold.CopyFrom(threshold)
-    if isinstance(threshold, config.GenericChangeThreshold):
-      to.change_threshold.CopyFrom(threshold)
-
-  # Empty metrics per slice is considered validated.
-  result = validation_result_pb2.ValidationResult(validation_ok=True)
-  validation_for_slice = validation_result_pb2.MetricsValidationForSlice()
-  for metric_key, metric in metrics.items():
-    # Not meaningful to check threshold for baseline model, thus always return
-    # True if such threshold is configured. We also do not compare Message type
-    # metrics.
-    if (metric_key.model_name == baseline_model_name or
-        metric_key not in thresholds):
-      continue
-    msg = ''
-    # We try to convert to float values.
-    try:
-      metric = float(metric)
-    except (TypeError, ValueError):
-      msg = """
-        Invalid threshold config: This metric is not comparable to the
-        threshold. The type of the threshold is: {}, and the metric value is:
-        \n{}""".format(type(metric), metric)
-    if not _check_threshold(metric_key, metric):
+      baselines, _ = _to_float_array(self._baseline_keys, metrics, {})
+      with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = diffs / baselines
+      passed = ((self._signs * diffs > self._absolutes) &
+                (self._signs * ratios > self._relatives))
+      _add_failures(self._change_keys, present & ~passed, failed)
+
+    # Empty metrics per slice is considered validated.
+    result = validation_result_pb2.ValidationResult(validation_ok=True)
+    if not failed:
+      return result
+    validation_for_slice = validation_result_pb2.MetricsValidationForSlice()
+    # Failures are reported in the order of the metrics.
+    for metric_key, metric in metrics.items():
+      if metric_key not in failed:
+        continue
       failure = validation_for_slice.failures.add()
       failure.metric_key.CopyFrom(metric_key.to_proto())
-      _copy_metric(metric, failure.metric_value)
-      _copy_threshold(thresholds[metric_key], failure.metric_threshold)
+      msg = failed[metric_key]
+      if not msg:
+        # Will add more types when more MetricValue are supported.
+        failure.metric_value.double_value.value = float(metric)
+      threshold = self._thresholds[metric_key]
+      if isinstance(threshold, config.GenericValueThreshold):
+        failure.metric_threshold.value_threshold.CopyFrom(threshold)
+      else:
+        failure.metric_threshold.change_threshold.CopyFrom(threshold)
       failure.message = msg
-  # Any failure leads to overall failure.
-  if validation_for_slice.failures:
+    # Any failure leads to overall failure.
     validation_for_slice.slice_key.CopyFrom(
         slicer.serialize_slice_key(sliced_key))
     result.validation_ok = False
     result.metric_validations_per_slice.append(validation_for_slice)
-  return result
+    return result
+
+
+def _to_float_array(
+    keys: List[metric_types.MetricKey],
+    metrics: Dict[metric_types.MetricKey, Any],
+    failed: Dict[metric_types.MetricKey, Text]
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Returns values of the keys as floats and a mask of the keys present.
+
+  Missing metrics and metrics that are not comparable to the thresholds are
+  NaN. Metrics that are not comparable are added to failed.
+
+  Args:
+    keys: Keys of metrics to get values for.
+    metrics: Metrics for slice.
+    failed: Failed keys mapped to their failure messages.
+  """
+  values = np.full(len(keys), np.nan)
+  present = np.zeros(len(keys), dtype=bool)
+  for i, key in enumerate(keys):
+    if key not in metrics:
+      continue
+    present[i] = True
+    metric = metrics[key]
+    # We try to convert to float values.
+    try:
+      values[i] = float(metric)
+    except (TypeError, ValueError):
+      failed[key] = """
+        Invalid threshold config: This metric is not comparable to the
+        threshold. The type of the threshold is: {}, and the metric value is:
+        \n{}""".format(type(metric), metric)
+  return values, present
+
+
+def _add_failures(keys: List[metric_types.MetricKey], failures: np.ndarray,
+                  failed: Dict[metric_types.MetricKey, Text]):
+  """Adds the keys with failures to failed (without a message)."""
+  for i in np.flatnonzero(failures):
+    if keys[i] not in failed:
+      failed[keys[i]] = ''
+
+
+def validate_metrics(
+    sliced_metrics: Tuple[slicer.SliceKeyType, Dict[metric_types.MetricKey,
+                                                    Any]],
+    eval_config: config.EvalConfig,
+    compiled_thresholds: Optional[CompiledMetricThresholds] = None
+) -> validation_result_pb2.ValidationResult:
+  """Check the metrics and check whether they should be validated.
+
+  Args:
+    sliced_metrics: Slice key and metrics for the slice.
+    eval_config: Eval config.
+    compiled_thresholds: Thresholds compiled from the eval_config. When
+      validating many slices, the thresholds should be compiled once and passed
+      here (otherwise they are compiled on every call).
+
+  Returns:
+    Validation result for the slice.
+  """
+  if compiled_thresholds is None:
+    compiled_thresholds = CompiledMetricThresholds(eval_config)
+  return compiled_thresholds.validate(sliced_metrics)
@@ -367,6 +367,104 @@ class MetricsValidatorTest(testutil.TensorflowModelAnalysisTest):
     result = metrics_validator.validate_metrics(sliced_metrics, eval_config)
     self.assertFalse(result.validation_ok)
 
+  def testCompiledThresholdsValidateMultipleSlices(self):
+    eval_config = config.EvalConfig(
+        model_specs=[
+            config.ModelSpec(),
+            config.ModelSpec(name='baseline', is_baseline=True)
+        ],
+        slicing_specs=[config.SlicingSpec()],
+        metrics_specs=[
+            config.MetricsSpec(
+                metrics=[
+                    config.MetricConfig(
+                        class_name='WeightedExampleCount',
+                        threshold=config.MetricThreshold(
+                            value_threshold=config.GenericValueThreshold(
+                                lower_bound={'value': 1}))),
+                    config.MetricConfig(
+                        class_name='MeanPrediction',
+                        threshold=config.MetricThreshold(
+                            change_threshold=config.GenericChangeThreshold(
+                                direction=config.MetricDirection
+                                .HIGHER_IS_BETTER,
+                                absolute={'value': 0}))),
+                ],
+                model_names=['']),
+        ],
+    )
+    compiled_thresholds = metrics_validator.CompiledMetricThresholds(
+        eval_config)
+    count_key = metric_types.MetricKey(name='weighted_example_count')
+    baseline_count_key = metric_types.MetricKey(
+        name='weighted_example_count', model_name='baseline')
+    baseline_key = metric_types.MetricKey(
+        name='mean_prediction', model_name='baseline')
+    diff_key = metric_types.MetricKey(name='mean_prediction', is_diff=True)
+
+    # Both pass (the baseline model is not validated).
+    self.assertTrue(
+        compiled_thresholds.validate(((), {
+            count_key: 2.0,
+            baseline_count_key: 0.0,
+            baseline_key: 0.5,
+            diff_key: 0.1
+        })).validation_ok)
+    # Missing metrics are not validated.
+    self.assertTrue(compiled_thresholds.validate(((), {})).validation_ok)
+    # Both fail (NaN never passes a threshold).
+    result = compiled_thresholds.validate(((('f', 1),), {
+        count_key: 0.5,
+        baseline_key: 0.5,
+        diff_key: float('nan')
+    }))
+    self.assertFalse(result.validation_ok)
+    self.assertLen(result.metric_validations_per_slice, 1)
+    self.assertEqual([count_key, diff_key], [
+        metric_types.MetricKey.from_proto(f.metric_key)
+        for f in result.metric_validations_per_slice[0].failures
+    ])
+    # Same result as validate_metrics.
+    self.assertEqual(
+        result,
+        metrics_validator.validate_metrics(
+            ((('f', 1),), {
+                count_key: 0.5,
+                baseline_key: 0.5,
+                diff_key: float('nan')
+            }), eval_config))
+
+  def testValidateMetricsChangeThresholdUnknownDirectionRaisesError(self):
+    eval_config = config.EvalConfig(
+        model_specs=[
+            config.ModelSpec(),
+            config.ModelSpec(name='baseline', is_baseline=True)
+        ],
+        slicing_specs=[config.SlicingSpec()],
+        metrics_specs=[
+            config.MetricsSpec(
+                metrics=[
+                    config.MetricConfig(
+                        class_name='MeanPrediction',
+                        threshold=config.MetricThreshold(
+                            change_threshold=config.GenericChangeThreshold(
+                                absolute={'value': 0}))),
+                ],
+                model_names=['']),
+        ],
+    )
+    compiled_thresholds = metrics_validator.CompiledMetricThresholds(
+        eval_config)
+    # Only raised if the metric is validated.
+    self.assertTrue(compiled_thresholds.validate(((), {})).validation_ok)
+    with self.assertRaisesRegexp(ValueError, 'UNKNOWN'):
+      compiled_thresholds.validate(((), {
+          metric_types.MetricKey(name='mean_prediction', model_name='baseline'):
+              0.333,
+          metric_types.MetricKey(name='mean_prediction', is_diff=True):
+              -0.333,
+      }))
+
 
 if __name__ == '__main__':
   tf.compat.v1.enable_v2_behavior()
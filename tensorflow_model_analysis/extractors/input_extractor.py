@@ -26,10 +26,13 @@ from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis.extractors import extractor
 from tfx_bsl.coders import example_coder
-from typing import Any, Dict, List, Optional, Text, Tuple, Union
+from typing import Dict, List, Optional, Text, Tuple, Union
 
 INPUT_EXTRACTOR_STAGE_NAME = 'ExtractInputs'
 
+# List of (extracts key, model name, feature key or dict of feature keys).
+_InputKeys = List[Tuple[Text, Text, Union[Text, Dict[Text, Text]]]]
+
 
 def InputExtractor(eval_config: config.EvalConfig) -> extractor.Extractor:
   """Creates an extractor for extracting features, labels, and example weights.
@@ -55,6 +58,11 @@ def InputExtractor(eval_config: config.EvalConfig) -> extractor.Extractor:
   case, the value stored here will be replaced by the predict extractor (though
   it will still be popped from the features).
 
+  No model is needed for case (2): the labels, predictions, and example weights
+  are read from the NumPy arrays decoded by tfx_bsl's example_coder and are
+  passed to the metrics as is (i.e. model-agnostic evaluation without running a
+  TF graph or session).
+
   Args:
     eval_config: Eval config.
 
@@ -88,12 +96,38 @@ def _keys_and_values(  # pylint: disable=invalid-name
     return ([], None)
 
 
-def _ParseExample(extracts: types.Extracts, eval_config: config.EvalConfig):
+def _input_keys(eval_config: config.EvalConfig) -> _InputKeys:
+  """Returns (extracts key, model name, feature key(s)) for the model specs.
+
+  The keys are computed once per extractor rather than once per example since
+  reading the (map) fields of the model specs is relatively expensive.
+
+  Args:
+    eval_config: Eval config.
+  """
+  result = []
+  for spec in eval_config.model_specs:
+    if spec.label_key or spec.label_keys:
+      result.append((constants.LABELS_KEY, spec.name, spec.label_key or
+                     dict(spec.label_keys)))
+    if spec.example_weight_key or spec.example_weight_keys:
+      result.append((constants.EXAMPLE_WEIGHTS_KEY, spec.name,
+                     spec.example_weight_key or dict(spec.example_weight_keys)))
+    if spec.prediction_key or spec.prediction_keys:
+      result.append((constants.PREDICTIONS_KEY, spec.name,
+                     spec.prediction_key or dict(spec.prediction_keys)))
+  return result
+
+
+def _ParseExample(extracts: types.Extracts, input_keys: _InputKeys,
+                  key_by_model_name: bool):
   """Parses serialized tf.train.Example to create additional extracts.
 
   Args:
     extracts: PCollection containing serialized examples under tfma.INPUT_KEY.
-    eval_config: Eval config.
+    input_keys: Keys returned by _input_keys.
+    key_by_model_name: True if the values should be keyed by model name (i.e.
+      multi-model evaluation).
 
   Returns:
     Extracts with additional keys added for features, labels, and example
@@ -103,34 +137,16 @@ def _ParseExample(extracts: types.Extracts, eval_config: config.EvalConfig):
   features = example_coder.ExampleToNumpyDict(extracts[constants.INPUT_KEY])
   extracts = copy.copy(extracts)
 
-  def add_to_extracts(  # pylint: disable=invalid-name
-      key: Text, model_name: Text, feature_values: Any):
-    """Adds features_values to extracts and feature_keys to keys_to_pop."""
-    # Only key by model name if multiple models.
-    if len(eval_config.model_specs) > 1:
+  keys_to_pop = []
+  for key, model_name, key_maybe_dict in input_keys:
+    keys, values = _keys_and_values(key_maybe_dict, features)
+    if key_by_model_name:
       if key not in extracts:
         extracts[key] = {}
-      extracts[key][model_name] = feature_values
+      extracts[key][model_name] = values
     else:
-      extracts[key] = feature_values
-
-  keys_to_pop = []
-  for spec in eval_config.model_specs:
-    if spec.label_key or spec.label_keys:
-      keys, values = _keys_and_values(
-          spec.label_key or dict(spec.label_keys), features)
-      add_to_extracts(constants.LABELS_KEY, spec.name, values)
-      keys_to_pop.extend(keys)
-    if spec.example_weight_key or spec.example_weight_keys:
-      keys, values = _keys_and_values(
-          spec.example_weight_key or dict(spec.example_weight_keys), features)
-      add_to_extracts(constants.EXAMPLE_WEIGHTS_KEY, spec.name, values)
-      keys_to_pop.extend(keys)
-    if spec.prediction_key or spec.prediction_keys:
-      keys, values = _keys_and_values(
-          spec.prediction_key or dict(spec.prediction_keys), features)
-      add_to_extracts(constants.PREDICTIONS_KEY, spec.name, values)
-      keys_to_pop.extend(keys)
+      extracts[key] = values
+    keys_to_pop.extend(keys)
   for key in keys_to_pop:
     if key in features:
       features.pop(key)
@@ -154,4 +170,6 @@ def _ExtractInputs(extracts: beam.pvalue.PCollection,
     under the keys tfma.FEATURES_KEY, tfma.LABELS_KEY, and
     tfma.EXAMPLE_WEIGHTS_KEY.
   """
-  return extracts | 'ParseExample' >> beam.Map(_ParseExample, eval_config)
+  return extracts | 'ParseExample' >> beam.Map(
+      _ParseExample, _input_keys(eval_config),
+      len(eval_config.model_specs) > 1)
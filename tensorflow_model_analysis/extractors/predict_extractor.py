@@ -18,6 +18,7 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
+import collections
 import copy
 # Standard Imports
 
@@ -29,9 +30,11 @@ from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import model_util
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis.eval_saved_model import constants as eval_saved_model_constants
+from tensorflow_model_analysis.eval_saved_model import load
 from tensorflow_model_analysis.extractors import extractor
 from tensorflow_model_analysis.extractors import feature_extractor
-from typing import Any, Dict, List, Optional, Sequence, Text, Union
+from tensorflow_model_analysis.extractors import prediction_cache
+from typing import Any, Dict, List, Optional, Sequence, Text, Tuple, Union
 
 PREDICT_EXTRACTOR_STAGE_NAME = 'Predict'
 
@@ -95,8 +98,78 @@ class _TFMAPredictionDoFn(model_util.BatchReducibleDoFnWithModels):
   def __init__(self, eval_shared_models: Dict[Text, types.EvalSharedModel],
                eval_config):
     super(_TFMAPredictionDoFn, self).__init__(
-        {k: v.model_loader for k, v in eval_shared_models.items()})
+        {k: v.model_loader for k, v in eval_shared_models.items()},
+        max_concurrent_models=model_util.get_max_concurrent_model_inferences(
+            eval_config))
     self._eval_config = eval_config
+    self._model_paths = {k: v.model_path for k, v in eval_shared_models.items()}
+    self._cache_lookups = prediction_cache.LookupCounters()
+
+  def setup(self):
+    super(_TFMAPredictionDoFn, self).setup()
+    self._prediction_caches = {}
+    cache_path = prediction_cache.get_prediction_cache_path(self._eval_config)
+    if cache_path:
+      for model_name, model_path in self._model_paths.items():
+        if model_path:
+          # The fetched values also depend on the fetches the model was loaded
+          # with, so they are part of the fingerprint.
+          eval_saved_model = self._loaded_models[model_name].eval_saved_model
+          self._prediction_caches[model_name] = (
+              prediction_cache.PredictionCache(
+                  cache_path,
+                  prediction_cache.model_fingerprint(
+                      model_path,
+                      eval_saved_model_constants.DEFAULT_EVAL_SIGNATURE_DEF_KEY,
+                      options=eval_saved_model.get_fetch_options())))
+
+  def finish_bundle(self):
+    for cache in self._prediction_caches.values():
+      cache.flush()
+    super(_TFMAPredictionDoFn, self).finish_bundle()
+
+  def _predict_list(
+      self, model_name: Text, serialized_examples: List[bytes]
+  ) -> Tuple[List[load.FetchedTensorValues], int, int]:
+    """Returns fetched values for given model using prediction cache if set.
+
+    This may be called from the worker threads of _run_inference_for_models, so
+    the fetched values are returned along with the number of cache hits and
+    misses which are reported to beam metrics by the caller.
+
+    Args:
+      model_name: Model name.
+      serialized_examples: Serialized examples to predict.
+    """
+    eval_saved_model = self._loaded_models[model_name].eval_saved_model
+    cache = self._prediction_caches.get(model_name)
+    if cache is None:
+      return eval_saved_model.predict_list(serialized_examples), 0, 0
+
+    keys = [prediction_cache.input_fingerprint(x) for x in serialized_examples]
+    result = []
+    misses = []
+    for i, values in enumerate(cache.get_many(keys)):
+      if values is None:
+        misses.append(i)
+      else:
+        result.append(load.FetchedTensorValues(input_ref=i, values=values))
+    if misses:
+      fetched_list = eval_saved_model.predict_list(
+          [serialized_examples[i] for i in misses])
+      num_fetched = collections.Counter(
+          fetched.input_ref for fetched in fetched_list)
+      for fetched in fetched_list:
+        input_ref = misses[fetched.input_ref]
+        result.append(
+            load.FetchedTensorValues(
+                input_ref=input_ref, values=fetched.values))
+        # Models that return multiple outputs per input are not cached.
+        if num_fetched[fetched.input_ref] == 1:
+          cache.put(keys[input_ref], fetched.values)
+    # Sort is stable so multiple outputs per input keep their order.
+    return (sorted(result, key=lambda fetched: fetched.input_ref),
+            len(keys) - len(misses), len(misses))
 
   def _get_example_weights(self, model_name: Text, features: Dict[Text,
                                                                   Any]) -> Any:
@@ -127,10 +200,16 @@ class _TFMAPredictionDoFn(model_util.BatchReducibleDoFnWithModels):
     serialized_examples = [x[constants.INPUT_KEY] for x in elements]
 
     # Compute features, predictions, and labels for each serialized_example
+    model_names = list(self._loaded_models.keys())
+    fetched_by_model = self._run_inference_for_models(
+        model_names,
+        lambda model_name: self._predict_list(model_name, serialized_examples))
     result = []
-    for model_name, loaded_model in self._loaded_models.items():
-      for i, fetched in enumerate(
-          loaded_model.eval_saved_model.predict_list(serialized_examples)):
+    for model_name, (fetched_list, num_cache_hits,
+                     num_cache_misses) in zip(model_names, fetched_by_model):
+      self._cache_lookups.update(num_cache_hits, num_cache_misses)
+      loaded_model = self._loaded_models[model_name]
+      for i, fetched in enumerate(fetched_list):
         if i >= len(result):
           element_copy = copy.copy(elements[fetched.input_ref])
           for key in fetched.values:
@@ -97,7 +97,8 @@ class PredictExtractorTest(testutil.TensorflowModelAnalysisTest,
 
       util.assert_that(predict_extracts, check_result)
 
-  def testMultiModelPredict(self):
+  @parameterized.named_parameters(('serial', None), ('concurrent', 2))
+  def testMultiModelPredict(self, max_concurrent_model_inferences):
     temp_eval_export_dir = self._getEvalExportDir()
     _, model1_dir = linear_classifier.simple_linear_classifier(
         None, temp_eval_export_dir)
@@ -111,6 +112,9 @@ class PredictExtractorTest(testutil.TensorflowModelAnalysisTest,
         config.ModelSpec(name='model1', example_weight_key='age'),
         config.ModelSpec(name='model2', example_weight_key='age')
     ])
+    if max_concurrent_model_inferences is not None:
+      eval_config.options.max_concurrent_model_inferences.value = (
+          max_concurrent_model_inferences)
 
     with beam.Pipeline() as pipeline:
       examples = [
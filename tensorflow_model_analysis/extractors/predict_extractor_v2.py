@@ -19,22 +19,35 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
+import collections
 import copy
 
-from typing import Dict, List, Optional, Sequence, Text, Union
+from typing import Any, Dict, List, Optional, Sequence, Text, Tuple, Union
 
 import apache_beam as beam
+import numpy as np
 import tensorflow as tf  # pylint: disable=g-explicit-tensorflow-version-import
 from tensorflow_model_analysis import config
 from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import model_util
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis.extractors import extractor
+from tensorflow_model_analysis.extractors import prediction_cache
 
 PREDICT_EXTRACTOR_STAGE_NAME = 'ExtractPredictions'
 
 PREDICT_SIGNATURE_DEF_KEY = 'predict'
 
+# Largest bucket used when padding batches if no desired batch size is given.
+# This must be at least the default max_batch_size used by beam.BatchElements.
+_DEFAULT_MAX_BUCKET_SIZE = 16384
+
+# Outputs (keyed by output name) per extract of a model along with the counts
+# that are reported to beam metrics by the thread processing the bundle.
+_ModelPredictions = collections.namedtuple(
+    '_ModelPredictions',
+    ['outputs', 'num_cache_hits', 'num_cache_misses', 'num_padded_rows'])
+
 
 def PredictExtractor(
     eval_config: config.EvalConfig,
@@ -81,16 +94,222 @@ def PredictExtractor(
 class _PredictionDoFn(model_util.BatchReducibleDoFnWithModels):
   """A DoFn that loads the models and predicts."""
 
-  def __init__(self, eval_config: config.EvalConfig,
-               eval_shared_models: Dict[Text, types.EvalSharedModel]) -> None:
+  def __init__(self,
+               eval_config: config.EvalConfig,
+               eval_shared_models: Dict[Text, types.EvalSharedModel],
+               desired_batch_size: Optional[int] = None) -> None:
     super(_PredictionDoFn, self).__init__(
-        {k: v.model_loader for k, v in eval_shared_models.items()})
+        {k: v.model_loader for k, v in eval_shared_models.items()},
+        max_concurrent_models=model_util.get_max_concurrent_model_inferences(
+            eval_config))
     self._eval_config = eval_config
+    self._model_paths = {k: v.model_path for k, v in eval_shared_models.items()}
+    self._bucket_sizes = None
+    if (eval_config.options.HasField('bucket_inference_batches') and
+        eval_config.options.bucket_inference_batches.value):
+      self._bucket_sizes = model_util.power_of_two_bucket_sizes(
+          desired_batch_size or _DEFAULT_MAX_BUCKET_SIZE)
+    self._num_padded_rows = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, 'num_padded_inference_rows')
+    self._cache_lookups = prediction_cache.LookupCounters()
+
+  def setup(self):
+    super(_PredictionDoFn, self).setup()
+    # The signature and the plan for converting extracts into the signature's
+    # inputs are the same for every batch, so they are only resolved once.
+    self._signatures = {}
+    self._input_specs = {}
+    self._rebatch_plans = {}
+    self._prediction_caches = {}
+    cache_path = prediction_cache.get_prediction_cache_path(self._eval_config)
+    for spec in self._eval_config.model_specs:
+      model_name = spec.name if len(self._eval_config.model_specs) > 1 else ''
+      if model_name not in self._loaded_models:
+        continue  # Reported when processing
+      signature, input_names, input_specs = self._get_signature(
+          spec, model_name)
+      self._signatures[model_name] = signature
+      self._input_specs[model_name] = input_specs
+      self._rebatch_plans[model_name] = (
+          model_util.RebatchPlan(input_names, input_specs)
+          if input_names is not None else None)
+      if self._bucket_sizes:
+        self._warmup(model_name)
+      if cache_path and self._model_paths.get(model_name):
+        self._prediction_caches[model_name] = prediction_cache.PredictionCache(
+            cache_path,
+            prediction_cache.model_fingerprint(self._model_paths[model_name],
+                                               spec.signature_name))
+
+  def finish_bundle(self):
+    for cache in self._prediction_caches.values():
+      cache.flush()
+    super(_PredictionDoFn, self).finish_bundle()
+
+  def _warmup(self, model_name: Text):
+    """Calls signature once per bucket size so all traces happen up front."""
+    signature = self._signatures[model_name]
+    input_specs = self._input_specs[model_name]
+    if input_specs is None and self._rebatch_plans[model_name] is not None:
+      tf.compat.v1.logging.info(
+          'skipping warmup of model "%s", input specs are unknown', model_name)
+      return
+    for bucket_size in self._bucket_sizes:
+      try:
+        if input_specs is not None:
+          signature(
+              **{
+                  k: tf.constant(
+                      model_util.get_warmup_values(k, v, bucket_size))
+                  for k, v in input_specs.items()
+              })
+        else:
+          # An empty serialized tf.Example (fails if features are required).
+          signature(tf.constant([b''] * bucket_size, dtype=tf.string))
+      except (ValueError, TypeError, tf.errors.OpError) as e:
+        tf.compat.v1.logging.warning(
+            'warmup of model "%s" with batch size %d failed (the model will be '
+            'traced while processing instead): %s', model_name, bucket_size, e)
+        return
+
+  def _get_signature(
+      self, spec: config.ModelSpec, model_name: Text
+  ) -> Tuple[Any, Optional[List[Text]], Optional[Dict[Text, tf.TypeSpec]]]:
+    """Returns signature, input names, and input specs for given model."""
+    loaded_model = self._loaded_models[model_name]
+    signatures = None
+    if loaded_model.keras_model:
+      signatures = loaded_model.keras_model.signatures
+    elif loaded_model.saved_model:
+      signatures = loaded_model.saved_model.signatures
+    if not signatures:
+      raise ValueError(
+          'PredictExtractor V2 requires a keras model or a serving model. '
+          'If using EvalSavedModel then you must use PredictExtractor V1.')
+
+    signature_key = spec.signature_name
+    # TODO(mdreves): Add support for multiple signatures per output.
+    if not signature_key:
+      # First try 'predict' then try 'serving_default'. The estimator output
+      # for the 'serving_default' key does not include all the heads in a
+      # multi-head model. However, keras only uses the 'serving_default' for
+      # its outputs. Note that the 'predict' key only exists for estimators
+      # for multi-head models, for single-head models only 'serving_default'
+      # is used.
+      signature_key = tf.saved_model.DEFAULT_SERVING_SIGNATURE_DEF_KEY
+      if PREDICT_SIGNATURE_DEF_KEY in signatures:
+        signature_key = PREDICT_SIGNATURE_DEF_KEY
+    if signature_key not in signatures:
+      raise ValueError('{} not found in model signatures: {}'.format(
+          signature_key, signatures))
+    signature = signatures[signature_key]
+
+    # If input names exist then filter the inputs by these names (unlike
+    # estimators, keras does not accept unknown inputs).
+    input_names = None
+    input_specs = None
+    # First arg of structured_input_signature tuple is shape, second is dtype
+    # (we currently only support named params passed as a dict)
+    if (signature.structured_input_signature and
+        len(signature.structured_input_signature) == 2 and
+        isinstance(signature.structured_input_signature[1], dict)):
+      input_names = [name for name in signature.structured_input_signature[1]]
+      input_specs = signature.structured_input_signature[1]
+    elif loaded_model.keras_model is not None:
+      # Calling keras_model.input_names does not work properly in TF 1.15.0.
+      # As a work around, make sure the signature.structured_input_signature
+      # check is before this check (see b/142807137).
+      input_names = loaded_model.keras_model.input_names
+    return signature, input_names, input_specs
+
+  def _predict(
+      self, model_name: Text,
+      batch_of_extracts: List[types.Extracts]) -> Tuple[Dict[Text, Any], int]:
+    """Returns batched outputs (keyed by output name) and num padded rows."""
+    signature = self._signatures[model_name]
+    rebatch_plan = self._rebatch_plans[model_name]
+    inputs = None
+    if rebatch_plan is not None:
+      inputs = rebatch_plan.rebatch(batch_of_extracts)
+    if not inputs and (rebatch_plan is None or
+                       len(rebatch_plan.input_names) <= 1):
+      # Assume serialized examples
+      inputs = [extract[constants.INPUT_KEY] for extract in batch_of_extracts]
+
+    # Pad the batch up to the next bucket size. The mask is used to strip the
+    # padded rows from the outputs.
+    batch_size = len(batch_of_extracts)
+    num_padded_rows = 0
+    mask = None
+    if self._bucket_sizes:
+      padded_size = model_util.get_bucket_size(batch_size, self._bucket_sizes)
+      if padded_size != batch_size:
+        mask = np.arange(padded_size) < batch_size
+        if isinstance(inputs, dict):
+          inputs = {
+              k: model_util.pad_batch(v, padded_size)
+              for k, v in inputs.items()
+          }
+        else:
+          inputs = model_util.pad_batch(inputs, padded_size)
+        num_padded_rows = padded_size - batch_size
+
+    if isinstance(inputs, dict):
+      outputs = signature(**{k: tf.constant(v) for k, v in inputs.items()})
+    else:
+      outputs = signature(tf.constant(inputs, dtype=tf.string))
+    if mask is not None:
+      return {k: v.numpy()[mask] for k, v in outputs.items()}, num_padded_rows
+    return {k: v.numpy() for k, v in outputs.items()}, num_padded_rows
+
+  def _predict_per_example(
+      self, model_name: Text,
+      batch_of_extracts: List[types.Extracts]) -> _ModelPredictions:
+    """Returns outputs (keyed by output name) per extract for given model.
+
+    If a prediction cache is used, only the extracts whose inputs are not found
+    in the cache are passed to the model. This may be called from the worker
+    threads of _run_inference_for_models, so the cache hits and misses and the
+    number of padded rows are returned rather than reported to beam metrics.
+
+    Args:
+      model_name: Model name.
+      batch_of_extracts: Batch of extracts.
+    """
+    cache = self._prediction_caches.get(model_name)
+    if cache is None:
+      outputs, num_padded_rows = self._predict(model_name, batch_of_extracts)
+      return _ModelPredictions(
+          outputs=[{k: v[i] for k, v in outputs.items()}
+                   for i in range(len(batch_of_extracts))],
+          num_cache_hits=0,
+          num_cache_misses=0,
+          num_padded_rows=num_padded_rows)
+
+    keys = [
+        prediction_cache.input_fingerprint(extract.get(constants.INPUT_KEY))
+        for extract in batch_of_extracts
+    ]
+    result = cache.get_many(keys)
+    misses = [i for i, output in enumerate(result) if output is None]
+    num_padded_rows = 0
+    if misses:
+      outputs, num_padded_rows = self._predict(
+          model_name, [batch_of_extracts[i] for i in misses])
+      for j, i in enumerate(misses):
+        result[i] = {k: v[j] for k, v in outputs.items()}
+        cache.put(keys[i], result[i])
+    return _ModelPredictions(
+        outputs=result,
+        num_cache_hits=len(result) - len(misses),
+        num_cache_misses=len(misses),
+        num_padded_rows=num_padded_rows)
 
   def _batch_reducible_process(
       self,
       batch_of_extracts: List[types.Extracts]) -> Sequence[types.Extracts]:
     result = copy.deepcopy(batch_of_extracts)
+    specs_by_model_name = collections.OrderedDict()
     for spec in self._eval_config.model_specs:
       # To maintain consistency between settings where single models are used,
       # always use '' as the model name regardless of whether a name is passed.
@@ -99,65 +318,23 @@ class _PredictionDoFn(model_util.BatchReducibleDoFnWithModels):
         raise ValueError(
             'loaded model for "{}" not found: eval_config={}'.format(
                 spec.name, self._eval_config))
-      loaded_model = self._loaded_models[model_name]
-      signatures = None
-      if loaded_model.keras_model:
-        signatures = loaded_model.keras_model.signatures
-      elif loaded_model.saved_model:
-        signatures = loaded_model.saved_model.signatures
-      if not signatures:
-        raise ValueError(
-            'PredictExtractor V2 requires a keras model or a serving model. '
-            'If using EvalSavedModel then you must use PredictExtractor V1.')
-
-      signature_key = spec.signature_name
-      # TODO(mdreves): Add support for multiple signatures per output.
-      if not signature_key:
-        # First try 'predict' then try 'serving_default'. The estimator output
-        # for the 'serving_default' key does not include all the heads in a
-        # multi-head model. However, keras only uses the 'serving_default' for
-        # its outputs. Note that the 'predict' key only exists for estimators
-        # for multi-head models, for single-head models only 'serving_default'
-        # is used.
-        signature_key = tf.saved_model.DEFAULT_SERVING_SIGNATURE_DEF_KEY
-        if PREDICT_SIGNATURE_DEF_KEY in signatures:
-          signature_key = PREDICT_SIGNATURE_DEF_KEY
-      if signature_key not in signatures:
-        raise ValueError('{} not found in model signatures: {}'.format(
-            signature_key, signatures))
-      signature = signatures[signature_key]
-
-      # If input names exist then filter the inputs by these names (unlike
-      # estimators, keras does not accept unknown inputs).
-      input_names = None
-      input_specs = None
-      # First arg of structured_input_signature tuple is shape, second is dtype
-      # (we currently only support named params passed as a dict)
-      if (signature.structured_input_signature and
-          len(signature.structured_input_signature) == 2 and
-          isinstance(signature.structured_input_signature[1], dict)):
-        input_names = [name for name in signature.structured_input_signature[1]]
-        input_specs = signature.structured_input_signature[1]
-      elif loaded_model.keras_model is not None:
-        # Calling keras_model.input_names does not work properly in TF 1.15.0.
-        # As a work around, make sure the signature.structured_input_signature
-        # check is before this check (see b/142807137).
-        input_names = loaded_model.keras_model.input_names
-      inputs = None
-      if input_names is not None:
-        inputs = model_util.rebatch_by_input_names(batch_of_extracts,
-                                                   input_names, input_specs)
-      if not inputs and (input_names is None or len(input_names) <= 1):
-        # Assume serialized examples
-        inputs = [extract[constants.INPUT_KEY] for extract in batch_of_extracts]
-
-      if isinstance(inputs, dict):
-        outputs = signature(**{k: tf.constant(v) for k, v in inputs.items()})
-      else:
-        outputs = signature(tf.constant(inputs, dtype=tf.string))
+      specs_by_model_name[model_name] = spec
+
+    model_names = list(specs_by_model_name.keys())
+    predictions_by_model = self._run_inference_for_models(
+        model_names,
+        lambda model_name: self._predict_per_example(model_name,
+                                                     batch_of_extracts))
 
+    for model_name, predictions in zip(model_names, predictions_by_model):
+      self._cache_lookups.update(predictions.num_cache_hits,
+                                 predictions.num_cache_misses)
+      if predictions.num_padded_rows:
+        self._num_padded_rows.inc(predictions.num_padded_rows)
+      spec = specs_by_model_name[model_name]
+      outputs = predictions.outputs
       for i in range(len(result)):
-        output = {k: v[i].numpy() for k, v in outputs.items()}
+        output = outputs[i]
         # Keras and regression serving models return a dict of predictions even
         # for single-outputs. Convert these to a single tensor for compatibility
         # with the labels (and model.predict API).
@@ -205,4 +382,6 @@ def _ExtractPredictions(  # pylint: disable=invalid-name
       | 'Batch' >> beam.BatchElements(**batch_args)
       | 'Predict' >> beam.ParDo(
           _PredictionDoFn(
-              eval_config=eval_config, eval_shared_models=eval_shared_models)))
+              eval_config=eval_config,
+              eval_shared_models=eval_shared_models,
+              desired_batch_size=desired_batch_size)))
@@ -21,6 +21,7 @@ from __future__ import print_function
 import os
 # Standard Imports
 
+from absl.testing import parameterized
 import apache_beam as beam
 from apache_beam.testing import util
 import numpy as np
@@ -36,7 +37,8 @@ from tensorflow_model_analysis.eval_saved_model.example_trainers import multi_he
 from tensorflow_model_analysis.extractors import predict_extractor_v2
 
 
-class PredictExtractorTest(testutil.TensorflowModelAnalysisTest):
+class PredictExtractorTest(testutil.TensorflowModelAnalysisTest,
+                           parameterized.TestCase):
 
   def _getExportDir(self):
     return os.path.join(self._getTempDir(), 'export_dir')
@@ -248,7 +250,9 @@ class PredictExtractorTest(testutil.TensorflowModelAnalysisTest):
 
       util.assert_that(result, check_result, label='result')
 
-  def testPredictExtractorWithMultiModels(self):
+  @parameterized.named_parameters(('serial', None), ('concurrent', 2))
+  def testPredictExtractorWithMultiModels(self,
+                                          max_concurrent_model_inferences):
     temp_export_dir = self._getExportDir()
     export_dir1, _ = multi_head.simple_multi_head(temp_export_dir, None)
     export_dir2, _ = multi_head.simple_multi_head(temp_export_dir, None)
@@ -257,6 +261,9 @@ class PredictExtractorTest(testutil.TensorflowModelAnalysisTest):
         config.ModelSpec(name='model1'),
         config.ModelSpec(name='model2')
     ])
+    if max_concurrent_model_inferences is not None:
+      eval_config.options.max_concurrent_model_inferences.value = (
+          max_concurrent_model_inferences)
     eval_shared_model1 = self.createTestEvalSharedModel(
         eval_saved_model_path=export_dir1, tags=[tf.saved_model.SERVING])
     eval_shared_model2 = self.createTestEvalSharedModel(
@@ -391,6 +398,169 @@ class PredictExtractorTest(testutil.TensorflowModelAnalysisTest):
 
       util.assert_that(result, check_result, label='result')
 
+  def testPredictExtractorWithBucketedBatches(self):
+    input1 = tf.keras.layers.Input(shape=(1,), name='input1')
+    output_layer = tf.keras.layers.Dense(
+        1, activation=tf.nn.sigmoid, name='output')(
+            input1)
+    model = tf.keras.models.Model(input1, output_layer)
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(lr=.001),
+        loss=tf.keras.losses.binary_crossentropy)
+    export_dir = self._getExportDir()
+    model.save(export_dir, save_format='tf')
+
+    eval_config = config.EvalConfig(model_specs=[config.ModelSpec()])
+    eval_config.options.bucket_inference_batches.value = True
+    eval_shared_model = self.createTestEvalSharedModel(
+        eval_saved_model_path=export_dir, tags=[tf.saved_model.SERVING])
+    predict_extractor = predict_extractor_v2.PredictExtractor(
+        eval_config=eval_config,
+        eval_shared_model=eval_shared_model,
+        desired_batch_size=3)
+
+    predict_features = [{
+        'input1': np.array([float(i)], dtype=np.float32)
+    } for i in range(3)]
+    expected = model.predict(np.array([[0.0], [1.0], [2.0]]))
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      result = (
+          pipeline
+          | 'Create' >> beam.Create(predict_features, reshuffle=False)
+          | 'FeaturesToExtracts' >>
+          beam.Map(lambda x: {constants.FEATURES_KEY: x})
+          | predict_extractor.stage_name >> predict_extractor.ptransform)
+
+      # pylint: enable=no-value-for-parameter
+
+      def check_result(got):
+        try:
+          # The batch of 3 is padded to 4, but the padded row is stripped.
+          self.assertLen(got, 3)
+          for item in got:
+            i = int(item[constants.FEATURES_KEY]['input1'][0])
+            self.assertAllClose(item[constants.PREDICTIONS_KEY], expected[i])
+
+        except AssertionError as err:
+          raise util.BeamAssertException(err)
+
+      util.assert_that(result, check_result, label='result')
+
+  def testPredictExtractorCountsPaddedRowsWithConcurrentModels(self):
+    input1 = tf.keras.layers.Input(shape=(1,), name='input1')
+    output_layer = tf.keras.layers.Dense(
+        1, activation=tf.nn.sigmoid, name='output')(
+            input1)
+    model = tf.keras.models.Model(input1, output_layer)
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(lr=.001),
+        loss=tf.keras.losses.binary_crossentropy)
+    export_dir = self._getExportDir()
+    model.save(export_dir, save_format='tf')
+
+    eval_config = config.EvalConfig(model_specs=[
+        config.ModelSpec(name='model1'),
+        config.ModelSpec(name='model2')
+    ])
+    eval_config.options.bucket_inference_batches.value = True
+    eval_config.options.max_concurrent_model_inferences.value = 2
+    predict_extractor = predict_extractor_v2.PredictExtractor(
+        eval_config=eval_config,
+        eval_shared_model={
+            'model1':
+                self.createTestEvalSharedModel(
+                    eval_saved_model_path=export_dir,
+                    tags=[tf.saved_model.SERVING]),
+            'model2':
+                self.createTestEvalSharedModel(
+                    eval_saved_model_path=export_dir,
+                    tags=[tf.saved_model.SERVING])
+        },
+        desired_batch_size=3)
+
+    predict_features = [{
+        'input1': np.array([float(i)], dtype=np.float32)
+    } for i in range(3)]
+
+    pipeline = beam.Pipeline()
+    # pylint: disable=no-value-for-parameter
+    _ = (
+        pipeline
+        | 'Create' >> beam.Create(predict_features, reshuffle=False)
+        | 'FeaturesToExtracts' >>
+        beam.Map(lambda x: {constants.FEATURES_KEY: x})
+        | predict_extractor.stage_name >> predict_extractor.ptransform)
+    # pylint: enable=no-value-for-parameter
+    result = pipeline.run()
+    result.wait_until_finish()
+
+    metric_filter = beam.metrics.metric.MetricsFilter().with_name(
+        'num_padded_inference_rows')
+    counters = result.metrics().query(filter=metric_filter)['counters']
+    # The batch of 3 is padded to 4 for each of the two models.
+    self.assertLen(counters, 1)
+    self.assertEqual(2, counters[0].committed)
+
+  def testPredictExtractorWithPredictionCache(self):
+    input1 = tf.keras.layers.Input(shape=(1,), name='input1')
+    output_layer = tf.keras.layers.Dense(
+        1, activation=tf.nn.sigmoid, name='output')(
+            input1)
+    model = tf.keras.models.Model(input1, output_layer)
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(lr=.001),
+        loss=tf.keras.losses.binary_crossentropy)
+    export_dir = self._getExportDir()
+    model.save(export_dir, save_format='tf')
+
+    cache_path = os.path.join(self._getTempDir(), 'cache')
+    eval_config = config.EvalConfig(model_specs=[config.ModelSpec()])
+    eval_config.options.prediction_cache_path.value = cache_path
+    eval_shared_model = self.createTestEvalSharedModel(
+        eval_saved_model_path=export_dir, tags=[tf.saved_model.SERVING])
+    predict_extractor = predict_extractor_v2.PredictExtractor(
+        eval_config=eval_config, eval_shared_model=eval_shared_model)
+    expected = model.predict(np.array([[0.0], [1.0], [2.0]]))
+
+    def run_pipeline(feature_offset, check_result):
+      with beam.Pipeline() as pipeline:
+        # pylint: disable=no-value-for-parameter
+        result = (
+            pipeline
+            | 'Create' >> beam.Create(range(3), reshuffle=False)
+            | 'ToExtracts' >> beam.Map(
+                lambda i: {  # pylint: disable=g-long-lambda
+                    constants.INPUT_KEY: str(i).encode('utf-8'),
+                    constants.FEATURES_KEY: {
+                        'input1':
+                            np.array([float(i + feature_offset)],
+                                     dtype=np.float32)
+                    }
+                })
+            | predict_extractor.stage_name >> predict_extractor.ptransform)
+
+        # pylint: enable=no-value-for-parameter
+
+        util.assert_that(result, check_result, label='result')
+
+    def check_predictions(got):
+      try:
+        self.assertLen(got, 3)
+        for item in got:
+          i = int(item[constants.INPUT_KEY])
+          self.assertAllClose(item[constants.PREDICTIONS_KEY], expected[i])
+
+      except AssertionError as err:
+        raise util.BeamAssertException(err)
+
+    run_pipeline(0, check_predictions)
+    self.assertNotEmpty(tf.io.gfile.listdir(cache_path))
+    # The inputs are unchanged, so the cached predictions are returned even
+    # though the features passed to the model would now be different.
+    run_pipeline(10, check_predictions)
+
   def testPredictExtractorWithSequentialKerasModel(self):
     # Note that the input will be called 'test_input'
     model = tf.keras.models.Sequential([
@@ -0,0 +1,361 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""On-disk cache of model predictions used by the predict extractors.
+
+Entries are keyed by a fingerprint of the serialized input and stored under a
+directory named after a fingerprint of the model (SavedModel contents and
+signature). Each entry is stored as a tf.train.Example in a plain TFRecord file
+with the fingerprint stored under the 'key' feature and every (possibly
+nested) output stored as a serialized TensorProto under a feature named after
+its JSON encoded path. This allows the cache to be inspected and pruned (e.g.
+by deleting the directory of an old model) using standard tools.
+
+The files of a model are sharded by the first characters of the keys (one
+subdirectory per shard) so that a lookup only needs to load the entries of its
+shard. Only a bounded number of shards are kept in memory at once and the files
+of a shard are compacted once there are too many of them.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import collections
+import hashlib
+import json
+import os
+import uuid
+
+import apache_beam as beam
+import numpy as np
+import six
+import tensorflow as tf
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis import constants
+
+from typing import Any, Dict, Iterable, List, Optional, Text, Tuple
+
+_KEY_FEATURE = 'key'
+_FILE_SUFFIX = '.tfrecord'
+_TEMP_FILE_PREFIX = '.tmp-'
+
+# Number of leading hex characters of the keys used to name the shards (i.e.
+# 256 shards).
+_SHARD_PREFIX_LENGTH = 2
+# Max number of shards kept in memory (per model) by default. With 256 shards
+# this bounds the memory used to 1/8 of the cache.
+DEFAULT_MAX_LOADED_SHARDS = 32
+# Max number of files per shard by default. Once a flush would exceed it, the
+# files of the shard are compacted into a single file.
+DEFAULT_MAX_FILES_PER_SHARD = 8
+
+# Parts used to store dense and sparse values.
+_DENSE = 'dense'
+_SPARSE_INDICES = 'indices'
+_SPARSE_VALUES = 'values'
+_SPARSE_DENSE_SHAPE = 'dense_shape'
+_EMPTY_DICT = 'empty_dict'
+
+
+def get_prediction_cache_path(
+    eval_config: Optional[config.EvalConfig]) -> Optional[Text]:
+  """Returns prediction cache path set in the eval config (if any)."""
+  if (eval_config is not None and
+      eval_config.options.HasField('prediction_cache_path') and
+      eval_config.options.prediction_cache_path.value):
+    return eval_config.options.prediction_cache_path.value
+  return None
+
+
+def input_fingerprint(serialized_input: Any) -> Optional[Text]:
+  """Returns fingerprint of serialized input (None if input is not bytes)."""
+  if isinstance(serialized_input, six.text_type):
+    serialized_input = serialized_input.encode('utf-8')
+  if not isinstance(serialized_input, bytes):
+    return None
+  return hashlib.sha256(serialized_input).hexdigest()
+
+
+def model_fingerprint(model_path: Text,
+                      signature_name: Text,
+                      options: Optional[Dict[Text, Any]] = None) -> Text:
+  """Returns fingerprint of the SavedModel at model_path and signature name.
+
+  The fingerprint covers the saved_model.pb (graph and signatures) and the
+  variables index (which contains checksums of the variable values) so that
+  re-exporting a model with new weights results in a new fingerprint.
+
+  Args:
+    model_path: Path to SavedModel directory.
+    signature_name: Name of signature used for inference.
+    options: Optional JSON serializable options that change the outputs of the
+      model (e.g. the fetches of an EvalSavedModel).
+  """
+  fingerprint = hashlib.sha256()
+  for filename in (tf.saved_model.SAVED_MODEL_FILENAME_PB,
+                   os.path.join(tf.saved_model.VARIABLES_DIRECTORY,
+                                'variables.index')):
+    path = os.path.join(model_path, filename)
+    if tf.io.gfile.exists(path):
+      with tf.io.gfile.GFile(path, 'rb') as f:
+        fingerprint.update(f.read())
+  fingerprint.update(signature_name.encode('utf-8'))
+  if options:
+    fingerprint.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+  return fingerprint.hexdigest()
+
+
+def _flatten(value: Any,
+             path: Tuple[Text, ...] = ()) -> List[Tuple[Tuple[Text, ...], Any]]:
+  """Returns (path, value) pairs for the leaves of a (nested) dict."""
+  if isinstance(value, dict) and value:
+    result = []
+    for k in sorted(value.keys()):
+      result.extend(_flatten(value[k], path + (k,)))
+    return result
+  return [(path, value)]
+
+
+def _tensor_feature(value: Any) -> tf.train.Feature:
+  tensor_proto = tf.compat.v1.make_tensor_proto(np.asarray(value))
+  return tf.train.Feature(
+      bytes_list=tf.train.BytesList(value=[tensor_proto.SerializeToString()]))
+
+
+def encode_entry(key: Text, value: Any) -> bytes:
+  """Encodes cache entry as a serialized tf.train.Example."""
+  example = tf.train.Example()
+  example.features.feature[_KEY_FEATURE].bytes_list.value.append(
+      key.encode('utf-8'))
+  for path, leaf in _flatten(value):
+    if isinstance(leaf, tf.compat.v1.SparseTensorValue):
+      parts = ((_SPARSE_INDICES, leaf.indices), (_SPARSE_VALUES, leaf.values),
+               (_SPARSE_DENSE_SHAPE, leaf.dense_shape))
+    elif isinstance(leaf, dict):
+      parts = ((_EMPTY_DICT, 0),)
+    else:
+      parts = ((_DENSE, leaf),)
+    for part, part_value in parts:
+      example.features.feature[json.dumps([list(path), part])].CopyFrom(
+          _tensor_feature(part_value))
+  return example.SerializeToString()
+
+
+def decode_entry(serialized: bytes) -> Tuple[Text, Any]:
+  """Decodes cache entry encoded using encode_entry."""
+  example = tf.train.Example.FromString(serialized)
+  key = None
+  leaves = {}  # Dict[Tuple[Text, ...], Dict[Text, np.ndarray]]
+  for name, feature in example.features.feature.items():
+    if name == _KEY_FEATURE:
+      key = feature.bytes_list.value[0].decode('utf-8')
+      continue
+    path, part = json.loads(name)
+    tensor_proto = tf.compat.v1.make_tensor_proto(0)
+    tensor_proto.ParseFromString(feature.bytes_list.value[0])
+    leaves.setdefault(tuple(path), {})[part] = tf.make_ndarray(tensor_proto)
+  value = None
+  for path, parts in leaves.items():
+    if _DENSE in parts:
+      leaf = parts[_DENSE]
+    elif _EMPTY_DICT in parts:
+      leaf = {}
+    else:
+      leaf = tf.compat.v1.SparseTensorValue(
+          indices=parts[_SPARSE_INDICES],
+          values=parts[_SPARSE_VALUES],
+          dense_shape=parts[_SPARSE_DENSE_SHAPE])
+    if not path:
+      value = leaf
+      continue
+    if value is None:
+      value = {}
+    current = value
+    for k in path[:-1]:
+      current = current.setdefault(k, {})
+    current[path[-1]] = leaf
+  return key, value
+
+
+class LookupCounters(object):
+  """Beam counters of the prediction cache hits and misses.
+
+  Beam metrics are tied to the thread processing the bundle, so the counts are
+  returned from the inference functions and reported by the DoFn after
+  _run_inference_for_models returns.
+  """
+
+  def __init__(self):
+    self._hits = beam.metrics.Metrics.counter(constants.METRICS_NAMESPACE,
+                                              'prediction_cache_hits')
+    self._misses = beam.metrics.Metrics.counter(constants.METRICS_NAMESPACE,
+                                                'prediction_cache_misses')
+
+  def update(self, num_hits: int, num_misses: int):
+    if num_hits:
+      self._hits.inc(num_hits)
+    if num_misses:
+      self._misses.inc(num_misses)
+
+
+def _shard(key: Text) -> Text:
+  return key[:_SHARD_PREFIX_LENGTH]
+
+
+class PredictionCache(object):
+  """Prediction cache for a single model.
+
+  The entries of a shard are loaded the first time one of its keys is looked
+  up and the least recently used shards are dropped once more than
+  max_loaded_shards are loaded. New entries are kept in memory until flush
+  (called from finish_bundle) where they are written to one temporary file per
+  shard that is then renamed to its final name so that readers never see
+  partially written files. Once a shard has max_files_per_shard files, the next
+  flush instead rewrites all of its entries into a single file and removes the
+  files that were merged, which bounds the number of files over many bundles
+  and runs.
+  """
+
+  def __init__(self,
+               cache_path: Text,
+               model_fingerprint_value: Text,
+               max_loaded_shards: int = DEFAULT_MAX_LOADED_SHARDS,
+               max_files_per_shard: int = DEFAULT_MAX_FILES_PER_SHARD):
+    """Initializes cache.
+
+    Args:
+      cache_path: Root directory of the prediction cache.
+      model_fingerprint_value: Fingerprint of the model (see model_fingerprint).
+      max_loaded_shards: Max number of shards kept in memory.
+      max_files_per_shard: Max number of files per shard before they are
+        compacted on flush.
+    """
+    self._dir = os.path.join(cache_path, model_fingerprint_value)
+    self._max_loaded_shards = max_loaded_shards
+    self._max_files_per_shard = max_files_per_shard
+    # Entries of the loaded shards keyed by shard (least recently used first).
+    self._shards = collections.OrderedDict()
+    # Entries added since the last flush keyed by shard.
+    self._pending = {}  # type: Dict[Text, Dict[Text, bytes]]
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_shards'] = collections.OrderedDict()
+    state['_pending'] = {}
+    return state
+
+  def _list_files(self, shard: Text) -> List[Text]:
+    """Returns the paths of the (fully written) files of the shard."""
+    shard_dir = os.path.join(self._dir, shard)
+    if not tf.io.gfile.exists(shard_dir):
+      return []
+    return [
+        path
+        for path in tf.io.gfile.glob(os.path.join(shard_dir, '*' + _FILE_SUFFIX))
+        if not os.path.basename(path).startswith(_TEMP_FILE_PREFIX)
+    ]
+
+  def _read_files(self, paths: List[Text]) -> Dict[Text, bytes]:
+    """Returns the entries stored in the given files keyed by key."""
+    entries = {}
+    for path in paths:
+      for record in tf.compat.v1.python_io.tf_record_iterator(path):
+        key = tf.train.Example.FromString(record).features.feature[
+            _KEY_FEATURE].bytes_list.value[0].decode('utf-8')
+        entries[key] = record
+    return entries
+
+  def _load_shard(self, shard: Text) -> Dict[Text, bytes]:
+    """Returns the entries of the shard (loading the shard if needed)."""
+    if shard in self._shards:
+      self._shards[shard] = self._shards.pop(shard)  # Most recently used.
+      return self._shards[shard]
+    entries = self._read_files(self._list_files(shard))
+    self._shards[shard] = entries
+    while len(self._shards) > self._max_loaded_shards:
+      self._shards.popitem(last=False)
+    return entries
+
+  def _get_record(self, key: Optional[Text]) -> Optional[bytes]:
+    if key is None:
+      return None
+    shard = _shard(key)
+    if key in self._pending.get(shard, {}):
+      return self._pending[shard][key]
+    return self._load_shard(shard).get(key)
+
+  def get(self, key: Optional[Text]) -> Optional[Any]:
+    """Returns cached value for key (or None on a miss)."""
+    return self.get_many([key])[0]
+
+  def get_many(self, keys: Iterable[Optional[Text]]) -> List[Optional[Any]]:
+    """Returns cached values for keys (None for misses).
+
+    The keys are looked up one shard at a time so that each shard is loaded at
+    most once per call.
+
+    The lookups are not counted here since the cache may be used from the
+    worker threads of _run_inference_for_models (see LookupCounters).
+
+    Args:
+      keys: Keys to look up.
+    """
+    keys = list(keys)
+    result = [None] * len(keys)
+    order = sorted(
+        (i for i, key in enumerate(keys) if key is not None),
+        key=lambda i: keys[i])
+    for i in order:
+      record = self._get_record(keys[i])
+      if record is not None:
+        result[i] = decode_entry(record)[1]
+    return result
+
+  def put(self, key: Optional[Text], value: Any):
+    """Adds entry to cache (entries are written to disk on flush)."""
+    if key is None:
+      return
+    self._pending.setdefault(_shard(key), {})[key] = encode_entry(key, value)
+
+  def flush(self):
+    """Writes the entries added since the last flush (one file per shard)."""
+    for shard, entries in self._pending.items():
+      shard_dir = os.path.join(self._dir, shard)
+      tf.io.gfile.makedirs(shard_dir)
+      records = entries
+      merged_paths = self._list_files(shard)
+      if len(merged_paths) >= self._max_files_per_shard:
+        records = self._read_files(merged_paths)
+        records.update(entries)
+      else:
+        merged_paths = []
+      filename = uuid.uuid4().hex + _FILE_SUFFIX
+      temp_path = os.path.join(shard_dir, _TEMP_FILE_PREFIX + filename)
+      with tf.io.TFRecordWriter(temp_path) as writer:
+        for record in records.values():
+          writer.write(record)
+      tf.io.gfile.rename(
+          temp_path, os.path.join(shard_dir, filename), overwrite=True)
+      # The merged files are only removed once the compacted file is in place.
+      # Another worker compacting the same shard may have removed them first.
+      for path in merged_paths:
+        try:
+          tf.io.gfile.remove(path)
+        except tf.errors.NotFoundError:
+          pass
+      if shard in self._shards:
+        self._shards[shard].update(entries)
+    self._pending = {}
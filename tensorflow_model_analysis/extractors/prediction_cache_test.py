@@ -0,0 +1,165 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for prediction cache."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis.eval_saved_model import testutil
+from tensorflow_model_analysis.extractors import prediction_cache
+
+
+class PredictionCacheTest(testutil.TensorflowModelAnalysisTest):
+
+  def testEncodeDecodeEntry(self):
+    value = {
+        'features': {
+            'age': np.array([1.0, 2.0]),
+            'language': tf.compat.v1.SparseTensorValue(
+                indices=np.array([[0, 0]]),
+                values=np.array([b'english'], dtype=object),
+                dense_shape=np.array([1, 1]))
+        },
+        'predictions': np.array([0.5], dtype=np.float32),
+        'labels': {}
+    }
+    key, got = prediction_cache.decode_entry(
+        prediction_cache.encode_entry('key1', value))
+    self.assertEqual('key1', key)
+    self.assertEqual({'features', 'predictions', 'labels'}, set(got.keys()))
+    self.assertAllClose(value['features']['age'], got['features']['age'])
+    self.assertAllEqual([[0, 0]], got['features']['language'].indices)
+    self.assertAllEqual([b'english'], got['features']['language'].values)
+    self.assertAllEqual([1, 1], got['features']['language'].dense_shape)
+    self.assertAllClose(value['predictions'], got['predictions'])
+    self.assertEqual(np.float32, got['predictions'].dtype)
+    self.assertEqual({}, got['labels'])
+
+  def testEncodeDecodeNonDictEntry(self):
+    _, got = prediction_cache.decode_entry(
+        prediction_cache.encode_entry('key1', np.array([[0.2, 0.8]])))
+    self.assertAllClose(np.array([[0.2, 0.8]]), got)
+
+  def testInputFingerprint(self):
+    self.assertEqual(
+        prediction_cache.input_fingerprint(b'example'),
+        prediction_cache.input_fingerprint(u'example'))
+    self.assertNotEqual(
+        prediction_cache.input_fingerprint(b'example1'),
+        prediction_cache.input_fingerprint(b'example2'))
+    self.assertIsNone(prediction_cache.input_fingerprint(None))
+
+  def testModelFingerprint(self):
+    model_path = self._getTempDir()
+    with tf.io.gfile.GFile(os.path.join(model_path, 'saved_model.pb'),
+                           'wb') as f:
+      f.write(b'graph1')
+    fingerprint1 = prediction_cache.model_fingerprint(model_path, 'sig')
+    self.assertEqual(fingerprint1,
+                     prediction_cache.model_fingerprint(model_path, 'sig'))
+    self.assertNotEqual(fingerprint1,
+                        prediction_cache.model_fingerprint(model_path, 'other'))
+    self.assertEqual(
+        fingerprint1,
+        prediction_cache.model_fingerprint(model_path, 'sig', options={}))
+    self.assertNotEqual(
+        fingerprint1,
+        prediction_cache.model_fingerprint(
+            model_path, 'sig', options={'additional_fetches': ['extra']}))
+    with tf.io.gfile.GFile(os.path.join(model_path, 'saved_model.pb'),
+                           'wb') as f:
+      f.write(b'graph2')
+    self.assertNotEqual(fingerprint1,
+                        prediction_cache.model_fingerprint(model_path, 'sig'))
+
+  def testPutFlushAndReload(self):
+    cache_path = self._getTempDir()
+    cache = prediction_cache.PredictionCache(cache_path, 'model1')
+    self.assertIsNone(cache.get('key1'))
+    cache.put('key1', {'output': np.array([0.5])})
+    cache.put(None, {'output': np.array([0.7])})
+    self.assertAllClose([0.5], cache.get('key1')['output'])
+    cache.flush()
+
+    reloaded = prediction_cache.PredictionCache(cache_path, 'model1')
+    self.assertAllClose([0.5], reloaded.get('key1')['output'])
+    self.assertIsNone(reloaded.get('key2'))
+    # Entries are stored per model fingerprint.
+    other_model = prediction_cache.PredictionCache(cache_path, 'model2')
+    self.assertIsNone(other_model.get('key1'))
+
+  def testEntriesAreShardedByKeyPrefix(self):
+    cache_path = self._getTempDir()
+    cache = prediction_cache.PredictionCache(
+        cache_path, 'model1', max_loaded_shards=1)
+    cache.put('aa1', {'output': np.array([0.1])})
+    cache.put('aa2', {'output': np.array([0.2])})
+    cache.put('bb1', {'output': np.array([0.3])})
+    cache.flush()
+    self.assertCountEqual(['aa', 'bb'],
+                          tf.io.gfile.listdir(os.path.join(cache_path,
+                                                           'model1')))
+
+    reloaded = prediction_cache.PredictionCache(
+        cache_path, 'model1', max_loaded_shards=1)
+    got = reloaded.get_many(['bb1', 'aa2', None, 'cc1', 'aa1'])
+    self.assertAllClose([0.3], got[0]['output'])
+    self.assertAllClose([0.2], got[1]['output'])
+    self.assertIsNone(got[2])
+    self.assertIsNone(got[3])
+    self.assertAllClose([0.1], got[4]['output'])
+    # Only the most recently used shard is kept in memory.
+    self.assertLen(reloaded._shards, 1)  # pylint: disable=protected-access
+
+  def testRepeatedFlushesCompactShardFiles(self):
+    cache_path = self._getTempDir()
+    for i in range(20):
+      cache = prediction_cache.PredictionCache(
+          cache_path, 'model1', max_files_per_shard=3)
+      cache.put('aa{}'.format(i), {'output': np.array([float(i)])})
+      cache.flush()
+      self.assertLessEqual(
+          len(tf.io.gfile.listdir(os.path.join(cache_path, 'model1', 'aa'))),
+          3)
+
+    reloaded = prediction_cache.PredictionCache(cache_path, 'model1')
+    got = reloaded.get_many(['aa{}'.format(i) for i in range(20)])
+    for i, value in enumerate(got):
+      self.assertAllClose([float(i)], value['output'])
+
+  def testUnflushedEntriesAreNotVisible(self):
+    cache_path = self._getTempDir()
+    cache = prediction_cache.PredictionCache(cache_path, 'model1')
+    cache.put('key1', {'output': np.array([0.5])})
+    reloaded = prediction_cache.PredictionCache(cache_path, 'model1')
+    self.assertIsNone(reloaded.get('key1'))
+
+  def testGetPredictionCachePath(self):
+    self.assertIsNone(prediction_cache.get_prediction_cache_path(None))
+    eval_config = config.EvalConfig()
+    self.assertIsNone(prediction_cache.get_prediction_cache_path(eval_config))
+    eval_config.options.prediction_cache_path.value = '/tmp/cache'
+    self.assertEqual('/tmp/cache',
+                     prediction_cache.get_prediction_cache_path(eval_config))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -14,6 +14,8 @@
 # limitations under the License.
 """Init module for TensorFlow Model Analysis metrics."""
 
+from tensorflow_model_analysis.metrics.auc_sketch import SketchAUC
+from tensorflow_model_analysis.metrics.auc_sketch import SketchAUCPrecisionRecall
 from tensorflow_model_analysis.metrics.calibration import Calibration
 from tensorflow_model_analysis.metrics.calibration import MeanLabel
 from tensorflow_model_analysis.metrics.calibration import MeanPrediction
@@ -0,0 +1,218 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Combiners for metrics whose state is a fixed vector of weighted sums.
+
+Metrics such as example count, mean label, calibration, etc only keep a small
+fixed number of (weighted) sums as their state. Combiners for these metrics
+implement the AdditiveSumsCombiner protocol so that all of them can share a
+single flat NumPy accumulator (see fuse_additive_sums_computations). The fused
+combiner normalizes the labels, predictions, and example weights once per
+distinct set of normalization settings (instead of once per metric) and merges
+accumulators using a single vectorized add.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import collections
+
+import apache_beam as beam
+import numpy as np
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis.metrics import metric_types
+from tensorflow_model_analysis.metrics import metric_util
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+
+class AdditiveSumsCombiner(beam.CombineFn):
+  """Base class for combiners whose accumulator is a vector of sums.
+
+  Subclasses implement input_key, prepare_input, update_sums, and
+  sums_to_output. Combiners with the same input_key must return the same
+  prepare_input output for a given element so that it can be shared when the
+  combiners are fused.
+  """
+
+  def __init__(self, num_sums: int):
+    self._num_sums = num_sums
+
+  @property
+  def num_sums(self) -> int:
+    return self._num_sums
+
+  def input_key(self) -> Hashable:
+    """Returns key identifying the output of prepare_input."""
+    raise NotImplementedError('Subclasses are expected to override this.')
+
+  def prepare_input(self, element: metric_types.StandardMetricInputs) -> Any:
+    """Returns input used by update_sums for the given element."""
+    raise NotImplementedError('Subclasses are expected to override this.')
+
+  def update_sums(self, sums: np.ndarray, prepared_input: Any):
+    """Adds prepared input to sums (in place)."""
+    raise NotImplementedError('Subclasses are expected to override this.')
+
+  def sums_to_output(self,
+                     sums: np.ndarray) -> Dict[metric_types.MetricKey, Any]:
+    """Returns output of the combiner given the final sums."""
+    raise NotImplementedError('Subclasses are expected to override this.')
+
+  def create_accumulator(self) -> np.ndarray:
+    return np.zeros(self._num_sums)
+
+  def add_input(self, accumulator: np.ndarray,
+                element: metric_types.StandardMetricInputs) -> np.ndarray:
+    self.update_sums(accumulator, self.prepare_input(element))
+    return accumulator
+
+  def merge_accumulators(self,
+                         accumulators: Iterable[np.ndarray]) -> np.ndarray:
+    return _merge_sums(accumulators, self._num_sums)
+
+  def extract_output(
+      self, accumulator: np.ndarray) -> Dict[metric_types.MetricKey, Any]:
+    return self.sums_to_output(accumulator)
+
+
+def _merge_sums(accumulators: Iterable[np.ndarray],
+                num_sums: int) -> np.ndarray:
+  accumulators = list(accumulators)
+  if not accumulators:
+    return np.zeros(num_sums)
+  return np.sum(accumulators, axis=0)
+
+
+class LabelPredictionExampleWeightSumsCombiner(AdditiveSumsCombiner):
+  """Base class for sums computed from the labels, predictions, and weights.
+
+  The prepared input is the list of (label, prediction, example_weight) tuples
+  returned by metric_util.to_label_prediction_example_weight.
+  """
+
+  def __init__(self,
+               num_sums: int,
+               key: metric_types.MetricKey,
+               eval_config: Optional[config.EvalConfig],
+               class_weights: Optional[Dict[int, float]],
+               allow_none: bool = False):
+    super(LabelPredictionExampleWeightSumsCombiner, self).__init__(num_sums)
+    self._key = key
+    self._eval_config = eval_config
+    self._class_weights = class_weights
+    self._allow_none = allow_none
+
+  def input_key(self) -> Hashable:
+    # The contents of the eval config are used (rather than its identity) so
+    # that the key is the same for copies of the config (e.g. after pickling).
+    eval_config_key = (
+        self._eval_config.SerializeToString(deterministic=True)
+        if self._eval_config is not None else None)
+    return ('label_prediction_example_weight', eval_config_key,
+            self._key.model_name, self._key.output_name, self._key.sub_key,
+            tuple(sorted(self._class_weights.items()))
+            if self._class_weights else None, self._allow_none)
+
+  def prepare_input(self, element: metric_types.StandardMetricInputs) -> Any:
+    return list(
+        metric_util.to_label_prediction_example_weight(
+            element,
+            eval_config=self._eval_config,
+            model_name=self._key.model_name,
+            output_name=self._key.output_name,
+            sub_key=self._key.sub_key,
+            class_weights=self._class_weights,
+            allow_none=self._allow_none))
+
+
+class _FusedAdditiveSumsCombiner(beam.CombineFn):
+  """Computes multiple AdditiveSumsCombiners using a single flat accumulator."""
+
+  def __init__(self, combiners: List[AdditiveSumsCombiner]):
+    self._combiners = combiners
+    self._slices = []
+    offset = 0
+    for combiner in combiners:
+      self._slices.append(slice(offset, offset + combiner.num_sums))
+      offset += combiner.num_sums
+    self._num_sums = offset
+    # Indices of the combiners sharing the same prepared input.
+    groups = collections.OrderedDict()
+    for i, combiner in enumerate(combiners):
+      groups.setdefault(combiner.input_key(), []).append(i)
+    self._groups = list(groups.values())
+
+  def create_accumulator(self) -> np.ndarray:
+    return np.zeros(self._num_sums)
+
+  def add_input(self, accumulator: np.ndarray,
+                element: metric_types.StandardMetricInputs) -> np.ndarray:
+    for indices in self._groups:
+      prepared_input = self._combiners[indices[0]].prepare_input(element)
+      for i in indices:
+        # Slices of the accumulator are views so the sums are updated in place.
+        self._combiners[i].update_sums(accumulator[self._slices[i]],
+                                       prepared_input)
+    return accumulator
+
+  def merge_accumulators(self,
+                         accumulators: Iterable[np.ndarray]) -> np.ndarray:
+    return _merge_sums(accumulators, self._num_sums)
+
+  def extract_output(
+      self, accumulator: np.ndarray) -> Dict[metric_types.MetricKey, Any]:
+    result = {}
+    for combiner, sums_slice in zip(self._combiners, self._slices):
+      result.update(combiner.sums_to_output(accumulator[sums_slice]))
+    return result
+
+
+def fuse_additive_sums_computations(
+    computations: List[metric_types.MetricComputation]
+) -> List[metric_types.MetricComputation]:
+  """Replaces computations using AdditiveSumsCombiners by a fused computation.
+
+  Only computations using the default preprocessor (None) are fused. The fused
+  computation takes the place of the first computation that was fused.
+
+  Args:
+    computations: Metric computations (non-derived).
+
+  Returns:
+    Computations with the additive sums computations fused into one.
+  """
+  fusable = [
+      c for c in computations
+      if isinstance(c.combiner, AdditiveSumsCombiner) and c.preprocessor is None
+  ]
+  if len(fusable) < 2:
+    return computations
+  keys = []
+  for c in fusable:
+    keys.extend(c.keys)
+  fused = metric_types.MetricComputation(
+      keys=keys,
+      preprocessor=None,
+      combiner=_FusedAdditiveSumsCombiner([c.combiner for c in fusable]))
+  result = []
+  fusable_ids = set(id(c) for c in fusable)
+  for c in computations:
+    if id(c) not in fusable_ids:
+      result.append(c)
+    elif c is fusable[0]:
+      result.append(fused)
+  return result
+
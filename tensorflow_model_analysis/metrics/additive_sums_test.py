@@ -0,0 +1,245 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for additive sums combiners."""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import apache_beam as beam
+from apache_beam.testing import util
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis.eval_saved_model import testutil
+from tensorflow_model_analysis.metrics import additive_sums
+from tensorflow_model_analysis.metrics import calibration
+from tensorflow_model_analysis.metrics import example_count
+from tensorflow_model_analysis.metrics import metric_types
+from tensorflow_model_analysis.metrics import metric_util
+from tensorflow_model_analysis.metrics import squared_pearson_correlation
+from tensorflow_model_analysis.metrics import tjur_discrimination
+from tensorflow_model_analysis.metrics import weighted_example_count
+
+
+def _computations(eval_config):
+  computations = []
+  for metric in (weighted_example_count.WeightedExampleCount(),
+                 calibration.MeanLabel(), calibration.Calibration(),
+                 squared_pearson_correlation.SquaredPearsonCorrelation(),
+                 tjur_discrimination.CoefficientOfDiscrimination()):
+    for c in metric.computations(eval_config=eval_config):
+      if isinstance(c, metric_types.MetricComputation):
+        computations.append(c)
+  return computations
+
+
+def _examples():
+  return [
+      metric_util.to_standard_metric_inputs({
+          'labels': np.array([0.0]),
+          'predictions': np.array([0.2]),
+          'example_weights': np.array([0.5]),
+      }),
+      metric_util.to_standard_metric_inputs({
+          'labels': np.array([1.0]),
+          'predictions': np.array([0.7]),
+          'example_weights': np.array([1.5]),
+      }),
+      metric_util.to_standard_metric_inputs({
+          'labels': np.array([1.0]),
+          'predictions': np.array([0.9]),
+          'example_weights': np.array([1.0]),
+      }),
+  ]
+
+
+def _run_combiner(combiner, examples, num_partitions=2):
+  accumulators = []
+  for i in range(num_partitions):
+    accumulator = combiner.create_accumulator()
+    for example in examples[i::num_partitions]:
+      accumulator = combiner.add_input(accumulator, example)
+    accumulators.append(accumulator)
+  return combiner.extract_output(combiner.merge_accumulators(accumulators))
+
+
+class _CountingCombiner(additive_sums.AdditiveSumsCombiner):
+  """Counts calls to prepare_input."""
+
+  calls = 0
+
+  def __init__(self, key, input_key):
+    super(_CountingCombiner, self).__init__(num_sums=2)
+    self._key = key
+    self._input_key = input_key
+
+  def input_key(self):
+    return self._input_key
+
+  def prepare_input(self, element):
+    _CountingCombiner.calls += 1
+    return element
+
+  def update_sums(self, sums, prepared_input):
+    sums[0] += prepared_input
+    sums[1] += 1
+
+  def sums_to_output(self, sums):
+    return {self._key: (float(sums[0]), float(sums[1]))}
+
+
+class AdditiveSumsTest(testutil.TensorflowModelAnalysisTest):
+
+  def testFuseAdditiveSumsComputations(self):
+    computations = _computations(config.EvalConfig())
+    fused = additive_sums.fuse_additive_sums_computations(computations)
+    self.assertLen(fused, 1)
+    self.assertCountEqual(
+        [k for c in computations for k in c.keys], fused[0].keys)
+    self.assertIsNone(fused[0].preprocessor)
+
+  def testFuseKeepsOtherComputations(self):
+    other = metric_types.MetricComputation(
+        keys=[metric_types.MetricKey(name='other')],
+        preprocessor=None,
+        combiner=beam.combiners.CountCombineFn())
+    computations = [other] + _computations(config.EvalConfig())
+    fused = additive_sums.fuse_additive_sums_computations(computations)
+    self.assertLen(fused, 2)
+    self.assertIs(other, fused[0])
+
+  def testFuseSingleComputationIsNoop(self):
+    computations = weighted_example_count.WeightedExampleCount().computations()
+    self.assertEqual(
+        computations,
+        additive_sums.fuse_additive_sums_computations(computations))
+
+  def testExampleCountIsNotFused(self):
+    # ExampleCount uses its own preprocessor so that it does not require labels
+    # and predictions.
+    example_count_computation = example_count.ExampleCount().computations()[0]
+    computations = [example_count_computation] + _computations(
+        config.EvalConfig())
+    fused = additive_sums.fuse_additive_sums_computations(computations)
+    self.assertLen(fused, 2)
+    self.assertIs(example_count_computation, fused[0])
+
+  def testFusedOutputsMatchIndividualOutputs(self):
+    computations = _computations(config.EvalConfig())
+    examples = _examples()
+    expected = {}
+    for c in computations:
+      expected.update(_run_combiner(c.combiner, examples))
+    fused = additive_sums.fuse_additive_sums_computations(computations)
+    got = _run_combiner(fused[0].combiner, examples)
+
+    self.assertEqual(set(expected.keys()), set(got.keys()))
+    for key, value in expected.items():
+      if hasattr(value, '__slots__'):
+        for slot in value.__slots__:
+          self.assertAlmostEqual(
+              getattr(value, slot), getattr(got[key], slot), msg=slot)
+      else:
+        self.assertAlmostEqual(value, got[key])
+    self.assertAlmostEqual(
+        3.0, got[metric_types.MetricKey(
+            name=weighted_example_count.WEIGHTED_EXAMPLE_COUNT_NAME)])
+
+  def testFusedCombinerSharesPreparedInputs(self):
+    key1 = metric_types.MetricKey(name='m1')
+    key2 = metric_types.MetricKey(name='m2')
+    key3 = metric_types.MetricKey(name='m3')
+    computations = [
+        metric_types.MetricComputation(
+            keys=[key1],
+            preprocessor=None,
+            combiner=_CountingCombiner(key1, 'shared')),
+        metric_types.MetricComputation(
+            keys=[key2],
+            preprocessor=None,
+            combiner=_CountingCombiner(key2, 'shared')),
+        metric_types.MetricComputation(
+            keys=[key3],
+            preprocessor=None,
+            combiner=_CountingCombiner(key3, 'other')),
+    ]
+    combiner = additive_sums.fuse_additive_sums_computations(
+        computations)[0].combiner
+    _CountingCombiner.calls = 0
+    got = _run_combiner(combiner, [1.0, 2.0, 3.0], num_partitions=1)
+    # One call per distinct input key per input.
+    self.assertEqual(6, _CountingCombiner.calls)
+    self.assertEqual({key1: (6.0, 3.0), key2: (6.0, 3.0), key3: (6.0, 3.0)},
+                     got)
+
+  def testInputKeyUsesEvalConfigContents(self):
+    key = metric_types.MetricKey(name='mean_label')
+
+    def make_combiner(eval_config):
+      return calibration._WeightedLabelsPredictionsExamplesCombiner(  # pylint: disable=protected-access
+          key, eval_config=eval_config, class_weights=None)
+
+    eval_config = config.EvalConfig(
+        model_specs=[config.ModelSpec(label_key='label')])
+    eval_config_copy = config.EvalConfig()
+    eval_config_copy.CopyFrom(eval_config)
+    self.assertEqual(
+        make_combiner(eval_config).input_key(),
+        make_combiner(eval_config_copy).input_key())
+    self.assertNotEqual(
+        make_combiner(eval_config).input_key(),
+        make_combiner(config.EvalConfig()).input_key())
+
+  def testMergeEmptyAccumulators(self):
+    combiner = example_count.ExampleCount().computations()[0].combiner
+    self.assertEqual({
+        metric_types.MetricKey(name=example_count.EXAMPLE_COUNT_NAME): 0
+    }, combiner.extract_output(combiner.merge_accumulators([])))
+
+  def testFusedCombinerInPipeline(self):
+    computations = additive_sums.fuse_additive_sums_computations(
+        _computations(config.EvalConfig()))
+    combiner = computations[0].combiner
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      result = (
+          pipeline
+          | 'Create' >> beam.Create(_examples())
+          | 'AddSlice' >> beam.Map(lambda x: ((), x))
+          | 'ComputeMetric' >> beam.CombinePerKey(combiner))
+
+      # pylint: enable=no-value-for-parameter
+
+      def check_result(got):
+        try:
+          self.assertLen(got, 1)
+          got_slice_key, got_metrics = got[0]
+          self.assertEqual(got_slice_key, ())
+          self.assertEqual(set(computations[0].keys), set(got_metrics.keys()))
+          self.assertAlmostEqual(
+              3.0, got_metrics[metric_types.MetricKey(
+                  name=weighted_example_count.WEIGHTED_EXAMPLE_COUNT_NAME)])
+
+        except AssertionError as err:
+          raise util.BeamAssertException(err)
+
+      util.assert_that(result, check_result, label='result')
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,534 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""AUC metrics computed using mergeable weighted quantile sketches.
+
+Unlike the AUC computed from binary confusion matrices (which is bounded by the
+resolution of a fixed list of thresholds), these metrics keep a summary of the
+weighted distribution of the predictions of the positive and negative examples.
+
+While a slice has at most exact_size distinct predictions per class, the
+summaries contain the exact predictions and weights and the AUC computed is the
+exact AUC (ties are counted as half correct). Once this size is exceeded, the
+summary is compressed to at most sketch_size + 1 weighted points by replacing
+runs of adjacent predictions by their weighted mean. Compressed summaries are
+kept in levels and are only merged (and re-compressed) with summaries of the
+same level, so a slice of n examples uses O(exact_size + sketch_size *
+log(n / exact_size)) memory per class.
+
+Each summary keeps track of the maximum error of its weighted cumulative
+distribution function (rank_error). The absolute error of the ROC AUC is at
+most (see error_bound):
+
+  positives.rank_error / total_positive_weight +
+  negatives.rank_error / total_negative_weight
+
+Each compression adds at most 1 / sketch_size (plus the relative weight of the
+heaviest prediction that was merged) to the relative rank error, so for
+predictions without heavy ties the error is bounded by about
+2 * num_levels / sketch_size where num_levels is the number of levels used.
+No similar bound is provided for the PR AUC.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+import apache_beam as beam
+import numpy as np
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis.metrics import metric_types
+from tensorflow_model_analysis.metrics import metric_util
+from typing import Any, Dict, List, NamedTuple, Optional, Text
+
+SKETCH_AUC_NAME = 'sketch_auc'
+SKETCH_AUC_PRECISION_RECALL_NAME = 'sketch_auc_precision_recall'
+AUC_SKETCH_NAME = '_auc_sketch'
+
+DEFAULT_SKETCH_SIZE = 1000
+DEFAULT_EXACT_SIZE = 2000
+
+_ROC = 'ROC'
+_PR = 'PR'
+
+
+class SketchAUC(metric_types.Metric):
+  """ROC AUC computed using quantile sketches (exact for small slices)."""
+
+  def __init__(self,
+               sketch_size: Optional[int] = None,
+               exact_size: Optional[int] = None,
+               name: Text = SKETCH_AUC_NAME):
+    """Initializes sketch based ROC AUC.
+
+    Args:
+      sketch_size: Max number of points kept per class after compression.
+        Defaults to DEFAULT_SKETCH_SIZE.
+      exact_size: Max number of distinct predictions per class for which the
+        AUC is computed exactly. Defaults to DEFAULT_EXACT_SIZE.
+      name: Metric name.
+    """
+    super(SketchAUC, self).__init__(
+        metric_util.merge_per_key_computations(_sketch_auc_roc),
+        sketch_size=sketch_size,
+        exact_size=exact_size,
+        name=name)
+
+
+metric_types.register_metric(SketchAUC)
+
+
+class SketchAUCPrecisionRecall(metric_types.Metric):
+  """PR AUC computed using quantile sketches (exact for small slices)."""
+
+  def __init__(self,
+               sketch_size: Optional[int] = None,
+               exact_size: Optional[int] = None,
+               name: Text = SKETCH_AUC_PRECISION_RECALL_NAME):
+    """Initializes sketch based PR AUC.
+
+    Args:
+      sketch_size: Max number of points kept per class after compression.
+        Defaults to DEFAULT_SKETCH_SIZE.
+      exact_size: Max number of distinct predictions per class for which the
+        AUC is computed exactly. Defaults to DEFAULT_EXACT_SIZE.
+      name: Metric name.
+    """
+    super(SketchAUCPrecisionRecall, self).__init__(
+        metric_util.merge_per_key_computations(_sketch_auc_pr),
+        sketch_size=sketch_size,
+        exact_size=exact_size,
+        name=name)
+
+
+metric_types.register_metric(SketchAUCPrecisionRecall)
+
+
+def _sketch_auc_roc(
+    sketch_size: Optional[int] = None,
+    exact_size: Optional[int] = None,
+    name: Text = SKETCH_AUC_NAME,
+    eval_config: Optional[config.EvalConfig] = None,
+    model_name: Text = '',
+    output_name: Text = '',
+    sub_key: Optional[metric_types.SubKey] = None,
+    class_weights: Optional[Dict[int, float]] = None
+) -> metric_types.MetricComputations:
+  """Returns metric computations for sketch based ROC AUC."""
+  return _sketch_auc(_ROC, name, sketch_size, exact_size, eval_config,
+                     model_name, output_name, sub_key, class_weights)
+
+
+def _sketch_auc_pr(
+    sketch_size: Optional[int] = None,
+    exact_size: Optional[int] = None,
+    name: Text = SKETCH_AUC_PRECISION_RECALL_NAME,
+    eval_config: Optional[config.EvalConfig] = None,
+    model_name: Text = '',
+    output_name: Text = '',
+    sub_key: Optional[metric_types.SubKey] = None,
+    class_weights: Optional[Dict[int, float]] = None
+) -> metric_types.MetricComputations:
+  """Returns metric computations for sketch based PR AUC."""
+  return _sketch_auc(_PR, name, sketch_size, exact_size, eval_config,
+                     model_name, output_name, sub_key, class_weights)
+
+
+def _sketch_auc(
+    curve: Text,
+    name: Text,
+    sketch_size: Optional[int] = None,
+    exact_size: Optional[int] = None,
+    eval_config: Optional[config.EvalConfig] = None,
+    model_name: Text = '',
+    output_name: Text = '',
+    sub_key: Optional[metric_types.SubKey] = None,
+    class_weights: Optional[Dict[int, float]] = None
+) -> metric_types.MetricComputations:
+  """Returns metric computations for sketch based AUC."""
+  key = metric_types.MetricKey(
+      name=name,
+      model_name=model_name,
+      output_name=output_name,
+      sub_key=sub_key)
+
+  # Make sure sketches are calculated (shared between ROC and PR).
+  computations = auc_sketch(
+      sketch_size=sketch_size,
+      exact_size=exact_size,
+      eval_config=eval_config,
+      model_name=model_name,
+      output_name=output_name,
+      sub_key=sub_key,
+      class_weights=class_weights)
+  sketch_key = computations[-1].keys[-1]
+
+  def result(
+      metrics: Dict[metric_types.MetricKey, Any]
+  ) -> Dict[metric_types.MetricKey, float]:
+    return {key: auc(metrics[sketch_key], curve=curve)}
+
+  derived_computation = metric_types.DerivedMetricComputation(
+      keys=[key], result=result)
+  computations.append(derived_computation)
+  return computations
+
+
+def auc_sketch(
+    sketch_size: Optional[int] = None,
+    exact_size: Optional[int] = None,
+    name: Optional[Text] = None,
+    eval_config: Optional[config.EvalConfig] = None,
+    model_name: Text = '',
+    output_name: Text = '',
+    sub_key: Optional[metric_types.SubKey] = None,
+    class_weights: Optional[Dict[int, float]] = None
+) -> metric_types.MetricComputations:
+  """Returns metric computations for the AUC sketches.
+
+  Args:
+    sketch_size: Max number of points kept per class after compression.
+    exact_size: Max number of distinct predictions per class kept before the
+      summaries are compressed. Must be >= sketch_size.
+    name: Metric name.
+    eval_config: Eval config.
+    model_name: Optional model name (if multi-model evaluation).
+    output_name: Optional output name (if multi-output model type).
+    sub_key: Optional sub key.
+    class_weights: Optional class weights to apply to multi-class / multi-label
+      labels and predictions prior to flattening (when micro averaging is used).
+
+  Returns:
+    MetricComputations for computing the sketches. The output is an AUCSketch.
+  """
+  if sketch_size is None:
+    sketch_size = DEFAULT_SKETCH_SIZE
+  if exact_size is None:
+    exact_size = max(DEFAULT_EXACT_SIZE, sketch_size)
+  if sketch_size <= 0 or exact_size < sketch_size:
+    raise ValueError(
+        'sketch_size must be > 0 and exact_size must be >= sketch_size: '
+        'sketch_size={}, exact_size={}'.format(sketch_size, exact_size))
+  if name is None:
+    name = '{}_{}_{}'.format(AUC_SKETCH_NAME, sketch_size, exact_size)
+  key = metric_types.MetricKey(
+      name=name,
+      model_name=model_name,
+      output_name=output_name,
+      sub_key=sub_key)
+  return [
+      metric_types.MetricComputation(
+          keys=[key],
+          preprocessor=None,
+          combiner=_AUCSketchCombiner(
+              key=key,
+              eval_config=eval_config,
+              class_weights=class_weights,
+              sketch_size=sketch_size,
+              exact_size=exact_size))
+  ]
+
+
+class WeightedSketch(object):
+  """Summary of a weighted distribution of predictions.
+
+  The values are sorted and unique. The rank_error is the max (absolute) error
+  of the weighted cumulative distribution function represented by the summary.
+  """
+  __slots__ = ['values', 'weights', 'rank_error']
+
+  def __init__(self,
+               values: Optional[np.ndarray] = None,
+               weights: Optional[np.ndarray] = None,
+               rank_error: float = 0.0):
+    self.values = (
+        values if values is not None else np.array([], dtype=np.float64))
+    self.weights = (
+        weights if weights is not None else np.array([], dtype=np.float64))
+    self.rank_error = rank_error
+
+  @property
+  def total_weight(self) -> float:
+    return float(np.sum(self.weights))
+
+
+AUCSketch = NamedTuple('AUCSketch', [('positives', WeightedSketch),
+                                     ('negatives', WeightedSketch)])
+
+# Sketches of a single class indexed by level. Level 0 is the exact summary of
+# the inputs (at most exact_size values). Level i > 0 (if not None) is a summary
+# that was compressed i times (at most sketch_size + 1 values). Summaries are
+# only merged with summaries of the same level (the result is promoted to the
+# next level) so that the error grows logarithmically with the number of
+# compressions.
+_Levels = List[Optional[WeightedSketch]]
+
+
+class _AUCSketchAccumulator(object):
+  """Levels of sketches for the positive and negative examples.
+
+  Inputs added since the last flush are kept in the pending lists.
+  """
+  __slots__ = [
+      'positives', 'negatives', 'pending_predictions',
+      'pending_positive_weights', 'pending_negative_weights'
+  ]
+
+  def __init__(self):
+    self.positives = [None]  # type: _Levels
+    self.negatives = [None]  # type: _Levels
+    self.pending_predictions = []
+    self.pending_positive_weights = []
+    self.pending_negative_weights = []
+
+
+def _union(sketches: List[WeightedSketch]) -> WeightedSketch:
+  """Returns union of sketches (values sorted and deduped)."""
+  sketches = [s for s in sketches if s is not None]
+  if not sketches:
+    return WeightedSketch()
+  values = np.concatenate([s.values for s in sketches])
+  weights = np.concatenate([s.weights for s in sketches])
+  rank_error = float(sum(s.rank_error for s in sketches))
+  if not values.size:
+    return WeightedSketch(rank_error=rank_error)
+  order = np.argsort(values, kind='mergesort')
+  values = values[order]
+  weights = weights[order]
+  starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+  return WeightedSketch(values[starts], np.add.reduceat(weights, starts),
+                        rank_error)
+
+
+def _compress(sketch: WeightedSketch, sketch_size: int) -> WeightedSketch:
+  """Returns sketch compressed to at most sketch_size + 1 values.
+
+  Adjacent values are grouped such that each group starts within a different
+  interval of total_weight / sketch_size of the cumulative weight, and each
+  group is replaced by its weighted mean. Replacing a group changes the
+  cumulative distribution by at most the weight of the group (which is at most
+  total_weight / sketch_size plus the weight of its last value).
+
+  Args:
+    sketch: Sketch to compress.
+    sketch_size: Max number of values (excluding the last group).
+  """
+  weights = sketch.weights
+  total_weight = np.sum(weights)
+  if total_weight <= 0.0:
+    return sketch
+  group_ids = np.floor(
+      (np.cumsum(weights) - weights) * sketch_size / total_weight)
+  starts = np.flatnonzero(
+      np.concatenate([[True], group_ids[1:] != group_ids[:-1]]))
+  group_weights = np.add.reduceat(weights, starts)
+  group_values = (
+      np.add.reduceat(sketch.values * weights, starts) / group_weights)
+  group_sizes = np.diff(np.append(starts, len(weights)))
+  merged = group_sizes > 1
+  added_error = float(np.max(group_weights[merged])) if np.any(merged) else 0.0
+  # Weighted means of sorted disjoint groups are non-decreasing, but adjacent
+  # means may be equal due to rounding.
+  result = _union([WeightedSketch(group_values, group_weights)])
+  result.rank_error = sketch.rank_error + added_error
+  return result
+
+
+def _add_to_level(levels: _Levels, sketch: WeightedSketch, level: int,
+                  sketch_size: int):
+  """Adds compressed sketch to levels (merging same level sketches)."""
+  while True:
+    while len(levels) <= level:
+      levels.append(None)
+    if levels[level] is None:
+      levels[level] = sketch
+      return
+    sketch = _compress(_union([levels[level], sketch]), sketch_size)
+    levels[level] = None
+    level += 1
+
+
+def _add_exact(levels: _Levels, sketch: WeightedSketch, sketch_size: int,
+               exact_size: int):
+  """Adds exact sketch to level 0 (compressing it if larger than exact_size)."""
+  levels[0] = _union([levels[0], sketch])
+  if len(levels[0].values) > exact_size:
+    compressed = _compress(levels[0], sketch_size)
+    levels[0] = None
+    _add_to_level(levels, compressed, 1, sketch_size)
+
+
+class _AUCSketchCombiner(beam.CombineFn):
+  """Creates sketches of the positive and negative predictions."""
+
+  def __init__(self, key: metric_types.MetricKey,
+               eval_config: Optional[config.EvalConfig],
+               class_weights: Optional[Dict[int, float]], sketch_size: int,
+               exact_size: int):
+    self._key = key
+    self._eval_config = eval_config
+    self._class_weights = class_weights
+    self._sketch_size = sketch_size
+    self._exact_size = exact_size
+
+  def _flush(self, accumulator: _AUCSketchAccumulator):
+    """Adds the pending inputs to the sketches."""
+    if not accumulator.pending_predictions:
+      return
+    predictions = np.array(accumulator.pending_predictions, dtype=np.float64)
+    for levels, pending_weights in (
+        (accumulator.positives, accumulator.pending_positive_weights),
+        (accumulator.negatives, accumulator.pending_negative_weights)):
+      weights = np.array(pending_weights, dtype=np.float64)
+      non_zero = weights > 0.0
+      _add_exact(levels, WeightedSketch(predictions[non_zero],
+                                        weights[non_zero]), self._sketch_size,
+                 self._exact_size)
+    accumulator.pending_predictions = []
+    accumulator.pending_positive_weights = []
+    accumulator.pending_negative_weights = []
+
+  def create_accumulator(self) -> _AUCSketchAccumulator:
+    return _AUCSketchAccumulator()
+
+  def add_input(
+      self, accumulator: _AUCSketchAccumulator,
+      element: metric_types.StandardMetricInputs) -> _AUCSketchAccumulator:
+    for label, prediction, example_weight in (
+        metric_util.to_label_prediction_example_weight(
+            element,
+            eval_config=self._eval_config,
+            model_name=self._key.model_name,
+            output_name=self._key.output_name,
+            sub_key=self._key.sub_key,
+            flatten=True,
+            class_weights=self._class_weights)):
+      example_weight = float(example_weight)
+      label = float(label)
+      accumulator.pending_predictions.append(float(prediction))
+      accumulator.pending_positive_weights.append(label * example_weight)
+      accumulator.pending_negative_weights.append(
+          (1.0 - label) * example_weight)
+    if len(accumulator.pending_predictions) >= self._exact_size:
+      self._flush(accumulator)
+    return accumulator
+
+  def merge_accumulators(
+      self,
+      accumulators: List[_AUCSketchAccumulator]) -> _AUCSketchAccumulator:
+    result = self.create_accumulator()
+    for accumulator in accumulators:
+      # The pending inputs are moved to the result (the input accumulators must
+      # not be modified).
+      result.pending_predictions.extend(accumulator.pending_predictions)
+      result.pending_positive_weights.extend(
+          accumulator.pending_positive_weights)
+      result.pending_negative_weights.extend(
+          accumulator.pending_negative_weights)
+      if len(result.pending_predictions) >= self._exact_size:
+        self._flush(result)
+      for result_levels, levels in ((result.positives, accumulator.positives),
+                                    (result.negatives, accumulator.negatives)):
+        if levels[0] is not None:
+          _add_exact(result_levels, levels[0], self._sketch_size,
+                     self._exact_size)
+        for level, sketch in enumerate(levels[1:], 1):
+          if sketch is not None:
+            _add_to_level(result_levels, sketch, level, self._sketch_size)
+    return result
+
+  def compact(self,
+              accumulator: _AUCSketchAccumulator) -> _AUCSketchAccumulator:
+    self._flush(accumulator)
+    return accumulator
+
+  def extract_output(
+      self, accumulator: _AUCSketchAccumulator
+  ) -> Dict[metric_types.MetricKey, AUCSketch]:
+    self._flush(accumulator)
+    return {
+        self._key:
+            AUCSketch(
+                positives=_union(accumulator.positives),
+                negatives=_union(accumulator.negatives))
+    }
+
+
+def error_bound(sketch: AUCSketch) -> float:
+  """Returns upper bound on the absolute error of the ROC AUC."""
+  total_positives = sketch.positives.total_weight
+  total_negatives = sketch.negatives.total_weight
+  if total_positives <= 0.0 or total_negatives <= 0.0:
+    return 0.0
+  return min(
+      1.0, sketch.positives.rank_error / total_positives +
+      sketch.negatives.rank_error / total_negatives)
+
+
+def auc(sketch: AUCSketch, curve: Text = _ROC) -> float:
+  """Returns AUC computed from the sketches.
+
+  Args:
+    sketch: Sketch output by the AUC sketch computation.
+    curve: Either 'ROC' or 'PR'. The PR curve is interpolated between the
+      distinct predictions as described by Davis & Goadrich (2006).
+
+  Returns:
+    AUC or NaN if there are no positive or negative examples.
+  """
+  positives = sketch.positives
+  negatives = sketch.negatives
+  total_positives = positives.total_weight
+  total_negatives = negatives.total_weight
+  if curve == _ROC:
+    if total_positives <= 0.0 or total_negatives <= 0.0:
+      return float('nan')
+    # Weight of negatives with predictions less than (or equal to) each of the
+    # positive predictions.
+    cumulative_negatives = np.concatenate([[0.0], np.cumsum(negatives.weights)])
+    less = cumulative_negatives[np.searchsorted(
+        negatives.values, positives.values, side='left')]
+    less_or_equal = cumulative_negatives[np.searchsorted(
+        negatives.values, positives.values, side='right')]
+    return float(
+        np.sum(positives.weights * (less + less_or_equal) / 2.0) /
+        (total_positives * total_negatives))
+  elif curve == _PR:
+    if total_positives <= 0.0:
+      return float('nan')
+    thresholds = np.union1d(positives.values, negatives.values)
+
+    def at_or_above(class_sketch: WeightedSketch) -> np.ndarray:
+      cumulative = np.concatenate([[0.0], np.cumsum(class_sketch.weights)])
+      result = cumulative[-1] - cumulative[np.searchsorted(
+          class_sketch.values, thresholds, side='left')]
+      # Final point where nothing is predicted positive.
+      return np.append(result, 0.0)
+
+    tp = at_or_above(positives)
+    p = tp + at_or_above(negatives)
+    # Interpolation of the PR curve as described by Davis & Goadrich (2006)
+    # (this matches tf.keras.metrics.AUC(curve='PR')).
+    dtp = tp[:-1] - tp[1:]
+    dp = p[:-1] - p[1:]
+    precision_slope = np.where(dp > 0, dtp / np.where(dp > 0, dp, 1.0), 0.0)
+    intercept = tp[1:] - precision_slope * p[1:]
+    safe_p_ratio = np.where(
+        np.logical_and(p[:-1] > 0, p[1:] > 0),
+        p[:-1] / np.where(p[1:] > 0, p[1:], 1.0), 1.0)
+    return float(
+        np.sum(precision_slope * (dtp + intercept * np.log(safe_p_ratio))) /
+        total_positives)
+  raise ValueError('unsupported curve: {}'.format(curve))
@@ -0,0 +1,190 @@
+# Lint as: python3
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for sketch based AUC metrics."""
+
+from __future__ import absolute_import
+from __future__ import division
+# Standard __future__ imports
+from __future__ import print_function
+
+from absl.testing import parameterized
+import apache_beam as beam
+from apache_beam.testing import util
+import numpy as np
+import tensorflow as tf
+from tensorflow_model_analysis.eval_saved_model import testutil
+from tensorflow_model_analysis.metrics import auc_sketch
+from tensorflow_model_analysis.metrics import metric_types
+from tensorflow_model_analysis.metrics import metric_util
+
+
+def _exact_roc_auc(predictions, labels, weights):
+  positives = labels > 0.5
+  total = 0.0
+  for p, pw in zip(predictions[positives], weights[positives]):
+    for n, nw in zip(predictions[~positives], weights[~positives]):
+      if p > n:
+        total += pw * nw
+      elif p == n:
+        total += 0.5 * pw * nw
+  return total / (np.sum(weights[positives]) * np.sum(weights[~positives]))
+
+
+class AUCSketchTest(testutil.TensorflowModelAnalysisTest,
+                    parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('roc', auc_sketch.SketchAUC(), 0.5),
+      ('pr', auc_sketch.SketchAUCPrecisionRecall(), 0.3187111))
+  def testSketchAUC(self, metric, expected_value):
+    computations = metric.computations()
+    sketch = computations[0]
+    metrics = computations[1]
+
+    # positives: 0.3, 0.9
+    # negatives: 0.0, 0.6, 0.6, 1.0
+    examples = []
+    for label, prediction in ((0.0, 0.0), (0.0, 0.6), (1.0, 0.3), (1.0, 0.9),
+                              (0.0, 1.0), (0.0, 0.6)):
+      examples.append({
+          'labels': np.array([label]),
+          'predictions': np.array([prediction]),
+          'example_weights': np.array([1.0]),
+      })
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      result = (
+          pipeline
+          | 'Create' >> beam.Create(examples)
+          | 'Process' >> beam.Map(metric_util.to_standard_metric_inputs)
+          | 'AddSlice' >> beam.Map(lambda x: ((), x))
+          | 'ComputeSketch' >> beam.CombinePerKey(sketch.combiner)
+          | 'ComputeMetrics' >> beam.Map(lambda x: (x[0], metrics.result(x[1])))
+      )  # pyformat: ignore
+
+      # pylint: enable=no-value-for-parameter
+
+      def check_result(got):
+        try:
+          self.assertLen(got, 1)
+          got_slice_key, got_metrics = got[0]
+          self.assertEqual(got_slice_key, ())
+          self.assertDictElementsAlmostEqual(
+              got_metrics, {metrics.keys[0]: expected_value}, places=5)
+        except AssertionError as err:
+          raise util.BeamAssertException(err)
+
+      util.assert_that(result, check_result, label='result')
+
+  def testROCAndPRShareSketch(self):
+    roc = auc_sketch.SketchAUC().computations()
+    pr = auc_sketch.SketchAUCPrecisionRecall().computations()
+    self.assertEqual(roc[0].keys, pr[0].keys)
+
+  def testInvalidSizes(self):
+    with self.assertRaises(ValueError):
+      auc_sketch.auc_sketch(sketch_size=100, exact_size=10)
+
+  def _run_combiner(self, combiner, predictions, labels, weights,
+                    num_partitions):
+    accumulators = []
+    for i in range(num_partitions):
+      accumulator = combiner.create_accumulator()
+      for prediction, label, weight in zip(predictions[i::num_partitions],
+                                           labels[i::num_partitions],
+                                           weights[i::num_partitions]):
+        accumulator = combiner.add_input(
+            accumulator,
+            metric_types.StandardMetricInputs(
+                np.array([label]), np.array([prediction]),
+                np.array([weight])))
+      accumulators.append(combiner.compact(accumulator))
+    merged = combiner.merge_accumulators([
+        combiner.merge_accumulators(accumulators[:num_partitions // 2]),
+        combiner.merge_accumulators(accumulators[num_partitions // 2:])
+    ])
+    return list(combiner.extract_output(merged).values())[0]
+
+  def testExactForSmallSlices(self):
+    random_state = np.random.RandomState(0)
+    predictions = np.round(random_state.rand(300), 2)
+    labels = (random_state.rand(300) < predictions).astype(np.float64)
+    weights = random_state.rand(300)
+    combiner = auc_sketch.auc_sketch()[0].combiner
+
+    sketch = self._run_combiner(combiner, predictions, labels, weights, 4)
+
+    self.assertEqual(0.0, auc_sketch.error_bound(sketch))
+    self.assertAlmostEqual(
+        _exact_roc_auc(predictions, labels, weights),
+        auc_sketch.auc(sketch),
+        places=10)
+
+  def testCompressedWithinErrorBound(self):
+    random_state = np.random.RandomState(0)
+    num_examples = 20000
+    predictions = random_state.rand(num_examples)
+    labels = (random_state.rand(num_examples) < predictions).astype(np.float64)
+    weights = random_state.rand(num_examples)
+    combiner = auc_sketch.auc_sketch(
+        sketch_size=100, exact_size=200)[0].combiner
+
+    sketch = self._run_combiner(combiner, predictions, labels, weights, 8)
+
+    # Exact AUC (computed using a sketch that is never compressed).
+    exact_combiner = auc_sketch.auc_sketch(
+        sketch_size=num_examples, exact_size=num_examples)[0].combiner
+    exact = auc_sketch.auc(
+        self._run_combiner(exact_combiner, predictions, labels, weights, 1))
+    bound = auc_sketch.error_bound(sketch)
+    self.assertGreater(bound, 0.0)
+    self.assertLess(bound, 0.25)
+    self.assertLessEqual(abs(exact - auc_sketch.auc(sketch)), bound)
+    # Memory is bounded by exact_size + sketch_size per level.
+    self.assertLess(len(sketch.positives.values), 200 + 101 * 10)
+
+  def testMergeDoesNotModifyInputs(self):
+    combiner = auc_sketch.auc_sketch()[0].combiner
+    accumulators = []
+    for label, prediction in ((1.0, 0.8), (0.0, 0.3)):
+      accumulator = combiner.create_accumulator()
+      accumulator = combiner.add_input(
+          accumulator,
+          metric_types.StandardMetricInputs(
+              np.array([label]), np.array([prediction]), np.array([1.0])))
+      accumulators.append(accumulator)
+
+    merged = combiner.merge_accumulators(accumulators)
+
+    for accumulator in accumulators:
+      self.assertLen(accumulator.pending_predictions, 1)
+      self.assertEqual([None], accumulator.positives)
+      self.assertEqual([None], accumulator.negatives)
+    sketch = list(combiner.extract_output(merged).values())[0]
+    self.assertAlmostEqual(1.0, auc_sketch.auc(sketch))
+
+  def testNoPositivesOrNegatives(self):
+    sketch = auc_sketch.AUCSketch(
+        positives=auc_sketch.WeightedSketch(),
+        negatives=auc_sketch.WeightedSketch(
+            np.array([0.5]), np.array([1.0])))
+    self.assertTrue(np.isnan(auc_sketch.auc(sketch)))
+    self.assertTrue(np.isnan(auc_sketch.auc(sketch, curve='PR')))
+    self.assertEqual(0.0, auc_sketch.error_bound(sketch))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -20,6 +20,8 @@ from __future__ import division
 from __future__ import print_function
 
 from typing import Any, Dict, List, NamedTuple, Optional, Text
+
+import numpy as np
 from tensorflow_model_analysis import config
 from tensorflow_model_analysis.metrics import calibration_histogram
 from tensorflow_model_analysis.metrics import metric_types
@@ -43,7 +45,9 @@ def binary_confusion_matrices(
     model_name: Text = '',
     output_name: Text = '',
     sub_key: Optional[metric_types.SubKey] = None,
-    class_weights: Optional[Dict[int, float]] = None
+    class_weights: Optional[Dict[int, float]] = None,
+    bucketing: Optional[Text] = None,
+    boundaries: Optional[List[float]] = None
 ) -> metric_types.MetricComputations:
   """Returns metric computations for computing binary confusion matrices.
 
@@ -62,6 +66,11 @@ def binary_confusion_matrices(
     sub_key: Optional sub key.
     class_weights: Optional class weights to apply to multi-class / multi-label
       labels and predictions prior to flattening (when micro averaging is used).
+    bucketing: Bucketing strategy of the underlying calibration histogram (see
+      calibration_histogram.bucket_boundaries). Defaults to uniform buckets.
+    boundaries: Bucket boundaries of the underlying calibration histogram when
+      quantile bucketing is used. Thresholds that are bucket boundaries are
+      applied exactly.
 
   Raises:
     ValueError: If both num_thresholds and thresholds are set at the same time.
@@ -88,19 +97,36 @@ def binary_confusion_matrices(
   # predictions are matched - i.e. thresholds <= 0) we will assume that other
   # metrics will make use of the calibration histogram and re-use the default
   # histogram for the given model_name/output_name/sub_key. This is also
-  # required to get accurate counts at the threshold boundaries. If this becomes
-  # an issue, then calibration histogram can be updated to support non-linear
-  # boundaries.
-  num_buckets = 1 if len(thresholds) == 1 and thresholds[0] <= 0 else None
+  # required to get accurate counts at the threshold boundaries. Thresholds that
+  # are not uniformly spaced (e.g. quantiles) can be computed exactly by
+  # passing the same thresholds as quantile bucket boundaries.
+  histogram_boundaries = calibration_histogram.bucket_boundaries(
+      bucketing=bucketing, boundaries=boundaries)
+  num_buckets = None
+  if (histogram_boundaries is None and len(thresholds) == 1 and
+      thresholds[0] <= 0):
+    num_buckets = 1
   histogram_computations = calibration_histogram.calibration_histogram(
       eval_config=eval_config,
       num_buckets=num_buckets,
       model_name=model_name,
       output_name=output_name,
       sub_key=sub_key,
-      class_weights=class_weights)
+      class_weights=class_weights,
+      bucketing=bucketing,
+      boundaries=boundaries)
   histogram_key = histogram_computations[-1].keys[-1]
 
+  if histogram_boundaries is None:
+    # Allow for rounding differences between the thresholds and the computed
+    # start of the uniform buckets.
+    above = lambda t: t + _EPSILON
+  else:
+    # The buckets start just above the boundaries, so use the smallest possible
+    # shift (an epsilon would skip entire buckets near 0 when logit buckets are
+    # used).
+    above = lambda t: float(np.nextafter(t, np.inf))
+
   def result(
       metrics: Dict[metric_types.MetricKey, Any]
   ) -> Dict[metric_types.MetricKey, Matrices]:
@@ -116,12 +142,12 @@ def binary_confusion_matrices(
       if thresholds[0] < 0:
         # This case is used when all prediction values are considered matches
         # (e.g. when calculating top_k for precision/recall).
-        rebin_thresholds = [thresholds[0], thresholds[0] + _EPSILON]
+        rebin_thresholds = [thresholds[0], above(thresholds[0])]
       else:
         # This case is used for a single threshold within [0, 1] (e.g. 0.5).
-        rebin_thresholds = [-_EPSILON, thresholds[0] + _EPSILON, 1.0 + _EPSILON]
+        rebin_thresholds = [-_EPSILON, above(thresholds[0]), 1.0 + _EPSILON]
     else:
-      rebin_thresholds = [t + _EPSILON if t != 0 else t for t in thresholds]
+      rebin_thresholds = [above(t) if t != 0 else t for t in thresholds]
       if thresholds[0] >= 0:
         # Add -epsilon bucket to account for differences in histogram vs
         # confusion matrix intervals mentioned above. If the epsilon bucket is
@@ -133,8 +159,10 @@ def binary_confusion_matrices(
         # othewise true negatives and true positives will be overcounted.
         rebin_thresholds = rebin_thresholds + [1.0 + _EPSILON]
 
-    histogram = calibration_histogram.rebin(rebin_thresholds,
-                                            metrics[histogram_key])
+    histogram = calibration_histogram.rebin(
+        rebin_thresholds,
+        metrics[histogram_key],
+        boundaries=histogram_boundaries)
     matrices = _to_binary_confusion_matrices(thresholds, histogram)
     # Check if need to remove -epsilon bucket (or reset back to 1 bucket).
     start_index = 1 if thresholds[0] >= 0 or len(thresholds) == 1 else 0
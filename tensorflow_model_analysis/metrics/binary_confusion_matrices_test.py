@@ -84,6 +84,27 @@ class BinaryConfusionMatricesTest(testutil.TensorflowModelAnalysisTest,
            fp=[0.0, 0.0],
            tn=[2.0, 2.0],
            fn=[1.0, 2.0])),
+      ('quantile_boundaries', {
+          'thresholds': [0.3, 0.5],
+          'bucketing': 'quantile',
+          'boundaries': [0.3, 0.5]
+      },
+       binary_confusion_matrices.Matrices(
+           thresholds=[0.3, 0.5],
+           tp=[1.0, 1.0],
+           fp=[1.0, 0.0],
+           tn=[1.0, 2.0],
+           fn=[1.0, 1.0])),
+      ('logit_buckets', {
+          'thresholds': [0.25, 0.75],
+          'bucketing': 'logit'
+      },
+       binary_confusion_matrices.Matrices(
+           thresholds=[0.25, 0.75],
+           tp=[2.0, 1.0],
+           fp=[1.0, 0.0],
+           tn=[1.0, 2.0],
+           fn=[0.0, 1.0])),
   )
   def testBinaryConfusionMatrices(self, kwargs, expected_matrices):
     computations = binary_confusion_matrices.binary_confusion_matrices(**kwargs)
@@ -18,9 +18,9 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
-import apache_beam as beam
 import numpy as np
 from tensorflow_model_analysis import config
+from tensorflow_model_analysis.metrics import additive_sums
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
 from typing import Any, Dict, List, Optional, Text
@@ -256,62 +256,44 @@ class _WeightedLabelsPredictionsExamples(object):
     self.total_weighted_examples = 0.0
 
 
-class _WeightedLabelsPredictionsExamplesCombiner(beam.CombineFn):
-  """Computes weighted labels, predictions, and examples."""
+class _WeightedLabelsPredictionsExamplesCombiner(
+    additive_sums.LabelPredictionExampleWeightSumsCombiner):
+  """Computes weighted labels, predictions, and examples.
+
+  The sums are stored as [total_weighted_labels, total_weighted_predictions,
+  total_weighted_examples].
+  """
 
   def __init__(self, key: metric_types.MetricKey,
                eval_config: Optional[config.EvalConfig],
                class_weights: Optional[Dict[int, float]]):
-    self._key = key
-    self._eval_config = eval_config
-    self._class_weights = class_weights
-
-  def create_accumulator(self) -> _WeightedLabelsPredictionsExamples:
-    return _WeightedLabelsPredictionsExamples()
-
-  def add_input(
-      self, accumulator: _WeightedLabelsPredictionsExamples,
-      element: metric_types.StandardMetricInputs
-  ) -> _WeightedLabelsPredictionsExamples:
-    for label, prediction, example_weight in (
-        metric_util.to_label_prediction_example_weight(
-            element,
-            eval_config=self._eval_config,
-            model_name=self._key.model_name,
-            output_name=self._key.output_name,
-            sub_key=self._key.sub_key,
-            class_weights=self._class_weights,
-            allow_none=True)):
+    super(_WeightedLabelsPredictionsExamplesCombiner, self).__init__(
+        3, key, eval_config, class_weights, allow_none=True)
+
+  def update_sums(self, sums: np.ndarray, prepared_input: List[Any]):
+    for label, prediction, example_weight in prepared_input:
       example_weight = float(example_weight)
-      accumulator.total_weighted_examples += example_weight
+      sums[2] += example_weight
       if label is not None:
         if self._key.sub_key and self._key.sub_key.top_k is not None:
           for i in range(self._key.sub_key.top_k):
             weighted_label = label[i] * example_weight
         else:
           weighted_label = float(label) * example_weight
-        accumulator.total_weighted_labels += weighted_label
+        sums[0] += weighted_label
       if prediction is not None:
         if self._key.sub_key and self._key.sub_key.top_k is not None:
           for i in range(self._key.sub_key.top_k):
             weighted_prediction = prediction[i] * example_weight
         else:
           weighted_prediction = float(prediction) * example_weight
-        accumulator.total_weighted_predictions += weighted_prediction
-    return accumulator
-
-  def merge_accumulators(
-      self, accumulators: List[_WeightedLabelsPredictionsExamples]
-  ) -> _WeightedLabelsPredictionsExamples:
-    result = self.create_accumulator()
-    for accumulator in accumulators:
-      result.total_weighted_labels += accumulator.total_weighted_labels
-      result.total_weighted_predictions += (
-          accumulator.total_weighted_predictions)
-      result.total_weighted_examples += accumulator.total_weighted_examples
-    return result
-
-  def extract_output(
-      self, accumulator: _WeightedLabelsPredictionsExamples
+        sums[1] += weighted_prediction
+
+  def sums_to_output(
+      self, sums: np.ndarray
   ) -> Dict[metric_types.MetricKey, _WeightedLabelsPredictionsExamples]:
-    return {self._key: accumulator}
+    result = _WeightedLabelsPredictionsExamples()
+    result.total_weighted_labels = float(sums[0])
+    result.total_weighted_predictions = float(sums[1])
+    result.total_weighted_examples = float(sums[2])
+    return {self._key: result}
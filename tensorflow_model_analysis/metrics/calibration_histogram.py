@@ -19,20 +19,35 @@ from __future__ import division
 from __future__ import print_function
 
 import bisect
-import heapq
-import itertools
-import operator
+import hashlib
+import json
 
 import apache_beam as beam
+import numpy as np
 from tensorflow_model_analysis import config
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
-from typing import Dict, List, Optional, NamedTuple, Text
+from tensorflow_model_analysis.proto import metrics_for_slice_pb2
+from typing import Any, Dict, List, Optional, NamedTuple, Text, Tuple
 
 CALIBRATION_HISTOGRAM_NAME = '_calibration_histogram'
 
 DEFAULT_NUM_BUCKETS = 10000
 
+# Bucketing strategies.
+#
+# Uniform buckets over [left, right].
+UNIFORM_BUCKETING = 'uniform'
+# Buckets that are uniform in logit space (log(p / (1 - p))) over [left,
+# right]. This gives more resolution near 0 and 1 (e.g. for rare-event models).
+LOGIT_BUCKETING = 'logit'
+# Buckets with user supplied boundaries (e.g. quantiles of the predictions).
+QUANTILE_BUCKETING = 'quantile'
+
+# Predictions are clipped to [_LOGIT_EPSILON, 1 - _LOGIT_EPSILON] when computing
+# the boundaries of logit buckets.
+_LOGIT_EPSILON = 1e-7
+
 Bucket = NamedTuple('Bucket', [('bucket_id', int), ('weighted_labels', float),
                                ('weighted_predictions', float),
                                ('weighted_examples', float)])
@@ -49,15 +64,18 @@ def calibration_histogram(
     model_name: Text = '',
     output_name: Text = '',
     sub_key: Optional[metric_types.SubKey] = None,
-    class_weights: Optional[Dict[int, float]] = None
+    class_weights: Optional[Dict[int, float]] = None,
+    bucketing: Optional[Text] = None,
+    boundaries: Optional[List[float]] = None
 ) -> metric_types.MetricComputations:
   """Returns metric computations for calibration histogram.
 
   Args:
     num_buckets: Number of buckets to use. Note that the actual number of
-      buckets will be num_buckets + 2 to account for the edge cases.
-    left: Start of predictions interval.
-    right: End of predictions interval.
+      buckets will be num_buckets + 2 to account for the edge cases. Not used
+      with QUANTILE_BUCKETING.
+    left: Start of predictions interval. Not used with QUANTILE_BUCKETING.
+    right: End of predictions interval. Not used with QUANTILE_BUCKETING.
     name: Metric name.
     eval_config: Eval config.
     model_name: Optional model name (if multi-model evaluation).
@@ -65,6 +83,9 @@ def calibration_histogram(
     sub_key: Optional sub key.
     class_weights: Optional class weights to apply to multi-class / multi-label
       labels and predictions prior to flattening (when micro averaging is used).
+    bucketing: Bucketing strategy (UNIFORM_BUCKETING, LOGIT_BUCKETING, or
+      QUANTILE_BUCKETING). Defaults to UNIFORM_BUCKETING.
+    boundaries: Sorted bucket boundaries (required for QUANTILE_BUCKETING).
 
   Returns:
     MetricComputations for computing the histogram(s).
@@ -75,8 +96,14 @@ def calibration_histogram(
     left = 0.0
   if right is None:
     right = 1.0
+  boundaries = bucket_boundaries(
+      num_buckets=num_buckets,
+      left=left,
+      right=right,
+      bucketing=bucketing,
+      boundaries=boundaries)
   if name is None:
-    name = '{}_{}'.format(CALIBRATION_HISTOGRAM_NAME, num_buckets)
+    name = _histogram_name(num_buckets, bucketing, boundaries)
   key = metric_types.PlotKey(
       name=name,
       model_name=model_name,
@@ -92,26 +119,111 @@ def calibration_histogram(
               class_weights=class_weights,
               num_buckets=num_buckets,
               left=left,
-              right=right))
+              right=right,
+              boundaries=boundaries))
   ]
 
 
+def bucket_boundaries(num_buckets: int = DEFAULT_NUM_BUCKETS,
+                      left: float = 0.0,
+                      right: float = 1.0,
+                      bucketing: Optional[Text] = None,
+                      boundaries: Optional[List[float]] = None
+                     ) -> Optional[List[float]]:
+  """Returns bucket boundaries for the given bucketing strategy.
+
+  Bucket 0 contains the predictions <= boundaries[0], bucket i contains the
+  predictions in (boundaries[i-1], boundaries[i]], and bucket len(boundaries)
+  contains the predictions > boundaries[-1]. The buckets are closed on the
+  right (unlike uniform buckets) so that confusion matrices computed at
+  thresholds that are boundaries (prediction > threshold) are exact.
+
+  Args:
+    num_buckets: Number of buckets (UNIFORM_BUCKETING and LOGIT_BUCKETING).
+    left: Start of predictions interval (UNIFORM_BUCKETING and LOGIT_BUCKETING).
+    right: End of predictions interval (UNIFORM_BUCKETING and LOGIT_BUCKETING).
+    bucketing: Bucketing strategy. Defaults to UNIFORM_BUCKETING.
+    boundaries: Sorted bucket boundaries (QUANTILE_BUCKETING only).
+
+  Returns:
+    Bucket boundaries or None for UNIFORM_BUCKETING (the bucket of a prediction
+    is computed arithmetically).
+
+  Raises:
+    ValueError: If the bucketing strategy is unknown or the boundaries are
+      invalid.
+  """
+  if bucketing is None:
+    bucketing = (
+        QUANTILE_BUCKETING if boundaries is not None else UNIFORM_BUCKETING)
+  if bucketing != QUANTILE_BUCKETING and boundaries is not None:
+    raise ValueError('boundaries are only used with {} bucketing: '
+                     'bucketing={}'.format(QUANTILE_BUCKETING, bucketing))
+  if bucketing == UNIFORM_BUCKETING:
+    return None
+  elif bucketing == LOGIT_BUCKETING:
+    low = min(max(left, _LOGIT_EPSILON), 1.0 - _LOGIT_EPSILON)
+    high = min(max(right, _LOGIT_EPSILON), 1.0 - _LOGIT_EPSILON)
+    logits = np.linspace(
+        np.log(low / (1.0 - low)), np.log(high / (1.0 - high)),
+        num_buckets + 1)
+    result = [float(v) for v in 1.0 / (1.0 + np.exp(-logits))]
+    result[0] = left
+    result[-1] = right
+    return result
+  elif bucketing == QUANTILE_BUCKETING:
+    if not boundaries or any(
+        b >= a for b, a in zip(boundaries[:-1], boundaries[1:])):
+      raise ValueError(
+          'boundaries must be non-empty and strictly increasing: {}'.format(
+              boundaries))
+    return [float(b) for b in boundaries]
+  raise ValueError('unknown bucketing strategy: {}'.format(bucketing))
+
+
+def _histogram_name(num_buckets: int, bucketing: Optional[Text],
+                    boundaries: Optional[List[float]]) -> Text:
+  """Returns the default name of the histogram computation."""
+  if boundaries is None:
+    return '{}_{}'.format(CALIBRATION_HISTOGRAM_NAME, num_buckets)
+  if bucketing == LOGIT_BUCKETING:
+    return '{}_{}_{}'.format(CALIBRATION_HISTOGRAM_NAME, LOGIT_BUCKETING,
+                             num_buckets)
+  # Different boundaries with the same number of buckets must not be shared.
+  fingerprint = hashlib.sha256(
+      json.dumps(boundaries).encode('utf-8')).hexdigest()[:16]
+  return '{}_{}_{}_{}'.format(CALIBRATION_HISTOGRAM_NAME, QUANTILE_BUCKETING,
+                              len(boundaries) - 1, fingerprint)
+
+
+# Sparse accumulator keyed by bucket index. The values are the (mutable)
+# [weighted_labels, weighted_predictions, weighted_examples] of the bucket.
+_HistogramAccumulator = Dict[int, List[float]]
+
+
 class _CalibrationHistogramCombiner(beam.CombineFn):
   """Creates histogram from labels, predictions, and example weights."""
 
-  def __init__(self, key: metric_types.PlotKey,
+  def __init__(self,
+               key: metric_types.PlotKey,
                eval_config: Optional[config.EvalConfig],
-               class_weights: Optional[Dict[int, float]], num_buckets: int,
-               left: float, right: float):
+               class_weights: Optional[Dict[int, float]],
+               num_buckets: int,
+               left: float,
+               right: float,
+               boundaries: Optional[List[float]] = None):
     self._key = key
     self._eval_config = eval_config
     self._class_weights = class_weights
     self._num_buckets = num_buckets
     self._left = left
     self._range = right - left
+    self._boundaries = boundaries
 
   def _bucket_index(self, prediction: float) -> int:
     """Returns bucket index given prediction value. Values are truncated."""
+    if self._boundaries is not None:
+      return bisect.bisect_left(self._boundaries, prediction)
     bucket_index = int(
         (prediction - self._left) / self._range * self._num_buckets) + 1
     if bucket_index < 0:
@@ -120,15 +232,82 @@ class _CalibrationHistogramCombiner(beam.CombineFn):
       return self._num_buckets + 1
     return bucket_index
 
-  def create_accumulator(self) -> Histogram:
-    # The number of accumulator (histogram) buckets is variable and depends on
-    # the number of distinct intervals that are matched during calls to
-    # add_inputs. This allows the historam size to start small and gradually
-    # grow size during calls to merge until reaching the final histogram.
-    return []
+  def _bucket_bounds(self, bucket_index: int) -> Tuple[float, float]:
+    """Returns the (lower, upper) thresholds of the bucket."""
+    if self._boundaries is not None:
+      lower = (
+          self._boundaries[bucket_index - 1] if bucket_index > 0 else
+          float('-inf'))
+      upper = (
+          self._boundaries[bucket_index]
+          if bucket_index < len(self._boundaries) else float('inf'))
+      return (lower, upper)
+    width = self._range / self._num_buckets
+    lower = (
+        self._left + (bucket_index - 1) * width if bucket_index > 0 else
+        float('-inf'))
+    upper = (
+        self._left + bucket_index * width
+        if bucket_index <= self._num_buckets else float('inf'))
+    return (lower, upper)
+
+  def _bucket_index_from_lower(self, lower: float) -> int:
+    """Returns the index of the bucket with the given lower threshold."""
+    if lower == float('-inf'):
+      return 0
+    if self._boundaries is not None:
+      return bisect.bisect_left(self._boundaries, lower) + 1
+    return int(
+        round((lower - self._left) / self._range * self._num_buckets)) + 1
+
+  def to_proto(
+      self, histogram: Histogram
+  ) -> metrics_for_slice_pb2.CalibrationHistogramBuckets:
+    """Converts histogram computed by this combiner into proto format.
+
+    Note that when boundaries are used the buckets are closed on the right (see
+    bucket_boundaries) even though the bounds are stored in the
+    lower_threshold_inclusive and upper_threshold_exclusive fields.
 
-  def add_input(self, accumulator: Histogram,
-                element: metric_types.StandardMetricInputs) -> Histogram:
+    Args:
+      histogram: Histogram computed by this combiner.
+
+    Returns:
+      CalibrationHistogramBuckets proto.
+    """
+    pb = metrics_for_slice_pb2.CalibrationHistogramBuckets()
+    for bucket in histogram:
+      lower, upper = self._bucket_bounds(bucket.bucket_id)
+      pb.buckets.add(
+          lower_threshold_inclusive=lower,
+          upper_threshold_exclusive=upper,
+          total_weighted_label={'value': bucket.weighted_labels},
+          total_weighted_refined_prediction={
+              'value': bucket.weighted_predictions
+          },
+          num_weighted_examples={'value': bucket.weighted_examples})
+    return pb
+
+  def from_proto(
+      self, pb: metrics_for_slice_pb2.CalibrationHistogramBuckets) -> Histogram:
+    """Converts proto created by to_proto back into a histogram."""
+    return [
+        Bucket(
+            self._bucket_index_from_lower(b.lower_threshold_inclusive),
+            b.total_weighted_label.value,
+            b.total_weighted_refined_prediction.value,
+            b.num_weighted_examples.value) for b in pb.buckets
+    ]
+
+  def create_accumulator(self) -> _HistogramAccumulator:
+    # Only the buckets that are matched during calls to add_input are stored.
+    # This allows the histogram size to start small and gradually grow during
+    # calls to merge until reaching the final histogram.
+    return {}
+
+  def add_input(
+      self, accumulator: _HistogramAccumulator,
+      element: metric_types.StandardMetricInputs) -> _HistogramAccumulator:
     for label, prediction, example_weight in (
         metric_util.to_label_prediction_example_weight(
             element,
@@ -144,58 +323,148 @@ class _CalibrationHistogramCombiner(beam.CombineFn):
       weighted_label = label * example_weight
       weighted_prediction = prediction * example_weight
       bucket_index = self._bucket_index(prediction)
-      # Check if bucket exists, all bucket values are > 0, so -1 are always less
-      insert_index = bisect.bisect_left(accumulator,
-                                        Bucket(bucket_index, -1, -1, -1))
-      if (insert_index == len(accumulator) or
-          accumulator[insert_index].bucket_id != bucket_index):
-        accumulator.insert(
-            insert_index,
-            Bucket(bucket_index, weighted_label, weighted_prediction,
-                   example_weight))
+      bucket = accumulator.get(bucket_index)
+      if bucket is None:
+        accumulator[bucket_index] = [
+            weighted_label, weighted_prediction, example_weight
+        ]
       else:
-        existing_bucket = accumulator[insert_index]
-        accumulator[insert_index] = Bucket(
-            bucket_index, existing_bucket.weighted_labels + weighted_label,
-            existing_bucket.weighted_predictions + weighted_prediction,
-            existing_bucket.weighted_examples + example_weight)
+        bucket[0] += weighted_label
+        bucket[1] += weighted_prediction
+        bucket[2] += example_weight
     return accumulator
 
-  def merge_accumulators(self, accumulators: List[Histogram]) -> Histogram:
-    result = []
-    for bucket_id, buckets in itertools.groupby(
-        heapq.merge(*accumulators), key=operator.attrgetter('bucket_id')):
-      total_weighted_labels = 0.0
-      total_weighted_predictions = 0.0
-      total_weighted_examples = 0.0
-      for bucket in buckets:
-        total_weighted_labels += bucket.weighted_labels
-        total_weighted_predictions += bucket.weighted_predictions
-        total_weighted_examples += bucket.weighted_examples
-      result.append(
-          Bucket(bucket_id, total_weighted_labels, total_weighted_predictions,
-                 total_weighted_examples))
+  def merge_accumulators(
+      self,
+      accumulators: List[_HistogramAccumulator]) -> _HistogramAccumulator:
+    result = {}
+    for accumulator in accumulators:
+      for bucket_index, values in accumulator.items():
+        bucket = result.get(bucket_index)
+        if bucket is None:
+          result[bucket_index] = list(values)
+        else:
+          bucket[0] += values[0]
+          bucket[1] += values[1]
+          bucket[2] += values[2]
     return result
 
   def extract_output(
-      self, accumulator: Histogram) -> Dict[metric_types.PlotKey, Histogram]:
-    return {self._key: accumulator}
+      self, accumulator: _HistogramAccumulator
+  ) -> Dict[metric_types.PlotKey, Histogram]:
+    return {
+        self._key: [
+            Bucket(bucket_index, *accumulator[bucket_index])
+            for bucket_index in sorted(accumulator)
+        ]
+    }
+
+
+def is_calibration_histogram(
+    computation: metric_types.MetricComputation) -> bool:
+  """Returns true if the computation computes a calibration histogram."""
+  return isinstance(computation.combiner, _CalibrationHistogramCombiner)
+
+
+def stored_histogram_key(key: metric_types.PlotKey) -> metric_types.PlotKey:
+  """Returns key used when storing the histogram with the given key.
+
+  Histograms are private (their names start with '_') so they are stored under
+  a public version of their name.
+
+  Args:
+    key: Key of the histogram computation.
+  """
+  return key._replace(name=key.name.lstrip('_'))
+
+
+def histogram_proto_computations(
+    computations: List[metric_types.MetricComputation]
+) -> List[metric_types.DerivedMetricComputation]:
+  """Returns computations converting the histograms to protos for storage.
+
+  Args:
+    computations: Metric computations (non-derived). Only the calibration
+      histograms are used.
+
+  Returns:
+    Derived computations that output the CalibrationHistogramBuckets of each
+    histogram under the key returned by stored_histogram_key.
+  """
+  result = []
+  for computation in computations:
+    if not is_calibration_histogram(computation):
+      continue
+    key = computation.keys[0]
+    stored_key = stored_histogram_key(key)
+
+    def to_proto(
+        metrics: Dict[metric_types.MetricKey, Any],
+        key: metric_types.PlotKey = key,
+        stored_key: metric_types.PlotKey = stored_key,
+        combiner: _CalibrationHistogramCombiner = computation.combiner
+    ) -> Dict[metric_types.MetricKey, Any]:
+      return {stored_key: combiner.to_proto(metrics[key])}
+
+    result.append(
+        metric_types.DerivedMetricComputation(
+            keys=[stored_key], result=to_proto))
+  return result
+
+
+def histograms_from_protos(
+    computations: List[metric_types.MetricComputation],
+    stored_histograms: Dict[metric_types.PlotKey,
+                            metrics_for_slice_pb2.CalibrationHistogramBuckets]
+) -> Dict[metric_types.PlotKey, Histogram]:
+  """Returns the outputs of the histogram computations from stored protos.
+
+  Args:
+    computations: Calibration histogram computations (non-derived).
+    stored_histograms: Histograms stored by a previous evaluation keyed by the
+      key returned by stored_histogram_key.
+
+  Raises:
+    ValueError: If a computation is not a calibration histogram or if its
+      histogram was not stored.
+  """
+  result = {}
+  for computation in computations:
+    if not is_calibration_histogram(computation):
+      raise ValueError(
+          'only metrics derived from the calibration histogram can be '
+          'computed from stored histograms: keys={}'.format(computation.keys))
+    key = computation.keys[0]
+    stored_key = stored_histogram_key(key)
+    if stored_key not in stored_histograms:
+      raise ValueError(
+          'histogram {} was not stored. Stored histograms: {}'.format(
+              stored_key, list(stored_histograms.keys())))
+    result[key] = computation.combiner.from_proto(stored_histograms[stored_key])
+  return result
 
 
 def rebin(thresholds: List[float],
           histogram: Histogram,
           num_buckets: int = DEFAULT_NUM_BUCKETS,
           left: float = 0.0,
-          right: float = 1.0) -> Histogram:
+          right: float = 1.0,
+          boundaries: Optional[List[float]] = None) -> Histogram:
   """Applies new thresholds to an existing calibration histogram.
 
+  Each bucket of the existing histogram is assigned to the new interval that
+  contains the start of the bucket. Thresholds that are boundaries of the
+  existing buckets are therefore applied exactly.
+
   Args:
     thresholds: New thresholds to apply to the histogram. Must be in sorted
       order, but need not be evenly spaced.
     histogram: Existing calibration histogram.
-    num_buckets: Number of buckets in existing histogram.
-    left: Left boundary for existing histogram.
-    right: Right boundary for existing histogram.
+    num_buckets: Number of buckets in existing histogram (uniform buckets).
+    left: Left boundary for existing histogram (uniform buckets).
+    right: Right boundary for existing histogram (uniform buckets).
+    boundaries: Bucket boundaries of the existing histogram if it does not use
+      uniform buckets (see bucket_boundaries).
 
   Returns:
     A histogram of len(thresholds) where the buckets with IDs (0, 1, 2, ...)
@@ -213,6 +482,9 @@ def rebin(thresholds: List[float],
   for bucket in histogram:
     if bucket.bucket_id == 0:
       pred = float('-inf')
+    elif boundaries is not None:
+      # Smallest value in (boundaries[i-1], boundaries[i]].
+      pred = float(np.nextafter(boundaries[bucket.bucket_id - 1], np.inf))
     elif bucket.bucket_id >= num_buckets + 1:
       pred = float('inf')
     else:
@@ -398,6 +398,145 @@ class CalibrationHistogramTest(testutil.TensorflowModelAnalysisTest):
     for i in range(len(got)):
       self.assertSequenceAlmostEqual(got[i], expected[i])
 
+  def testBucketBoundaries(self):
+    self.assertIsNone(calibration_histogram.bucket_boundaries())
+    self.assertEqual([0.1, 0.5, 0.7],
+                     calibration_histogram.bucket_boundaries(
+                         bucketing=calibration_histogram.QUANTILE_BUCKETING,
+                         boundaries=[0.1, 0.5, 0.7]))
+    # Quantile bucketing is assumed when boundaries are passed.
+    self.assertEqual([0.1, 0.5],
+                     calibration_histogram.bucket_boundaries(
+                         boundaries=[0.1, 0.5]))
+    logit = calibration_histogram.bucket_boundaries(
+        num_buckets=4, bucketing=calibration_histogram.LOGIT_BUCKETING)
+    self.assertLen(logit, 5)
+    self.assertEqual(0.0, logit[0])
+    self.assertEqual(1.0, logit[-1])
+    self.assertAlmostEqual(0.5, logit[2])
+    # Logit buckets are narrower near 0 and 1.
+    self.assertLess(logit[1] - logit[0], logit[2] - logit[1])
+    self.assertLess(logit[4] - logit[3], logit[3] - logit[2])
+
+  def testBucketBoundariesInvalid(self):
+    with self.assertRaises(ValueError):
+      calibration_histogram.bucket_boundaries(bucketing='unknown')
+    with self.assertRaises(ValueError):
+      calibration_histogram.bucket_boundaries(
+          bucketing=calibration_histogram.QUANTILE_BUCKETING)
+    with self.assertRaises(ValueError):
+      calibration_histogram.bucket_boundaries(boundaries=[0.5, 0.5])
+    with self.assertRaises(ValueError):
+      calibration_histogram.bucket_boundaries(
+          bucketing=calibration_histogram.LOGIT_BUCKETING, boundaries=[0.5])
+
+  def testHistogramNames(self):
+    uniform = calibration_histogram.calibration_histogram()[0]
+    logit = calibration_histogram.calibration_histogram(
+        bucketing=calibration_histogram.LOGIT_BUCKETING)[0]
+    quantile1 = calibration_histogram.calibration_histogram(
+        boundaries=[0.1, 0.5])[0]
+    quantile2 = calibration_histogram.calibration_histogram(
+        boundaries=[0.1, 0.6])[0]
+    self.assertEqual('_calibration_histogram_10000', uniform.keys[0].name)
+    self.assertEqual('_calibration_histogram_logit_10000', logit.keys[0].name)
+    self.assertNotEqual(quantile1.keys[0].name, quantile2.keys[0].name)
+
+  def testCalibrationHistogramWithQuantileBoundaries(self):
+    computation = calibration_histogram.calibration_histogram(
+        boundaries=[0.2, 0.5, 0.8])[0]
+    combiner = computation.combiner
+    accumulators = []
+    for predictions in ([0.0, 0.2, 0.3], [0.5, 0.9, 0.2]):
+      accumulator = combiner.create_accumulator()
+      for prediction in predictions:
+        accumulator = combiner.add_input(
+            accumulator,
+            metric_types.StandardMetricInputs(
+                np.array([1.0]), np.array([prediction]), np.array([1.0])))
+      accumulators.append(accumulator)
+    got = combiner.extract_output(combiner.merge_accumulators(accumulators))
+
+    # Buckets: (-inf, 0.2], (0.2, 0.5], (0.5, 0.8], (0.8, inf). Empty buckets
+    # are not stored.
+    expected = [
+        calibration_histogram.Bucket(0, 3.0, 0.4, 3.0),
+        calibration_histogram.Bucket(1, 2.0, 0.8, 2.0),
+        calibration_histogram.Bucket(3, 1.0, 0.9, 1.0),
+    ]
+    self.assertIn(computation.keys[0], got)
+    self.assertLen(got[computation.keys[0]], len(expected))
+    for i in range(len(expected)):
+      self.assertSequenceAlmostEqual(got[computation.keys[0]][i], expected[i])
+
+  def testRebinWithBoundaries(self):
+    boundaries = [0.2, 0.5, 0.8]
+    histogram = [
+        calibration_histogram.Bucket(0, 1.0, 0.1, 2.0),  # (-inf, 0.2]
+        calibration_histogram.Bucket(1, 2.0, 0.7, 2.0),  # (0.2, 0.5]
+        calibration_histogram.Bucket(2, 1.0, 0.6, 1.0),  # (0.5, 0.8]
+        calibration_histogram.Bucket(3, 3.0, 2.7, 3.0),  # (0.8, inf)
+    ]
+    thresholds = [float('-inf'), 0.5, 1.0]
+    got = calibration_histogram.rebin(
+        thresholds, histogram, boundaries=boundaries)
+
+    expected = [
+        calibration_histogram.Bucket(0, 3.0, 0.8, 4.0),
+        calibration_histogram.Bucket(1, 4.0, 3.3, 4.0),
+        calibration_histogram.Bucket(2, 0.0, 0.0, 0.0),
+    ]
+    self.assertLen(got, len(expected))
+    for i in range(len(got)):
+      self.assertSequenceAlmostEqual(got[i], expected[i])
+
+  def testToProtoAndFromProto(self):
+    for kwargs in ({
+        'num_buckets': 100
+    }, {
+        'bucketing': calibration_histogram.LOGIT_BUCKETING,
+        'num_buckets': 10
+    }, {
+        'boundaries': [0.2, 0.5, 0.8]
+    }):
+      combiner = calibration_histogram.calibration_histogram(
+          **kwargs)[0].combiner
+      num_buckets = (
+          len(kwargs['boundaries']) - 1
+          if 'boundaries' in kwargs else kwargs['num_buckets'])
+      histogram = [
+          calibration_histogram.Bucket(0, 1.0, -0.5, 2.0),
+          calibration_histogram.Bucket(1, 2.0, 0.25, 3.0),
+          calibration_histogram.Bucket(num_buckets, 1.0, 0.75, 1.0),
+          calibration_histogram.Bucket(num_buckets + 1, 4.0, 4.5, 4.0),
+      ]
+      pb = combiner.to_proto(histogram)
+      self.assertLen(pb.buckets, 4)
+      self.assertEqual(float('-inf'), pb.buckets[0].lower_threshold_inclusive)
+      self.assertEqual(float('inf'), pb.buckets[3].upper_threshold_exclusive)
+      self.assertEqual(histogram, combiner.from_proto(pb), msg=kwargs)
+
+  def testHistogramProtoComputations(self):
+    computations = calibration_histogram.calibration_histogram(num_buckets=10)
+    proto_computations = calibration_histogram.histogram_proto_computations(
+        computations)
+    self.assertLen(proto_computations, 1)
+    key = computations[0].keys[0]
+    stored_key = calibration_histogram.stored_histogram_key(key)
+    self.assertEqual([stored_key], proto_computations[0].keys)
+    self.assertFalse(stored_key.name.startswith('_'))
+
+    histogram = [calibration_histogram.Bucket(6, 1.0, 0.5, 1.0)]
+    stored = proto_computations[0].result({key: histogram})
+    self.assertEqual({
+        key: histogram
+    }, calibration_histogram.histograms_from_protos(computations, stored))
+
+  def testHistogramsFromProtosMissingHistogram(self):
+    computations = calibration_histogram.calibration_histogram(num_buckets=10)
+    with self.assertRaisesRegexp(ValueError, 'was not stored'):
+      calibration_histogram.histograms_from_protos(computations, {})
+
 
 if __name__ == '__main__':
   tf.test.main()
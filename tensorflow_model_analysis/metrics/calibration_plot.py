@@ -37,22 +37,29 @@ class CalibrationPlot(metric_types.Metric):
                num_buckets: int = DEFAULT_NUM_BUCKETS,
                left: float = 0.0,
                right: float = 1.0,
-               name: Text = CALIBRATION_PLOT_NAME):
+               name: Text = CALIBRATION_PLOT_NAME,
+               bucketing: Optional[Text] = None,
+               boundaries: Optional[List[float]] = None):
     """Initializes calibration plot.
 
     Args:
       num_buckets: Number of buckets to use when creating the plot. Defaults to
-        1000.
+        1000. Not used with quantile bucketing.
       left: Left boundary of plot. Defaults to 0.0.
       right: Right boundary of plot. Defaults to 1.0.
       name: Plot name.
+      bucketing: Bucketing strategy ('uniform', 'logit', or 'quantile').
+        Defaults to 'uniform'.
+      boundaries: Bucket boundaries when 'quantile' bucketing is used.
     """
     super(CalibrationPlot, self).__init__(
         metric_util.merge_per_key_computations(_calibration_plot),
         num_buckets=num_buckets,
         left=left,
         right=right,
-        name=name)
+        name=name,
+        bucketing=bucketing,
+        boundaries=boundaries)
 
 
 metric_types.register_metric(CalibrationPlot)
@@ -67,7 +74,9 @@ def _calibration_plot(
     model_name: Text = '',
     output_name: Text = '',
     sub_key: Optional[metric_types.SubKey] = None,
-    class_weights: Optional[Dict[int, float]] = None
+    class_weights: Optional[Dict[int, float]] = None,
+    bucketing: Optional[Text] = None,
+    boundaries: Optional[List[float]] = None
 ) -> metric_types.MetricComputations:
   """Returns metric computations for calibration plot."""
   key = metric_types.PlotKey(
@@ -87,18 +96,33 @@ def _calibration_plot(
       sub_key=sub_key,
       left=left,
       right=right,
-      class_weights=class_weights)
+      class_weights=class_weights,
+      bucketing=bucketing,
+      boundaries=boundaries)
   histogram_key = computations[-1].keys[-1]
+  histogram_boundaries = calibration_histogram.bucket_boundaries(
+      left=left, right=right, bucketing=bucketing, boundaries=boundaries)
+  thresholds = calibration_histogram.bucket_boundaries(
+      num_buckets=num_buckets,
+      left=left,
+      right=right,
+      bucketing=bucketing,
+      boundaries=boundaries)
+  if thresholds is None:
+    thresholds = [
+        left + i * (right - left) / num_buckets for i in range(num_buckets + 1)
+    ]
+  thresholds = [float('-inf')] + thresholds
 
   def result(
       metrics: Dict[metric_types.MetricKey, Any]
   ) -> Dict[metric_types.MetricKey, Any]:
-    thresholds = [
-        left + i * (right - left) / num_buckets for i in range(num_buckets + 1)
-    ]
-    thresholds = [float('-inf')] + thresholds
     histogram = calibration_histogram.rebin(
-        thresholds, metrics[histogram_key], left=left, right=right)
+        thresholds,
+        metrics[histogram_key],
+        left=left,
+        right=right,
+        boundaries=histogram_boundaries)
     return {key: _to_proto(thresholds, histogram)}
 
   derived_computation = metric_types.DerivedMetricComputation(
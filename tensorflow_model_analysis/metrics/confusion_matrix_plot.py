@@ -19,10 +19,11 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
-from typing import Any, Dict, Optional, Text
+from typing import Any, Dict, List, Optional, Text
 
 from tensorflow_model_analysis import config
 from tensorflow_model_analysis.metrics import binary_confusion_matrices
+from tensorflow_model_analysis.metrics import calibration_histogram
 from tensorflow_model_analysis.metrics import confusion_matrix_metrics
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
@@ -38,18 +39,27 @@ class ConfusionMatrixPlot(metric_types.Metric):
 
   def __init__(self,
                num_thresholds: int = DEFAULT_NUM_THRESHOLDS,
-               name: Text = CONFUSION_MATRIX_PLOT_NAME):
+               name: Text = CONFUSION_MATRIX_PLOT_NAME,
+               bucketing: Optional[Text] = None,
+               boundaries: Optional[List[float]] = None):
     """Initializes confusion matrix plot.
 
     Args:
       num_thresholds: Number of thresholds to use when discretizing the curve.
-        Values must be > 1. Defaults to 1000.
+        Values must be > 1. Defaults to 1000. Not used with quantile bucketing.
       name: Metric name.
+      bucketing: Bucketing strategy ('uniform', 'logit', or 'quantile'). The
+        thresholds are spaced the same way as the calibration histogram
+        buckets. Defaults to 'uniform'.
+      boundaries: Bucket boundaries (used as the thresholds) when 'quantile'
+        bucketing is used.
     """
     super(ConfusionMatrixPlot, self).__init__(
         metric_util.merge_per_key_computations(_confusion_matrix_plot),
         num_thresholds=num_thresholds,
-        name=name)
+        name=name,
+        bucketing=bucketing,
+        boundaries=boundaries)
 
 
 metric_types.register_metric(ConfusionMatrixPlot)
@@ -62,7 +72,9 @@ def _confusion_matrix_plot(
     model_name: Text = '',
     output_name: Text = '',
     sub_key: Optional[metric_types.SubKey] = None,
-    class_weights: Optional[Dict[int, float]] = None
+    class_weights: Optional[Dict[int, float]] = None,
+    bucketing: Optional[Text] = None,
+    boundaries: Optional[List[float]] = None
 ) -> metric_types.MetricComputations:
   """Returns metric computations for confusion matrix plots."""
   key = metric_types.PlotKey(
@@ -73,7 +85,12 @@ def _confusion_matrix_plot(
 
   # The interoploation stragety used here matches how the legacy post export
   # metrics calculated its plots.
-  thresholds = [i * 1.0 / num_thresholds for i in range(0, num_thresholds + 1)]
+  thresholds = calibration_histogram.bucket_boundaries(
+      num_buckets=num_thresholds, bucketing=bucketing, boundaries=boundaries)
+  if thresholds is None:
+    thresholds = [
+        i * 1.0 / num_thresholds for i in range(0, num_thresholds + 1)
+    ]
   thresholds = [-1e-6] + thresholds
 
   # Make sure matrices are calculated.
@@ -83,7 +100,9 @@ def _confusion_matrix_plot(
       output_name=output_name,
       sub_key=sub_key,
       class_weights=class_weights,
-      thresholds=thresholds)
+      thresholds=thresholds,
+      bucketing=bucketing,
+      boundaries=boundaries)
   matrices_key = matrices_computations[-1].keys[-1]
 
   def result(
@@ -19,9 +19,11 @@ from __future__ import division
 from __future__ import print_function
 
 import apache_beam as beam
+import numpy as np
 from tensorflow_model_analysis import types
+from tensorflow_model_analysis.metrics import additive_sums
 from tensorflow_model_analysis.metrics import metric_types
-from typing import Dict, Iterable, List, Text
+from typing import Dict, Hashable, Iterable, Text
 
 EXAMPLE_COUNT_NAME = 'example_count'
 
@@ -54,30 +56,36 @@ def _example_count(
 
 
 class _ExampleCountPreprocessor(beam.DoFn):
-  """Computes example count."""
+  """Computes example count.
+
+  The count does not depend on the labels, predictions, or example weights so
+  a preprocessor is used instead of the default StandardMetricInputs (which
+  would require those extracts to exist). This also means that the count is not
+  fused with the other additive sums.
+  """
 
   def process(self, extracts: types.Extracts) -> Iterable[int]:
     yield 1
 
 
-class _ExampleCountCombiner(beam.CombineFn):
+class _ExampleCountCombiner(additive_sums.AdditiveSumsCombiner):
   """Computes example count."""
 
   def __init__(self, metric_key: metric_types.MetricKey):
+    super(_ExampleCountCombiner, self).__init__(num_sums=1)
     self._metric_key = metric_key
 
-  def create_accumulator(self) -> int:
-    return 0
+  def input_key(self) -> Hashable:
+    return 'example_count'
 
-  def add_input(self, accumulator: int, state: int) -> int:
-    return accumulator + state
+  def prepare_input(self, element: int) -> int:
+    # Each element is the output of _ExampleCountPreprocessor for a single
+    # example (or a single query if a query_key is used).
+    return element
 
-  def merge_accumulators(self, accumulators: List[int]) -> int:
-    result = 0
-    for accumulator in accumulators:
-      result += accumulator
-    return result
+  def update_sums(self, sums: np.ndarray, prepared_input: int):
+    sums[0] += prepared_input
 
-  def extract_output(self,
-                     accumulator: int) -> Dict[metric_types.MetricKey, int]:
-    return {self._metric_key: accumulator}
+  def sums_to_output(self,
+                     sums: np.ndarray) -> Dict[metric_types.MetricKey, int]:
+    return {self._metric_key: int(sums[0])}
@@ -659,6 +659,39 @@ def one_hot(tensor: np.ndarray, target: np.ndarray) -> np.ndarray:
   return tensor.reshape(target.shape)
 
 
+def pad_and_stack(values: List[np.ndarray],
+                  fill_value: Any = 0) -> Tuple[np.ndarray, np.ndarray]:
+  """Stacks variable length 1-D arrays into a padded 2-D array plus mask.
+
+  This is used by query based metrics to process a batch of queries (each with
+  a different number of candidates) using vectorized operations. Values are
+  left aligned so that the padding is always at the end of each row.
+
+  Example:
+    Input  : [np.array([0.2, 0.8]), np.array([0.5])], fill_value=0
+    Output : (np.array([[0.2, 0.8], [0.5, 0.0]]),
+              np.array([[True, True], [True, False]]))
+
+  Args:
+    values: List of 1-D arrays (one per row).
+    fill_value: Value to use for padded entries.
+
+  Returns:
+    Tuple of (padded values with shape (len(values), max_len), boolean mask of
+    the same shape that is True for non-padded entries). The second dimension
+    is always at least 1 so that empty rows can be indexed safely.
+  """
+  lengths = np.array([len(v) for v in values], dtype=np.int64)
+  max_len = max(int(lengths.max()) if lengths.size else 0, 1)
+  mask = np.arange(max_len)[np.newaxis, :] < lengths[:, np.newaxis]
+  if not values:
+    return np.full((0, max_len), fill_value), mask
+  flat = np.concatenate(values)
+  padded = np.full((len(values), max_len), fill_value, dtype=flat.dtype)
+  padded[mask] = flat
+  return padded, mask
+
+
 def merge_per_key_computations(
     create_computations_fn: Callable[..., metric_types.MetricComputations],
 ) -> metric_types.MetricComputations:
@@ -387,6 +387,16 @@ class UtilTest(tf.test.TestCase):
     self.assertSequenceEqual(list(got_labels), ['', 'c'])
     self.assertSequenceEqual(list(got_preds), ['b', 'd'])
 
+  def testPadAndStack(self):
+    values = [np.array([0.2, 0.8]), np.array([]), np.array([0.5])]
+    got_values, got_mask = metric_util.pad_and_stack(values, fill_value=-1.0)
+
+    self.assertAllClose(got_values,
+                        np.array([[0.2, 0.8], [-1.0, -1.0], [0.5, -1.0]]))
+    self.assertAllEqual(got_mask,
+                        np.array([[True, True], [False, False], [True,
+                                                                 False]]))
+
 
 if __name__ == '__main__':
   tf.test.main()
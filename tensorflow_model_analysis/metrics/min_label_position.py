@@ -84,21 +84,64 @@ def _min_label_position(
 
 
 class _MinLabelPositionAccumulator(object):
-  """Min label position accumulator."""
-  __slots__ = ['total_min_position', 'total_weighted_examples']
+  """Min label position accumulator.
+
+  Attributes:
+    total_min_position: Sum of min label positions.
+    total_weighted_examples: Sum of weights for queries with a positive label.
+    has_labels: Per candidate positive label flags for each query that has not
+      been processed yet.
+    example_weights: Weights for each query that has not been processed yet.
+  """
+  __slots__ = [
+      'total_min_position', 'total_weighted_examples', 'has_labels',
+      'example_weights'
+  ]
 
   def __init__(self):
     self.total_min_position = 0.0
     self.total_weighted_examples = 0.0
+    self.has_labels = []  # type: List[np.ndarray]
+    self.example_weights = []  # type: List[float]
+
+  def len_inputs(self) -> int:
+    return len(self.example_weights)
+
+  def clear_inputs(self):
+    del self.has_labels[:]
+    del self.example_weights[:]
 
 
 class _MinLabelPositionCombiner(beam.CombineFn):
   """Computes min label position metric."""
 
-  def __init__(self, key: metric_types.MetricKey,
-               eval_config: Optional[config.EvalConfig]):
+  # Number of queries to accumulate before computing their min label positions
+  # in a single vectorized call.
+  _BATCH_SIZE = 1000
+
+  def __init__(self,
+               key: metric_types.MetricKey,
+               eval_config: Optional[config.EvalConfig],
+               batch_size: Optional[int] = None):
     self._key = key
     self._eval_config = eval_config
+    self._batch_size = (
+        batch_size if batch_size is not None else self._BATCH_SIZE)
+
+  def _process_batch(self, accumulator: _MinLabelPositionAccumulator):
+    if accumulator.len_inputs() == 0:
+      return
+    has_labels, _ = metric_util.pad_and_stack(
+        accumulator.has_labels, fill_value=False)
+    example_weights = np.array(accumulator.example_weights)
+    has_min_label_pos = np.any(has_labels, axis=1)
+    # Use 1-indexed positions
+    min_label_pos = np.argmax(has_labels, axis=1) + 1
+    accumulator.total_min_position += float(
+        np.sum(min_label_pos[has_min_label_pos]))
+    accumulator.total_weighted_examples += float(
+        np.sum(example_weights[has_min_label_pos]))
+    accumulator.clear_inputs()
 
   def create_accumulator(self) -> _MinLabelPositionAccumulator:
     return _MinLabelPositionAccumulator()
@@ -107,7 +150,7 @@ class _MinLabelPositionCombiner(beam.CombineFn):
       self, accumulator: _MinLabelPositionAccumulator,
       elements: List[metric_types.StandardMetricInputs]
   ) -> _MinLabelPositionAccumulator:
-    min_label_pos = None
+    has_labels = np.zeros(len(elements), dtype=bool)
     example_weight = None
     for i, element in enumerate(elements):
       label, _, weight = next(
@@ -126,14 +169,19 @@ class _MinLabelPositionCombiner(beam.CombineFn):
             'all example weights for the same query value must use the '
             'same value {} != {}: StandardMetricInputs={}'.format(
                 weight, example_weight, element))
-      if label is not None and np.sum(label) > 0:
-        min_label_pos = i + 1  # Use 1-indexed positions
-        break
+      has_labels[i] = label is not None and np.sum(label) > 0
     if example_weight is None:
       example_weight = 1.0
-    if min_label_pos:
-      accumulator.total_min_position += min_label_pos
-      accumulator.total_weighted_examples += example_weight
+    accumulator.has_labels.append(has_labels)
+    accumulator.example_weights.append(example_weight)
+    if accumulator.len_inputs() >= self._batch_size:
+      self._process_batch(accumulator)
+    return accumulator
+
+  def compact(
+      self, accumulator: _MinLabelPositionAccumulator
+  ) -> _MinLabelPositionAccumulator:
+    self._process_batch(accumulator)
     return accumulator
 
   def merge_accumulators(
@@ -141,13 +189,20 @@ class _MinLabelPositionCombiner(beam.CombineFn):
   ) -> _MinLabelPositionAccumulator:
     result = self.create_accumulator()
     for accumulator in accumulators:
+      # The unprocessed queries are moved to the result (the input accumulators
+      # must not be modified).
       result.total_min_position += accumulator.total_min_position
       result.total_weighted_examples += accumulator.total_weighted_examples
+      result.has_labels.extend(accumulator.has_labels)
+      result.example_weights.extend(accumulator.example_weights)
+      if result.len_inputs() >= self._batch_size:
+        self._process_batch(result)
     return result
 
   def extract_output(
       self, accumulator: _MinLabelPositionAccumulator
   ) -> Dict[metric_types.MetricKey, float]:
+    self._process_batch(accumulator)
     if accumulator.total_weighted_examples > 0:
       value = (
           accumulator.total_min_position / accumulator.total_weighted_examples)
@@ -207,6 +207,41 @@ class MinLabelPositionTest(testutil.TensorflowModelAnalysisTest):
 
       util.assert_that(result, check_result, label='result')
 
+  def testMinLabelPositionWithSmallBatchSize(self):
+    key = metric_types.MetricKey(name='min_label_position')
+    combiner = min_label_position._MinLabelPositionCombiner(
+        key, eval_config=None, batch_size=2)
+
+    def to_standard_metric_inputs(label, example_weight):
+      return metric_types.StandardMetricInputs(
+          label=np.array([label]),
+          prediction=np.array([0.5]),
+          example_weight=np.array([example_weight]))
+
+    queries = [
+        [to_standard_metric_inputs(1.0, 1.0),
+         to_standard_metric_inputs(0.0, 1.0)],
+        [to_standard_metric_inputs(0.0, 2.0),
+         to_standard_metric_inputs(1.0, 2.0),
+         to_standard_metric_inputs(0.0, 2.0)],
+        # Queries without positive labels are not counted.
+        [to_standard_metric_inputs(0.0, 4.0)],
+        [to_standard_metric_inputs(1.0, 3.0)],
+    ]
+    accumulator1 = combiner.create_accumulator()
+    for query in queries[:3]:
+      accumulator1 = combiner.add_input(accumulator1, query)
+    accumulator2 = combiner.create_accumulator()
+    accumulator2 = combiner.add_input(accumulator2, queries[3])
+    self.assertEqual(accumulator2.len_inputs(), 1)
+    merged = combiner.merge_accumulators([accumulator1, accumulator2])
+    # The input accumulators are not modified by the merge.
+    self.assertEqual(accumulator1.len_inputs(), 1)
+    self.assertEqual(accumulator2.len_inputs(), 1)
+    self.assertEqual(accumulator2.total_weighted_examples, 0.0)
+    got_metrics = combiner.extract_output(merged)
+    self.assertDictElementsAlmostEqual(got_metrics, {key: 0.66667}, places=5)
+
 
 if __name__ == '__main__':
   tf.test.main()
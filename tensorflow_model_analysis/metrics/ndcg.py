@@ -98,20 +98,91 @@ def _ndcg(gain_key: Text,
 
 
 class _NDCGAccumulator(object):
-  """NDCG accumulator."""
-  __slots__ = ['ndcg', 'total_weighted_examples']
+  """NDCG accumulator.
+
+  Attributes:
+    ndcg: Weighted sum of NDCG@k values (one per metric key).
+    total_weighted_examples: Sum of query weights.
+    gains: Gains for each query that has not been processed yet.
+    predictions: Predictions for each query that has not been processed yet.
+    example_weights: Weights for each query that has not been processed yet.
+  """
+  __slots__ = [
+      'ndcg', 'total_weighted_examples', 'gains', 'predictions',
+      'example_weights'
+  ]
 
   def __init__(self, size: int):
-    self.ndcg = [0.0] * size
+    self.ndcg = np.zeros(size)
     self.total_weighted_examples = 0.0
+    self.gains = []  # type: List[np.ndarray]
+    self.predictions = []  # type: List[np.ndarray]
+    self.example_weights = []  # type: List[float]
+
+  def len_inputs(self) -> int:
+    return len(self.example_weights)
+
+  def clear_inputs(self):
+    del self.gains[:]
+    del self.predictions[:]
+    del self.example_weights[:]
+
+
+def _ndcg_at_k(gains: np.ndarray, predictions: np.ndarray, mask: np.ndarray,
+               top_ks: List[int]) -> np.ndarray:
+  """Returns NDCG@k for a batch of queries.
+
+  Args:
+    gains: Gains with shape (num_queries, max_candidates). Padded entries are
+      ignored.
+    predictions: Predictions with the same shape as gains.
+    mask: Boolean mask that is True for non-padded entries. Padding must be at
+      the end of each row.
+    top_ks: List of k values to compute NDCG@k for.
+
+  Returns:
+    Array of shape (num_queries, len(top_ks)) containing NDCG@k values.
+  """
+  num_queries, max_candidates = gains.shape
+  gains = np.where(mask, gains, 0.0)
+  # Padded candidates are ranked last. A stable sort is used so that ties are
+  # broken deterministically (in reverse input order after the reversal).
+  ranking = np.argsort(
+      np.where(mask, predictions, -np.inf), axis=1, kind='mergesort')[:, ::-1]
+  ranked_gains = np.take_along_axis(gains, ranking, axis=1)
+  optimal_gains = -np.sort(np.where(mask, -gains, np.inf), axis=1)
+  optimal_gains = np.where(mask, optimal_gains, 0.0)
+  discounts = 1.0 / np.log2(np.arange(2, max_candidates + 2))
+  # Since mask is left aligned, the first len(query) positions of both the
+  # ranked and optimal gains contain all the non-padded values.
+  dcg = np.cumsum(ranked_gains * discounts, axis=1)
+  optimal_dcg = np.cumsum(optimal_gains * discounts, axis=1)
+  result = np.zeros((num_queries, len(top_ks)))
+  for i, k in enumerate(top_ks):
+    position = min(k, max_candidates) - 1
+    numerator = dcg[:, position]
+    denominator = optimal_dcg[:, position]
+    np.divide(
+        numerator, denominator, out=result[:, i], where=denominator > 0)
+  return result
 
 
 class _NDCGCombiner(beam.CombineFn):
   """Computes NDCG (normalized discounted cumulative gain)."""
 
-  def __init__(self, metric_keys: List[metric_types.MetricKey],
-               eval_config: Optional[config.EvalConfig], model_name: Text,
-               output_name: Text, query_key: Text, gain_key: Text):
+  # Number of queries to accumulate before computing their NDCG values in a
+  # single vectorized call. This also acts as a cap on the memory used to store
+  # unprocessed queries.
+  _BATCH_SIZE = 1000
+
+  def __init__(self,
+               metric_keys: List[metric_types.MetricKey],
+               eval_config: Optional[config.EvalConfig],
+               model_name: Text,
+               output_name: Text,
+               query_key: Text,
+               gain_key: Text,
+               batch_size: Optional[int] = None):
     """Initialize.
 
     Args:
@@ -121,13 +192,17 @@ class _NDCGCombiner(beam.CombineFn):
       output_name: Output name.
       query_key: Query key.
       gain_key: Key of feature in features dictionary that holds gain values.
+      batch_size: Number of queries to process at a time (testing only).
     """
     self._metric_keys = metric_keys
+    self._top_ks = [key.sub_key.top_k for key in metric_keys]
     self._eval_config = eval_config
     self._model_name = model_name
     self._output_name = output_name
     self._query_key = query_key
     self._gain_key = gain_key
+    self._batch_size = (
+        batch_size if batch_size is not None else self._BATCH_SIZE)
 
   def _query(
       self, i: metric_types.StandardMetricInputs
@@ -147,13 +222,14 @@ class _NDCGCombiner(beam.CombineFn):
                                                       gain, self._metric_keys,
                                                       i))
 
-  def _to_gains_example_weight(
+  def _to_gains_predictions_example_weight(
       self, inputs: List[metric_types.StandardMetricInputs]
-  ) -> Tuple[List[float], float]:
-    """Returns gains and example_weight sorted by prediction."""
-    predictions = []
+  ) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Returns gains, predictions, and example_weight for a query."""
+    gains = np.empty(len(inputs))
+    predictions = np.empty(len(inputs))
     example_weight = None
-    for i in inputs:
+    for index, i in enumerate(inputs):
       _, prediction, weight = next(
           metric_util.to_label_prediction_example_weight(
               i,
@@ -169,52 +245,22 @@ class _NDCGCombiner(beam.CombineFn):
             'all example weights for the same query value must use the '
             'same value {} != {}: query={}, StandardMetricInputs={}'.format(
                 weight, example_weight, self._query(i), i))
-      predictions.append(float(prediction))
+      predictions[index] = float(prediction)
+      gains[index] = self._gain(i)
     if example_weight is None:
       example_weight = 1.0
-    sort_indices = np.argsort(predictions)[::-1]
-    sorted_gains = []
-    for i in sort_indices:
-      sorted_gains.append(self._gain(inputs[i]))
-    return (sorted_gains, example_weight)
-
-  def _calculate_dcg_at_k(self, k: int, sorted_values: List[float]) -> float:
-    """Calculate the value of DCG@k.
-
-    Args:
-      k: The last position to consider.
-      sorted_values: A list of gain values assumed to be sorted in the desired
-        ranking order.
-
-    Returns:
-      The value of DCG@k.
-    """
-    return np.sum(
-        np.array(sorted_values)[:k] / np.log2(np.array(range(2, k + 2))))
-
-  def _calculate_ndcg(self, values: List[Tuple[int, float]], k: int) -> float:
-    """Calculate NDCG@k, based on given rank and gain values.
-
-    Args:
-      values: A list of tuples representing rank order and gain values.
-      k: The maximum position to consider in calculating nDCG
-
-    Returns:
-      The value of NDCG@k, for the given list of values.
-    """
-    max_rank = min(k, len(values))
-    ranked_values = [
-        gain for _, gain in sorted(values, key=lambda x: x[0], reverse=False)
-    ]
-    optimal_values = [
-        gain for _, gain in sorted(values, key=lambda x: x[1], reverse=True)
-    ]
-    dcg = self._calculate_dcg_at_k(max_rank, ranked_values)
-    optimal_dcg = self._calculate_dcg_at_k(max_rank, optimal_values)
-    if optimal_dcg > 0:
-      return dcg / optimal_dcg
-    else:
-      return 0
+    return (gains, predictions, example_weight)
+
+  def _process_batch(self, accumulator: _NDCGAccumulator):
+    if accumulator.len_inputs() == 0:
+      return
+    gains, mask = metric_util.pad_and_stack(accumulator.gains)
+    predictions, _ = metric_util.pad_and_stack(accumulator.predictions)
+    example_weights = np.array(accumulator.example_weights)
+    ndcg = _ndcg_at_k(gains, predictions, mask, self._top_ks)
+    accumulator.ndcg += np.dot(example_weights, ndcg)
+    accumulator.total_weighted_examples += float(np.sum(example_weights))
+    accumulator.clear_inputs()
 
   def create_accumulator(self):
     return _NDCGAccumulator(len(self._metric_keys))
@@ -222,23 +268,36 @@ class _NDCGCombiner(beam.CombineFn):
   def add_input(
       self, accumulator: _NDCGAccumulator,
       elements: List[metric_types.StandardMetricInputs]) -> _NDCGAccumulator:
-    gains, example_weight = self._to_gains_example_weight(elements)
-    rank_gain = [(pos + 1, gain) for pos, gain in enumerate(gains)]
-    for i, key in enumerate(self._metric_keys):
-      accumulator.ndcg[i] += (
-          self._calculate_ndcg(rank_gain, key.sub_key.top_k) * example_weight)
-    accumulator.total_weighted_examples += float(example_weight)
+    gains, predictions, example_weight = (
+        self._to_gains_predictions_example_weight(elements))
+    accumulator.gains.append(gains)
+    accumulator.predictions.append(predictions)
+    accumulator.example_weights.append(example_weight)
+    if accumulator.len_inputs() >= self._batch_size:
+      self._process_batch(accumulator)
+    return accumulator
+
+  def compact(self, accumulator: _NDCGAccumulator) -> _NDCGAccumulator:
+    self._process_batch(accumulator)
     return accumulator
 
   def merge_accumulators(
       self, accumulators: List[_NDCGAccumulator]) -> _NDCGAccumulator:
     result = self.create_accumulator()
     for accumulator in accumulators:
-      result.ndcg = [a + b for a, b in zip(result.ndcg, accumulator.ndcg)]
+      # The unprocessed queries are moved to the result (the input accumulators
+      # must not be modified).
+      result.ndcg += accumulator.ndcg
       result.total_weighted_examples += accumulator.total_weighted_examples
+      result.gains.extend(accumulator.gains)
+      result.predictions.extend(accumulator.predictions)
+      result.example_weights.extend(accumulator.example_weights)
+      if result.len_inputs() >= self._batch_size:
+        self._process_batch(result)
     return result
 
   def extract_output(self, accumulator: _NDCGAccumulator) -> Dict[Text, float]:
+    self._process_batch(accumulator)
     output = {}
     for i, key in enumerate(self._metric_keys):
       if accumulator.total_weighted_examples > 0:
@@ -145,6 +145,78 @@ class NDCGMetricsTest(testutil.TensorflowModelAnalysisTest):
 
       util.assert_that(result, check_result, label='result')
 
+  def testNDCGWithSmallBatchSize(self):
+    ndcg1_key = metric_types.MetricKey(
+        name='ndcg', sub_key=metric_types.SubKey(top_k=1))
+    ndcg2_key = metric_types.MetricKey(
+        name='ndcg', sub_key=metric_types.SubKey(top_k=2))
+    combiner = ndcg._NDCGCombiner(
+        metric_keys=[ndcg1_key, ndcg2_key],
+        eval_config=None,
+        model_name='',
+        output_name='',
+        query_key='query',
+        gain_key='gain',
+        batch_size=2)
+
+    def to_standard_metric_inputs(query, prediction, gain, example_weight):
+      return metric_types.StandardMetricInputs(
+          label=np.array([0.0]),
+          prediction=np.array([prediction]),
+          example_weight=np.array([example_weight]),
+          features={
+              'query': np.array([query]),
+              'gain': np.array([gain])
+          })
+
+    # Same queries as in testNDCG, but with the batches split across queries.
+    query1 = [
+        to_standard_metric_inputs('query1', 0.2, 1.0, 1.0),
+        to_standard_metric_inputs('query1', 0.8, 0.5, 1.0)
+    ]
+    query2 = [
+        to_standard_metric_inputs('query2', 0.5, 0.5, 2.0),
+        to_standard_metric_inputs('query2', 0.9, 1.0, 2.0),
+        to_standard_metric_inputs('query2', 0.1, 0.1, 2.0)
+    ]
+    query3 = [to_standard_metric_inputs('query3', 0.9, 1.0, 3.0)]
+
+    accumulator1 = combiner.create_accumulator()
+    accumulator1 = combiner.add_input(accumulator1, query1)
+    accumulator1 = combiner.add_input(accumulator1, query2)
+    # The batch is flushed once batch_size queries have been added.
+    self.assertEqual(accumulator1.len_inputs(), 0)
+    accumulator2 = combiner.create_accumulator()
+    accumulator2 = combiner.add_input(accumulator2, query3)
+    self.assertEqual(accumulator2.len_inputs(), 1)
+    merged = combiner.merge_accumulators([accumulator1, accumulator2])
+    # The input accumulators are not modified by the merge.
+    self.assertEqual(accumulator2.len_inputs(), 1)
+    self.assertEqual(accumulator2.total_weighted_examples, 0.0)
+    got_metrics = combiner.extract_output(merged)
+    self.assertDictElementsAlmostEqual(
+        got_metrics, {
+            ndcg1_key: 0.9166667,
+            ndcg2_key: 0.9766198
+        }, places=5)
+
+  def testNDCGAtKWithPaddedQueries(self):
+    # Query1: (p=0.2, g=1.0) (p=0.8, g=0.5)
+    # Query2: (p=0.5, g=0.5) (p=0.9, g=1.0) (p=0.1, g=0.1)
+    # Query3: (p=0.9, g=1.0)
+    gains, mask = metric_util.pad_and_stack(
+        [np.array([1.0, 0.5]),
+         np.array([0.5, 1.0, 0.1]),
+         np.array([1.0])])
+    predictions, _ = metric_util.pad_and_stack(
+        [np.array([0.2, 0.8]),
+         np.array([0.5, 0.9, 0.1]),
+         np.array([0.9])])
+    got = ndcg._ndcg_at_k(gains, predictions, mask, [1, 2, 5])
+    ndcg2 = (0.5 + 1.0 / np.log2(3)) / (1.0 + 0.5 / np.log2(3))
+    self.assertAllClose(
+        got, [[0.5, ndcg2, ndcg2], [1.0, 1.0, 1.0], [1.0, 1.0, 1.0]])
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -19,9 +19,10 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
-from typing import Dict, List, Optional, Text
-import apache_beam as beam
+from typing import Any, Dict, List, Optional, Text
+import numpy as np
 from tensorflow_model_analysis import config
+from tensorflow_model_analysis.metrics import additive_sums
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
 
@@ -81,61 +82,41 @@ class _SquaredPearsonCorrelationAccumulator(object):
     self.total_weighted_examples = 0.0
 
 
-class _SquaredPearsonCorrelationCombiner(beam.CombineFn):
-  """Computes squared pearson correlation (r^2) metric."""
+class _SquaredPearsonCorrelationCombiner(
+    additive_sums.LabelPredictionExampleWeightSumsCombiner):
+  """Computes squared pearson correlation (r^2) metric.
+
+  The sums are stored in the order of the _SquaredPearsonCorrelationAccumulator
+  slots.
+  """
 
   def __init__(self, key: metric_types.MetricKey,
                eval_config: Optional[config.EvalConfig],
                class_weights: Optional[Dict[int, float]]):
-    self._key = key
-    self._eval_config = eval_config
-    self._class_weights = class_weights
-
-  def create_accumulator(self) -> _SquaredPearsonCorrelationAccumulator:
-    return _SquaredPearsonCorrelationAccumulator()
-
-  def add_input(
-      self, accumulator: _SquaredPearsonCorrelationAccumulator,
-      element: metric_types.StandardMetricInputs
-  ) -> _SquaredPearsonCorrelationAccumulator:
-    for label, prediction, example_weight in (
-        metric_util.to_label_prediction_example_weight(
-            element,
-            eval_config=self._eval_config,
-            model_name=self._key.model_name,
-            output_name=self._key.output_name,
-            class_weights=self._class_weights)):
+    super(_SquaredPearsonCorrelationCombiner,
+          self).__init__(6, key, eval_config, class_weights)
+
+  def update_sums(self, sums: np.ndarray, prepared_input: List[Any]):
+    for label, prediction, example_weight in prepared_input:
       example_weight = float(example_weight)
       label = float(label)
       prediction = float(prediction)
-      accumulator.total_weighted_labels += example_weight * label
-      accumulator.total_weighted_predictions += example_weight * prediction
-      accumulator.total_weighted_squared_labels += example_weight * label**2
-      accumulator.total_weighted_squared_predictions += (
-          example_weight * prediction**2)
-      accumulator.total_weighted_labels_times_predictions += (
-          example_weight * label * prediction)
-      accumulator.total_weighted_examples += example_weight
-    return accumulator
-
-  def merge_accumulators(
-      self, accumulators: List[_SquaredPearsonCorrelationAccumulator]
-  ) -> _SquaredPearsonCorrelationAccumulator:
-    result = self.create_accumulator()
-    for accumulator in accumulators:
-      result.total_weighted_labels += accumulator.total_weighted_labels
-      result.total_weighted_predictions += (
-          accumulator.total_weighted_predictions)
-      result.total_weighted_squared_labels += (
-          accumulator.total_weighted_squared_labels)
-      result.total_weighted_squared_predictions += (
-          accumulator.total_weighted_squared_predictions)
-      result.total_weighted_labels_times_predictions += (
-          accumulator.total_weighted_labels_times_predictions)
-      result.total_weighted_examples += accumulator.total_weighted_examples
-    return result
-
-  def extract_output(
+      sums[0] += example_weight * label
+      sums[1] += example_weight * prediction
+      sums[2] += example_weight * label**2
+      sums[3] += example_weight * prediction**2
+      sums[4] += example_weight * label * prediction
+      sums[5] += example_weight
+
+  def sums_to_output(self,
+                     sums: np.ndarray) -> Dict[metric_types.MetricKey, float]:
+    accumulator = _SquaredPearsonCorrelationAccumulator()
+    for slot, value in zip(_SquaredPearsonCorrelationAccumulator.__slots__,
+                           sums):
+      setattr(accumulator, slot, float(value))
+    return self._extract_output(accumulator)
+
+  def _extract_output(
       self, accumulator: _SquaredPearsonCorrelationAccumulator
   ) -> Dict[metric_types.MetricKey, float]:
     result = float('nan')
@@ -19,9 +19,11 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
+import functools
 import importlib
+import time
 
-from typing import Any, Dict, List, Optional, Text, Type, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Text, Type, Tuple, Union
 
 import apache_beam as beam
 import numpy as np
@@ -30,6 +32,7 @@ from tensorflow_model_analysis import config
 from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import model_util
 from tensorflow_model_analysis import types
+from tensorflow_model_analysis import util
 from tensorflow_model_analysis.metrics import binary_confusion_matrices
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
@@ -40,6 +43,8 @@ _THRESHOLDS_KEY = 'thresholds'
 _CLASS_ID_KEY = 'class_id'
 _TOP_K_KEY = 'top_k'
 _DEFAULT_NUM_THRESHOLDS_IN_KERAS = 200
+# Same value as tf.keras.backend.epsilon() (used by BinaryCrossentropy).
+_KERAS_EPSILON = 1e-7
 
 _TFMetricOrLoss = Union[tf.keras.metrics.Metric, tf.keras.losses.Loss]
 
@@ -74,7 +79,9 @@ def tf_metric_computations(
     model_loader: Optional model loader. Only the non-compilable metrics will be
       evaluated using the model, all other metrics will be calculated directly
       in eager mode. However, the model is also used to add default metrics.
-    batch_size: Batch size to use when calling TF metrics (testing only).
+    batch_size: Batch size to use when calling TF metrics (testing only). By
+      default the Options.metrics_batch_size_options in the eval_config are
+      used.
 
   Returns:
     Metric computations.
@@ -147,7 +154,9 @@ def tf_metric_computations(
                 model_name,
                 sub_key,
                 class_weights,
-                batch_size,
+                model_util.get_metrics_batch_sizer(
+                    eval_config, _CompilableMetricsCombiner._BATCH_SIZE,
+                    batch_size),
             )))
 
   if non_compilable_metrics:
@@ -383,6 +392,153 @@ def _load_custom_objects(
   return loaded_custom_objects
 
 
+def _div_no_nan(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+  """Returns x / y with 0 where y is 0 (NumPy version of tf.math.div_no_nan)."""
+  x = np.asarray(x, dtype=np.float64)
+  y = np.asarray(y, dtype=np.float64)
+  return np.where(y == 0, 0.0, x / np.where(y == 0, 1.0, y))
+
+
+def _numpy_auc(matrices: binary_confusion_matrices.Matrices, curve: Text,
+               summation_method: Text) -> float:
+  """Returns AUC computed from matrices the same way tf.keras.metrics.AUC does."""
+  tp = np.asarray(matrices.tp, dtype=np.float64)
+  fp = np.asarray(matrices.fp, dtype=np.float64)
+  tn = np.asarray(matrices.tn, dtype=np.float64)
+  fn = np.asarray(matrices.fn, dtype=np.float64)
+  if curve == 'PR' and summation_method == 'interpolation':
+    # Interpolation of the PR curve as described by Davis & Goadrich (2006).
+    dtp = tp[:-1] - tp[1:]
+    p = tp + fp
+    dp = p[:-1] - p[1:]
+    precision_slope = _div_no_nan(dtp, np.maximum(dp, 0))
+    intercept = tp[1:] - precision_slope * p[1:]
+    safe_p_ratio = np.where(
+        np.logical_and(p[:-1] > 0, p[1:] > 0),
+        _div_no_nan(p[:-1], np.maximum(p[1:], 0)), np.ones_like(p[1:]))
+    return float(
+        np.sum(
+            _div_no_nan(
+                precision_slope * (dtp + intercept * np.log(safe_p_ratio)),
+                np.maximum(tp[1:] + fn[1:], 0))))
+  recall = _div_no_nan(tp, tp + fn)
+  if curve == 'ROC':
+    x = _div_no_nan(fp, fp + tn)
+    y = recall
+  else:
+    x = recall
+    y = _div_no_nan(tp, tp + fp)
+  if summation_method == 'interpolation':
+    heights = (y[:-1] + y[1:]) / 2.0
+  elif summation_method == 'minoring':
+    heights = np.minimum(y[:-1], y[1:])
+  else:
+    heights = np.maximum(y[:-1], y[1:])
+  return float(np.sum((x[:-1] - x[1:]) * heights))
+
+
+def _numpy_ratio(matrices: binary_confusion_matrices.Matrices,
+                 numerator: Text, other: Text) -> Any:
+  """Returns numerator / (numerator + other) computed from matrices."""
+  num = np.asarray(getattr(matrices, numerator), dtype=np.float64)
+  result = _div_no_nan(num,
+                       num + np.asarray(getattr(matrices, other), np.float64))
+  return result[0] if len(result) == 1 else result
+
+
+def _numpy_count(matrices: binary_confusion_matrices.Matrices,
+                 field: Text) -> Any:
+  """Returns the given confusion matrix count computed from matrices."""
+  result = np.asarray(getattr(matrices, field), dtype=np.float64)
+  return result[0] if len(result) == 1 else result
+
+
+def _numpy_confusion_matrix_result_fn(
+    metric: tf.keras.metrics.Metric
+) -> Optional[Callable[[binary_confusion_matrices.Matrices], Any]]:
+  """Returns NumPy fn computing metric result from matrices (if supported).
+
+  Only stock Keras metrics are supported (subclasses may override result()).
+  Unsupported metrics will return None and must be computed using TF.
+
+  Args:
+    metric: Confusion matrix based Keras metric.
+  """
+  metric_type = type(metric)
+  if metric_type is tf.keras.metrics.AUC:
+    metric_config = metric.get_config()
+    curve = metric_config.get('curve')
+    summation_method = metric_config.get('summation_method')
+    if (metric_config.get('multi_label') or
+        metric_config.get('label_weights') is not None or
+        curve not in ('ROC', 'PR') or
+        summation_method not in ('interpolation', 'minoring', 'majoring')):
+      return None
+    return functools.partial(
+        _numpy_auc, curve=curve, summation_method=summation_method)
+  elif metric_type is tf.keras.metrics.Precision:
+    return functools.partial(_numpy_ratio, numerator='tp', other='fp')
+  elif metric_type is tf.keras.metrics.Recall:
+    return functools.partial(_numpy_ratio, numerator='tp', other='fn')
+  elif metric_type is tf.keras.metrics.TruePositives:
+    return functools.partial(_numpy_count, field='tp')
+  elif metric_type is tf.keras.metrics.FalsePositives:
+    return functools.partial(_numpy_count, field='fp')
+  elif metric_type is tf.keras.metrics.TrueNegatives:
+    return functools.partial(_numpy_count, field='tn')
+  elif metric_type is tf.keras.metrics.FalseNegatives:
+    return functools.partial(_numpy_count, field='fn')
+  return None
+
+
+def _numpy_binary_accuracy(label: np.ndarray,
+                           prediction: np.ndarray) -> np.ndarray:
+  return np.mean(
+      np.equal(label, (prediction > 0.5).astype(prediction.dtype)), axis=-1)
+
+
+def _numpy_mean_squared_error(label: np.ndarray,
+                              prediction: np.ndarray) -> np.ndarray:
+  return np.mean(np.square(prediction - label), axis=-1)
+
+
+def _numpy_binary_crossentropy(label: np.ndarray,
+                               prediction: np.ndarray) -> np.ndarray:
+  prediction = np.clip(prediction, _KERAS_EPSILON, 1.0 - _KERAS_EPSILON)
+  bce = label * np.log(prediction + _KERAS_EPSILON)
+  bce += (1.0 - label) * np.log(1.0 - prediction + _KERAS_EPSILON)
+  return np.mean(-bce, axis=-1)
+
+
+# Stock Keras mean metrics that can be computed per batch with NumPy.
+_NUMPY_MEAN_METRIC_FNS = {
+    tf.keras.metrics.BinaryAccuracy: _numpy_binary_accuracy,
+    tf.keras.metrics.MeanSquaredError: _numpy_mean_squared_error,
+    tf.keras.metrics.BinaryCrossentropy: _numpy_binary_crossentropy,
+}
+
+
+def _numpy_mean_metric_fn(
+    metric: tf.keras.metrics.Metric
+) -> Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]]:
+  """Returns NumPy per example fn for metric if it has default settings."""
+  metric_type = type(metric)
+  if metric_type not in _NUMPY_MEAN_METRIC_FNS:
+    return None
+  # Names and dtypes don't impact the values computed, but any other settings
+  # (thresholds, label smoothing, logits, ...) must be the defaults.
+  ignored = ('name', 'dtype')
+  metric_config = {
+      k: v for k, v in metric.get_config().items() if k not in ignored
+  }
+  default_config = {
+      k: v for k, v in metric_type().get_config().items() if k not in ignored
+  }
+  if metric_config != default_config:
+    return None
+  return _NUMPY_MEAN_METRIC_FNS[metric_type]
+
+
 def _wrap_confusion_matrix_metric(
     metric: tf.keras.metrics.Metric, model_name: Text, output_name: Text,
     sub_key: Optional[metric_types.SubKey],
@@ -415,6 +571,7 @@ def _wrap_confusion_matrix_metric(
       sub_key=sub_key)
 
   metric_config = tf.keras.metrics.serialize(metric)
+  numpy_result_fn = _numpy_confusion_matrix_result_fn(metric)
 
   thresholds = None
   num_thresholds = None
@@ -457,6 +614,11 @@ def _wrap_confusion_matrix_metric(
     """Returns AUC derived from binary confustion matrices."""
     matrices = metrics[matrices_key]
 
+    # Stock metrics are computed directly from the matrices using NumPy to
+    # avoid the overhead of creating and assigning TF variables per slice.
+    if numpy_result_fn is not None:
+      return {key: numpy_result_fn(matrices)}
+
     metric = tf.keras.metrics.deserialize(metric_config)
     if (isinstance(metric, tf.keras.metrics.AUC) or
         isinstance(metric, tf.keras.metrics.SpecificityAtSensitivity) or
@@ -501,6 +663,18 @@ class _LossMetric(tf.keras.metrics.Mean):
         self.loss(y_true, y_pred), sample_weight=sample_weight)
 
 
+def _numpy_mean_weights(fn: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                        label: np.ndarray, prediction: np.ndarray,
+                        example_weight: np.ndarray) -> np.ndarray:
+  """Returns [total, count] weights (as used by tf.keras.metrics.Mean)."""
+  values = fn(label.astype(np.float64), prediction.astype(np.float64))
+  weights = np.broadcast_to(
+      np.reshape(example_weight.astype(np.float64),
+                 (example_weight.shape[0],) + (1,) * (values.ndim - 1)),
+      values.shape)
+  return np.array([np.sum(values * weights), np.sum(weights)])
+
+
 class _CompilableMetricsAccumulator(object):
   """Accumulator for compilable metrics.
 
@@ -567,11 +741,9 @@ class _CompilableMetricsCombiner(beam.CombineFn):
 
   # This needs to be large enough to allow for efficient TF invocations during
   # batch flushing, but shouldn't be too large as it also acts as cap on the
-  # maximum memory usage of the computation.
-  #
-  # We really want the batch size to be adaptive like it is in
-  # beam.BatchElements(), but there isn't an easy way to make it so.
-  # TODO(b/73789023): Figure out how to make this batch size dynamic.
+  # maximum memory usage of the computation. This is only the default, the
+  # batch size (and whether it adapts) is configured using
+  # Options.metrics_batch_size_options.
   _BATCH_SIZE = 1000
 
   def __init__(self,
@@ -581,7 +753,7 @@ class _CompilableMetricsCombiner(beam.CombineFn):
                model_name: Optional[Text],
                sub_key: Optional[metric_types.SubKey],
                class_weights: Dict[int, float],
-               batch_size: Optional[int] = None):
+               batch_sizer: Optional[util.BatchSizer] = None):
     # Use parallel lists to store output_names and configs to guarantee
     # consistent ordering and for natural alignment with the accumulator where
     # lists are used instead of dicts for efficency.
@@ -593,11 +765,19 @@ class _CompilableMetricsCombiner(beam.CombineFn):
     self._sub_key = sub_key
     self._class_weights = class_weights
     self._metrics = None  # type: Dict[Text, List[tf.keras.metrics.Metric]]
-    self._batch_size = (
-        batch_size if batch_size is not None else self._BATCH_SIZE)
+    # Parallel to self._metrics. Stock metrics with default settings are
+    # computed using NumPy instead of calling update_state on the TF metric.
+    self._numpy_fns = None  # type: Dict[Text, List[Optional[Callable]]]
+    self._batch_sizer = (
+        batch_sizer
+        if batch_sizer is not None else util.BatchSizer(self._BATCH_SIZE))
     self._keras_compilable_metrics_batch_size = (
         beam.metrics.Metrics.distribution(
             constants.METRICS_NAMESPACE, 'keras_compilable_metrics_batch_size'))
+    self._keras_compilable_metrics_desired_batch_size = (
+        beam.metrics.Metrics.distribution(
+            constants.METRICS_NAMESPACE,
+            'keras_compilable_metrics_desired_batch_size'))
 
   def _setup_if_needed(self):
     if self._metrics is None:
@@ -609,19 +789,34 @@ class _CompilableMetricsCombiner(beam.CombineFn):
               _deserialize_metrics(self._metric_configs[i]))
           for loss in _deserialize_losses(self._loss_configs[i]):
             self._metrics[output_name].append(_LossMetric(loss))
+      self._numpy_fns = {}
+      for output_name, metrics in self._metrics.items():
+        self._numpy_fns[output_name] = [
+            _numpy_mean_metric_fn(m) for m in metrics
+        ]
 
   def _process_batch(self, accumulator: _CompilableMetricsAccumulator):
     self._setup_if_needed()
     if accumulator.len_inputs() == 0:
       return
-    self._keras_compilable_metrics_batch_size.update(accumulator.len_inputs())
+    batch_size = accumulator.len_inputs()
+    self._keras_compilable_metrics_batch_size.update(batch_size)
+    start = time.time()
     for output_index, output_name in enumerate(self._output_names):
       inputs = accumulator.get_inputs(output_index)
       for metric_index, metric in enumerate(self._metrics[output_name]):
+        numpy_fn = self._numpy_fns[output_name][metric_index]
+        if numpy_fn is not None:
+          accumulator.add_weights(output_index, metric_index,
+                                  _numpy_mean_weights(numpy_fn, *inputs))
+          continue
         metric.reset_states()
         metric.update_state(*inputs)
         accumulator.add_weights(output_index, metric_index,
                                 metric.get_weights())
+    self._batch_sizer.record(batch_size, time.time() - start)
+    self._keras_compilable_metrics_desired_batch_size.update(
+        self._batch_sizer.batch_size)
     accumulator.clear_inputs()
 
   def create_accumulator(self) -> _CompilableMetricsAccumulator:
@@ -645,7 +840,7 @@ class _CompilableMetricsCombiner(beam.CombineFn):
               flatten=self._class_weights is not None,
               model_name=self._model_name)):
         accumulator.add_input(i, label, prediction, example_weight)
-    if accumulator.len_inputs() >= self._batch_size:
+    if accumulator.len_inputs() >= self._batch_sizer.batch_size:
       self._process_batch(accumulator)
     return accumulator
 
@@ -687,6 +882,11 @@ class _CompilableMetricsCombiner(beam.CombineFn):
             output_name=output_name,
             sub_key=self._sub_key)
         weights = accumulator.get_weights(output_index, metric_index)
+        if self._numpy_fns[output_name][metric_index] is not None:
+          result[key] = (
+              float(_div_no_nan(weights[0], weights[1]))
+              if weights is not None else 0.0)
+          continue
         if weights is not None:
           metric.set_weights(weights)
         else:
@@ -30,6 +30,7 @@ from tensorflow_model_analysis import config
 from tensorflow_model_analysis import model_util
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis.eval_saved_model import testutil
+from tensorflow_model_analysis.metrics import binary_confusion_matrices
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
 from tensorflow_model_analysis.metrics import tf_metric_wrapper
@@ -727,6 +728,151 @@ class MixedMetricsTest(testutil.TensorflowModelAnalysisTest):
           label='non_confusion')
 
 
+class NumpyMetricsTest(testutil.TensorflowModelAnalysisTest,
+                       parameterized.TestCase):
+
+  def _tf_metric_by_name(self, metric_name):
+    """Returns instance of tf.keras.metric given name."""
+    if metric_name == 'binary_accuracy':
+      return tf.keras.metrics.BinaryAccuracy(name=metric_name)
+    elif metric_name == 'mse':
+      return tf.keras.metrics.MeanSquaredError(name=metric_name)
+    elif metric_name == 'binary_crossentropy':
+      return tf.keras.metrics.BinaryCrossentropy(name=metric_name)
+    elif metric_name == 'auc':
+      return tf.keras.metrics.AUC(name=metric_name)
+    elif metric_name == 'auc_pr':
+      return tf.keras.metrics.AUC(name=metric_name, curve='PR')
+    elif metric_name == 'auc_minoring':
+      return tf.keras.metrics.AUC(
+          name=metric_name, summation_method='minoring')
+    elif metric_name == 'precision':
+      return tf.keras.metrics.Precision(name=metric_name)
+    elif metric_name == 'recall':
+      return tf.keras.metrics.Recall(name=metric_name, thresholds=[0.3, 0.6])
+    elif metric_name == 'true_positives':
+      return tf.keras.metrics.TruePositives(name=metric_name)
+
+  @parameterized.named_parameters(
+      ('binary_accuracy', 'binary_accuracy'),
+      ('mse', 'mse'),
+      ('binary_crossentropy', 'binary_crossentropy'),
+  )
+  def testNumpyMeanMetricMatchesKeras(self, metric_name):
+    metric = self._tf_metric_by_name(metric_name)
+    fn = tf_metric_wrapper._numpy_mean_metric_fn(metric)
+    self.assertIsNotNone(fn)
+
+    np.random.seed(0)
+    labels = np.random.randint(0, 2, size=(50, 1)).astype(np.float32)
+    predictions = np.random.uniform(size=(50, 1)).astype(np.float32)
+    example_weights = np.random.uniform(size=(50, 1)).astype(np.float32)
+    weights = tf_metric_wrapper._numpy_mean_weights(fn, labels, predictions,
+                                                     example_weights)
+
+    metric.update_state(labels, predictions, example_weights)
+    self.assertAllClose(
+        weights[0] / weights[1], metric.result().numpy(), rtol=1e-5)
+
+  def testNumpyMeanMetricNotUsedForNonDefaultSettings(self):
+    self.assertIsNone(
+        tf_metric_wrapper._numpy_mean_metric_fn(
+            tf.keras.metrics.BinaryAccuracy(threshold=0.7)))
+    self.assertIsNone(
+        tf_metric_wrapper._numpy_mean_metric_fn(
+            tf.keras.metrics.BinaryCrossentropy(from_logits=True)))
+    self.assertIsNone(tf_metric_wrapper._numpy_mean_metric_fn(_CustomMetric()))
+    self.assertIsNone(
+        tf_metric_wrapper._numpy_mean_metric_fn(
+            tf.keras.metrics.CategoricalCrossentropy()))
+
+  @parameterized.named_parameters(
+      ('auc', 'auc'),
+      ('auc_pr', 'auc_pr'),
+      ('auc_minoring', 'auc_minoring'),
+      ('precision', 'precision'),
+      ('recall', 'recall'),
+      ('true_positives', 'true_positives'),
+  )
+  def testNumpyConfusionMatrixMetricMatchesKeras(self, metric_name):
+    metric = self._tf_metric_by_name(metric_name)
+    fn = tf_metric_wrapper._numpy_confusion_matrix_result_fn(metric)
+    self.assertIsNotNone(fn)
+
+    np.random.seed(0)
+    labels = np.random.randint(0, 2, size=(100, 1)).astype(np.float32)
+    predictions = np.random.uniform(size=(100, 1)).astype(np.float32)
+    metric.update_state(labels, predictions)
+    if hasattr(metric, 'true_positives'):
+      tp = metric.true_positives.numpy()
+      fp = metric.false_positives.numpy()
+      tn = metric.true_negatives.numpy() if hasattr(
+          metric, 'true_negatives') else np.zeros_like(tp)
+      fn_ = metric.false_negatives.numpy() if hasattr(
+          metric, 'false_negatives') else np.zeros_like(tp)
+    else:
+      tp = metric.accumulator.numpy()
+      fp = tn = fn_ = np.zeros_like(tp)
+    matrices = binary_confusion_matrices.Matrices(
+        thresholds=list(metric.thresholds),
+        tp=list(tp),
+        tn=list(tn),
+        fp=list(fp),
+        fn=list(fn_))
+
+    self.assertAllClose(fn(matrices), metric.result().numpy(), rtol=1e-5)
+
+  def testNumpyConfusionMatrixMetricNotUsedForUnsupportedMetrics(self):
+    self.assertIsNone(
+        tf_metric_wrapper._numpy_confusion_matrix_result_fn(
+            tf.keras.metrics.SpecificityAtSensitivity(0.5)))
+
+  def testMixedNumpyAndTFMetricsWithBatching(self):
+    computation = tf_metric_wrapper.tf_metric_computations([
+        _CustomMetric(),
+        tf.keras.metrics.BinaryAccuracy(name='binary_accuracy'),
+        tf.keras.metrics.BinaryAccuracy(name='accuracy_at_0.95', threshold=0.95)
+    ],
+                                                           config.EvalConfig(),
+                                                           batch_size=2)[0]
+
+    example1 = {'labels': [0.0], 'predictions': [0.0], 'example_weights': [1.0]}
+    example2 = {'labels': [0.0], 'predictions': [0.5], 'example_weights': [1.0]}
+    example3 = {'labels': [1.0], 'predictions': [0.3], 'example_weights': [1.0]}
+    example4 = {'labels': [1.0], 'predictions': [0.9], 'example_weights': [1.0]}
+    example5 = {'labels': [1.0], 'predictions': [0.5], 'example_weights': [0.0]}
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      result = (
+          pipeline
+          | 'Create' >> beam.Create(
+              [example1, example2, example3, example4, example5])
+          | 'Process' >> beam.Map(metric_util.to_standard_metric_inputs)
+          | 'AddSlice' >> beam.Map(lambda x: ((), x))
+          | 'Combine' >> beam.CombinePerKey(computation.combiner))
+
+      # pylint: enable=no-value-for-parameter
+
+      def check_result(got):
+        try:
+          self.assertLen(got, 1)
+          got_slice_key, got_metrics = got[0]
+          self.assertEqual(got_slice_key, ())
+          self.assertDictElementsAlmostEqual(
+              got_metrics, {
+                  metric_types.MetricKey(name='custom'): 1.7 / 4.0,
+                  metric_types.MetricKey(name='binary_accuracy'): 3.0 / 4.0,
+                  metric_types.MetricKey(name='accuracy_at_0.95'): 2.0 / 4.0,
+              },
+              places=5)
+
+        except AssertionError as err:
+          raise util.BeamAssertException(err)
+
+      util.assert_that(result, check_result, label='result')
+
+
 if __name__ == '__main__':
   tf.compat.v1.enable_v2_behavior()
   tf.test.main()
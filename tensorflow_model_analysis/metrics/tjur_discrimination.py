@@ -24,8 +24,9 @@ from __future__ import division
 from __future__ import print_function
 
 from typing import Any, Dict, List, Optional, Text
-import apache_beam as beam
+import numpy as np
 from tensorflow_model_analysis import config
+from tensorflow_model_analysis.metrics import additive_sums
 from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.metrics import metric_util
 
@@ -207,59 +208,33 @@ class _TJURDiscriminationAccumulator(object):
     self.total_positive_weighted_labels = 0.0
 
 
-class _TJURDiscriminationCombiner(beam.CombineFn):
-  """Computes min label position metric."""
+class _TJURDiscriminationCombiner(
+    additive_sums.LabelPredictionExampleWeightSumsCombiner):
+  """Computes min label position metric.
+
+  The sums are stored in the order of the _TJURDiscriminationAccumulator slots.
+  """
 
   def __init__(self, key: metric_types.MetricKey,
                eval_config: Optional[config.EvalConfig],
                class_weights: Optional[Dict[int, float]]):
-    self._key = key
-    self._eval_config = eval_config
-    self._class_weights = class_weights
-
-  def create_accumulator(self) -> _TJURDiscriminationAccumulator:
-    return _TJURDiscriminationAccumulator()
-
-  def add_input(
-      self, accumulator: _TJURDiscriminationAccumulator,
-      element: metric_types.StandardMetricInputs
-  ) -> _TJURDiscriminationAccumulator:
-    for label, prediction, example_weight in (
-        metric_util.to_label_prediction_example_weight(
-            element,
-            eval_config=self._eval_config,
-            model_name=self._key.model_name,
-            output_name=self._key.output_name,
-            class_weights=self._class_weights)):
+    super(_TJURDiscriminationCombiner, self).__init__(4, key, eval_config,
+                                                      class_weights)
+
+  def update_sums(self, sums: np.ndarray, prepared_input: List[Any]):
+    for label, prediction, example_weight in prepared_input:
       label = float(label)
       prediction = float(prediction)
       example_weight = float(example_weight)
-      accumulator.total_negative_weighted_labels += ((1.0 - label) *
-                                                     example_weight)
-      accumulator.total_positive_weighted_labels += label * example_weight
-      accumulator.total_negative_weighted_predictions += ((1.0 - label) *
-                                                          prediction *
-                                                          example_weight)
-      accumulator.total_positive_weighted_predictions += (
-          label * prediction * example_weight)
-    return accumulator
-
-  def merge_accumulators(
-      self, accumulators: List[_TJURDiscriminationAccumulator]
-  ) -> _TJURDiscriminationAccumulator:
-    result = self.create_accumulator()
-    for accumulator in accumulators:
-      result.total_negative_weighted_predictions += (
-          accumulator.total_negative_weighted_predictions)
-      result.total_negative_weighted_labels += (
-          accumulator.total_negative_weighted_labels)
-      result.total_positive_weighted_predictions += (
-          accumulator.total_positive_weighted_predictions)
-      result.total_positive_weighted_labels += (
-          accumulator.total_positive_weighted_labels)
-    return result
-
-  def extract_output(
-      self, accumulator: _TJURDiscriminationAccumulator
+      sums[0] += (1.0 - label) * prediction * example_weight
+      sums[1] += (1.0 - label) * example_weight
+      sums[2] += label * prediction * example_weight
+      sums[3] += label * example_weight
+
+  def sums_to_output(
+      self, sums: np.ndarray
   ) -> Dict[metric_types.MetricKey, _TJURDiscriminationAccumulator]:
+    accumulator = _TJURDiscriminationAccumulator()
+    for slot, value in zip(_TJURDiscriminationAccumulator.__slots__, sums):
+      setattr(accumulator, slot, float(value))
     return {self._key: accumulator}
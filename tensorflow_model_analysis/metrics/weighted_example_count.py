@@ -18,11 +18,11 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
-import apache_beam as beam
 import numpy as np
 from tensorflow_model_analysis import util
+from tensorflow_model_analysis.metrics import additive_sums
 from tensorflow_model_analysis.metrics import metric_types
-from typing import Dict, List, Optional, Text
+from typing import Dict, Hashable, List, Optional, Text
 
 WEIGHTED_EXAMPLE_COUNT_NAME = 'weighted_example_count'
 
@@ -72,17 +72,19 @@ def _weighted_example_count(
   return computations
 
 
-class _WeightedExampleCountCombiner(beam.CombineFn):
+class _WeightedExampleCountCombiner(additive_sums.AdditiveSumsCombiner):
   """Computes weighted example count."""
 
   def __init__(self, key: metric_types.MetricKey):
+    super(_WeightedExampleCountCombiner, self).__init__(num_sums=1)
     self._key = key
 
-  def create_accumulator(self) -> float:
-    return 0.0
+  def input_key(self) -> Hashable:
+    return ('weighted_example_count', self._key.model_name,
+            self._key.output_name)
 
-  def add_input(self, accumulator: float,
-                element: metric_types.StandardMetricInputs) -> float:
+  def prepare_input(self,
+                    element: metric_types.StandardMetricInputs) -> float:
     example_weight = element.example_weight or np.array(1.0)
     if isinstance(example_weight, dict) and self._key.model_name:
       value = util.get_by_keys(
@@ -98,14 +100,11 @@ class _WeightedExampleCountCombiner(beam.CombineFn):
           'This is most likely a configuration error (for multi-output models'
           'a separate metric is needed for each output).'.format(
               self._key, example_weight))
-    return accumulator + np.sum(example_weight)
+    return np.sum(example_weight)
 
-  def merge_accumulators(self, accumulators: List[float]) -> float:
-    result = 0.0
-    for accumulator in accumulators:
-      result += accumulator
-    return result
+  def update_sums(self, sums: np.ndarray, prepared_input: float):
+    sums[0] += prepared_input
 
-  def extract_output(self,
-                     accumulator: float) -> Dict[metric_types.MetricKey, float]:
-    return {self._key: accumulator}
+  def sums_to_output(self,
+                     sums: np.ndarray) -> Dict[metric_types.MetricKey, float]:
+    return {self._key: float(sums[0])}
@@ -57,6 +57,11 @@ Then the expected output is:
                   'language': SparseTensorValue('English')}
   FPL.predictions = {'predictions' : np.array[1.0]}
   FPL.labels = {'labels' : np.array[2.0]}
+
+When only the metrics of the V2 evaluation (tfma.metrics) are needed, no graph
+is required: the labels and predictions can be read straight from the examples
+by the InputExtractor using the label_key and prediction_key of the ModelSpec
+(see model_spec_from_model_agnostic_config).
 """
 
 from __future__ import absolute_import
@@ -66,12 +71,13 @@ from __future__ import print_function
 
 # Standard Imports
 import tensorflow as tf
+from tensorflow_model_analysis import config
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis import util as general_util
 from tensorflow_model_analysis.eval_saved_model import encoding
 from tensorflow_model_analysis.eval_saved_model import util
 
-from typing import Any, Dict, List, NamedTuple, Text  # pytype: disable=not-supported-yet
+from typing import Any, Dict, List, NamedTuple, Optional, Text  # pytype: disable=not-supported-yet
 
 
 class ModelAgnosticConfig(
@@ -129,6 +135,44 @@ class ModelAgnosticConfig(
         feature_spec=feature_spec)
 
 
+def model_spec_from_model_agnostic_config(
+    model_agnostic_config: ModelAgnosticConfig,
+    name: Text = '',
+    example_weight_key: Optional[Text] = None) -> config.ModelSpec:
+  """Returns a ModelSpec for model-agnostic evaluation in the V2 pipeline.
+
+  When used in an EvalConfig without an EvalSharedModel, the InputExtractor
+  reads the labels, predictions, and example weights from the parsed examples
+  and no TF graph is created to parse them. Only single-output configs are
+  supported since the ModelAgnosticConfig does not define which label goes
+  with which prediction. For multiple outputs, set the label_keys and
+  prediction_keys of the ModelSpec (keyed by output name) directly.
+
+  Args:
+    model_agnostic_config: Model agnostic config.
+    name: Model name.
+    example_weight_key: Optional key of the example weights in the examples.
+
+  Raises:
+    ValueError: If the config has more than one label or prediction key.
+  """
+  if (len(model_agnostic_config.label_keys) != 1 or
+      len(model_agnostic_config.prediction_keys) != 1):
+    raise ValueError(
+        'only one label key and prediction key are supported, use label_keys '
+        'and prediction_keys in the ModelSpec for multi-output models: '
+        'label_keys={}, prediction_keys={}'.format(
+            model_agnostic_config.label_keys,
+            model_agnostic_config.prediction_keys))
+  model_spec = config.ModelSpec(
+      name=name,
+      label_key=model_agnostic_config.label_keys[0],
+      prediction_key=model_agnostic_config.prediction_keys[0])
+  if example_weight_key:
+    model_spec.example_weight_key = example_weight_key
+  return model_spec
+
+
 class ModelAgnosticPredict(object):
   """Abstraction for using a model agnostic evaluation.
 
@@ -18,11 +18,17 @@ from __future__ import division
 from __future__ import print_function
 
 # Standard Imports
+import apache_beam as beam
+from apache_beam.testing import util
 import numpy as np
 
 import tensorflow as tf
 
+from tensorflow_model_analysis import config
+from tensorflow_model_analysis import constants
+from tensorflow_model_analysis.api import model_eval_lib
 from tensorflow_model_analysis.eval_saved_model import testutil
+from tensorflow_model_analysis.extractors import input_extractor
 from tensorflow_model_analysis.model_agnostic_eval import model_agnostic_predict
 
 
@@ -163,6 +169,94 @@ class ModelAgnosticPredictTest(testutil.TensorflowModelAnalysisTest):
                           fpl.predictions['probabilities']['node'])
       self.assertEquals(expected_labels[i], fpl.labels['label']['node'])
 
+  def testModelSpecFromModelAgnosticConfig(self):
+    feature_map = {
+        'prediction': tf.io.FixedLenFeature([], tf.float32),
+        'label': tf.io.FixedLenFeature([], tf.float32)
+    }
+    model_agnostic_config = model_agnostic_predict.ModelAgnosticConfig(
+        label_keys=['label'],
+        prediction_keys=['prediction'],
+        feature_spec=feature_map)
+
+    self.assertEqual(
+        config.ModelSpec(
+            name='model',
+            label_key='label',
+            prediction_key='prediction',
+            example_weight_key='weight'),
+        model_agnostic_predict.model_spec_from_model_agnostic_config(
+            model_agnostic_config, name='model', example_weight_key='weight'))
+
+  def testModelSpecFromModelAgnosticConfigRaisesErrorForMultipleKeys(self):
+    feature_map = {
+        'prediction': tf.io.FixedLenFeature([], tf.float32),
+        'label1': tf.io.FixedLenFeature([], tf.float32),
+        'label2': tf.io.FixedLenFeature([], tf.float32)
+    }
+    model_agnostic_config = model_agnostic_predict.ModelAgnosticConfig(
+        label_keys=['label1', 'label2'],
+        prediction_keys=['prediction'],
+        feature_spec=feature_map)
+
+    with self.assertRaisesRegexp(ValueError,
+                                 'only one label key and prediction key'):
+      model_agnostic_predict.model_spec_from_model_agnostic_config(
+          model_agnostic_config)
+
+  def testInputExtractorMatchesModelAgnosticGraph(self):
+    examples = [
+        self._makeExample(age=1.0, prediction=0.2, label=1.0),
+        self._makeExample(age=2.0, prediction=0.7, label=0.0),
+        self._makeExample(age=3.0, prediction=0.9, label=1.0),
+    ]
+    serialized_examples = [e.SerializeToString() for e in examples]
+    feature_map = {
+        'age': tf.io.FixedLenFeature([1], tf.float32),
+        'prediction': tf.io.FixedLenFeature([1], tf.float32),
+        'label': tf.io.FixedLenFeature([1], tf.float32)
+    }
+    model_agnostic_config = model_agnostic_predict.ModelAgnosticConfig(
+        label_keys=['label'],
+        prediction_keys=['prediction'],
+        feature_spec=feature_map)
+    fpls = model_agnostic_predict.ModelAgnosticPredict(
+        model_agnostic_config).get_fpls_from_examples(serialized_examples)
+
+    model_spec = model_agnostic_predict.model_spec_from_model_agnostic_config(
+        model_agnostic_config)
+    extractor = input_extractor.InputExtractor(
+        eval_config=config.EvalConfig(model_specs=[model_spec]))
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      result = (
+          pipeline
+          | 'Create' >> beam.Create(serialized_examples, reshuffle=False)
+          | 'InputsToExtracts' >> model_eval_lib.InputsToExtracts()
+          | extractor.stage_name >> extractor.ptransform)
+
+      # pylint: enable=no-value-for-parameter
+
+      def check_result(got):
+        try:
+          self.assertLen(got, 3)
+          for extracts, fpl in zip(got, fpls):
+            self.assertAllClose(
+                fpl.labels['label']['node'].flatten(),
+                extracts[constants.LABELS_KEY])
+            self.assertAllClose(
+                fpl.predictions['prediction']['node'].flatten(),
+                extracts[constants.PREDICTIONS_KEY])
+            self.assertAllClose(
+                fpl.features['age']['node'].flatten(),
+                extracts[constants.FEATURES_KEY]['age'])
+
+        except AssertionError as err:
+          raise util.BeamAssertException(err)
+
+      util.assert_that(result, check_result, label='result')
+
 
 if __name__ == '__main__':
   tf.test.main()
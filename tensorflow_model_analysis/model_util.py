@@ -17,18 +17,33 @@
 
 import collections
 import datetime
+from multiprocessing import pool as multiprocessing_pool
+import os
+import threading
+import time
+
 import apache_beam as beam
+import numpy as np
 import tensorflow as tf  # pylint: disable=g-explicit-tensorflow-version-import
 from tensorflow_model_analysis import config
 from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import types
+from tensorflow_model_analysis import util
 from tensorflow_model_analysis.eval_saved_model import constants as eval_constants
 from tensorflow_model_analysis.eval_saved_model import load
 
-from typing import Any, Callable, Dict, List, Optional, Sequence, Text
+from typing import Any, Callable, Dict, List, Optional, Sequence, Text, Tuple
 
 KERAS_INPUT_SUFFIX = '_input'
 
+# Default number of loaded models kept in the process-wide model cache.
+_DEFAULT_MODEL_CACHE_SIZE = 4
+
+# Batch size used when warming up models after they are loaded.
+_WARMUP_BATCH_SIZE = 1
+
+_PREDICT_SIGNATURE_DEF_KEY = 'predict'
+
 
 def get_baseline_model_spec(
     eval_config: config.EvalConfig) -> Optional[config.ModelSpec]:
@@ -50,6 +65,90 @@ def get_model_spec(eval_config: config.EvalConfig,
   return None
 
 
+def get_max_concurrent_model_inferences(
+    eval_config: Optional[config.EvalConfig]) -> int:
+  """Returns max number of models that may be run concurrently (min of 1)."""
+  if (eval_config is not None and
+      eval_config.options.HasField('max_concurrent_model_inferences')):
+    return max(eval_config.options.max_concurrent_model_inferences.value, 1)
+  return 1
+
+
+def get_metrics_batch_sizer(
+    eval_config: Optional[config.EvalConfig],
+    default_batch_size: int,
+    batch_size: Optional[int] = None) -> util.BatchSizer:
+  """Returns batch sizer for combiners that compute metrics in batches.
+
+  Args:
+    eval_config: Eval config. The Options.metrics_batch_size_options are used
+      if set.
+    default_batch_size: Batch size to use if no batch size is configured.
+    batch_size: Explicit batch size. Takes precedence over the batch size
+      configured in the eval_config (the adaptive settings are still used).
+  """
+  options = config.BatchSizeOptions()
+  if (eval_config is not None and
+      eval_config.options.HasField('metrics_batch_size_options')):
+    options = eval_config.options.metrics_batch_size_options
+  if not batch_size or batch_size <= 0:
+    if options.HasField('batch_size') and options.batch_size.value > 0:
+      batch_size = options.batch_size.value
+    else:
+      batch_size = default_batch_size
+  kwargs = {}
+  if options.HasField('min_batch_size'):
+    kwargs['min_batch_size'] = options.min_batch_size.value
+  if options.HasField('max_batch_size'):
+    kwargs['max_batch_size'] = options.max_batch_size.value
+  if options.HasField('target_batch_duration_secs'):
+    kwargs['target_batch_duration_secs'] = (
+        options.target_batch_duration_secs.value)
+  return util.BatchSizer(
+      batch_size,
+      adaptive=options.HasField('adaptive') and options.adaptive.value,
+      **kwargs)
+
+
+def power_of_two_bucket_sizes(max_batch_size: int) -> List[int]:
+  """Returns powers of two up to (and including) the first >= max_batch_size."""
+  bucket_sizes = [1]
+  while bucket_sizes[-1] < max_batch_size:
+    bucket_sizes.append(bucket_sizes[-1] * 2)
+  return bucket_sizes
+
+
+def get_bucket_size(batch_size: int, bucket_sizes: List[int]) -> int:
+  """Returns smallest bucket size >= batch_size (or batch_size if too large)."""
+  for bucket_size in bucket_sizes:
+    if bucket_size >= batch_size:
+      return bucket_size
+  return batch_size
+
+
+def pad_batch(values: Any, padded_size: int) -> Any:
+  """Pads batch of values to padded_size by repeating the last value.
+
+  Repeating a real value (rather than padding with zeros) guarantees that the
+  padded rows are valid inputs for the model. The padded rows must be stripped
+  from the outputs by the caller.
+
+  Args:
+    values: Batch of values (np.ndarray or list).
+    padded_size: Size to pad to.
+
+  Returns:
+    Padded batch of the same type as values.
+  """
+  num_padded = padded_size - len(values)
+  if num_padded <= 0:
+    return values
+  if isinstance(values, np.ndarray):
+    return np.concatenate(
+        [values, np.repeat(values[-1:], num_padded, axis=0)], axis=0)
+  return list(values) + [values[-1]] * num_padded
+
+
 def rebatch_by_input_names(
     batch_of_extracts: List[types.Extracts],
     input_names: List[Text],
@@ -64,7 +163,8 @@ def rebatch_by_input_names(
   Returns:
     Dict of batch aligned features keyed by input (feature) name.
   """
-  # TODO(b/138474171): Make this code more efficient.
+  # For repeated calls with the same inputs, see RebatchPlan which resolves the
+  # layout of the inputs once and stacks the values per input.
   if input_specs is None:
     input_specs = {}
   inputs = collections.defaultdict(list)
@@ -116,14 +216,332 @@ def rebatch_by_input_names(
   return inputs
 
 
+class RebatchPlan(object):
+  """Precompiled plan for converting batches of extracts into model inputs.
+
+  For a fixed set of input names and specs, the mapping from the features in
+  the extracts to the model inputs is the same for every batch. The plan
+  resolves the feature key used for each input once (from the first example
+  in which every input is found) and then gathers the values for each input
+  with a single np.stack instead of appending them element by element. Batches
+  that don't match the resolved layout (e.g. raw inputs or missing features)
+  fall back to rebatch_by_input_names.
+  """
+
+  def __init__(self,
+               input_names: List[Text],
+               input_specs: Optional[Dict[Text, tf.TypeSpec]] = None):
+    """Initializes plan.
+
+    Args:
+      input_names: List of input names to search for features under.
+      input_specs: Optional type specs associated with inputs.
+    """
+    self._input_names = list(input_names)
+    self._input_specs = input_specs or {}
+    # If the expected input shape contains only the batch dimension the values
+    # must be flattened (see rebatch_by_input_names).
+    self._flatten = [
+        name in self._input_specs and len(self._input_specs[name].shape) == 1
+        for name in self._input_names
+    ]
+    self._feature_keys = None  # type: Optional[List[Text]]
+
+  @property
+  def input_names(self) -> List[Text]:
+    return self._input_names
+
+  def _resolve_feature_keys(
+      self, features: Dict[Text, Any]) -> List[Optional[Text]]:
+    """Returns feature key used for each input (None if not found)."""
+    feature_keys = []
+    for name in self._input_names:
+      if name in features:
+        feature_keys.append(name)
+      # Some keras models prepend '_input' to the names of the inputs so try
+      # under '<name>_input' as well.
+      elif (name.endswith(KERAS_INPUT_SUFFIX) and
+            name[:-len(KERAS_INPUT_SUFFIX)] in features):
+        feature_keys.append(name[:-len(KERAS_INPUT_SUFFIX)])
+      else:
+        feature_keys.append(None)
+    return feature_keys
+
+  def _stack(self, name: Text, values: List[Any], flatten: bool) -> Any:
+    """Returns values stacked into a single batch."""
+    try:
+      stacked = np.stack(values)
+    except ValueError:
+      # Ragged values are passed through as a list (as rebatch_by_input_names).
+      if flatten:
+        raise ValueError(
+            'model expects inputs with shape (?,), but values have different '
+            'shapes: input_name={}, input_specs={}'.format(
+                name, self._input_specs))
+      return values
+    if flatten:
+      if stacked.size != len(values):
+        raise ValueError(
+            'model expects inputs with shape (?,), but shape is {}: '
+            'input_name={}, input_specs={}'.format(stacked.shape[1:], name,
+                                                   self._input_specs))
+      return stacked.reshape((len(values),))
+    return stacked
+
+  def rebatch(self, batch_of_extracts: List[types.Extracts]) -> Dict[Text, Any]:
+    """Converts a batch of extracts into batches keyed by input names.
+
+    Args:
+      batch_of_extracts: Batch of extracts (one per example).
+
+    Returns:
+      Dict of batch aligned features keyed by input (feature) name.
+    """
+    features_list = []
+    for extract in batch_of_extracts:
+      if constants.FEATURES_KEY in extract:
+        features = extract[constants.FEATURES_KEY]
+      else:
+        features = extract[constants.INPUT_KEY]
+      if not isinstance(features, dict):
+        return rebatch_by_input_names(batch_of_extracts, self._input_names,
+                                      self._input_specs)
+      features_list.append(features)
+    if not features_list:
+      return {}
+    if self._feature_keys is None:
+      feature_keys = self._resolve_feature_keys(features_list[0])
+      if None in feature_keys:
+        # The missing inputs may be optional features that are present in
+        # other examples, so the layout is only cached once every input is
+        # found and until then the batches are converted one by one.
+        return rebatch_by_input_names(batch_of_extracts, self._input_names,
+                                      self._input_specs)
+      self._feature_keys = feature_keys
+    inputs = {}
+    try:
+      for name, key, flatten in zip(self._input_names, self._feature_keys,
+                                    self._flatten):
+        inputs[name] = self._stack(name, [f[key] for f in features_list],
+                                   flatten)
+    except KeyError:
+      # The features in this batch don't match the resolved layout.
+      return rebatch_by_input_names(batch_of_extracts, self._input_names,
+                                    self._input_specs)
+    return inputs
+
+
+class _ModelCache(object):
+  """Bounded process-wide LRU cache of loaded models.
+
+  shared.Shared only keeps a weak reference to the models it constructs, so a
+  model is loaded again whenever all the DoFns using it are discarded (e.g.
+  between stages). Keeping strong references to the most recently used models
+  avoids these reloads. Hits and evictions are tracked per thread so that the
+  DoFns (whose setup runs the construct function in the calling thread) can
+  report them using Beam metrics.
+  """
+
+  def __init__(self, max_size: int):
+    self._lock = threading.Lock()
+    self._max_size = max_size
+    self._models = collections.OrderedDict()
+    self._thread_stats = threading.local()
+
+  def _stats(self) -> Dict[Text, int]:
+    if not hasattr(self._thread_stats, 'stats'):
+      self._thread_stats.stats = {'hits': 0, 'evictions': 0}
+    return self._thread_stats.stats
+
+  def thread_stats(self) -> Tuple[int, int]:
+    """Returns (hits, evictions) for lookups made by the current thread."""
+    stats = self._stats()
+    return stats['hits'], stats['evictions']
+
+  def set_max_size(self, max_size: int):
+    with self._lock:
+      self._max_size = max_size
+      self._evict_if_needed()
+
+  def _evict_if_needed(self):
+    while len(self._models) > max(self._max_size, 0):
+      self._models.popitem(last=False)
+      self._stats()['evictions'] += 1
+
+  def get(self, key: Any) -> Optional[types.ModelTypes]:
+    with self._lock:
+      if key not in self._models:
+        return None
+      # Move to the end (most recently used).
+      model = self._models.pop(key)
+      self._models[key] = model
+      self._stats()['hits'] += 1
+      return model
+
+  def put(self, key: Any, model: types.ModelTypes):
+    with self._lock:
+      self._models.pop(key, None)
+      self._models[key] = model
+      self._evict_if_needed()
+
+  def clear(self):
+    with self._lock:
+      self._models.clear()
+
+
+_MODEL_CACHE = _ModelCache(_DEFAULT_MODEL_CACHE_SIZE)
+
+
+def clear_model_cache():
+  """Removes all models from the process-wide model cache."""
+  _MODEL_CACHE.clear()
+
+
+def _callback_cache_key(callback: Callable[..., Any]) -> Optional[Text]:
+  """Returns key identifying callback independent of its instance (or None).
+
+  The key must be the same after the callback is pickled and unpickled, so
+  functions are identified by their name and objects by their type and
+  attributes. Callbacks whose identity cannot be determined this way (e.g.
+  lambdas and nested functions) return None.
+
+  Args:
+    callback: Add metrics callback.
+  """
+  if hasattr(callback, '__code__'):
+    name = getattr(callback, '__qualname__', callback.__name__)
+    # Lambdas and nested functions (<lambda>, <locals>) are not unique.
+    if '<' in name:
+      return None
+    return '{}.{}'.format(callback.__module__, name)
+  if not hasattr(callback, '__dict__'):
+    return None
+  state = repr(sorted((k, repr(v)) for k, v in vars(callback).items()))
+  if ' at 0x' in state:
+    return None
+  return '{}.{}{}'.format(
+      type(callback).__module__,
+      type(callback).__name__, state)
+
+
+def _model_cache_key(
+    eval_saved_model_path: Text, tags: List[Text], *args: Any) -> Optional[Any]:
+  """Returns key used to cache the model (None if it should not be cached).
+
+  The key includes the modification times of the model files so that a model
+  re-exported to the same path is loaded again.
+
+  Args:
+    eval_saved_model_path: Path to model.
+    tags: Model tags.
+    *args: Additional hashable settings that affect the loaded model.
+  """
+  mtimes = []
+  for filename in (tf.saved_model.SAVED_MODEL_FILENAME_PB,
+                   os.path.join(tf.saved_model.VARIABLES_DIRECTORY,
+                                'variables.index')):
+    path = os.path.join(eval_saved_model_path, filename)
+    mtimes.append(
+        tf.io.gfile.stat(path).mtime_nsec if tf.io.gfile.exists(path) else None)
+  model_type = ('eval_saved_model'
+                if eval_constants.EVAL_TAG in tags else 'saved_model')
+  return (eval_saved_model_path, tuple(sorted(tags)), model_type,
+          tuple(mtimes)) + args
+
+
+def get_warmup_values(name: Text, spec: tf.TypeSpec, batch_size: int) -> Any:
+  """Returns batch of synthetic values matching the given input spec."""
+  if not isinstance(spec, tf.TensorSpec) or spec.shape.rank is None:
+    raise ValueError('unable to create warmup values for input "{}" with spec '
+                     '{}'.format(name, spec))
+  shape = [batch_size] + [
+      d if d is not None else 1 for d in spec.shape.as_list()[1:]
+  ]
+  if spec.dtype == tf.string:
+    return np.full(shape, b'', dtype=object)
+  return np.zeros(shape, dtype=spec.dtype.as_numpy_dtype)
+
+
+def warmup_model(model: types.ModelTypes,
+                 signature_names: List[Text],
+                 batch_size: int = _WARMUP_BATCH_SIZE):
+  """Calls the given signatures once on a synthetic batch.
+
+  The inputs are built from the signature's input specs (or consist of empty
+  serialized tf.Examples if the signature takes a single string input).
+  Failures are logged and otherwise ignored since they only mean that the work
+  done during the first call happens while processing instead.
+
+  Args:
+    model: Loaded model.
+    signature_names: Names of signatures to warm up. An empty name stands for
+      the default signature ('predict' if it exists, else 'serving_default').
+    batch_size: Size of synthetic batch.
+  """
+  if model.eval_saved_model is not None:
+    tf.compat.v1.logging.info('skipping warmup of EvalSavedModel')
+    return
+  if model.keras_model is not None:
+    signatures = model.keras_model.signatures
+  else:
+    signatures = model.saved_model.signatures
+  for signature_name in signature_names:
+    if not signature_name:
+      signature_name = (
+          _PREDICT_SIGNATURE_DEF_KEY if _PREDICT_SIGNATURE_DEF_KEY in signatures
+          else tf.saved_model.DEFAULT_SERVING_SIGNATURE_DEF_KEY)
+    if signature_name not in signatures:
+      continue  # Reported when the signature is used.
+    signature = signatures[signature_name]
+    try:
+      input_specs = None
+      if (signature.structured_input_signature and
+          len(signature.structured_input_signature) == 2 and
+          isinstance(signature.structured_input_signature[1], dict)):
+        input_specs = signature.structured_input_signature[1]
+      if input_specs:
+        signature(
+            **{
+                k: tf.constant(get_warmup_values(k, v, batch_size))
+                for k, v in input_specs.items()
+            })
+      else:
+        signature(tf.constant([b''] * batch_size, dtype=tf.string))
+    except (ValueError, TypeError, tf.errors.OpError) as e:
+      tf.compat.v1.logging.warning(
+          'warmup of signature "%s" failed (the model will be warmed up while '
+          'processing instead): %s', signature_name, e)
+
+
 def model_construct_fn(  # pylint: disable=invalid-name
     eval_saved_model_path: Optional[Text] = None,
     add_metrics_callbacks: Optional[List[types.AddMetricsCallbackType]] = None,
     include_default_metrics: Optional[bool] = None,
     additional_fetches: Optional[List[Text]] = None,
     blacklist_feature_fetches: Optional[List[Text]] = None,
-    tags: Optional[List[Text]] = None):
-  """Returns function for constructing shared ModelTypes."""
+    tags: Optional[List[Text]] = None,
+    model_cache_size: Optional[int] = None,
+    warmup_signature_names: Optional[List[Text]] = None):
+  """Returns function for constructing shared ModelTypes.
+
+  Loaded models are stored in a bounded process-wide LRU cache so that stages
+  running in the same process reuse models that were loaded by earlier stages.
+
+  Args:
+    eval_saved_model_path: Path to model.
+    add_metrics_callbacks: Callbacks for adding metrics (EvalSavedModel only).
+    include_default_metrics: True to include the default metrics that are part
+      of the saved model graph (EvalSavedModel only).
+    additional_fetches: Prefixes of additional tensors to fetch
+      (EvalSavedModel only).
+    blacklist_feature_fetches: Features to exclude from fetches (EvalSavedModel
+      only).
+    tags: Model tags.
+    model_cache_size: Max number of models kept in the process-wide model cache
+      (0 disables caching). Defaults to the current size of the cache.
+    warmup_signature_names: Signatures to call once on a synthetic batch after
+      the model is loaded. None disables warmup.
+  """
   if tags is None:
     tags = [eval_constants.EVAL_TAG]
 
@@ -132,6 +550,21 @@ def model_construct_fn(  # pylint: disable=invalid-name
 
     def construct():  # pylint: disable=invalid-name
       """Function for constructing shared ModelTypes."""
+      if model_cache_size is not None:
+        _MODEL_CACHE.set_max_size(model_cache_size)
+      cache_key = None
+      if eval_saved_model_path and model_cache_size != 0:
+        callback_keys = tuple(
+            _callback_cache_key(c) for c in add_metrics_callbacks or [])
+        if None not in callback_keys:
+          cache_key = _model_cache_key(
+              eval_saved_model_path, tags, callback_keys,
+              include_default_metrics, tuple(additional_fetches or []),
+              tuple(blacklist_feature_fetches or []))
+      if cache_key is not None:
+        model = _MODEL_CACHE.get(cache_key)
+        if model is not None:
+          return model
       start_time = datetime.datetime.now()
       saved_model = None
       keras_model = None
@@ -164,12 +597,17 @@ def model_construct_fn(  # pylint: disable=invalid-name
         if keras_model is None:
           saved_model = tf.compat.v1.saved_model.load_v2(
               eval_saved_model_path, tags=tags)
-      end_time = datetime.datetime.now()
-      model_load_seconds_callback(int((end_time - start_time).total_seconds()))
-      return types.ModelTypes(
+      model = types.ModelTypes(
           saved_model=saved_model,
           keras_model=keras_model,
           eval_saved_model=eval_saved_model)
+      if warmup_signature_names is not None:
+        warmup_model(model, warmup_signature_names)
+      end_time = datetime.datetime.now()
+      model_load_seconds_callback(int((end_time - start_time).total_seconds()))
+      if cache_key is not None:
+        _MODEL_CACHE.put(cache_key, model)
+      return model
 
     return construct
 
@@ -186,15 +624,23 @@ class DoFnWithModels(beam.DoFn):
     self._model_load_seconds = None
     self._model_load_seconds_distribution = beam.metrics.Metrics.distribution(
         constants.METRICS_NAMESPACE, 'model_load_seconds')
+    self._model_cache_stats = None
+    self._model_cache_hits = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, 'model_cache_hits')
+    self._model_cache_evictions = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, 'model_cache_evictions')
 
   def _set_model_load_seconds(self, model_load_seconds):
     self._model_load_seconds = model_load_seconds
 
   def setup(self):
     self._loaded_models = {}
+    hits, evictions = _MODEL_CACHE.thread_stats()
     for model_name, model_loader in self._model_loaders.items():
       self._loaded_models[model_name] = model_loader.shared_handle.acquire(
           model_loader.construct_fn(self._set_model_load_seconds))
+    new_hits, new_evictions = _MODEL_CACHE.thread_stats()
+    self._model_cache_stats = (new_hits - hits, new_evictions - evictions)
 
   def process(self, elem):
     raise NotImplementedError('Subclasses are expected to override this.')
@@ -205,6 +651,10 @@ class DoFnWithModels(beam.DoFn):
     if self._model_load_seconds is not None:
       self._model_load_seconds_distribution.update(self._model_load_seconds)
       self._model_load_seconds = None
+    if self._model_cache_stats is not None:
+      self._model_cache_hits.inc(self._model_cache_stats[0])
+      self._model_cache_evictions.inc(self._model_cache_stats[1])
+      self._model_cache_stats = None
 
 
 @beam.typehints.with_input_types(beam.typehints.List[types.Extracts])
@@ -213,12 +663,31 @@ class BatchReducibleDoFnWithModels(DoFnWithModels):
   """Abstract class for DoFns that need the shared models.
 
   This DoFn will try to use large batch size at first. If a functional failure
-  is caught, an attempt will be made to process the elements serially
-  at batch size 1.
+  is caught, the batch is bisected recursively so that the halves that succeed
+  are still processed at large batch sizes and only the offending elements are
+  processed at batch size 1.
+
+  Subclasses that run inference for multiple models on the same batch should
+  use _run_inference_for_models so that the per-model latency is tracked and
+  the models can optionally be run concurrently.
   """
 
-  def __init__(self, model_loaders: Dict[Text, types.ModelLoader]):
+  def __init__(self,
+               model_loaders: Dict[Text, types.ModelLoader],
+               max_concurrent_models: int = 1):
+    """Initializes DoFn.
+
+    Args:
+      model_loaders: Dict of model loaders keyed by model name.
+      max_concurrent_models: Max number of models to run inference for
+        concurrently. If > 1 (and multiple models are used), a thread pool of
+        this size is created per DoFn instance. Since TF releases the GIL while
+        executing, this bounds the wall time of a batch by the slowest model
+        rather than the sum over all models.
+    """
     super(BatchReducibleDoFnWithModels, self).__init__(model_loaders)
+    self._max_concurrent_models = max_concurrent_models
+    self._thread_pool = None
     self._batch_size = (
         beam.metrics.Metrics.distribution(constants.METRICS_NAMESPACE,
                                           'batch_size'))
@@ -227,6 +696,70 @@ class BatchReducibleDoFnWithModels(DoFnWithModels):
                                           'batch_size_failed'))
     self._num_instances = beam.metrics.Metrics.counter(
         constants.METRICS_NAMESPACE, 'num_instances')
+    self._num_bad_examples = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, 'num_bad_examples')
+    self._batch_bisection_depth = (
+        beam.metrics.Metrics.distribution(constants.METRICS_NAMESPACE,
+                                          'batch_bisection_depth'))
+    self._model_inference_milliseconds = {}
+
+  def setup(self):
+    super(BatchReducibleDoFnWithModels, self).setup()
+    num_threads = min(self._max_concurrent_models, len(self._model_loaders))
+    if num_threads > 1:
+      self._thread_pool = multiprocessing_pool.ThreadPool(num_threads)
+
+  def teardown(self):
+    if self._thread_pool is not None:
+      self._thread_pool.close()
+      self._thread_pool.join()
+      self._thread_pool = None
+
+  def _model_inference_milliseconds_distribution(self, model_name: Text):
+    if model_name not in self._model_inference_milliseconds:
+      name = 'model_inference_milliseconds'
+      if model_name:
+        name = '{}_{}'.format(name, model_name)
+      self._model_inference_milliseconds[model_name] = (
+          beam.metrics.Metrics.distribution(constants.METRICS_NAMESPACE, name))
+    return self._model_inference_milliseconds[model_name]
+
+  def _run_inference_for_models(
+      self, model_names: List[Text],
+      inference_fn: Callable[[Text], Any]) -> List[Any]:
+    """Calls inference_fn for each model name and returns the outputs.
+
+    The models are run concurrently on the DoFn's thread pool if one was
+    configured, otherwise they are run one after another. Either way, the
+    outputs are returned in the same order as model_names and any exception
+    raised by inference_fn is re-raised in the calling thread.
+
+    Args:
+      model_names: Names of models to run inference for.
+      inference_fn: Function taking a model name and returning its output.
+
+    Returns:
+      List of outputs (one per model name).
+    """
+
+    def timed_inference_fn(model_name: Text) -> Tuple[Any, float]:
+      start = time.time()
+      output = inference_fn(model_name)
+      return output, time.time() - start
+
+    if self._thread_pool is not None and len(model_names) > 1:
+      outputs_and_seconds = self._thread_pool.map(timed_inference_fn,
+                                                  model_names)
+    else:
+      outputs_and_seconds = [timed_inference_fn(n) for n in model_names]
+    outputs = []
+    for model_name, (output, seconds) in zip(model_names, outputs_and_seconds):
+      # Beam metrics are tied to the thread processing the bundle so they are
+      # updated here instead of inside of the worker threads.
+      self._model_inference_milliseconds_distribution(model_name).update(
+          int(seconds * 1000))
+      outputs.append(output)
+    return outputs
 
   def _batch_reducible_process(
       self, elements: List[types.Extracts]) -> Sequence[types.Extracts]:
@@ -242,15 +775,61 @@ class BatchReducibleDoFnWithModels(DoFnWithModels):
     except (ValueError, tf.errors.InvalidArgumentError) as e:
       tf.compat.v1.logging.warning(
           'Large batch_size %s failed with error %s. '
-          'Attempting to run batch through serially.', batch_size, e)
-      self._batch_size_failed.update(batch_size)
-      result = []
-      for element in elements:
-        self._batch_size.update(1)
-        result.extend(self._batch_reducible_process([element]))
+          'Attempting to bisect the batch.', batch_size, e)
+      result = self._bisect_batch_reducible_process(elements, 0, 0, e)
       self._num_instances.inc(len(result))
       return result
 
+  def _bisect_batch_reducible_process(self, elements: List[types.Extracts],
+                                      offset: int, depth: int,
+                                      error: Exception) -> List[types.Extracts]:
+    """Processes elements that failed with error by bisecting them.
+
+    The elements are split in half and each half is retried (recursively
+    bisecting any half that fails again).
+
+    Args:
+      elements: Elements that failed to be processed.
+      offset: Offset of the elements within the batch originally passed to
+        process (for debugging).
+      depth: Bisection depth of elements.
+      error: Error raised when processing elements.
+
+    Returns:
+      Processed elements.
+
+    Raises:
+      The error raised when processing a single element. The error includes the
+      offset of the element, the bisection depth, and a reference to the input.
+      The element is also counted in num_bad_examples, but since the error
+      fails the bundle the counter is only visible for work items that are
+      retried or reported as failed by the runner.
+    """
+    self._batch_size_failed.update(len(elements))
+    if len(elements) == 1:
+      self._num_bad_examples.inc(1)
+      self._batch_bisection_depth.update(depth)
+      util.reraise_augmented(
+          error, 'bad example at offset {} of the batch (bisection depth {}): '
+          'input={}'.format(
+              offset, depth,
+              util.input_ref(elements[0].get(constants.INPUT_KEY,
+                                             elements[0]))))
+    half = len(elements) // 2
+    result = []
+    for sub_offset, sub_elements in ((0, elements[:half]),
+                                     (half, elements[half:])):
+      try:
+        result.extend(self._batch_reducible_process(sub_elements))
+        self._batch_size.update(len(sub_elements))
+        self._batch_bisection_depth.update(depth + 1)
+      except (ValueError, tf.errors.InvalidArgumentError) as e:
+        result.extend(
+            self._bisect_batch_reducible_process(sub_elements,
+                                                 offset + sub_offset,
+                                                 depth + 1, e))
+    return result
+
 
 class CombineFnWithModels(beam.CombineFn):
   """Abstract class for CombineFns that need the shared models.
@@ -266,6 +845,10 @@ class CombineFnWithModels(beam.CombineFn):
     self._model_load_seconds = None
     self._model_load_seconds_distribution = beam.metrics.Metrics.distribution(
         constants.METRICS_NAMESPACE, 'model_load_seconds')
+    self._model_cache_hits = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, 'model_cache_hits')
+    self._model_cache_evictions = beam.metrics.Metrics.counter(
+        constants.METRICS_NAMESPACE, 'model_cache_evictions')
 
   def _set_model_load_seconds(self, model_load_seconds):
     self._model_load_seconds = model_load_seconds
@@ -276,9 +859,13 @@ class CombineFnWithModels(beam.CombineFn):
   def _setup_if_needed(self) -> None:
     if self._loaded_models is None:
       self._loaded_models = {}
+      hits, evictions = _MODEL_CACHE.thread_stats()
       for model_name, model_loader in self._model_loaders.items():
         self._loaded_models[model_name] = model_loader.shared_handle.acquire(
             model_loader.construct_fn(self._set_model_load_seconds))
+      new_hits, new_evictions = _MODEL_CACHE.thread_stats()
+      self._model_cache_hits.inc(new_hits - hits)
+      self._model_cache_evictions.inc(new_evictions - evictions)
       if self._model_load_seconds is not None:
         self._model_load_seconds_distribution.update(self._model_load_seconds)
         self._model_load_seconds = None
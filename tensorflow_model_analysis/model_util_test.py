@@ -20,9 +20,26 @@ from __future__ import print_function
 
 import numpy as np
 import tensorflow as tf
+from tensorflow_model_analysis import config
 from tensorflow_model_analysis import model_util
 
 
+class _BatchReducibleDoFn(model_util.BatchReducibleDoFnWithModels):
+  """Fails for batches containing bad or mixed types of elements."""
+
+  def __init__(self):
+    super(_BatchReducibleDoFn, self).__init__({})
+    self.batch_sizes = []
+
+  def _batch_reducible_process(self, elements):
+    self.batch_sizes.append(len(elements))
+    if any(e['input'] == 'bad' for e in elements):
+      raise ValueError('bad input')
+    if len(set(e['input'] for e in elements)) > 1:
+      raise ValueError('mixed inputs')
+    return elements
+
+
 class ModelUtilTest(tf.test.TestCase):
 
   def testRebatchByInputNames(self):
@@ -67,5 +84,170 @@ class ModelUtilTest(tf.test.TestCase):
     self.assertNotIsInstance(got['a'][0], np.ndarray)
 
 
+  def testRebatchPlan(self):
+    extracts = [{
+        'features': {
+            'a': np.array([1.1]),
+            'b': np.array([1.2])
+        }
+    }, {
+        'features': {
+            'a': np.array([2.1]),
+            'b': np.array([2.2])
+        }
+    }]
+    input_specs = {
+        'a': tf.TensorSpec(shape=(2,)),
+        'b_input': tf.TensorSpec(shape=(2, 1))
+    }
+    plan = model_util.RebatchPlan(['a', 'b_input'], input_specs)
+    got = plan.rebatch(extracts)
+    self.assertAllClose(got['a'], np.array([1.1, 2.1]))
+    self.assertAllClose(got['b_input'], np.array([[1.2], [2.2]]))
+    # The plan is reused for subsequent batches.
+    got = plan.rebatch(extracts[:1])
+    self.assertAllClose(got['a'], np.array([1.1]))
+    self.assertAllClose(got['b_input'], np.array([[1.2]]))
+
+  def testRebatchPlanFallsBackForDifferentLayout(self):
+    plan = model_util.RebatchPlan(['a', 'b'])
+    plan.rebatch([{'features': {'a': np.array([1.1]), 'b': np.array([1.2])}}])
+    got = plan.rebatch([{'features': {'a': np.array([2.1])}}])
+    self.assertEqual({'a': [np.array([2.1])]}, got)
+
+  def testRebatchPlanWithFeatureMissingFromFirstExample(self):
+    plan = model_util.RebatchPlan(['a', 'b'])
+    got = plan.rebatch([{
+        'features': {
+            'a': np.array([1.1])
+        }
+    }, {
+        'features': {
+            'a': np.array([2.1]),
+            'b': np.array([2.2])
+        }
+    }])
+    self.assertAllClose(got['a'], [np.array([1.1]), np.array([2.1])])
+    self.assertAllClose(got['b'], [np.array([2.2])])
+    # The optional feature is still used for subsequent batches.
+    got = plan.rebatch([{
+        'features': {
+            'a': np.array([3.1]),
+            'b': np.array([3.2])
+        }
+    }])
+    self.assertAllClose(got['a'], np.array([[3.1]]))
+    self.assertAllClose(got['b'], np.array([[3.2]]))
+
+  def testRebatchPlanRaisesErrorForInvalidFlattenedInput(self):
+    plan = model_util.RebatchPlan(['a'], {'a': tf.TensorSpec(shape=(2,))})
+    with self.assertRaises(ValueError):
+      plan.rebatch([{'features': {'a': np.array([1.1, 1.2])}}])
+
+  def testBucketSizes(self):
+    bucket_sizes = model_util.power_of_two_bucket_sizes(5)
+    self.assertEqual(bucket_sizes, [1, 2, 4, 8])
+    self.assertEqual(model_util.get_bucket_size(3, bucket_sizes), 4)
+    self.assertEqual(model_util.get_bucket_size(8, bucket_sizes), 8)
+    self.assertEqual(model_util.get_bucket_size(9, bucket_sizes), 9)
+
+  def testPadBatch(self):
+    self.assertAllEqual(
+        model_util.pad_batch(np.array([[1], [2], [3]]), 4),
+        np.array([[1], [2], [3], [3]]))
+    self.assertEqual(model_util.pad_batch([b'a', b'b'], 4),
+                     [b'a', b'b', b'b', b'b'])
+    self.assertEqual(model_util.pad_batch([b'a', b'b'], 2), [b'a', b'b'])
+
+  def testGetMetricsBatchSizer(self):
+    self.assertEqual(
+        model_util.get_metrics_batch_sizer(None, 1000).batch_size, 1000)
+    eval_config = config.EvalConfig()
+    batch_size_options = eval_config.options.metrics_batch_size_options
+    batch_size_options.batch_size.value = 50
+    batch_size_options.adaptive.value = True
+    batch_size_options.max_batch_size.value = 60
+    sizer = model_util.get_metrics_batch_sizer(eval_config, 1000)
+    self.assertEqual(sizer.batch_size, 50)
+    sizer.record(50, 0.0)
+    self.assertEqual(sizer.batch_size, 60)
+    # Explicit batch sizes take precedence.
+    self.assertEqual(
+        model_util.get_metrics_batch_sizer(eval_config, 1000, 20).batch_size,
+        20)
+
+  def testBatchReducibleDoFnBisectsFailedBatch(self):
+    elements = [{'input': 'a'}] * 6 + [{'input': 'b'}] * 2
+    dofn = _BatchReducibleDoFn()
+    dofn.setup()
+    self.assertEqual(dofn.process(elements), elements)
+    # The first half succeeds at once, only the second half is bisected further.
+    self.assertEqual(dofn.batch_sizes, [8, 4, 4, 2, 2])
+
+  def testBatchReducibleDoFnReportsBadExample(self):
+    elements = [{'input': 'a'}] * 5 + [{'input': 'bad'}] + [{'input': 'a'}] * 2
+    dofn = _BatchReducibleDoFn()
+    dofn.setup()
+    with self.assertRaisesRegexp(ValueError,
+                                 'offset 5 of the batch.*depth 3.*bad'):
+      dofn.process(elements)
+
+  def testModelCacheEvictsLeastRecentlyUsed(self):
+    cache = model_util._ModelCache(2)
+    cache.put('a', 'model_a')
+    cache.put('b', 'model_b')
+    self.assertEqual(cache.get('a'), 'model_a')
+    cache.put('c', 'model_c')  # Evicts 'b' (least recently used)
+    self.assertIsNone(cache.get('b'))
+    self.assertEqual(cache.get('a'), 'model_a')
+    self.assertEqual(cache.get('c'), 'model_c')
+    self.assertEqual(cache.thread_stats(), (3, 1))
+    cache.set_max_size(0)
+    self.assertIsNone(cache.get('a'))
+    self.assertEqual(cache.thread_stats(), (3, 3))
+
+  def _exportKerasModel(self):
+    input_layer = tf.keras.layers.Input(shape=(1,), name='input')
+    output_layer = tf.keras.layers.Dense(1, name='output')(input_layer)
+    model = tf.keras.models.Model(input_layer, output_layer)
+    export_dir = self.get_temp_dir()
+    model.save(export_dir, save_format='tf')
+    return export_dir
+
+  def testModelConstructFnUsesModelCache(self):
+    model_util.clear_model_cache()
+    export_dir = self._exportKerasModel()
+    load_seconds = []
+    construct_fn = model_util.model_construct_fn(
+        export_dir,
+        tags=[tf.saved_model.SERVING],
+        warmup_signature_names=[''])
+    model1 = construct_fn(load_seconds.append)()
+    model2 = construct_fn(load_seconds.append)()
+    self.assertIs(model1, model2)
+    # The model is only loaded once.
+    self.assertLen(load_seconds, 1)
+
+    uncached_construct_fn = model_util.model_construct_fn(
+        export_dir, tags=[tf.saved_model.SERVING], model_cache_size=0)
+    self.assertIsNot(model1, uncached_construct_fn(load_seconds.append)())
+    self.assertLen(load_seconds, 2)
+    model_util.clear_model_cache()
+
+  def testCallbackCacheKey(self):
+
+    def callback(features_dict, predictions_dict, labels_dict):
+      del features_dict, predictions_dict, labels_dict
+
+    self.assertIsNotNone(model_util._callback_cache_key(_module_callback))
+    # Nested functions can't be identified by name.
+    self.assertIsNone(model_util._callback_cache_key(callback))
+    self.assertIsNone(model_util._callback_cache_key(lambda *args: None))
+
+
+def _module_callback(features_dict, predictions_dict, labels_dict):
+  del features_dict, predictions_dict, labels_dict
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -33,7 +33,7 @@ from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis.proto import metrics_for_slice_pb2
 from tensorflow_model_analysis.slicer import slice_accessor
-from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Text, Tuple, Union
+from typing import Any, Callable, Dict, FrozenSet, Generator, Iterable, List, Optional, Text, Tuple, Union
 
 # FeatureValueType represents a value that a feature could take.
 FeatureValueType = Union[Text, int, float]  # pylint: disable=invalid-name
@@ -168,6 +168,10 @@ class SingleSliceSpec(object):
     """Returns True if this specification represents the overall slice."""
     return not self._columns and not self._features
 
+  def slice_columns(self) -> FrozenSet[Text]:
+    """Returns the columns of every slice key this spec is applicable to."""
+    return self._columns | frozenset(key for key, _ in self._features)
+
   def is_slice_applicable(self, slice_key: SliceKeyType):
     """Determines if this slice spec is applicable to a slice of data.
 
@@ -327,6 +327,15 @@ class SlicerTest(testutil.TensorflowModelAnalysisTest):
       self.assertEqual(
           slice_spec.is_slice_applicable(slice_key), result, msg=name)
 
+  def testSliceColumns(self):
+    self.assertEqual(frozenset(), slicer.SingleSliceSpec().slice_columns())
+    self.assertEqual(
+        frozenset(['column1', 'column2', 'column3']),
+        slicer.SingleSliceSpec(
+            columns=['column1'],
+            features=[('column2', 'value2'),
+                      ('column3', 'value3')]).slice_columns())
+
   def testSliceDefaultSlice(self):
     with beam.Pipeline() as pipeline:
       fpls = create_fpls()
@@ -183,6 +183,14 @@ def reraise_augmented(exception: Exception, additional_message: Text) -> None:
   six.reraise(type(new_exception), new_exception, original_traceback)
 
 
+def input_ref(value: Any, max_length: int = 200) -> Text:
+  """Returns (truncated) reference to an input for use in error messages."""
+  value = repr(value)
+  if len(value) > max_length:
+    value = value[:max_length] + '...'
+  return value
+
+
 def kwargs_only(fn):
   """Wraps function so that callers must call it using keyword-arguments only.
 
@@ -263,3 +271,61 @@ def get_features_from_extracts(
   else:
     raise RuntimeError('Features missing, Please ensure Predict() was called.')
   return features
+
+
+class BatchSizer(object):
+  """Tracks the batch size to use when flushing batches of inputs to TF.
+
+  If adaptive, the batch size is updated based on the time per row measured
+  for each (full) batch so that a batch takes roughly target_batch_duration_secs
+  to process. Since the time per row includes the fixed overhead of each TF
+  call, the batch size grows until the overhead is amortized. Similar to
+  beam.BatchElements, the size is at most doubled (or halved) per update.
+  """
+
+  # Weight given to the latest measurement when smoothing the time per row.
+  _SMOOTHING = 0.3
+
+  def __init__(self,
+               batch_size: int,
+               adaptive: bool = False,
+               min_batch_size: int = 1,
+               max_batch_size: int = 10000,
+               target_batch_duration_secs: float = 1.0):
+    if min_batch_size < 1 or max_batch_size < min_batch_size:
+      raise ValueError(
+          'invalid batch size bounds: min_batch_size={}, max_batch_size={}'
+          .format(min_batch_size, max_batch_size))
+    self._adaptive = adaptive
+    self._min_batch_size = min_batch_size
+    self._max_batch_size = max_batch_size
+    self._target_batch_duration_secs = target_batch_duration_secs
+    self._secs_per_row = None  # type: Optional[float]
+    if adaptive:
+      batch_size = max(min(batch_size, max_batch_size), min_batch_size)
+    self._batch_size = max(batch_size, 1)
+
+  @property
+  def batch_size(self) -> int:
+    return self._batch_size
+
+  def record(self, batch_size: int, duration_secs: float) -> None:
+    """Records the time spent processing a batch of the given size."""
+    # Batches smaller than the current size are typically flushed at the end of
+    # a bundle and are dominated by the fixed overhead, so they are ignored.
+    if not self._adaptive or batch_size < self._batch_size:
+      return
+    secs_per_row = max(duration_secs, 0.0) / batch_size
+    if self._secs_per_row is None:
+      self._secs_per_row = secs_per_row
+    else:
+      self._secs_per_row = (
+          self._SMOOTHING * secs_per_row +
+          (1 - self._SMOOTHING) * self._secs_per_row)
+    if self._secs_per_row > 0:
+      target = int(self._target_batch_duration_secs / self._secs_per_row)
+    else:
+      target = self._max_batch_size
+    target = max(min(target, 2 * self._batch_size), self._batch_size // 2)
+    self._batch_size = max(
+        min(target, self._max_batch_size), self._min_batch_size)
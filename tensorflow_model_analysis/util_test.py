@@ -148,5 +148,40 @@ class UtilTest(tf.test.TestCase):
       util.get_features_from_extracts({})
 
 
+  def testBatchSizerNotAdaptive(self):
+    sizer = util.BatchSizer(100)
+    sizer.record(100, 10.0)
+    self.assertEqual(sizer.batch_size, 100)
+
+  def testBatchSizerGrowsAndShrinks(self):
+    sizer = util.BatchSizer(
+        100,
+        adaptive=True,
+        min_batch_size=10,
+        max_batch_size=1000,
+        target_batch_duration_secs=1.0)
+    # Fast batches grow the batch size, but at most by 2x per update.
+    sizer.record(100, 0.01)
+    self.assertEqual(sizer.batch_size, 200)
+    sizer.record(200, 0.02)
+    self.assertEqual(sizer.batch_size, 400)
+    # Batches smaller than the current size are ignored.
+    sizer.record(5, 100.0)
+    self.assertEqual(sizer.batch_size, 400)
+    # Slow batches shrink the batch size, but at most by 2x per update.
+    sizer.record(400, 400.0)
+    self.assertEqual(sizer.batch_size, 200)
+
+  def testBatchSizerRespectsBounds(self):
+    sizer = util.BatchSizer(
+        100, adaptive=True, min_batch_size=80, max_batch_size=150)
+    sizer.record(100, 0.0)
+    self.assertEqual(sizer.batch_size, 150)
+    sizer.record(150, 1000.0)
+    self.assertEqual(sizer.batch_size, 80)
+    with self.assertRaises(ValueError):
+      util.BatchSizer(100, adaptive=True, min_batch_size=10, max_batch_size=5)
+
+
 if __name__ == '__main__':
   tf.test.main()
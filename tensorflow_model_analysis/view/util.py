@@ -19,12 +19,15 @@ from __future__ import print_function
 import json
 import os
 
+import numpy as np
 from tensorflow_model_analysis import config
 from tensorflow_model_analysis.api import model_eval_lib
+from tensorflow_model_analysis.metrics import calibration_histogram
 from tensorflow_model_analysis.metrics import example_count
 from tensorflow_model_analysis.metrics import weighted_example_count
 from tensorflow_model_analysis.post_export_metrics import metric_keys
 from tensorflow_model_analysis.slicer import slicer_lib as slicer
+from tensorflow_model_analysis.writers import metrics_and_plots_serialization
 from typing import Any, Dict, List, Optional, Text, Tuple, Union
 
 
@@ -52,16 +55,26 @@ def get_slicing_metrics(
     ValueError: The provided slicing_column does not exist in results or more
     than one set of overall result is found.
   """
+  data = find_all_slices(results,
+                         _get_slicing_spec(slicing_column, slicing_spec))
+  _check_slice_count(len(data), slicing_column, slicing_spec)
+  return data
 
+
+def _get_slicing_spec(
+    slicing_column: Optional[Text],
+    slicing_spec: Optional[slicer.SingleSliceSpec]) -> slicer.SingleSliceSpec:
   if slicing_column:
-    data = find_all_slices(results,
-                           slicer.SingleSliceSpec(columns=[slicing_column]))
+    return slicer.SingleSliceSpec(columns=[slicing_column])
   elif not slicing_spec:
-    data = find_all_slices(results, slicer.SingleSliceSpec())
+    return slicer.SingleSliceSpec()
   else:
-    data = find_all_slices(results, slicing_spec)
+    return slicing_spec
+
 
-  slice_count = len(data)
+def _check_slice_count(slice_count: int, slicing_column: Optional[Text],
+                       slicing_spec: Optional[slicer.SingleSliceSpec]):
+  """Raises ValueError if the number of matching slices is not valid."""
   if not slice_count:
     if not slicing_spec:
       if not slicing_column:
@@ -72,8 +85,145 @@ def get_slicing_metrics(
   elif not slicing_column and not slicing_spec and slice_count > 1:
     raise ValueError('More than one slice found for %s' %
                      slicer.OVERALL_SLICE_NAME)
-  else:
-    return data
+
+
+# Default number of slices per page of SlicingMetricsPages.
+DEFAULT_SLICES_PAGE_SIZE = 1000
+
+
+def _metric_value_for_sorting(metrics: Dict[Text, Any],
+                              metric_name: Text) -> float:
+  """Returns the value of the given metric of a slice (NaN if not found)."""
+  for output_name in sorted(metrics):
+    for sub_key in sorted(metrics[output_name]):
+      if metric_name not in metrics[output_name][sub_key]:
+        continue
+      value = metrics[output_name][sub_key][metric_name]
+      if isinstance(value, dict):
+        if 'doubleValue' in value:
+          value = value['doubleValue']
+        elif 'boundedValue' in value:
+          value = value['boundedValue'].get('value')
+      try:
+        return float(value)
+      except (TypeError, ValueError):
+        return float('nan')
+  return float('nan')
+
+
+class SlicingMetricsPages(object):
+  """Pages of the slicing metrics shown by the slicing metrics view.
+
+  Only the keys of the matching slices are listed when created. The metrics of
+  a slice are looked up when the slice is on a requested page (or when the
+  slices are sorted by a metric), so results loaded using load_eval_result are
+  only deserialized on demand.
+  """
+
+  def __init__(self,
+               results: List[Tuple[slicer.SliceKeyType, Dict[Text, Any]]],
+               slicing_column: Optional[Text] = None,
+               slicing_spec: Optional[slicer.SingleSliceSpec] = None,
+               page_size: int = DEFAULT_SLICES_PAGE_SIZE):
+    """Initializes the pages.
+
+    Args:
+      results: A list of records (or a LazySlicedResults). Each record is a
+        tuple of (slice_name, {metric_name, metric_value}).
+      slicing_column: The column to filter the results with.
+      slicing_spec: The slicer.SingleSliceSpec to filter the results with. If
+        neither slicing_column nor slicing_spec is set, the overall slice is
+        used.
+      page_size: Number of slices per page.
+
+    Raises:
+      ValueError: If no slices match or more than one overall slice is found.
+    """
+    spec = _get_slicing_spec(slicing_column, slicing_spec)
+    if isinstance(results, metrics_and_plots_serialization.LazySlicedResults):
+      self._slice_keys = results.find_slice_keys(spec)
+      self._metrics = None
+      self._lazy_results = results
+    else:
+      self._slice_keys = []
+      self._metrics = []
+      for slice_key, metrics in results:
+        if spec.is_slice_applicable(slice_key):
+          self._slice_keys.append(slice_key)
+          self._metrics.append(metrics)
+    _check_slice_count(len(self._slice_keys), slicing_column, slicing_spec)
+    self._slice_names = [
+        slicer.stringify_slice_key(k) for k in self._slice_keys
+    ]
+    self._page_size = page_size
+    # Values used for sorting keyed by metric name.
+    self._sort_values = {}
+
+  @property
+  def num_slices(self) -> int:
+    return len(self._slice_keys)
+
+  def _get_metrics(self, index: int) -> Dict[Text, Any]:
+    if self._metrics is not None:
+      return self._metrics[index]
+    return self._lazy_results.get(self._slice_keys[index])
+
+  def _get_sort_values(self, metric_name: Text) -> List[float]:
+    if metric_name not in self._sort_values:
+      self._sort_values[metric_name] = [
+          _metric_value_for_sorting(self._get_metrics(i), metric_name)
+          for i in range(self.num_slices)
+      ]
+    return self._sort_values[metric_name]
+
+  def get_page(self,
+               page: int = 0,
+               sort_by: Optional[Text] = None,
+               descending: bool = False,
+               slice_filter: Optional[Text] = None) -> Dict[Text, Any]:
+    """Returns a page of slices.
+
+    Args:
+      page: Index of the page to return.
+      sort_by: Optional name of the metric to sort the slices by. Slices
+        without the metric are always last.
+      descending: True to sort in descending order.
+      slice_filter: Optional text that the slice names must contain (case
+        insensitive).
+
+    Returns:
+      A dict with the 'data' of the page (a list of {slice, metrics} like
+      get_slicing_metrics) and the 'pagination' state (page, numPages,
+      pageSize, numSlices matching the filter, totalSlices, sortBy,
+      descending, and filter).
+    """
+    indices = list(range(self.num_slices))
+    if slice_filter:
+      lowered = slice_filter.lower()
+      indices = [i for i in indices if lowered in self._slice_names[i].lower()]
+    if sort_by:
+      values = self._get_sort_values(sort_by)
+      sign = -1.0 if descending else 1.0
+      indices.sort(key=lambda i: (np.isnan(values[i]), sign * values[i]))
+    num_pages = max(-(-len(indices) // self._page_size), 1)
+    page = min(max(page, 0), num_pages - 1)
+    start = page * self._page_size
+    return {
+        'data': [{
+            'slice': self._slice_names[i],
+            'metrics': self._get_metrics(i)
+        } for i in indices[start:start + self._page_size]],
+        'pagination': {
+            'page': page,
+            'numPages': num_pages,
+            'pageSize': self._page_size,
+            'numSlices': len(indices),
+            'totalSlices': self.num_slices,
+            'sortBy': sort_by,
+            'descending': descending,
+            'filter': slice_filter,
+        }
+    }
 
 
 def find_all_slices(
@@ -84,12 +234,16 @@ def find_all_slices(
 
   Args:
     results: A list of records. Each record is a tuple of (slice_name,
-      {metric_name, metric_value}).
+      {metric_name, metric_value}). A LazySlicedResults (as loaded by
+      load_eval_result) is looked up using its slice index.
     slicing_spec: The spec to slice on.
 
   Returns:
     A list of {slice, metrics}
   """
+  if isinstance(results, metrics_and_plots_serialization.LazySlicedResults):
+    # Use the slice index to avoid scanning (and deserializing) all slices.
+    results = results.find_slices(slicing_spec)
   data = []
   for (slice_key, metric_value) in results:
     if slicing_spec.is_slice_applicable(slice_key):
@@ -211,6 +365,186 @@ def _replace_nan_with_none(
   return output_metrics
 
 
+def _to_float(value: Any) -> float:
+  """Converts a plot data value (as output by MessageToDict) to float."""
+  # Missing (default) values are omitted and NaN has been replaced with None.
+  # Infinite values are stored as the strings 'Infinity' and '-Infinity'.
+  return 0.0 if value is None else float(value)
+
+
+def _to_json_value(value: float) -> Union[float, Text]:
+  """Converts a float to the representation used by MessageToDict."""
+  if np.isinf(value):
+    return 'Infinity' if value > 0 else '-Infinity'
+  return value
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+  """Returns the indices of the points kept by largest-triangle-three-buckets.
+
+  The first and last points are always kept. The remaining points are split
+  into num_points - 2 buckets and from each bucket the point forming the
+  largest triangle with the previously kept point and the average of the next
+  bucket is kept, which preserves the visual shape of the curve.
+
+  Args:
+    x: X coordinates of the points (in plotting order).
+    y: Y coordinates of the points.
+    num_points: Number of points to keep.
+  """
+  n = len(x)
+  if num_points >= n:
+    return np.arange(n)
+  if num_points < 3:
+    return np.array([0, n - 1])[:max(num_points, 0)]
+  indices = np.zeros(num_points, dtype=np.int64)
+  indices[-1] = n - 1
+  # Since n > num_points, each bucket holds at least one point.
+  edges = np.linspace(1, n - 1, num_points - 1).astype(np.int64)
+  previous = 0
+  for i in range(num_points - 2):
+    start, end = edges[i], edges[i + 1]
+    if i + 2 < len(edges):
+      next_x = np.mean(x[end:edges[i + 2]])
+      next_y = np.mean(y[end:edges[i + 2]])
+    else:
+      next_x, next_y = x[n - 1], y[n - 1]
+    areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                   (x[previous] - x[start:end]) * (next_y - y[previous]))
+    previous = start + int(np.argmax(areas))
+    indices[i + 1] = previous
+  return indices
+
+
+def _downsample_matrices(matrices: List[Dict[Text, Any]],
+                         max_points: int) -> List[Dict[Text, Any]]:
+  """Downsamples confusion matrices while preserving the ROC and PR curves."""
+  if len(matrices) <= max_points:
+    return matrices
+
+  def column(name):
+    return np.array([_to_float(m.get(name)) for m in matrices])
+
+  false_positives = column('falsePositives')
+  true_negatives = column('trueNegatives')
+  negatives = false_positives + true_negatives
+  false_positive_rate = np.divide(
+      false_positives,
+      negatives,
+      out=np.zeros_like(negatives),
+      where=negatives > 0)
+  recall = column('recall')
+  # Half of the points are used for each of the curves drawn from the matrices.
+  num_points = max(max_points // 2, 3)
+  indices = np.union1d(
+      _lttb_indices(false_positive_rate, recall, num_points),
+      _lttb_indices(recall, column('precision'), num_points))
+  if len(indices) > max_points:
+    # Only happens for max_points < 6 (each curve needs at least 3 points).
+    indices = indices[np.round(np.linspace(0,
+                                           len(indices) - 1,
+                                           max_points)).astype(int)]
+  return [matrices[i] for i in indices]
+
+
+def _rebin_buckets(buckets: List[Dict[Text, Any]],
+                   max_points: int) -> List[Dict[Text, Any]]:
+  """Merges consecutive calibration buckets into at most max_points buckets."""
+  if len(buckets) <= max_points:
+    return buckets
+  boundaries = [_to_float(b.get('lowerThresholdInclusive')) for b in buckets]
+  histogram = [
+      calibration_histogram.Bucket(
+          bucket_id=i + 1,
+          weighted_labels=_to_float(b.get('totalWeightedLabel')),
+          weighted_predictions=_to_float(
+              b.get('totalWeightedRefinedPrediction')),
+          weighted_examples=_to_float(b.get('numWeightedExamples')))
+      for i, b in enumerate(buckets)
+  ]
+  # Every group of buckets_per_point consecutive buckets is merged into one.
+  buckets_per_point = -(-len(buckets) // max_points)
+  thresholds = boundaries[::buckets_per_point]
+  upper_bounds = thresholds[1:] + [
+      _to_float(buckets[-1].get('upperThresholdExclusive'))
+  ]
+  result = []
+  for bucket in calibration_histogram.rebin(
+      thresholds, histogram, boundaries=boundaries):
+    result.append({
+        'lowerThresholdInclusive':
+            _to_json_value(thresholds[bucket.bucket_id]),
+        'upperThresholdExclusive':
+            _to_json_value(upper_bounds[bucket.bucket_id]),
+        'numWeightedExamples':
+            bucket.weighted_examples,
+        'totalWeightedLabel':
+            bucket.weighted_labels,
+        'totalWeightedRefinedPrediction':
+            bucket.weighted_predictions,
+    })
+  return result
+
+
+def _filter_by_threshold_range(
+    data_series_name: Text, data_series: List[Dict[Text, Any]],
+    threshold_range: Tuple[float, float]) -> List[Dict[Text, Any]]:
+  """Returns the points of the data series within the threshold range."""
+  lower, upper = threshold_range
+  if data_series_name == 'buckets':
+    return [
+        b for b in data_series
+        if _to_float(b.get('upperThresholdExclusive')) > lower and
+        _to_float(b.get('lowerThresholdInclusive')) <= upper
+    ]
+  return [
+      m for m in data_series if lower <= _to_float(m.get('threshold')) <= upper
+  ]
+
+
+def downsample_plot_data(
+    plot_data: Dict[Text, Any],
+    max_points: Optional[int] = None,
+    threshold_range: Optional[Tuple[float, float]] = None
+) -> Tuple[Dict[Text, Any], bool]:
+  """Reduces the number of points sent to the frontend for each plot.
+
+  Confusion matrices (used for the ROC and PR curves) are decimated using
+  largest-triangle-three-buckets and calibration histograms are rebinned
+  (using calibration_histogram.rebin) so that each plot has at most max_points
+  points. To look at a part of a plot in more detail (e.g. when zooming in),
+  the data can first be restricted to a threshold range.
+
+  Args:
+    plot_data: Plot data as returned by get_plot_data_and_config.
+    max_points: Max number of points per plot. Defaults to no limit.
+    threshold_range: Optional (lower, upper) thresholds of the points to keep.
+
+  Returns:
+    Tuple of the downsampled plot data and whether any points were removed.
+  """
+  result = {}
+  downsampled = False
+  for plot_keys in _SUPPORTED_PLOT_KEYS.values():
+    metric_name = plot_keys['metricName']
+    data_series_name = plot_keys['dataSeries']
+    if data_series_name not in plot_data.get(metric_name, {}):
+      continue
+    data_series = plot_data[metric_name][data_series_name]
+    num_points = len(data_series)
+    if threshold_range is not None:
+      data_series = _filter_by_threshold_range(data_series_name, data_series,
+                                               threshold_range)
+    if max_points is not None:
+      if data_series_name == 'buckets':
+        data_series = _rebin_buckets(data_series, max_points)
+      else:
+        data_series = _downsample_matrices(data_series, max_points)
+    downsampled = downsampled or len(data_series) != num_points
+    result[metric_name] = {data_series_name: data_series}
+  return result, downsampled
+
+
 def get_plot_data_and_config(
     results: List[Tuple[slicer.SliceKeyType, Dict[Text, Any]]],
     slicing_spec: slicer.SingleSliceSpec,
@@ -219,6 +553,8 @@ def get_plot_data_and_config(
     top_k: Optional[int] = None,
     k: Optional[int] = None,
     label: Optional[Text] = None,
+    max_points: Optional[int] = None,
+    threshold_range: Optional[Tuple[float, float]] = None,
 ) -> Tuple[Union[Dict[Text, Any], Text], Dict[Text, Union[Dict[Text, Dict[
     Text, Text]], Text]]]:
   """Util function that extracts plot for a particular slice from the results.
@@ -234,6 +570,11 @@ def get_plot_data_and_config(
     k: The k used to compute prediciton at the kth position.
     label: A partial label used to match a set of plots in the results. This is
       kept for backward compatibility.
+    max_points: Optional max number of points per plot (see
+      downsample_plot_data). If any points are removed, 'downsampled' is set to
+      True in the plot config.
+    threshold_range: Optional (lower, upper) thresholds of the points to
+      return (e.g. the range zoomed into).
 
   Returns:
     (plot_data, plot_config) for the specified slice.
@@ -339,6 +680,9 @@ def get_plot_data_and_config(
                        json.dumps(plot_data))
 
   plot_data = _replace_nan_with_none(plot_data, _SUPPORTED_PLOT_KEYS)
+  if max_points is not None or threshold_range is not None:
+    plot_data, plot_config['downsampled'] = downsample_plot_data(
+        plot_data, max_points, threshold_range)
 
   return plot_data, plot_config  # pytype: disable=bad-return-type
 
@@ -228,6 +228,53 @@ class UtilTest(testutil.TensorflowModelAnalysisTest):
             'metrics': self.metrics_aggregate
         }])
 
+  def testSlicingMetricsPages(self):
+    results = [([(self.column_1, i)], _add_to_nested_dict({
+        'a': i % 4,
+        'b': {
+            'doubleValue': -i
+        }
+    })) for i in range(10)]
+    results.append(([(self.column_2, 'x')], self.metrics_c))
+    pages = util.SlicingMetricsPages(results, self.column_1, page_size=4)
+
+    self.assertEqual(10, pages.num_slices)
+    first_page = pages.get_page()
+    self.assertEqual(
+        {
+            'page': 0,
+            'numPages': 3,
+            'pageSize': 4,
+            'numSlices': 10,
+            'totalSlices': 10,
+            'sortBy': None,
+            'descending': False,
+            'filter': None,
+        }, first_page['pagination'])
+    self.assertEqual(
+        util.get_slicing_metrics(results, self.column_1)[:4],
+        first_page['data'])
+
+    last_page = pages.get_page(page=2)
+    self.assertEqual(['col1:8', 'col1:9'],
+                     [d['slice'] for d in last_page['data']])
+
+    # Sorting is stable and uses the doubleValue of dict valued metrics.
+    sorted_page = pages.get_page(sort_by='a', descending=True)
+    self.assertEqual(['col1:3', 'col1:7', 'col1:2', 'col1:6'],
+                     [d['slice'] for d in sorted_page['data']])
+    sorted_page = pages.get_page(sort_by='b')
+    self.assertEqual(['col1:9', 'col1:8', 'col1:7', 'col1:6'],
+                     [d['slice'] for d in sorted_page['data']])
+
+    filtered_page = pages.get_page(slice_filter='COL1:1')
+    self.assertEqual(['col1:1'], [d['slice'] for d in filtered_page['data']])
+    self.assertEqual(1, filtered_page['pagination']['numSlices'])
+
+  def testSlicingMetricsPagesRaisesErrorWhenNoSlicesMatch(self):
+    with self.assertRaises(ValueError):
+      util.SlicingMetricsPages(self._makeTestData(), 'unknown_column')
+
   def testFilterColumnResultBySpec(self):
     self.assertEqual(
         util.get_slicing_metrics(
@@ -374,6 +421,84 @@ class UtilTest(testutil.TensorflowModelAnalysisTest):
         }
     })
 
+  def testDownsamplePlotDataRebinsCalibrationBuckets(self):
+    buckets = [{
+        'lowerThresholdInclusive': '-Infinity',
+        'upperThresholdExclusive': 0.0,
+    }]
+    for i in range(100):
+      buckets.append({
+          'lowerThresholdInclusive': i / 100.0,
+          'upperThresholdExclusive': (i + 1) / 100.0,
+          'numWeightedExamples': 1.0,
+          'totalWeightedLabel': 0.5,
+      })
+    plot_data = {'calibrationHistogramBuckets': {'buckets': buckets}}
+
+    data, downsampled = util.downsample_plot_data(plot_data, max_points=10)
+
+    self.assertTrue(downsampled)
+    got = data['calibrationHistogramBuckets']['buckets']
+    self.assertLen(got, 10)
+    self.assertEqual('-Infinity', got[0]['lowerThresholdInclusive'])
+    self.assertAlmostEqual(1.0, got[-1]['upperThresholdExclusive'])
+    self.assertAlmostEqual(100.0, sum(b['numWeightedExamples'] for b in got))
+    self.assertAlmostEqual(50.0, sum(b['totalWeightedLabel'] for b in got))
+
+  def testDownsamplePlotDataKeepsCurveEndpoints(self):
+    matrices = []
+    for i in range(1000):
+      threshold = i / 1000.0
+      matrices.append({
+          'threshold': threshold,
+          'falsePositives': 1000.0 - i,
+          'trueNegatives': float(i),
+          'precision': 0.5 + threshold / 2,
+          'recall': 1.0 - threshold * threshold,
+      })
+    plot_data = {'confusionMatrixAtThresholds': {'matrices': matrices}}
+
+    data, downsampled = util.downsample_plot_data(plot_data, max_points=100)
+
+    self.assertTrue(downsampled)
+    got = data['confusionMatrixAtThresholds']['matrices']
+    self.assertLessEqual(len(got), 100)
+    self.assertEqual(matrices[0], got[0])
+    self.assertEqual(matrices[-1], got[-1])
+    thresholds = [m['threshold'] for m in got]
+    self.assertEqual(sorted(thresholds), thresholds)
+
+    # Zooming in only keeps the points within the threshold range.
+    data, _ = util.downsample_plot_data(
+        plot_data, max_points=100, threshold_range=(0.25, 0.3))
+    got = data['confusionMatrixAtThresholds']['matrices']
+    self.assertLen(got, 51)
+    self.assertAlmostEqual(0.25, got[0]['threshold'])
+
+  def testDownsamplePlotDataWithFewMaxPoints(self):
+    matrices = [{
+        'threshold': i / 100.0,
+        'falsePositives': 100.0 - i,
+        'trueNegatives': float(i),
+        'precision': 0.5 + i / 200.0,
+        'recall': 1.0 - i / 100.0,
+    } for i in range(100)]
+    plot_data = {'confusionMatrixAtThresholds': {'matrices': matrices}}
+
+    for max_points in range(1, 6):
+      data, _ = util.downsample_plot_data(plot_data, max_points=max_points)
+      self.assertLessEqual(
+          len(data['confusionMatrixAtThresholds']['matrices']), max_points)
+
+  def testGetPlotDataAndConfigWithMaxPoints(self):
+    data, plot_config = util.get_plot_data_and_config(
+        self._makeTestPlotsData(),
+        SingleSliceSpec(features=[(self.column_1, self.slice_a)]),
+        max_points=10)
+
+    self.assertEqual(data, self.plots_data_a)
+    self.assertFalse(plot_config['downsampled'])
+
   def testGetPlotUsingLabel(self):
     data, _ = util.get_plot_data_and_config(
         self._makeTestPlotsData(),
@@ -22,8 +22,11 @@ from tensorflow_model_analysis.api import model_eval_lib
 import tensorflow_model_analysis.notebook.visualization as visualization
 from tensorflow_model_analysis.slicer import slicer_lib as slicer
 from tensorflow_model_analysis.view import util
-from typing import Callable, Dict, Optional, Text, Union
+from typing import Callable, Dict, Optional, Text, Tuple, Union
 
+# Suggested max number of points per plot sent to the frontend (see the
+# max_points argument of render_plot).
+DEFAULT_MAX_PLOT_POINTS = 1000
 
 def render_slicing_metrics(
     result: model_eval_lib.EvalResult,
@@ -90,9 +93,16 @@ def render_plot(
     top_k: Optional[int] = None,
     k: Optional[int] = None,
     label: Optional[Text] = None,
+    max_points: Optional[int] = None,
+    threshold_range: Optional[Tuple[float, float]] = None,
 ) -> Optional[visualization.PlotViewer]:  # pytype: disable=invalid-annotation
   """Renders the plot view as widget.
 
+  If max_points is set, large plots (e.g. calibration plots with 10k buckets)
+  are downsampled before they are sent to the frontend (see
+  util.downsample_plot_data). To look at part of a downsampled curve in more
+  detail, render it again with a threshold_range.
+
   Args:
     result: An tfma.EvalResult.
     slicing_spec: The slicing spec to identify the slice. Show overall if unset.
@@ -101,12 +111,23 @@ def render_plot(
     top_k: The k used to compute prediction in the top k position.
     k: The k used to compute prediciton at the kth position.
     label: A partial label used to match a set of plots in the results.
+    max_points: Optional max number of points per plot (e.g.
+      DEFAULT_MAX_PLOT_POINTS). None (the default) to send all the points.
+    threshold_range: Optional (lower, upper) thresholds of the points to show.
 
   Returns:
     A PlotViewer object if in Jupyter notebook; None if in Colab.
   """
   slice_spec_to_use = slicing_spec if slicing_spec else slicer.SingleSliceSpec()
-  data, config = util.get_plot_data_and_config(result.plots, slice_spec_to_use,
-                                               output_name, class_id, top_k, k,
-                                               label)
+
+  data, config = util.get_plot_data_and_config(
+      result.plots,
+      slice_spec_to_use,
+      output_name,
+      class_id,
+      top_k,
+      k,
+      label,
+      max_points=max_points,
+      threshold_range=threshold_range)
   return visualization.render_plot(data, config)
@@ -19,7 +19,10 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
-from typing import Any, Dict, List, Optional, Text, Tuple
+import collections
+import functools
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Text, Tuple
 
 import apache_beam as beam
 
@@ -117,67 +120,101 @@ def _get_sub_key_id(sub_key):
     return 'k:' + str(sub_key.k.value)
 
 
+def _deserialize_metrics_for_slice(
+    record: bytes,
+    model_name: Optional[Text] = None) -> Tuple[slicer.SliceKeyType, Any]:
+  """Deserializes a MetricsForSlice record into a (slice key, metric map)."""
+  metrics_for_slice = metrics_for_slice_pb2.MetricsForSlice.FromString(record)
+
+  model_metrics_map = {}
+  if metrics_for_slice.metrics:
+    model_metrics_map[''] = {
+        '': {
+            '': _convert_proto_map_to_dict(metrics_for_slice.metrics)
+        }
+    }
+
+  if metrics_for_slice.metric_keys_and_values:
+    for kv in metrics_for_slice.metric_keys_and_values:
+      current_model_name = kv.key.model_name
+
+      if current_model_name not in model_metrics_map:
+        model_metrics_map[current_model_name] = {}
+      output_name = kv.key.output_name
+      if output_name not in model_metrics_map[current_model_name]:
+        model_metrics_map[current_model_name][output_name] = {}
+
+      sub_key_metrics_map = model_metrics_map[current_model_name][output_name]
+      sub_key_id = _get_sub_key_id(
+          kv.key.sub_key) if kv.key.HasField('sub_key') else ''
+      if sub_key_id not in sub_key_metrics_map:
+        sub_key_metrics_map[sub_key_id] = {}
+      metric_name = kv.key.name
+      sub_key_metrics_map[sub_key_id][
+          metric_name] = json_format.MessageToDict(kv.value)
+
+  metrics_map = None
+  keys = list(model_metrics_map.keys())
+  if model_name in model_metrics_map:
+    # Use the provided model name if there is a match.
+    metrics_map = model_metrics_map[model_name]
+    # Add model-independent (e.g. example_count) metrics to all models.
+    if model_name and '' in model_metrics_map:
+      for output_name, output_dict in model_metrics_map[''].items():
+        for sub_key_id, sub_key_dict in output_dict.items():
+          for name, value in sub_key_dict.items():
+            metrics_map.setdefault(output_name,
+                                   {}).setdefault(sub_key_id, {})[name] = value
+  elif not model_name and len(keys) == 1:
+    # Show result of the only model if no model name is specified.
+    metrics_map = model_metrics_map[keys[0]]
+  else:
+    # No match found.
+    raise ValueError('Fail to find metrics for model name: %s . '
+                     'Available model names are [%s]' %
+                     (model_name, ', '.join(keys)))
+
+  return (
+      slicer.deserialize_slice_key(metrics_for_slice.slice_key),  # pytype: disable=wrong-arg-types
+      metrics_map)
+
+
 def load_and_deserialize_metrics(
     path: Text,
     model_name: Optional[Text] = None) -> List[Tuple[slicer.SliceKeyType, Any]]:
   """Loads metrics from the given location and builds a metric map for it."""
   result = []
   for record in tf.compat.v1.python_io.tf_record_iterator(path):
-    metrics_for_slice = metrics_for_slice_pb2.MetricsForSlice.FromString(record)
+    result.append(_deserialize_metrics_for_slice(record, model_name))
+  return result
 
-    model_metrics_map = {}
-    if metrics_for_slice.metrics:
-      model_metrics_map[''] = {
-          '': {
-              '': _convert_proto_map_to_dict(metrics_for_slice.metrics)
-          }
-      }
 
-    if metrics_for_slice.metric_keys_and_values:
-      for kv in metrics_for_slice.metric_keys_and_values:
-        current_model_name = kv.key.model_name
-
-        if current_model_name not in model_metrics_map:
-          model_metrics_map[current_model_name] = {}
-        output_name = kv.key.output_name
-        if output_name not in model_metrics_map[current_model_name]:
-          model_metrics_map[current_model_name][output_name] = {}
-
-        sub_key_metrics_map = model_metrics_map[current_model_name][output_name]
-        sub_key_id = _get_sub_key_id(
-            kv.key.sub_key) if kv.key.HasField('sub_key') else ''
-        if sub_key_id not in sub_key_metrics_map:
-          sub_key_metrics_map[sub_key_id] = {}
-        metric_name = kv.key.name
-        sub_key_metrics_map[sub_key_id][
-            metric_name] = json_format.MessageToDict(kv.value)
-
-    metrics_map = None
-    keys = list(model_metrics_map.keys())
-    if model_name in model_metrics_map:
-      # Use the provided model name if there is a match.
-      metrics_map = model_metrics_map[model_name]
-      # Add model-independent (e.g. example_count) metrics to all models.
-      if model_name and '' in model_metrics_map:
-        for output_name, output_dict in model_metrics_map[''].items():
-          for sub_key_id, sub_key_dict in output_dict.items():
-            for name, value in sub_key_dict.items():
-              metrics_map.setdefault(output_name,
-                                     {}).setdefault(sub_key_id,
-                                                    {})[name] = value
-    elif not model_name and len(keys) == 1:
-      # Show result of the only model if no model name is specified.
-      metrics_map = model_metrics_map[keys[0]]
-    else:
-      # No match found.
-      raise ValueError('Fail to find metrics for model name: %s . '
-                       'Available model names are [%s]' %
-                       (model_name, ', '.join(keys)))
-
-    result.append((
-        slicer.deserialize_slice_key(metrics_for_slice.slice_key),  # pytype: disable=wrong-arg-types
-        metrics_map))
-  return result
+def _deserialize_plots_for_slice(
+    record: bytes) -> Tuple[slicer.SliceKeyType, Any]:
+  """Deserializes a PlotsForSlice record into a (slice key, plot map)."""
+  plots_for_slice = metrics_for_slice_pb2.PlotsForSlice.FromString(record)
+  plots_map = {}
+  if plots_for_slice.plots:
+    plot_dict = _convert_proto_map_to_dict(plots_for_slice.plots)
+    keys = list(plot_dict.keys())
+    # If there is only one label, choose it automatically.
+    plot_data = plot_dict[keys[0]] if len(keys) == 1 else plot_dict
+    plots_map[''] = {'': plot_data}
+  elif plots_for_slice.HasField('plot_data'):
+    plots_map[''] = {'': json_format.MessageToDict(plots_for_slice.plot_data)}
+
+  if plots_for_slice.plot_keys_and_values:
+    for kv in plots_for_slice.plot_keys_and_values:
+      output_name = kv.key.output_name
+      if output_name not in plots_map:
+        plots_map[output_name] = {}
+      sub_key_id = _get_sub_key_id(
+          kv.key.sub_key) if kv.key.HasField('sub_key') else ''
+      plots_map[output_name][sub_key_id] = json_format.MessageToDict(kv.value)
+
+  return (
+      slicer.deserialize_slice_key(plots_for_slice.slice_key),  # pytype: disable=wrong-arg-types
+      plots_map)
 
 
 def load_and_deserialize_plots(
@@ -185,30 +222,506 @@ def load_and_deserialize_plots(
   """Returns deserialized plots loaded from given path."""
   result = []
   for record in tf.compat.v1.python_io.tf_record_iterator(path):
-    plots_for_slice = metrics_for_slice_pb2.PlotsForSlice.FromString(record)
-    plots_map = {}
-    if plots_for_slice.plots:
-      plot_dict = _convert_proto_map_to_dict(plots_for_slice.plots)
-      keys = list(plot_dict.keys())
-      # If there is only one label, choose it automatically.
-      plot_data = plot_dict[keys[0]] if len(keys) == 1 else plot_dict
-      plots_map[''] = {'': plot_data}
-    elif plots_for_slice.HasField('plot_data'):
-      plots_map[''] = {'': json_format.MessageToDict(plots_for_slice.plot_data)}
-
-    if plots_for_slice.plot_keys_and_values:
-      for kv in plots_for_slice.plot_keys_and_values:
-        output_name = kv.key.output_name
-        if output_name not in plots_map:
-          plots_map[output_name] = {}
-        sub_key_id = _get_sub_key_id(
-            kv.key.sub_key) if kv.key.HasField('sub_key') else ''
-        plots_map[output_name][sub_key_id] = json_format.MessageToDict(kv.value)
-
-    result.append((
-        slicer.deserialize_slice_key(plots_for_slice.slice_key),  # pytype: disable=wrong-arg-types
-        plots_map))
+    result.append(_deserialize_plots_for_slice(record))
+  return result
+
+
+# TFRecords are stored as: uint64 length, uint32 masked crc32 of length, data,
+# uint32 masked crc32 of data.
+_TFRECORD_HEADER_SIZE = 12
+_TFRECORD_FOOTER_SIZE = 4
+
+# Default max number of deserialized slices cached by LazySlicedResults.
+DEFAULT_LAZY_RESULTS_CACHE_SIZE = 1000
+
+# Tag of the slice_key field (field 1, length delimited) in both MetricsForSlice
+# and PlotsForSlice.
+_SLICE_KEY_TAG = b'\x0a'
+
+
+def _parse_slice_key(record: bytes) -> slicer.SliceKeyType:
+  """Parses only the slice key of a serialized MetricsForSlice/PlotsForSlice."""
+  # Fields are serialized in field number order, so if the slice key is set it
+  # is stored at the start of the record. This avoids parsing the (potentially
+  # large) metric and plot values just to build the index.
+  if record[:1] == _SLICE_KEY_TAG:
+    length, pos = 0, 1
+    shift = 0
+    while True:
+      byte = six.indexbytes(record, pos)
+      length |= (byte & 0x7f) << shift
+      pos += 1
+      shift += 7
+      if not byte & 0x80:
+        break
+    slice_key = metrics_for_slice_pb2.SliceKey.FromString(record[pos:pos +
+                                                                 length])
+  else:
+    slice_key = metrics_for_slice_pb2.MetricsForSlice.FromString(
+        record).slice_key
+  return slicer.deserialize_slice_key(slice_key)  # pytype: disable=wrong-arg-types
+
+
+class LazySlicedResults(object):
+  """List-like view of per slice results that are deserialized on demand.
+
+  When created, the records in the file are read once using the TFRecord reader
+  (which checks the length and data CRCs) to build an index from slice key to
+  record offset. Only the slice keys are parsed while indexing. The metrics or
+  plots for a slice are deserialized when they are requested using get or
+  find_slices and the most recently used cache_size slices are kept in memory,
+  so large results can be opened without holding every deserialized record in
+  memory. The file is opened for each request (and closed before it returns)
+  so that no file handle is held between requests; requests for multiple
+  slices read all of them using a single handle.
+
+  For backwards compatibility, the object can also be used like the list of
+  (slice key, results) tuples returned by load_and_deserialize_metrics and
+  load_and_deserialize_plots. Note that iterating over the object deserializes
+  every record.
+  """
+
+  def __init__(self,
+               path: Text,
+               deserialize_fn: Callable[[bytes], Tuple[slicer.SliceKeyType,
+                                                       Any]],
+               cache_size: int = DEFAULT_LAZY_RESULTS_CACHE_SIZE):
+    """Initializes the index.
+
+    Args:
+      path: Path to the (uncompressed) TFRecord file with serialized
+        MetricsForSlice or PlotsForSlice protos.
+      deserialize_fn: Function used to deserialize a record into a tuple of
+        (slice key, results).
+      cache_size: Max number of deserialized slices kept in memory.
+    """
+    self._path = path
+    self._deserialize_fn = deserialize_fn
+    self._cache_size = cache_size
+    self._slice_keys = []
+    self._offsets = []
+    self._lengths = []
+    self._index_by_slice_key = {}
+    self._indices_by_columns = {}
+    # Deserialized slices keyed by index (least recently used first).
+    self._cache = collections.OrderedDict()
+    self._build_index()
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_cache'] = collections.OrderedDict()
+    return state
+
+  def _build_index(self):
+    """Reads the records of the file and indexes them by slice key.
+
+    Raises:
+      ValueError: If the file contains the same slice key more than once.
+    """
+    offset = 0
+    # The record offsets are computed from the record lengths since the reader
+    # does not expose them.
+    for record in tf.compat.v1.python_io.tf_record_iterator(self._path):
+      slice_key = _parse_slice_key(record)
+      if slice_key in self._index_by_slice_key:
+        raise ValueError('duplicate slice key {} in {}'.format(
+            slicer.stringify_slice_key(slice_key), self._path))
+      index = len(self._slice_keys)
+      self._slice_keys.append(slice_key)
+      self._offsets.append(offset + _TFRECORD_HEADER_SIZE)
+      self._lengths.append(len(record))
+      self._index_by_slice_key[slice_key] = index
+      columns = frozenset(column for column, _ in slice_key)
+      self._indices_by_columns.setdefault(columns, []).append(index)
+      offset += _TFRECORD_HEADER_SIZE + len(record) + _TFRECORD_FOOTER_SIZE
+
+  def _read_record(self, f: Any, index: int) -> bytes:
+    f.seek(self._offsets[index])
+    record = f.read(self._lengths[index])
+    if len(record) != self._lengths[index]:
+      raise ValueError('truncated record {} in {} (was the file modified?)'
+                       .format(index, self._path))
+    return record
+
+  def _deserialize_all(
+      self,
+      indices: Iterable[int]) -> Iterator[Tuple[slicer.SliceKeyType, Any]]:
+    """Yields the deserialized slices at the given indices.
+
+    The file is only opened if a slice is not cached, and is closed once every
+    slice was yielded (or the iterator is discarded).
+
+    Args:
+      indices: Indices of the slices.
+    """
+    f = None
+    try:
+      for index in indices:
+        if index in self._cache:
+          self._cache[index] = self._cache.pop(index)  # Most recently used.
+          yield self._cache[index]
+          continue
+        if f is None:
+          f = tf.io.gfile.GFile(self._path, 'rb')
+        result = self._deserialize_fn(self._read_record(f, index))
+        if self._cache_size > 0:
+          self._cache[index] = result
+          while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        yield result
+    finally:
+      if f is not None:
+        f.close()
+
+  def _deserialize(self, index: int) -> Tuple[slicer.SliceKeyType, Any]:
+    return list(self._deserialize_all([index]))[0]
+
+  def slice_keys(self) -> List[slicer.SliceKeyType]:
+    """Returns the slice keys in the order they are stored."""
+    return list(self._slice_keys)
+
+  def records(self) -> Iterator[bytes]:
+    """Yields the serialized records (without deserializing them)."""
+    with tf.io.gfile.GFile(self._path, 'rb') as f:
+      for offset, length in zip(self._offsets, self._lengths):
+        f.seek(offset)
+        yield f.read(length)
+
+  def get(self, slice_key: slicer.SliceKeyType) -> Optional[Any]:
+    """Returns the results for the given slice key (or None if not found)."""
+    index = self._index_by_slice_key.get(slice_key)
+    if index is None:
+      return None
+    return self._deserialize(index)[1]
+
+  def find_slice_keys(
+      self, slicing_spec: slicer.SingleSliceSpec) -> List[slicer.SliceKeyType]:
+    """Returns the keys of the slices matching the given spec.
+
+    Unlike find_slices, none of the results are deserialized.
+
+    Args:
+      slicing_spec: Slicing spec to match.
+    """
+    candidates = self._indices_by_columns.get(slicing_spec.slice_columns(), [])
+    return [
+        self._slice_keys[i]
+        for i in candidates
+        if slicing_spec.is_slice_applicable(self._slice_keys[i])
+    ]
+
+  def find_slices(
+      self, slicing_spec: slicer.SingleSliceSpec
+  ) -> List[Tuple[slicer.SliceKeyType, Any]]:
+    """Returns the (slice key, results) for slices matching the given spec.
+
+    Only the slices with the same columns as the spec are checked, and only the
+    matching results are deserialized.
+
+    Args:
+      slicing_spec: Slicing spec to match.
+    """
+    candidates = self._indices_by_columns.get(slicing_spec.slice_columns(), [])
+    return list(
+        self._deserialize_all(
+            i for i in candidates
+            if slicing_spec.is_slice_applicable(self._slice_keys[i])))
+
+  def __len__(self) -> int:
+    return len(self._slice_keys)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return list(self._deserialize_all(range(len(self))[index]))
+    if index < 0:
+      index += len(self)
+    if index < 0 or index >= len(self):
+      raise IndexError('index out of range: {}'.format(index))
+    return self._deserialize(index)
+
+  def __iter__(self):
+    return self._deserialize_all(range(len(self)))
+
+
+def load_lazy_metrics(path: Text,
+                      model_name: Optional[Text] = None) -> LazySlicedResults:
+  """Returns an index of the metrics at the given location.
+
+  Same as load_and_deserialize_metrics except the metrics for each slice are
+  only deserialized when requested.
+
+  Args:
+    path: Path to metrics file.
+    model_name: Optional model name used to select metrics for multi-model
+      evaluations.
+  """
+  return LazySlicedResults(
+      path,
+      functools.partial(_deserialize_metrics_for_slice, model_name=model_name))
+
+
+def load_lazy_plots(path: Text) -> LazySlicedResults:
+  """Returns an index of the plots at the given location.
+
+  Same as load_and_deserialize_plots except the plots for each slice are only
+  deserialized when requested.
+
+  Args:
+    path: Path to plots file.
+  """
+  return LazySlicedResults(path, _deserialize_plots_for_slice)
+
+
+class _SliceColumns(object):
+  """Builds the slice columns of the columns returned by *_to_columns.
+
+  Each distinct slice key is stored once and rows refer to their slice key by
+  index so the slice columns can be expanded using a single gather per column.
+  """
+
+  def __init__(self):
+    self._slice_keys = []
+    self._slice_key_rows = []
+    self._column_names = collections.OrderedDict()
+
+  def add(self, slice_key_proto: metrics_for_slice_pb2.SliceKey):
+    slice_key = slicer.deserialize_slice_key(slice_key_proto)  # pytype: disable=wrong-arg-types
+    self._slice_keys.append(slice_key)
+    for column, _ in slice_key:
+      self._column_names[column] = True
+
+  def add_rows(self, num_rows: int):
+    """Adds rows for the most recently added slice key."""
+    self._slice_key_rows.extend([len(self._slice_keys) - 1] * num_rows)
 
+  def columns(self,
+              reserved_names: Iterable[Text]) -> Dict[Text, np.ndarray]:
+    """Returns the slice columns.
+
+    Args:
+      reserved_names: Names of the other columns. Slice columns with the same
+        name as one of these are prefixed with 'slice_'.
+    """
+    rows = np.array(self._slice_key_rows, dtype=np.int64)
+    result = collections.OrderedDict()
+    result['slice'] = np.array(
+        [slicer.stringify_slice_key(k) for k in self._slice_keys],
+        dtype=object)[rows]
+    reserved_names = set(reserved_names) | set(['slice'])
+    for column in self._column_names:
+      values = np.array([dict(k).get(column) for k in self._slice_keys],
+                        dtype=object)
+      name = 'slice_' + column if column in reserved_names else column
+      result[name] = values[rows]
+    return result
+
+
+def _append_metric_value(columns: Dict[Text, List[Any]],
+                         value: metrics_for_slice_pb2.MetricValue) -> bool:
+  """Appends value and bounds of a scalar metric (returns False if skipped)."""
+  value_type = value.WhichOneof('type')
+  lower_bound, upper_bound = float('nan'), float('nan')
+  if value_type == 'double_value':
+    point_estimate = value.double_value.value
+  elif value_type == 'bounded_value':
+    point_estimate = value.bounded_value.value.value
+    lower_bound = value.bounded_value.lower_bound.value
+    upper_bound = value.bounded_value.upper_bound.value
+  elif value_type == 't_distribution_value':
+    point_estimate = value.t_distribution_value.unsampled_value.value
+  else:
+    return False
+  columns['value'].append(point_estimate)
+  columns['lower_bound'].append(lower_bound)
+  columns['upper_bound'].append(upper_bound)
+  return True
+
+
+_METRIC_KEY_COLUMNS = ('model_name', 'output_name', 'sub_key', 'metric_name',
+                       'is_diff')
+_METRIC_VALUE_COLUMNS = ('value', 'lower_bound', 'upper_bound')
+
+
+def metrics_to_columns(
+    records: Iterable[bytes],
+    metric_names: Optional[Iterable[Text]] = None,
+    model_name: Optional[Text] = None) -> Dict[Text, np.ndarray]:
+  """Converts serialized MetricsForSlice protos into columns.
+
+  The protos are read directly (unlike load_and_deserialize_metrics the
+  metrics are not converted to nested dicts). Each row holds a single scalar
+  metric (double, bounded, or t-distribution value) for a given slice and
+  metric key. Non-scalar metrics (e.g. confusion matrices) are skipped.
+
+  Args:
+    records: Serialized MetricsForSlice protos.
+    metric_names: Optional names of the metrics to load. Defaults to all.
+    model_name: Optional model name. If set, only the metrics of that model
+      (and the model independent metrics such as example_count) are loaded.
+
+  Returns:
+    Columns keyed by name. The columns are 'slice' (stringified slice key),
+    one column per slice feature (None if the slice does not use the
+    feature), 'model_name', 'output_name', 'sub_key', 'metric_name',
+    'is_diff', 'value', 'lower_bound', and 'upper_bound' (NaN if not
+    bounded).
+  """
+  if metric_names is not None:
+    metric_names = frozenset(metric_names)
+  slice_columns = _SliceColumns()
+  columns = collections.OrderedDict(
+      (name, []) for name in _METRIC_KEY_COLUMNS + _METRIC_VALUE_COLUMNS)
+  for record in records:
+    metrics_for_slice = metrics_for_slice_pb2.MetricsForSlice.FromString(
+        record)
+    slice_columns.add(metrics_for_slice.slice_key)
+    num_rows = 0
+    for kv in metrics_for_slice.metric_keys_and_values:
+      key = kv.key
+      if metric_names is not None and key.name not in metric_names:
+        continue
+      if model_name is not None and key.model_name not in (model_name, ''):
+        continue
+      if not _append_metric_value(columns, kv.value):
+        continue
+      columns['model_name'].append(key.model_name)
+      columns['output_name'].append(key.output_name)
+      columns['sub_key'].append(
+          _get_sub_key_id(key.sub_key) if key.HasField('sub_key') else '')
+      columns['metric_name'].append(key.name)
+      columns['is_diff'].append(key.is_diff)
+      num_rows += 1
+    # Metrics stored using the deprecated string keyed map.
+    for name in sorted(metrics_for_slice.metrics):
+      if metric_names is not None and name not in metric_names:
+        continue
+      if not _append_metric_value(columns, metrics_for_slice.metrics[name]):
+        continue
+      columns['model_name'].append('')
+      columns['output_name'].append('')
+      columns['sub_key'].append('')
+      columns['metric_name'].append(name)
+      columns['is_diff'].append(False)
+      num_rows += 1
+    slice_columns.add_rows(num_rows)
+
+  result = slice_columns.columns(columns.keys())
+  for name in ('model_name', 'output_name', 'sub_key', 'metric_name'):
+    result[name] = np.array(columns[name], dtype=object)
+  result['is_diff'] = np.array(columns['is_diff'], dtype=bool)
+  for name in _METRIC_VALUE_COLUMNS:
+    result[name] = np.array(columns[name], dtype=np.float64)
+  return result
+
+
+# Plot types supported by plots_to_columns keyed by PlotData field name. The
+# values are the name of the repeated field holding the points, the name of the
+# repeated field holding the entries of each point (for plots with multiple
+# rows per threshold), and the names of the fields stored as columns.
+_PLOT_COLUMNS = {
+    'calibration_histogram_buckets':
+        ('buckets', None,
+         ('lower_threshold_inclusive', 'upper_threshold_exclusive',
+          'num_weighted_examples', 'total_weighted_label',
+          'total_weighted_refined_prediction')),
+    'confusion_matrix_at_thresholds':
+        ('matrices', None,
+         ('threshold', 'false_negatives', 'true_negatives', 'false_positives',
+          'true_positives', 'precision', 'recall')),
+    'multi_class_confusion_matrix_at_thresholds':
+        ('matrices', 'entries',
+         ('actual_class_id', 'predicted_class_id', 'num_weighted_examples')),
+    'multi_label_confusion_matrix_at_thresholds':
+        ('matrices', 'entries',
+         ('actual_class_id', 'predicted_class_id', 'false_negatives',
+          'true_negatives', 'false_positives', 'true_positives')),
+}
+
+
+def _plot_field_values(points: Any, field: Text) -> List[float]:
+  values = [getattr(point, field) for point in points]
+  # Wrapped values (e.g. google.protobuf.DoubleValue) are unwrapped.
+  if values and hasattr(values[0], 'value'):
+    values = [value.value for value in values]
+  return values
+
+
+def plots_to_columns(records: Iterable[bytes],
+                     plot_type: Text) -> Dict[Text, np.ndarray]:
+  """Converts serialized PlotsForSlice protos into columns.
+
+  Each row holds a single point of a plot (e.g. a threshold of a confusion
+  matrix plot or a bucket of a calibration plot).
+
+  Args:
+    records: Serialized PlotsForSlice protos.
+    plot_type: Name of the PlotData field to load:
+      'calibration_histogram_buckets', 'confusion_matrix_at_thresholds',
+      'multi_class_confusion_matrix_at_thresholds', or
+      'multi_label_confusion_matrix_at_thresholds'.
+
+  Returns:
+    Columns keyed by name. The columns are 'slice' (stringified slice key),
+    one column per slice feature, 'model_name', 'output_name', 'sub_key', and
+    the fields of the plot points (plus 'threshold' for multi-class and
+    multi-label confusion matrices).
+
+  Raises:
+    ValueError: If the plot type is not supported.
+  """
+  if plot_type not in _PLOT_COLUMNS:
+    raise ValueError('unsupported plot_type: {}. Supported plot types are: '
+                     '{}'.format(plot_type, sorted(_PLOT_COLUMNS.keys())))
+  points_field, entries_field, fields = _PLOT_COLUMNS[plot_type]
+  if entries_field:
+    fields = ('threshold',) + fields
+  slice_columns = _SliceColumns()
+  key_columns = collections.OrderedDict(
+      (name, []) for name in ('model_name', 'output_name', 'sub_key'))
+  value_columns = collections.OrderedDict((name, []) for name in fields)
+
+  def append_plot(model_name, output_name, sub_key, plot_data):
+    if not plot_data.HasField(plot_type):
+      return 0
+    points = getattr(getattr(plot_data, plot_type), points_field)
+    if entries_field:
+      thresholds = []
+      entries = []
+      for point in points:
+        point_entries = getattr(point, entries_field)
+        thresholds.extend([point.threshold] * len(point_entries))
+        entries.extend(point_entries)
+      value_columns['threshold'].extend(thresholds)
+      points = entries
+    for field in fields[1:] if entries_field else fields:
+      value_columns[field].extend(_plot_field_values(points, field))
+    key_columns['model_name'].extend([model_name] * len(points))
+    key_columns['output_name'].extend([output_name] * len(points))
+    key_columns['sub_key'].extend([sub_key] * len(points))
+    return len(points)
+
+  for record in records:
+    plots_for_slice = metrics_for_slice_pb2.PlotsForSlice.FromString(record)
+    slice_columns.add(plots_for_slice.slice_key)
+    num_rows = 0
+    for kv in plots_for_slice.plot_keys_and_values:
+      num_rows += append_plot(
+          kv.key.model_name, kv.key.output_name,
+          _get_sub_key_id(kv.key.sub_key)
+          if kv.key.HasField('sub_key') else '', kv.value)
+    # Plots stored using the deprecated fields.
+    if plots_for_slice.HasField('plot_data'):
+      num_rows += append_plot('', '', '', plots_for_slice.plot_data)
+    for name in sorted(plots_for_slice.plots):
+      num_rows += append_plot('', name, '', plots_for_slice.plots[name])
+    slice_columns.add_rows(num_rows)
+
+  result = slice_columns.columns(
+      list(key_columns.keys()) + list(value_columns.keys()))
+  for name, values in key_columns.items():
+    result[name] = np.array(values, dtype=object)
+  for name, values in value_columns.items():
+    result[name] = np.array(values, dtype=np.float64)
   return result
 
 
@@ -307,15 +820,25 @@ def convert_slice_metrics(
       metrics_for_slice.metrics[key].CopyFrom(metric_value)
 
 
+def _convert_window(window: Optional[beam.window.BoundedWindow],
+                    time_window: metrics_for_slice_pb2.TimeWindow):
+  """Converts the given Beam window into the given TimeWindow proto."""
+  if isinstance(window, beam.window.IntervalWindow):
+    time_window.start_micros = window.start.micros
+    time_window.end_micros = window.end.micros
+
+
 def _serialize_metrics(
     metrics: Tuple[slicer.SliceKeyType, Dict[Any, Any]],
-    add_metrics_callbacks: List[types.AddMetricsCallbackType]) -> bytes:
+    add_metrics_callbacks: List[types.AddMetricsCallbackType],
+    window: Optional[beam.window.BoundedWindow] = None) -> bytes:
   """Converts the given slice metrics into serialized proto MetricsForSlice.
 
   Args:
     metrics: The slice metrics.
     add_metrics_callbacks: A list of metric callbacks. This should be the same
       list as the one passed to tfma.Evaluate().
+    window: Optional window the metrics were computed over.
 
   Returns:
     The serialized proto MetricsForSlice.
@@ -333,12 +856,14 @@ def _serialize_metrics(
                                  slice_metrics[metric_keys.ERROR_METRIC])
     metrics = metrics_for_slice_pb2.MetricsForSlice()
     metrics.slice_key.CopyFrom(slicer.serialize_slice_key(slice_key))
+    _convert_window(window, metrics.window)
     metrics.metrics[metric_keys.ERROR_METRIC].debug_message = slice_metrics[
         metric_keys.ERROR_METRIC]
     return metrics.SerializeToString()
 
   # Convert the slice key.
   result.slice_key.CopyFrom(slicer.serialize_slice_key(slice_key))
+  _convert_window(window, result.window)
 
   # Convert the slice metrics.
   convert_slice_metrics(slice_key, slice_metrics, add_metrics_callbacks, result)
@@ -402,15 +927,25 @@ def _convert_slice_plots(
             ]))
 
 
+def _serialize_metrics_with_window(
+    metrics: Tuple[slicer.SliceKeyType, Dict[Any, Any]],
+    add_metrics_callbacks: List[types.AddMetricsCallbackType],
+    window=beam.DoFn.WindowParam) -> bytes:
+  """Same as _serialize_metrics, but includes the bounds of the window."""
+  return _serialize_metrics(metrics, add_metrics_callbacks, window=window)
+
+
 def _serialize_plots(
     plots: Tuple[slicer.SliceKeyType, Dict[Any, Any]],
-    add_metrics_callbacks: List[types.AddMetricsCallbackType]) -> bytes:
+    add_metrics_callbacks: List[types.AddMetricsCallbackType],
+    window: Optional[beam.window.BoundedWindow] = None) -> bytes:
   """Converts the given slice plots into serialized proto PlotsForSlice..
 
   Args:
     plots: The slice plots.
     add_metrics_callbacks: A list of metric callbacks. This should be the same
       list as the one passed to tfma.Evaluate().
+    window: Optional window the plots were computed over.
 
   Returns:
     The serialized proto PlotsForSlice.
@@ -424,12 +959,14 @@ def _serialize_plots(
                                  slice_plots[metric_keys.ERROR_METRIC])
     metrics = metrics_for_slice_pb2.PlotsForSlice()
     metrics.slice_key.CopyFrom(slicer.serialize_slice_key(slice_key))
+    _convert_window(window, metrics.window)
     metrics.plots[metric_keys.ERROR_METRIC].debug_message = slice_plots[
         metric_keys.ERROR_METRIC]
     return metrics.SerializeToString()
 
   # Convert the slice key.
   result.slice_key.CopyFrom(slicer.serialize_slice_key(slice_key))
+  _convert_window(window, result.window)
 
   # Convert the slice plots.
   _convert_slice_plots(slice_plots, add_metrics_callbacks, result)  # pytype: disable=wrong-arg-types
@@ -437,11 +974,71 @@ def _serialize_plots(
   return result.SerializeToString()
 
 
+def _serialize_plots_with_window(
+    plots: Tuple[slicer.SliceKeyType, Dict[Any, Any]],
+    add_metrics_callbacks: List[types.AddMetricsCallbackType],
+    window=beam.DoFn.WindowParam) -> bytes:
+  """Same as _serialize_plots, but includes the bounds of the window."""
+  return _serialize_plots(plots, add_metrics_callbacks, window=window)
+
+
+def _serialize_calibration_histograms(
+    histograms: Tuple[slicer.SliceKeyType,
+                      Dict[metric_types.MetricKey,
+                           metrics_for_slice_pb2.CalibrationHistogramBuckets]],
+    window: Optional[beam.window.BoundedWindow] = None) -> bytes:
+  """Converts slice histograms into serialized CalibrationHistogramsForSlice."""
+  slice_key, slice_histograms = histograms
+  result = metrics_for_slice_pb2.CalibrationHistogramsForSlice()
+  result.slice_key.CopyFrom(slicer.serialize_slice_key(slice_key))
+  _convert_window(window, result.window)
+  for key in sorted(slice_histograms.keys()):
+    key_and_value = result.histogram_keys_and_values.add()
+    # PlotKey.to_proto drops the name, so the MetricKey conversion is used.
+    key_and_value.key.CopyFrom(metric_types.MetricKey.to_proto(key))
+    key_and_value.value.CopyFrom(slice_histograms[key])
+  return result.SerializeToString()
+
+
+def _serialize_calibration_histograms_with_window(
+    histograms: Tuple[slicer.SliceKeyType,
+                      Dict[metric_types.MetricKey,
+                           metrics_for_slice_pb2.CalibrationHistogramBuckets]],
+    window=beam.DoFn.WindowParam) -> bytes:
+  """Same as _serialize_calibration_histograms, but includes the window."""
+  return _serialize_calibration_histograms(histograms, window=window)
+
+
+def load_and_deserialize_calibration_histograms(
+    file_pattern: Text
+) -> List[Tuple[slicer.SliceKeyType,
+                Dict[metric_types.PlotKey,
+                     metrics_for_slice_pb2.CalibrationHistogramBuckets]]]:
+  """Returns histograms loaded from files matching the given pattern."""
+  result = []
+  for path in tf.io.gfile.glob(file_pattern):
+    for record in tf.compat.v1.python_io.tf_record_iterator(path):
+      histograms_for_slice = (
+          metrics_for_slice_pb2.CalibrationHistogramsForSlice.FromString(
+              record))
+      histograms = {}
+      for kv in histograms_for_slice.histogram_keys_and_values:
+        histograms[metric_types.PlotKey(
+            *metric_types.MetricKey.from_proto(kv.key))] = kv.value
+      result.append(
+          (slicer.deserialize_slice_key(histograms_for_slice.slice_key),  # pytype: disable=wrong-arg-types
+           histograms))
+  return result
+
+
 class SerializeMetrics(beam.PTransform):  # pylint: disable=invalid-name
   """Converts metrics to serialized protos."""
 
-  def __init__(self, add_metrics_callbacks: List[types.AddMetricsCallbackType]):
+  def __init__(self,
+               add_metrics_callbacks: List[types.AddMetricsCallbackType],
+               include_window: bool = False):
     self._add_metrics_callbacks = add_metrics_callbacks
+    self._include_window = include_window
 
   def expand(self, metrics: beam.pvalue.PCollection):
     """Converts the given metrics into serialized proto.
@@ -453,15 +1050,20 @@ class SerializeMetrics(beam.PTransform):  # pylint: disable=invalid-name
       PCollection of serialized proto MetricsForSlice.
     """
     metrics = metrics | 'SerializeMetrics' >> beam.Map(
-        _serialize_metrics, add_metrics_callbacks=self._add_metrics_callbacks)
+        _serialize_metrics_with_window
+        if self._include_window else _serialize_metrics,
+        add_metrics_callbacks=self._add_metrics_callbacks)
     return metrics
 
 
 class SerializePlots(beam.PTransform):  # pylint: disable=invalid-name
   """Converts plots serialized protos."""
 
-  def __init__(self, add_metrics_callbacks: List[types.AddMetricsCallbackType]):
+  def __init__(self,
+               add_metrics_callbacks: List[types.AddMetricsCallbackType],
+               include_window: bool = False):
     self._add_metrics_callbacks = add_metrics_callbacks
+    self._include_window = include_window
 
   def expand(self, plots: beam.pvalue.PCollection):
     """Converts the given plots into serialized proto.
@@ -473,10 +1075,32 @@ class SerializePlots(beam.PTransform):  # pylint: disable=invalid-name
       PCollection of serialized proto MetricsForSlice.
     """
     plots = plots | 'SerializePlots' >> beam.Map(
-        _serialize_plots, add_metrics_callbacks=self._add_metrics_callbacks)
+        _serialize_plots_with_window
+        if self._include_window else _serialize_plots,
+        add_metrics_callbacks=self._add_metrics_callbacks)
     return plots
 
 
+class SerializeCalibrationHistograms(beam.PTransform):  # pylint: disable=invalid-name
+  """Converts calibration histograms to serialized protos."""
+
+  def __init__(self, include_window: bool = False):
+    self._include_window = include_window
+
+  def expand(self, histograms: beam.pvalue.PCollection):
+    """Converts the given histograms into serialized proto.
+
+    Args:
+      histograms: PCollection of (slice key, dict of histogram protos).
+
+    Returns:
+      PCollection of serialized proto CalibrationHistogramsForSlice.
+    """
+    return histograms | 'SerializeCalibrationHistograms' >> beam.Map(
+        _serialize_calibration_histograms_with_window
+        if self._include_window else _serialize_calibration_histograms)
+
+
 # No typehint for input or output, since it's a multi-output DoFn result that
 # Beam doesn't support typehints for yet (BEAM-3280).
 class SerializeMetricsAndPlots(beam.PTransform):  # pylint: disable=invalid-name
@@ -17,6 +17,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
 import string
 
 # Standard Imports
@@ -806,6 +807,240 @@ class EvaluateMetricsAndPlotsTest(testutil.TensorflowModelAnalysisTest):
         expected_metrics_for_slice,
         metrics_for_slice_pb2.MetricsForSlice.FromString(got))
 
+  def testLazySlicedResults(self):
+    path = os.path.join(self._getTempDir(), 'metrics')
+    slice_keys = [(), (('age', 5),), (('age', 6),),
+                  (('age', 5), ('language', 'english'))]
+    with tf.io.TFRecordWriter(path) as writer:
+      for i, slice_key in enumerate(slice_keys):
+        writer.write(
+            metrics_and_plots_serialization._serialize_metrics(
+                (slice_key, {
+                    metric_types.MetricKey(name='example_count'): i
+                }), []))
+
+    expected = metrics_and_plots_serialization.load_and_deserialize_metrics(
+        path)
+    got = metrics_and_plots_serialization.load_lazy_metrics(path)
+
+    self.assertLen(got, 4)
+    self.assertEqual(slice_keys, got.slice_keys())
+    self.assertEqual(expected, list(got))
+    self.assertEqual(expected[1], got[1])
+    self.assertEqual(expected[-1], got[-1])
+    self.assertEqual(expected[1:3], got[1:3])
+    self.assertEqual(expected[2][1], got.get((('age', 6),)))
+    self.assertIsNone(got.get((('age', 7),)))
+    self.assertEqual([expected[1], expected[2]],
+                     got.find_slices(slicer.SingleSliceSpec(columns=['age'])))
+    self.assertEqual([expected[3]],
+                     got.find_slices(
+                         slicer.SingleSliceSpec(
+                             columns=['language'], features=[('age', 5)])))
+    self.assertEqual([expected[0]], got.find_slices(slicer.SingleSliceSpec()))
+    self.assertEqual([(('age', 5),), (('age', 6),)],
+                     got.find_slice_keys(
+                         slicer.SingleSliceSpec(columns=['age'])))
+    with self.assertRaises(IndexError):
+      got[4]  # pylint: disable=pointless-statement
+    self.assertEqual(
+        slice_keys,
+        [metrics_and_plots_serialization._parse_slice_key(r)
+         for r in got.records()])
+
+  def testLazySlicedResultsCacheIsBounded(self):
+    path = os.path.join(self._getTempDir(), 'metrics')
+    with tf.io.TFRecordWriter(path) as writer:
+      for i in range(5):
+        writer.write(
+            metrics_and_plots_serialization._serialize_metrics(
+                ((('age', i),), {
+                    metric_types.MetricKey(name='example_count'): i
+                }), []))
+
+    got = metrics_and_plots_serialization.LazySlicedResults(
+        path,
+        metrics_and_plots_serialization._deserialize_metrics_for_slice,
+        cache_size=2)
+    expected = metrics_and_plots_serialization.load_and_deserialize_metrics(
+        path)
+    self.assertEqual(expected, list(got))
+    self.assertLen(got._cache, 2)
+    self.assertEqual([3, 4], list(got._cache.keys()))
+    self.assertEqual(expected[3], got[3])
+    self.assertEqual([4, 3], list(got._cache.keys()))
+
+  def testLazySlicedResultsRaisesErrorOnDuplicateSliceKey(self):
+    path = os.path.join(self._getTempDir(), 'metrics')
+    with tf.io.TFRecordWriter(path) as writer:
+      for i in range(2):
+        writer.write(
+            metrics_and_plots_serialization._serialize_metrics(
+                ((('age', 1),), {
+                    metric_types.MetricKey(name='example_count'): i
+                }), []))
+
+    with self.assertRaisesRegexp(ValueError, 'duplicate slice key age:1'):
+      metrics_and_plots_serialization.load_lazy_metrics(path)
+
+  def testLazySlicedResultsRaisesErrorOnCorruptRecord(self):
+    path = os.path.join(self._getTempDir(), 'metrics')
+    with tf.io.TFRecordWriter(path) as writer:
+      writer.write(
+          metrics_and_plots_serialization._serialize_metrics(
+              ((('age', 1),), {
+                  metric_types.MetricKey(name='example_count'): 1
+              }), []))
+    with tf.io.gfile.GFile(path, 'rb') as f:
+      data = bytearray(f.read())
+    # Flip a bit of the last data byte (the data CRC no longer matches).
+    data[-5] ^= 1
+    with tf.io.gfile.GFile(path, 'wb') as f:
+      f.write(bytes(data))
+
+    with self.assertRaises(tf.errors.DataLossError):
+      metrics_and_plots_serialization.load_lazy_metrics(path)
+
+  def testMetricsToColumns(self):
+    records = [
+        text_format.Parse(
+            """
+            metric_keys_and_values {
+              key { name: "example_count" }
+              value { double_value { value: 3.0 } }
+            }
+            metric_keys_and_values {
+              key { name: "auc" model_name: "candidate" }
+              value {
+                bounded_value {
+                  value { value: 0.8 }
+                  lower_bound { value: 0.7 }
+                  upper_bound { value: 0.9 }
+                }
+              }
+            }
+            metric_keys_and_values {
+              key { name: "auc" model_name: "baseline" }
+              value { double_value { value: 0.6 } }
+            }
+            metric_keys_and_values {
+              key { name: "confusion_matrix" }
+              value { confusion_matrix_at_thresholds {} }
+            }
+            """, metrics_for_slice_pb2.MetricsForSlice()).SerializeToString(),
+        text_format.Parse(
+            """
+            slice_key {
+              single_slice_keys { column: "age" int64_value: 5 }
+            }
+            metric_keys_and_values {
+              key {
+                name: "auc"
+                model_name: "candidate"
+                sub_key { class_id { value: 1 } }
+                is_diff: true
+              }
+              value { double_value { value: 0.1 } }
+            }
+            """, metrics_for_slice_pb2.MetricsForSlice()).SerializeToString(),
+    ]
+
+    got = metrics_and_plots_serialization.metrics_to_columns(records)
+    self.assertEqual([
+        'slice', 'age', 'model_name', 'output_name', 'sub_key', 'metric_name',
+        'is_diff', 'value', 'lower_bound', 'upper_bound'
+    ], list(got.keys()))
+    self.assertEqual(['Overall', 'Overall', 'Overall', 'age:5'],
+                     list(got['slice']))
+    self.assertEqual([None, None, None, 5], list(got['age']))
+    self.assertEqual(['', 'candidate', 'baseline', 'candidate'],
+                     list(got['model_name']))
+    self.assertEqual(['', '', '', 'classId:1'], list(got['sub_key']))
+    self.assertEqual(['example_count', 'auc', 'auc', 'auc'],
+                     list(got['metric_name']))
+    self.assertEqual([False, False, False, True], list(got['is_diff']))
+    np.testing.assert_allclose([3.0, 0.8, 0.6, 0.1], got['value'])
+    np.testing.assert_allclose([np.nan, 0.7, np.nan, np.nan],
+                               got['lower_bound'])
+    np.testing.assert_allclose([np.nan, 0.9, np.nan, np.nan],
+                               got['upper_bound'])
+
+    got = metrics_and_plots_serialization.metrics_to_columns(
+        records, metric_names=['auc'], model_name='candidate')
+    self.assertEqual(['Overall', 'age:5'], list(got['slice']))
+    np.testing.assert_allclose([0.8, 0.1], got['value'])
+
+  def testPlotsToColumns(self):
+    records = [
+        text_format.Parse(
+            """
+            slice_key {
+              single_slice_keys { column: "value" bytes_value: "x" }
+            }
+            plot_keys_and_values {
+              key { output_name: "head" }
+              value {
+                confusion_matrix_at_thresholds {
+                  matrices { threshold: 0.25 true_positives: 2.0 }
+                  matrices { threshold: 0.75 true_positives: 1.0 }
+                }
+                calibration_histogram_buckets {
+                  buckets {
+                    lower_threshold_inclusive: 0.0
+                    upper_threshold_exclusive: 0.5
+                    num_weighted_examples { value: 3.0 }
+                  }
+                }
+              }
+            }
+            """, metrics_for_slice_pb2.PlotsForSlice()).SerializeToString(),
+        text_format.Parse(
+            """
+            plot_keys_and_values {
+              key {}
+              value {
+                multi_class_confusion_matrix_at_thresholds {
+                  matrices {
+                    threshold: 0.5
+                    entries {
+                      actual_class_id: 0
+                      predicted_class_id: 1
+                      num_weighted_examples: 2.0
+                    }
+                    entries {
+                      actual_class_id: 1
+                      predicted_class_id: 1
+                      num_weighted_examples: 3.0
+                    }
+                  }
+                }
+              }
+            }
+            """, metrics_for_slice_pb2.PlotsForSlice()).SerializeToString(),
+    ]
+
+    got = metrics_and_plots_serialization.plots_to_columns(
+        records, 'confusion_matrix_at_thresholds')
+    self.assertEqual(['value:x', 'value:x'], list(got['slice']))
+    self.assertEqual(['x', 'x'], list(got['value']))
+    self.assertEqual(['head', 'head'], list(got['output_name']))
+    np.testing.assert_allclose([0.25, 0.75], got['threshold'])
+    np.testing.assert_allclose([2.0, 1.0], got['true_positives'])
+
+    got = metrics_and_plots_serialization.plots_to_columns(
+        records, 'calibration_histogram_buckets')
+    np.testing.assert_allclose([3.0], got['num_weighted_examples'])
+
+    got = metrics_and_plots_serialization.plots_to_columns(
+        records, 'multi_class_confusion_matrix_at_thresholds')
+    self.assertEqual(['Overall', 'Overall'], list(got['slice']))
+    np.testing.assert_allclose([0.5, 0.5], got['threshold'])
+    np.testing.assert_allclose([0, 1], got['actual_class_id'])
+    np.testing.assert_allclose([2.0, 3.0], got['num_weighted_examples'])
+
+    with self.assertRaises(ValueError):
+      metrics_and_plots_serialization.plots_to_columns(records, 'unknown')
+
 
 if __name__ == '__main__':
   tf.test.main()
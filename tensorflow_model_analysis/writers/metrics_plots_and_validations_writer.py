@@ -19,31 +19,57 @@ from __future__ import division
 # Standard __future__ imports
 from __future__ import print_function
 
-from typing import Dict, Optional, List, Text
+from typing import Callable, Dict, Iterable, Optional, List, Text, Tuple
 
 import apache_beam as beam
+from apache_beam.io import fileio
+from apache_beam.io import tfrecordio
 from tensorflow_model_analysis import constants
 from tensorflow_model_analysis import types
 from tensorflow_model_analysis.evaluators import evaluator
+from tensorflow_model_analysis.proto import metrics_for_slice_pb2
 from tensorflow_model_analysis.proto import validation_result_pb2
 from tensorflow_model_analysis.writers import metrics_and_plots_serialization
 from tensorflow_model_analysis.writers import writer
 
+# Default max number of validation failures per metric kept in the
+# ValidationResult (see Options.max_validation_failures_per_metric).
+DEFAULT_MAX_VALIDATION_FAILURES_PER_METRIC = 100
+
 
 def MetricsPlotsAndValidationsWriter(
     output_paths: Dict[Text, Text],
     add_metrics_callbacks: List[types.AddMetricsCallbackType],
     metrics_key: Text = constants.METRICS_KEY,
     plots_key: Text = constants.PLOTS_KEY,
-    validations_key: Text = constants.VALIDATIONS_KEY) -> writer.Writer:
+    validations_key: Text = constants.VALIDATIONS_KEY,
+    accumulators_key: Text = constants.ACCUMULATORS_KEY,
+    calibration_histograms_key: Text = constants.CALIBRATION_HISTOGRAMS_KEY,
+    windowed: bool = False,
+    max_validation_failures_per_metric: int = (
+        DEFAULT_MAX_VALIDATION_FAILURES_PER_METRIC)
+) -> writer.Writer:
   """Returns metrics and plots writer.
 
   Args:
     output_paths: Output paths keyed by output key (e.g. 'metrics', 'plots').
+      If windowed is True, the paths are used as directories.
     add_metrics_callbacks: Optional list of metric callbacks (if used).
     metrics_key: Name to use for metrics key in Evaluation output.
     plots_key: Name to use for plots key in Evaluation output.
     validations_key: Name to use for validations key in Evaluation output.
+    accumulators_key: Name to use for accumulators key in Evaluation output.
+    calibration_histograms_key: Name to use for calibration histograms key in
+      Evaluation output.
+    windowed: True if the evaluation was computed using event-time windows (see
+      tfma.WindowingSpec). In this case the outputs are written to separate
+      files per window and the window bounds are stored with each
+      MetricsForSlice and PlotsForSlice. Windowed writes also support unbounded
+      PCollections.
+    max_validation_failures_per_metric: Max number of failures per metric
+      (across all slices) stored in the ValidationResult. If the output paths
+      contain a 'validation_failures' path, the complete list of failures is
+      written there (one MetricsValidationForSlice per failing slice).
   """
   return writer.Writer(
       stage_name='WriteMetricsAndPlots',
@@ -52,7 +78,65 @@ def MetricsPlotsAndValidationsWriter(
           add_metrics_callbacks=add_metrics_callbacks,
           metrics_key=metrics_key,
           plots_key=plots_key,
-          validations_key=validations_key))
+          validations_key=validations_key,
+          accumulators_key=accumulators_key,
+          calibration_histograms_key=calibration_histograms_key,
+          windowed=windowed,
+          max_validation_failures_per_metric=max_validation_failures_per_metric
+      ))
+
+
+def MetricsCallbackWriter(
+    callback: Callable[[metrics_for_slice_pb2.MetricsForSlice], None],
+    add_metrics_callbacks: Optional[List[types.AddMetricsCallbackType]] = None,
+    metrics_key: Text = constants.METRICS_KEY) -> writer.Writer:
+  """Returns a writer that passes the metrics to a callback.
+
+  The callback is called with one MetricsForSlice per slice (and per window if
+  the evaluation is windowed). The callback is called from within the pipeline
+  workers, so this writer is mostly useful for in-process runners (e.g. for
+  tests or monitoring when using the DirectRunner).
+
+  Args:
+    callback: Function called with each MetricsForSlice.
+    add_metrics_callbacks: Optional list of metric callbacks (if used).
+    metrics_key: Name to use for metrics key in Evaluation output.
+  """
+  return writer.Writer(
+      stage_name='WriteMetricsToCallback',
+      ptransform=_WriteMetricsToCallback(  # pylint: disable=no-value-for-parameter
+          callback=callback,
+          add_metrics_callbacks=add_metrics_callbacks or [],
+          metrics_key=metrics_key))
+
+
+class _TFRecordSink(fileio.FileSink):
+  """File sink for writing serialized protos as TFRecords."""
+
+  def open(self, fh):
+    self._fh = fh
+
+  def write(self, record: bytes):
+    tfrecordio._TFRecordUtil.write_record(self._fh, record)  # pylint: disable=protected-access
+
+  def flush(self):
+    self._fh.flush()
+
+
+def _WriteToWindowedTFRecords(  # pylint: disable=invalid-name
+    path: Text, prefix: Text) -> beam.PTransform:
+  """Returns PTransform writing serialized protos to TFRecord files per window.
+
+  Args:
+    path: Output directory.
+    prefix: Prefix for file names. The window, pane, and shard are added to
+      the name of each file.
+  """
+  return fileio.WriteToFiles(
+      path=path,
+      file_naming=fileio.default_file_naming(prefix=prefix, suffix='.tfrecord'),
+      sink=lambda _: _TFRecordSink(),
+      shards=1)
 
 
 def _SerializeValidations(
@@ -78,52 +162,121 @@ class SerializeValidations(beam.PTransform):  # pylint: disable=invalid-name
     return validations
 
 
+class _ValidationsAccumulator(object):
+  """Accumulator for _CombineValidations.
+
+  The slice keys, metric keys, and failures are stored serialized so that the
+  accumulator is cheap to encode and merge.
+  """
+
+  __slots__ = [
+      'validation_ok', 'num_failing_slices', 'failure_counts', 'samples',
+      'sample_counts'
+  ]
+
+  def __init__(self):
+    # None until the first ValidationResult is added.
+    self.validation_ok = None  # type: Optional[bool]
+    self.num_failing_slices = 0
+    # Number of failures keyed by serialized MetricKey.
+    self.failure_counts = {}  # type: Dict[bytes, int]
+    # Sampled failures stored as (slice_key, metric_key, failure) tuples.
+    self.samples = []  # type: List[Tuple[bytes, bytes, bytes]]
+    # Number of sampled failures keyed by serialized MetricKey.
+    self.sample_counts = {}  # type: Dict[bytes, int]
+
+
 @beam.typehints.with_input_types(validation_result_pb2.ValidationResult)
 @beam.typehints.with_output_types(validation_result_pb2.ValidationResult)
 class _CombineValidations(beam.CombineFn):
   """Combines the ValidationResults protos.
 
   Combines PCollection of ValidationResults for different metrics and slices.
+  Only the overall result, the failure counts, and at most
+  max_failures_per_metric failures per metric are kept so that the size of the
+  accumulator does not grow with the number of failing slices. The complete
+  list of failures is written to the validation failures output instead.
   """
 
-  def create_accumulator(self) -> None:
-    return
+  def __init__(self, max_failures_per_metric: int):
+    self._max_failures_per_metric = max_failures_per_metric
+
+  def create_accumulator(self) -> _ValidationsAccumulator:
+    return _ValidationsAccumulator()
+
+  def _add_sample(self, accumulator: _ValidationsAccumulator,
+                  sample: Tuple[bytes, bytes, bytes]):
+    metric_key = sample[1]
+    count = accumulator.sample_counts.get(metric_key, 0)
+    if count < self._max_failures_per_metric:
+      accumulator.samples.append(sample)
+      accumulator.sample_counts[metric_key] = count + 1
 
   def add_input(
-      self, result: 'Optional[validation_result_pb2.ValidationResult]',
+      self, accumulator: _ValidationsAccumulator,
       new_input: 'Optional[validation_result_pb2.ValidationResult]'
-  ) -> 'Optional[validation_result_pb2.ValidationResult]':
+  ) -> _ValidationsAccumulator:
     if new_input is None:
-      return None
-    if result is None:
-      result = validation_result_pb2.ValidationResult(validation_ok=True)
-    result.validation_ok &= new_input.validation_ok
-    result.metric_validations_per_slice.extend(
-        new_input.metric_validations_per_slice)
-    return result
+      return accumulator
+    accumulator.validation_ok = (
+        accumulator.validation_ok is not False and new_input.validation_ok)
+    for validation_for_slice in new_input.metric_validations_per_slice:
+      if not validation_for_slice.failures:
+        continue
+      accumulator.num_failing_slices += 1
+      slice_key = validation_for_slice.slice_key.SerializeToString(
+          deterministic=True)
+      for failure in validation_for_slice.failures:
+        metric_key = failure.metric_key.SerializeToString(deterministic=True)
+        accumulator.failure_counts[metric_key] = (
+            accumulator.failure_counts.get(metric_key, 0) + 1)
+        self._add_sample(accumulator,
+                         (slice_key, metric_key, failure.SerializeToString()))
+    return accumulator
 
   def merge_accumulators(
-      self,
-      accumulators: 'List[Optional[validation_result_pb2.ValidationResult]]'
-  ) -> 'Optional[validation_result_pb2.ValidationResult]':
-    accumulators = [accumulator for accumulator in accumulators if accumulator]
-    if not accumulators:
-      return None
-    result = validation_result_pb2.ValidationResult(validation_ok=True)
-    for new_input in accumulators:
-      result.metric_validations_per_slice.extend(
-          new_input.metric_validations_per_slice)
-      result.validation_ok &= new_input.validation_ok
+      self, accumulators: Iterable[_ValidationsAccumulator]
+  ) -> _ValidationsAccumulator:
+    result = self.create_accumulator()
+    for accumulator in accumulators:
+      if accumulator.validation_ok is None:
+        continue
+      result.validation_ok = (
+          result.validation_ok is not False and accumulator.validation_ok)
+      result.num_failing_slices += accumulator.num_failing_slices
+      for metric_key, count in accumulator.failure_counts.items():
+        result.failure_counts[metric_key] = (
+            result.failure_counts.get(metric_key, 0) + count)
+      for sample in accumulator.samples:
+        self._add_sample(result, sample)
     return result
 
   def extract_output(
-      self, accumulator: 'Optional[validation_result_pb2.ValidationResult]'
-  ) -> 'Optional[validation_result_pb2.ValidationResult]':
+      self, accumulator: _ValidationsAccumulator
+  ) -> validation_result_pb2.ValidationResult:
     # Verification fails if there is empty input.
-    if not accumulator:
-      result = validation_result_pb2.ValidationResult(validation_ok=False)
-      return result
-    return accumulator
+    if accumulator.validation_ok is None:
+      return validation_result_pb2.ValidationResult(validation_ok=False)
+    result = validation_result_pb2.ValidationResult(
+        validation_ok=accumulator.validation_ok,
+        num_failing_slices=accumulator.num_failing_slices)
+    # Failures are grouped by slice in the order the slices were first seen.
+    validations_per_slice = {}
+    for slice_key, _, failure in accumulator.samples:
+      if slice_key not in validations_per_slice:
+        validation_for_slice = result.metric_validations_per_slice.add()
+        validation_for_slice.slice_key.CopyFrom(
+            metrics_for_slice_pb2.SliceKey.FromString(slice_key))
+        validations_per_slice[slice_key] = validation_for_slice
+      validations_per_slice[slice_key].failures.add().CopyFrom(
+          validation_result_pb2.ValidationFailure.FromString(failure))
+    for metric_key, count in accumulator.failure_counts.items():
+      failure_count = result.failure_counts.add(num_failures=count)
+      failure_count.metric_key.CopyFrom(
+          metrics_for_slice_pb2.MetricKey.FromString(metric_key))
+      result.num_failures += count
+    result.failures_truncated = result.num_failures > len(accumulator.samples)
+    return result
 
 
 @beam.ptransform_fn
@@ -132,7 +285,9 @@ class _CombineValidations(beam.CombineFn):
 def _WriteMetricsPlotsAndValidations(
     evaluation: evaluator.Evaluation, output_paths: Dict[Text, Text],
     add_metrics_callbacks: List[types.AddMetricsCallbackType],
-    metrics_key: Text, plots_key: Text, validations_key: Text):
+    metrics_key: Text, plots_key: Text, validations_key: Text,
+    accumulators_key: Text, calibration_histograms_key: Text, windowed: bool,
+    max_validation_failures_per_metric: int):
   """PTransform to write metrics and plots."""
   # Skip write if no metrics, plots, or validations are used.
   if (metrics_key not in evaluation and plots_key not in evaluation and
@@ -143,8 +298,12 @@ def _WriteMetricsPlotsAndValidations(
     metrics = (
         evaluation[metrics_key] |
         'SerializeMetrics' >> metrics_and_plots_serialization.SerializeMetrics(
-            add_metrics_callbacks=add_metrics_callbacks))
-    if constants.METRICS_KEY in output_paths:
+            add_metrics_callbacks=add_metrics_callbacks,
+            include_window=windowed))
+    if windowed and constants.METRICS_KEY in output_paths:
+      _ = metrics | 'WriteMetrics' >> _WriteToWindowedTFRecords(
+          output_paths[constants.METRICS_KEY], constants.METRICS_KEY)
+    elif constants.METRICS_KEY in output_paths:
       # We only use a single shard here because metrics are usually single
       # values so even with 1M slices and a handful of metrics the size
       # requirements will only be a few hundred MB.
@@ -156,8 +315,12 @@ def _WriteMetricsPlotsAndValidations(
     plots = (
         evaluation[plots_key]
         | 'SerializePlots' >> metrics_and_plots_serialization.SerializePlots(
-            add_metrics_callbacks=add_metrics_callbacks))
-    if constants.PLOTS_KEY in output_paths:
+            add_metrics_callbacks=add_metrics_callbacks,
+            include_window=windowed))
+    if windowed and constants.PLOTS_KEY in output_paths:
+      _ = plots | 'WritePlots' >> _WriteToWindowedTFRecords(
+          output_paths[constants.PLOTS_KEY], constants.PLOTS_KEY)
+    elif constants.PLOTS_KEY in output_paths:
       # We only use a single shard here because we are assuming that plots will
       # not be enabled when millions of slices are in use. By default plots are
       # stored with 1K thresholds with each plot entry taking up to 7 fields
@@ -168,15 +331,95 @@ def _WriteMetricsPlotsAndValidations(
           shard_name_template='')
 
   if validations_key in evaluation:
+    combine_validations = beam.CombineGlobally(
+        _CombineValidations(max_validation_failures_per_metric))
+    if windowed:
+      # Validation results are produced per window. A window without any
+      # results does not produce an (invalid) default result.
+      combine_validations = combine_validations.without_defaults()
     validations = (
         evaluation[validations_key]
-        |
-        'MergeValidationResults' >> beam.CombineGlobally(_CombineValidations())
+        | 'MergeValidationResults' >> combine_validations
         | 'SerializeValidationResults' >> SerializeValidations())
-    if constants.VALIDATIONS_KEY in output_paths:
+    if windowed and constants.VALIDATIONS_KEY in output_paths:
+      _ = validations | 'WriteValidations' >> _WriteToWindowedTFRecords(
+          output_paths[constants.VALIDATIONS_KEY], constants.VALIDATIONS_KEY)
+    elif constants.VALIDATIONS_KEY in output_paths:
       # We only use a single shard here because validations are usually single
       # values.
       _ = validations | 'WriteValidations' >> beam.io.WriteToTFRecord(
           file_path_prefix=output_paths[constants.VALIDATIONS_KEY],
           shard_name_template='')
+    failures = (
+        evaluation[validations_key]
+        | 'ExtractValidationFailures' >>
+        beam.FlatMap(lambda v: v.metric_validations_per_slice)
+        | 'SerializeValidationFailures' >>
+        beam.Map(lambda v: v.SerializeToString()))
+    if windowed and constants.VALIDATION_FAILURES_KEY in output_paths:
+      _ = failures | 'WriteValidationFailures' >> _WriteToWindowedTFRecords(
+          output_paths[constants.VALIDATION_FAILURES_KEY],
+          constants.VALIDATION_FAILURES_KEY)
+    elif constants.VALIDATION_FAILURES_KEY in output_paths:
+      # Unlike the ValidationResult, the failures grow with the number of
+      # failing slices so the output is sharded.
+      _ = failures | 'WriteValidationFailures' >> beam.io.WriteToTFRecord(
+          file_path_prefix=output_paths[constants.VALIDATION_FAILURES_KEY])
+
+  if accumulators_key in evaluation:
+    if windowed and constants.ACCUMULATORS_KEY in output_paths:
+      _ = (
+          evaluation[accumulators_key]
+          | 'WriteAccumulators' >> _WriteToWindowedTFRecords(
+              output_paths[constants.ACCUMULATORS_KEY],
+              constants.ACCUMULATORS_KEY))
+    elif constants.ACCUMULATORS_KEY in output_paths:
+      # Unlike the metrics, the accumulators may contain large state per slice
+      # (e.g. calibration histograms) so the output is sharded.
+      _ = (
+          evaluation[accumulators_key]
+          | 'WriteAccumulators' >> beam.io.WriteToTFRecord(
+              file_path_prefix=output_paths[constants.ACCUMULATORS_KEY]))
+
+  if calibration_histograms_key in evaluation:
+    histograms = (
+        evaluation[calibration_histograms_key]
+        | 'SerializeCalibrationHistograms' >>
+        metrics_and_plots_serialization.SerializeCalibrationHistograms(
+            include_window=windowed))
+    if windowed and constants.CALIBRATION_HISTOGRAMS_KEY in output_paths:
+      _ = (
+          histograms
+          | 'WriteCalibrationHistograms' >> _WriteToWindowedTFRecords(
+              output_paths[constants.CALIBRATION_HISTOGRAMS_KEY],
+              constants.CALIBRATION_HISTOGRAMS_KEY))
+    elif constants.CALIBRATION_HISTOGRAMS_KEY in output_paths:
+      # Histograms have up to DEFAULT_NUM_BUCKETS + 2 buckets per slice so the
+      # output is sharded (like the accumulators).
+      _ = histograms | 'WriteCalibrationHistograms' >> beam.io.WriteToTFRecord(
+          file_path_prefix=output_paths[constants.CALIBRATION_HISTOGRAMS_KEY])
+  return beam.pvalue.PDone(metrics.pipeline)
+
+
+@beam.ptransform_fn
+@beam.typehints.with_input_types(evaluator.Evaluation)
+@beam.typehints.with_output_types(beam.pvalue.PDone)
+def _WriteMetricsToCallback(  # pylint: disable=invalid-name
+    evaluation: evaluator.Evaluation,
+    callback: Callable[[metrics_for_slice_pb2.MetricsForSlice], None],
+    add_metrics_callbacks: List[types.AddMetricsCallbackType],
+    metrics_key: Text):
+  """PTransform to pass metrics to a callback."""
+  if metrics_key not in evaluation:
+    return beam.pvalue.PDone(list(evaluation.values())[0].pipeline)
+
+  def call_callback(serialized: bytes):
+    callback(metrics_for_slice_pb2.MetricsForSlice.FromString(serialized))
+
+  metrics = evaluation[metrics_key]
+  _ = (
+      metrics
+      | 'SerializeMetrics' >> metrics_and_plots_serialization.SerializeMetrics(
+          add_metrics_callbacks=add_metrics_callbacks, include_window=True)
+      | 'CallCallback' >> beam.Map(call_callback))
   return beam.pvalue.PDone(metrics.pipeline)
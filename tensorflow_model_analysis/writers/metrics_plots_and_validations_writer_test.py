@@ -36,6 +36,7 @@ from tensorflow_model_analysis.extractors import input_extractor
 from tensorflow_model_analysis.extractors import predict_extractor
 from tensorflow_model_analysis.extractors import predict_extractor_v2
 from tensorflow_model_analysis.extractors import slice_key_extractor
+from tensorflow_model_analysis.metrics import metric_types
 from tensorflow_model_analysis.post_export_metrics import post_export_metrics
 from tensorflow_model_analysis.proto import metrics_for_slice_pb2
 from tensorflow_model_analysis.proto import validation_result_pb2
@@ -43,6 +44,29 @@ from tensorflow_model_analysis.slicer import slicer_lib as slicer
 from tensorflow_model_analysis.writers import metrics_plots_and_validations_writer
 from google.protobuf import text_format
 
+# Results passed to _collectMetrics. This must be stored at module level since
+# the callback is pickled when the pipeline runs.
+_COLLECTED_METRICS = []
+
+
+def _collectMetrics(metrics_for_slice):  # pylint: disable=invalid-name
+  _COLLECTED_METRICS.append(metrics_for_slice)
+
+
+def _windowedMetrics(pipeline):  # pylint: disable=invalid-name
+  """Returns example_count metrics in two fixed windows of 10 seconds."""
+  example_count_key = metric_types.MetricKey(name='example_count')
+  return (pipeline
+          | 'Create' >> beam.Create([
+              beam.window.TimestampedValue(((), {
+                  example_count_key: 2.0
+              }), 1),
+              beam.window.TimestampedValue(((), {
+                  example_count_key: 3.0
+              }), 12),
+          ])
+          | 'WindowInto' >> beam.WindowInto(beam.window.FixedWindows(10)))
+
 
 class MetricsPlotsAndValidationsWriterTest(testutil.TensorflowModelAnalysisTest
                                           ):
@@ -170,8 +194,11 @@ class MetricsPlotsAndValidationsWriterTest(testutil.TensorflowModelAnalysisTest
         metrics_and_plots_evaluator_v2.MetricsAndPlotsEvaluator(
             eval_config=eval_config, eval_shared_model=eval_shared_models)
     ]
+    validation_failures_path = os.path.join(self._getTempDir(),
+                                            constants.VALIDATION_FAILURES_KEY)
     output_paths = {
         constants.VALIDATIONS_KEY: validations_file,
+        constants.VALIDATION_FAILURES_KEY: validation_failures_path,
     }
     writers = [
         metrics_plots_and_validations_writer.MetricsPlotsAndValidationsWriter(
@@ -263,6 +290,74 @@ class MetricsPlotsAndValidationsWriterTest(testutil.TensorflowModelAnalysisTest
     self.assertCountEqual(
         expected_validations,
         validation_result.metric_validations_per_slice[0].failures)
+    self.assertEqual(3, validation_result.num_failures)
+    self.assertEqual(1, validation_result.num_failing_slices)
+    self.assertFalse(validation_result.failures_truncated)
+    validation_failures = model_eval_lib.load_validation_failures(
+        validation_failures_path)
+    self.assertLen(validation_failures, 1)
+    self.assertCountEqual(expected_validations,
+                          validation_failures[0].failures)
+
+  def testCombineValidationsKeepsBoundedSampleOfFailures(self):
+    combiner = metrics_plots_and_validations_writer._CombineValidations(
+        max_failures_per_metric=2)
+    metric_keys = [
+        metric_types.MetricKey(name='m1').to_proto(),
+        metric_types.MetricKey(name='m2').to_proto()
+    ]
+    inputs = []
+    for i in range(5):
+      validation_for_slice = validation_result_pb2.MetricsValidationForSlice()
+      validation_for_slice.slice_key.single_slice_keys.add(
+          column='f', int64_value=i)
+      # Slice i fails m1, and even slices also fail m2.
+      for metric_key in metric_keys[:1 if i % 2 else 2]:
+        validation_for_slice.failures.add(metric_key=metric_key)
+      inputs.append(
+          validation_result_pb2.ValidationResult(
+              validation_ok=False,
+              metric_validations_per_slice=[validation_for_slice]))
+    inputs.append(validation_result_pb2.ValidationResult(validation_ok=True))
+
+    accumulators = []
+    for i in range(3):
+      accumulator = combiner.create_accumulator()
+      for new_input in inputs[i::3]:
+        accumulator = combiner.add_input(accumulator, new_input)
+      accumulators.append(accumulator)
+    result = combiner.extract_output(
+        combiner.merge_accumulators(accumulators))
+
+    self.assertFalse(result.validation_ok)
+    self.assertTrue(result.failures_truncated)
+    self.assertEqual(8, result.num_failures)
+    self.assertEqual(5, result.num_failing_slices)
+    self.assertEqual(
+        [(metric_keys[0], 5), (metric_keys[1], 3)],
+        [(c.metric_key, c.num_failures) for c in result.failure_counts])
+    sampled = [
+        f.metric_key
+        for v in result.metric_validations_per_slice
+        for f in v.failures
+    ]
+    self.assertEqual(2, sampled.count(metric_keys[0]))
+    self.assertEqual(2, sampled.count(metric_keys[1]))
+
+  def testCombineValidationsWithoutInputs(self):
+    combiner = metrics_plots_and_validations_writer._CombineValidations(
+        max_failures_per_metric=2)
+    self.assertEqual(
+        validation_result_pb2.ValidationResult(validation_ok=False),
+        combiner.extract_output(
+            combiner.merge_accumulators([combiner.create_accumulator()])))
+    result = combiner.extract_output(
+        combiner.add_input(
+            combiner.create_accumulator(),
+            validation_result_pb2.ValidationResult(validation_ok=True)))
+    self.assertTrue(result.validation_ok)
+    self.assertEqual(0, result.num_failures)
+    self.assertFalse(result.failures_truncated)
 
   def testWriteMetricsAndPlots(self):
     metrics_file = os.path.join(self._getTempDir(), 'metrics')
@@ -403,6 +498,55 @@ class MetricsPlotsAndValidationsWriterTest(testutil.TensorflowModelAnalysisTest
     self.assertEqual(1, len(plot_records), 'plots: %s' % plot_records)
     self.assertProtoEquals(expected_plots_for_slice, plot_records[0])
 
+  def testWriteWindowedMetrics(self):
+    metrics_dir = os.path.join(self._getTempDir(), 'metrics')
+    writers = [
+        metrics_plots_and_validations_writer.MetricsPlotsAndValidationsWriter(
+            {constants.METRICS_KEY: metrics_dir}, [], windowed=True)
+    ]
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      _ = ({
+          constants.METRICS_KEY: _windowedMetrics(pipeline)
+      }
+           | 'WriteResults' >> model_eval_lib.WriteResults(writers=writers))
+      # pylint: enable=no-value-for-parameter
+
+    metric_records = []
+    for metrics_file in tf.io.gfile.glob(os.path.join(metrics_dir, '*')):
+      for record in tf.compat.v1.python_io.tf_record_iterator(metrics_file):
+        metric_records.append(
+            metrics_for_slice_pb2.MetricsForSlice.FromString(record))
+    self.assertLen(tf.io.gfile.glob(os.path.join(metrics_dir, '*')), 2)
+    metric_records.sort(key=lambda m: m.window.start_micros)
+    expected = [(0, 10000000, 2.0), (10000000, 20000000, 3.0)]
+    self.assertEqual(expected, [
+        (m.window.start_micros, m.window.end_micros,
+         m.metric_keys_and_values[0].value.double_value.value)
+        for m in metric_records
+    ])
+
+  def testMetricsCallbackWriter(self):
+    del _COLLECTED_METRICS[:]
+    writers = [
+        metrics_plots_and_validations_writer.MetricsCallbackWriter(
+            _collectMetrics)
+    ]
+
+    with beam.Pipeline() as pipeline:
+      # pylint: disable=no-value-for-parameter
+      _ = ({
+          constants.METRICS_KEY: _windowedMetrics(pipeline)
+      }
+           | 'WriteResults' >> model_eval_lib.WriteResults(writers=writers))
+      # pylint: enable=no-value-for-parameter
+
+    got = sorted((m.window.start_micros,
+                  m.metric_keys_and_values[0].value.double_value.value)
+                 for m in _COLLECTED_METRICS)
+    self.assertEqual([(0, 2.0), (10000000, 3.0)], got)
+
 
 if __name__ == '__main__':
   tf.compat.v1.enable_v2_behavior()